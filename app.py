@@ -4,6 +4,7 @@ Run: streamlit run app.py
 """
 import os
 import json
+from collections import deque
 from datetime import datetime, timedelta
 import pytz
 
@@ -12,19 +13,48 @@ import streamlit as st  # type: ignore
 
 from portodash.data_fetch import get_current_prices, fetch_and_store_snapshot
 from portodash.calculations import compute_portfolio_df
-from portodash.fx import get_fx_rates
-from portodash.viz import make_allocation_pie, make_30d_performance_chart, make_snapshot_performance_chart
+from portodash.fx import fx_rate_ages, get_fx_rates
+from portodash.viz import (
+    make_allocation_pie,
+    make_cube_performance_chart,
+    make_breakdown_performance_chart,
+    make_correlation_heatmap,
+    make_projection_fan_chart,
+)
+from portodash.performance import load_snapshot_cube, compute_breakdowns
+from portodash.returns import ReturnsEngine, TOTAL
+from portodash.risk import get_risk_report
+from portodash.price_store import get_price_history, store_mtime as price_store_mtime
+from portodash.distributions import events_mtime, load_events, refresh_distributions, total_return_values
+from portodash.simulation import project_portfolio
+from portodash.rebalance import compute_rebalance_trades
+from portodash import query as query_layer, tracing
+from portodash.query import is_available as query_layer_available
+from portodash.portfolio import load_portfolio
+from portodash.ledger import default_path as ledger_default_path, load_ledger
+from portodash.locking import LockTimeout
+from portodash.snapshot_store import history_path
+from portodash.export import FORMATS as EXPORT_FORMATS, export_file_name, export_history, export_mime
 from portodash.fund_names import get_fund_names, format_ticker_with_name
+from portodash.holdings_grid import (
+    COLUMN_FORMATS,
+    DEFAULT_PAGE_SIZE,
+    DISPLAY_COLUMNS,
+    PAGE_SIZES,
+    SORT_COLUMNS,
+    TREND_COLORS,
+    TREND_OPTIONS,
+    holdings_frame,
+    query_holdings,
+    trend_column,
+)
 from portodash.theme import (
-    inject_modern_fintech_css,
-    inject_typography_css,
-    inject_accessibility_css,
+    inject_theme_css,
     render_metric_card,
     render_metric_grid,
     render_page_title,
     render_section_header,
     render_subsection_header,
-    render_sidebar_subtitle,
     render_sidebar_title,
     get_section_label,
 )
@@ -32,61 +62,523 @@ from portodash.theme import (
 
 BASE_DIR = os.path.dirname(__file__)
 PORTFOLIO_PATH = os.path.join(BASE_DIR, 'portfolio.json') if not os.path.exists('portfolio.json') else 'portfolio.json'
-HIST_CSV = os.path.join(BASE_DIR, 'historical.csv')
+# historical.db (SQLite store) when present, historical.csv otherwise
+HIST_CSV = history_path(BASE_DIR)
 FX_CSV = os.path.join(BASE_DIR, 'fx_rates.csv')
 
+# Performance panel: reruns kept in the rolling history; PORTODASH_TRACE=1 traces every rerun
+PERF_HISTORY_SIZE = 20
+TRACE_FROM_ENV = tracing.is_enabled()
 
-def load_portfolio(path):
-    """Load portfolio from new account-centric JSON structure.
-    
-    Returns:
-        dict with keys:
-        - 'accounts': list of account metadata dicts
-        - 'holdings': flat list of holdings with account metadata attached
+TIMEZONE = pytz.timezone('America/Toronto')
+# Price refresh rate limiting, in seconds
+COOLDOWN_SECONDS = 60
+RATE_LIMIT_EXTENDED_COOLDOWN = 3600  # 1 hour if rate limited by yfinance
+# Rates are cached for 12 hours in logs/fx_rates.json; this only bounds how
+# long a session keeps them (and retries after a failed fetch)
+FX_CACHE_TTL = 3600
+# Seconds between scheduler process/log checks
+SCHEDULER_CHECK_TTL = 30
+
+
+def _file_mtime(path):
+    """Return a file's mtime (or None) for use as a cache key."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@st.cache_data(ttl=FX_CACHE_TTL, show_spinner=False)
+def _cached_fx_rates(currencies, base_currency):
+    """Rates to the reporting currency for every currency in the portfolio, shared by all filter selections."""
+    return get_fx_rates(currencies, base=base_currency) if currencies else {}
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_portfolio_df(portfolio_mtime, selection, prices, fx_rates, base_currency):
+    """compute_portfolio_df for a (nicknames, holders, types) filter selection.
+
+    prices and fx_rates are sorted item tuples so the call is hashable; an
+    empty selection means every holding.
+    """
+    holdings = load_portfolio(PORTFOLIO_PATH).filter_holdings(*selection)
+    return compute_portfolio_df(holdings, dict(prices), fx_rates=dict(fx_rates), base_currency=base_currency)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_snapshot_cube(csv_path, fx_csv_path, csv_mtime, fx_mtime):
+    """Load the last MAX_PERIOD_DAYS of the snapshot cube once per
+    historical.csv / fx_rates.csv version; every period selection slices it.
+
+    A shared resource rather than cache_data: the cube is only ever sliced,
+    never modified, so reruns skip copying it out of the cache.
+    """
+    # A day extra: periods start at midnight UTC, not at this moment
+    return load_snapshot_cube(csv_path, fx_csv_path=fx_csv_path, days=MAX_PERIOD_DAYS + 1)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _returns_engine(csv_path, fx_csv_path, accounts):
+    """Incremental returns state for an account selection, kept across historical.csv versions."""
+    return ReturnsEngine()
+
+
+def _period_start(days):
+    """First date (midnight UTC) of a window covering today and the previous days."""
+    return pd.Timestamp.now(tz='UTC').normalize() - pd.Timedelta(days=days)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_breakdowns(csv_path, fx_csv_path, csv_mtime, fx_mtime, accounts, start, account_meta):
+    """Slice the cached cube from start, compute every breakdown in one grouped
+    pass and the flow-adjusted returns for the window.
+
+    Keyed on the window's start date rather than its length, so an entry
+    computed before midnight is not reused for the next day's window.
+    accounts and account_meta are tuples so the filter selection is hashable.
+    Returns come from the selection's ReturnsEngine, which only links the
+    snapshots added since its last update, and are then cut to the window.
+    """
+    history = _cached_snapshot_cube(csv_path, fx_csv_path, csv_mtime, fx_mtime).slice(accounts=list(accounts))
+    cube = history.slice(start=start)
+    breakdowns = compute_breakdowns(cube, {name: {'holder': holder, 'type': type_} for name, holder, type_ in account_meta})
+    returns = _returns_engine(csv_path, fx_csv_path, accounts).update(history).slice(start)
+    return cube, breakdowns, returns
+
+
+def _export_payload(fmt, start, end, accounts, tickers):
+    """Bytes for the snapshot download, produced only when the button is clicked.
+
+    export_history streams the (filtered) export to logs/exports/ once per
+    historical.csv version; later clicks reuse the file. The finished file is
+    still returned as one bytes object, so an unfiltered CSV export holds
+    about the size of historical.csv in memory while it is being served.
     """
-    with open(path, 'r') as f:
-        data = json.load(f)
+    path = export_history(HIST_CSV, fmt, start=start, end=end, accounts=accounts, tickers=tickers)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@st.cache_data(show_spinner=False)
+def _cached_sql_insights(csv_path, fx_csv_path, csv_mtime, fx_mtime, start, account_meta):
+    """Quarterly gain by account type and FX contribution by holder (DuckDB).
+
+    Keyed on the window's start date, like _cached_breakdowns, so the
+    FX window moves forward at midnight.
+    """
+    accounts = [{'nickname': name, 'holder': holder, 'type': type_} for name, holder, type_ in account_meta]
+    con = query_layer.connect(csv_path, fx_csv_path, accounts=accounts)
+    try:
+        start = start.date()
+        return query_layer.run(con, 'gain_by_type', period='quarter'), query_layer.run(con, 'fx_contribution_by_holder', start=start)
+    finally:
+        con.close()
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_risk_report(tickers, benchmark, store_mtime, today):
+    """Risk metrics for tickers, recomputed only when the price store changes
+    or the date rolls over (the store tops itself up at most once a day)."""
+    return get_risk_report(list(tickers), benchmark=benchmark, window=63, period='1y')
+
+
+@st.cache_data(show_spinner=False)
+def _cached_distribution_events(tickers, events_mtime):
+    """Stored dividend/split events, reloaded only when the store file changes."""
+    return load_events(tickers)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_projection(portfolio_df, prices, horizon_days, n_paths=10_000):
+    """Monte Carlo bands for the visible holdings (fixed seed so reruns are stable)."""
+    return project_portfolio(portfolio_df, prices, horizon_days=horizon_days, n_paths=n_paths, seed=0)
+
+
+@st.cache_data(ttl=SCHEDULER_CHECK_TTL, show_spinner=False)
+def _detect_scheduler_running():
+    """Return (running_bool, method) where method is 'process' or 'log' or None."""
+    # Try psutil first
+    try:
+        import psutil
+        for p in psutil.process_iter(['cmdline']):
+            try:
+                cmd = p.info.get('cmdline') or []
+                if any('run_scheduler.py' in str(c) for c in cmd):
+                    return True, 'process'
+            except Exception:
+                continue
+    except Exception:
+        # psutil not available; fall back to log inspection
+        pass
+
+    # Check today's scheduler log as a heuristic
+    log_path = os.path.join(BASE_DIR, 'logs', f'scheduler_{datetime.now().strftime("%Y%m%d")}.log')
+    try:
+        if os.path.exists(log_path):
+            # if log exists and was modified recently, consider scheduler running
+            mtime = datetime.fromtimestamp(os.path.getmtime(log_path), TIMEZONE)
+            if (datetime.now(TIMEZONE) - mtime).total_seconds() < 24 * 3600:
+                return True, 'log'
+            return False, 'log'
+    except Exception:
+        pass
+
+    return False, None
+
+
+# Benchmarks offered in the risk section alongside the portfolio's own tickers
+RISK_BENCHMARKS = ['XIC.TO', 'SPY']
+
+
+# Performance chart breakdown options -> compute_breakdowns keys
+BREAKDOWN_OPTIONS = {
+    'Total': 'total',
+    'Account': 'account',
+    'Holder': 'holder',
+    'Account type': 'type',
+    'Fund/ETF': 'ticker',
+}
+
+
+PERIOD_OPTIONS = {'Last day': 1, 'Last 7 days': 7, 'Last 30 days': 30}
+# Longest period any selection offers; the cached snapshot cube covers it
+MAX_PERIOD_DAYS = 30
+
+
+def _select_period():
+    """Performance period in days, from the preset selector (and custom slider)."""
+    # Date range selector with radio buttons for presets and custom option
+    st.markdown('<div aria-label="Performance period selector: Choose a preset or custom date range for the performance chart">', unsafe_allow_html=True)
+    range_option = st.radio(
+        'Performance chart period',
+        options=list(PERIOD_OPTIONS) + ['Custom'],
+        index=2,  # Default to 30 days
+        key='range_preset',
+        horizontal=True,
+        label_visibility='collapsed'
+    )
+    if range_option in PERIOD_OPTIONS:
+        days = PERIOD_OPTIONS[range_option]
+    else:  # Custom
+        days = st.slider(
+            'Days',
+            min_value=1,
+            max_value=MAX_PERIOD_DAYS,
+            value=MAX_PERIOD_DAYS,
+            step=1,
+            help='Select a custom date range',
+            key='custom_days_slider',
+            label_visibility='collapsed'
+        )
+    st.markdown('</div>', unsafe_allow_html=True)
+    return days
+
+
+# Sections below are fragments: their own widgets rerun only the section, with
+# the arguments of the last full run as inputs. Full reruns (filter changes,
+# refreshes) call them again with fresh arguments.
+
+@st.fragment
+def _performance_section(visible_accounts, account_meta, all_tickers):
+    """Performance chart, flow-adjusted returns and SQL aggregates.
+
+    The period selector and the breakdown radio are drawn in this fragment's
+    body (a fragment may not draw into containers created outside it), so
+    changing them recomputes only this section.
+    """
+    # Performance chart from snapshots
+    st.markdown("---")
+    header = st.empty()
+    days = _select_period()
+    header.markdown(render_section_header(f"Performance — Last {days} Days"), unsafe_allow_html=True)
     
-    # Validate new structure
-    if 'accounts' not in data:
-        raise ValueError(
-            "Portfolio file must use new account-centric structure with 'accounts' key. "
-            "See portfolio_new_format.json for the required format."
+    # Use snapshot-based chart (from historical.csv); filters slice a cached cube
+    if os.path.exists(HIST_CSV):
+        breakdown_label = st.radio(
+            'View by',
+            options=list(BREAKDOWN_OPTIONS),
+            horizontal=True,
+            key='performance_breakdown',
+        )
+        perf_cube, breakdowns, perf_returns = _cached_breakdowns(
+            HIST_CSV, FX_CSV, _file_mtime(HIST_CSV), _file_mtime(FX_CSV), visible_accounts, _period_start(days),
+            account_meta
         )
+        dimension = BREAKDOWN_OPTIONS[breakdown_label]
+        # Semantic wrapper with ARIA label for screen readers
+        st.markdown(f'<div role="img" aria-label="Performance line chart showing portfolio value over the last {days} days with FX impact analysis">', unsafe_allow_html=True)
+        if dimension == 'total':
+            # Distributions come from the local store only; refreshing prices updates it
+            events = _cached_distribution_events(all_tickers, events_mtime())
+            total_return = total_return_values(perf_cube, events) if not events.empty else None
+            perf_fig = make_cube_performance_chart(perf_cube, days=days, total_return=total_return)
+        else:
+            perf_fig = make_breakdown_performance_chart(breakdowns[dimension], dimension_label=breakdown_label)
+        st.plotly_chart(perf_fig, use_container_width=True, config={'displayModeBar': False})
+        st.markdown('</div>', unsafe_allow_html=True)
+
+        # Flow-adjusted returns: share count changes are contributions, not performance
+        twr = perf_returns.twr(TOTAL)
+        irr = perf_returns.irr.get(TOTAL)
+        # Windows shorter than a year show the period return; annualizing days of data overstates it
+        annualized = perf_returns.years >= 1
+        mwr = irr if annualized else perf_returns.mwr(TOTAL)
+        if twr is not None:
+            return_cards = [
+                render_metric_card(
+                    'Time-Weighted Return',
+                    f"{twr * 100:+.2f}%",
+                    value_is_currency=False,
+                    help_text=f'Chain-linked daily returns over the last {days} days, excluding share changes',
+                )
+            ]
+            if mwr is not None:
+                return_cards.append(
+                    render_metric_card(
+                        'Money-Weighted Return (annualized)' if annualized else 'Money-Weighted Return',
+                        f"{mwr * 100:+.2f}%",
+                        value_is_currency=False,
+                        help_text=('Annualized IRR of contributions and current value' if annualized else
+                                   f'IRR of contributions and current value over the last {days} days, '
+                                   'not annualized'),
+                    )
+                )
+            st.markdown(render_metric_grid(*return_cards), unsafe_allow_html=True)
+
+        # Period aggregates from the optional DuckDB query layer
+        if query_layer_available():
+            with st.expander('Quarterly gains and FX contribution (SQL)'):
+                gains, fx_contribution = _cached_sql_insights(
+                    HIST_CSV, FX_CSV, _file_mtime(HIST_CSV), _file_mtime(FX_CSV), _period_start(days), account_meta
+                )
+                st.markdown(render_subsection_header('Unrealized gain by account type, per quarter'), unsafe_allow_html=True)
+                st.dataframe(gains, width='stretch', hide_index=True, column_config={
+                    'period': st.column_config.DateColumn('Quarter', format='YYYY-[Q]Q'),
+                    'type': st.column_config.TextColumn('Account type'),
+                    'value_cad': st.column_config.NumberColumn('Value (CAD)', format='$%.0f'),
+                    'cost_cad': st.column_config.NumberColumn('Cost (CAD)', format='$%.0f'),
+                    'gain_cad': st.column_config.NumberColumn('Gain (CAD)', format='$%.0f'),
+                    'value_change_cad': st.column_config.NumberColumn('Change vs prior quarter', format='$%.0f'),
+                })
+                st.markdown(render_subsection_header(f'FX contribution by holder, last {days} days'), unsafe_allow_html=True)
+                st.dataframe(fx_contribution, width='stretch', hide_index=True, column_config={
+                    'holder': st.column_config.TextColumn('Holder'),
+                    'value_cad': st.column_config.NumberColumn('Value (CAD)', format='$%.0f'),
+                    'fx_contribution_cad': st.column_config.NumberColumn('FX contribution (CAD)', format='$%.0f'),
+                })
+    else:
+        st.info('No historical snapshots yet. Capture a daily snapshot to build your performance history.')
+
+
+@st.fragment
+def _risk_section(risk_tickers, df):
+    """Risk metrics, correlations and projection for the visible tickers (opt-in)."""
+    # Risk analytics from the local price store (opt-in: first load downloads history)
+    st.markdown("---")
+    st.markdown(render_section_header('Risk'), unsafe_allow_html=True)
+    risk_tickers = list(risk_tickers)
+    if st.toggle('Show risk analytics', key='show_risk', help='Downloads missing daily prices once, then reuses the local price store'):
+        benchmark_options = list(dict.fromkeys(RISK_BENCHMARKS + risk_tickers))
+        benchmark = st.selectbox('Benchmark', options=benchmark_options, key='risk_benchmark')
+        with st.spinner('Computing risk metrics...'):
+            risk_report = _cached_risk_report(
+                tuple(risk_tickers), benchmark, price_store_mtime(), datetime.utcnow().date()
+            )
+        if risk_report.volatility.empty:
+            st.info('No price history available for risk analytics yet.')
+        else:
+            risk_summary = risk_report.summary().reindex(risk_tickers).reset_index()
+            risk_summary[['volatility', 'max_drawdown']] *= 100
+            st.dataframe(
+                risk_summary,
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    'ticker': st.column_config.TextColumn('Fund/ETF'),
+                    'volatility': st.column_config.NumberColumn('Volatility (63d, ann.)', format='%.1f%%'),
+                    'max_drawdown': st.column_config.NumberColumn('Max Drawdown (1y)', format='%.1f%%'),
+                    'beta': st.column_config.NumberColumn(f'Beta vs {benchmark}', format='%.2f'),
+                },
+            )
+            st.markdown('<div role="img" aria-label="Correlation heatmap of daily returns between holdings">', unsafe_allow_html=True)
+            corr = risk_report.correlation.reindex(index=risk_tickers, columns=risk_tickers)
+            st.plotly_chart(make_correlation_heatmap(corr), use_container_width=True, config={'displayModeBar': False})
+            st.markdown('</div>', unsafe_allow_html=True)
+
+            st.markdown(render_subsection_header('Projection'), unsafe_allow_html=True)
+            horizon_years = st.select_slider(
+                'Projection horizon',
+                options=[1, 3, 5, 10],
+                value=1,
+                format_func=lambda y: f"{y} year{'s' if y > 1 else ''}",
+                key='projection_years',
+            )
+            risk_prices = get_price_history(risk_tickers, period='1y', refresh=False)
+            projection = _cached_projection(df, risk_prices, horizon_years * 252)
+            st.markdown(f'<div role="img" aria-label="Fan chart of projected portfolio value percentiles over {horizon_years} years">', unsafe_allow_html=True)
+            st.plotly_chart(make_projection_fan_chart(projection), use_container_width=True, config={'displayModeBar': False})
+            st.markdown('</div>', unsafe_allow_html=True)
+            st.caption('10,000 simulated paths using correlated daily returns from the last year. Illustrative only, not a forecast.')
+
+
+@st.fragment
+def _data_management_section(can_refresh, all_tickers, ledger, all_holdings, holdings, prices, fetched_at_iso, accounts):
+    """Refresh, snapshot and export controls; export options rerun only this section."""
+    now = datetime.now(TIMEZONE)
+    # Data Management
+    st.markdown("---")
+    st.markdown(render_section_header('Data Management'), unsafe_allow_html=True)
     
-    # Store accounts metadata
-    accounts = data['accounts']
+    col1, col2, col3 = st.columns([1, 1, 1])
+    
+    with col1:
+        # Manual refresh button
+        refresh_disabled = not can_refresh
+        refresh_help = 'Fetch latest prices from Yahoo Finance'
+        
+        if st.session_state.rate_limited_until and now < st.session_state.rate_limited_until:
+            remaining_mins = int((st.session_state.rate_limited_until - now).total_seconds()) // 60
+            refresh_help = f'Rate limited - retry in {remaining_mins} minutes'
+        elif not can_refresh:
+            refresh_help = 'Cooldown active - wait before retrying'
+        
+        st.markdown('<div aria-label="Refresh prices button: Fetch latest prices from Yahoo Finance for all portfolio holdings">', unsafe_allow_html=True)
+        if st.button('Refresh prices', disabled=refresh_disabled, width='stretch', help=refresh_help):
+            # Trigger a manual refresh
+            with st.spinner('Fetching latest prices...'):
+                st.session_state.fetch_in_progress = True
+                
+                try:
+                    prices, fetched_at_iso, price_source = get_current_prices(all_tickers, csv_path=HIST_CSV)
+                    st.session_state.prices_cache = prices
+                    st.session_state.fetched_at_iso = fetched_at_iso
+                    st.session_state.price_source = price_source
+                    st.session_state.last_fetch_time = now
+                    st.session_state.last_error = None
+                    st.session_state.rate_limited_until = None
+                    # Top up dividend/split history (only new or day-old tickers are downloaded)
+                    try:
+                        refresh_distributions(all_tickers)
+                    except Exception as e:
+                        st.caption(f'Distributions not updated: {e}')
+                    st.success('Prices updated successfully')
+                    st.rerun()
+                except Exception as e:
+                    error_msg = str(e)
+                    if 'YFRateLimitError' in error_msg or 'Rate limited' in error_msg or 'Too Many Requests' in error_msg:
+                        st.session_state.rate_limited_until = now + timedelta(seconds=RATE_LIMIT_EXTENDED_COOLDOWN)
+                        st.session_state.last_error = "Rate limit reached"
+                        st.error(f'Rate limited - retry available in 1 hour')
+                    else:
+                        st.session_state.last_error = error_msg
+                        st.error(f'Fetch failed: {error_msg}')
+                    st.rerun()
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Show error message if present
+        if st.session_state.last_error:
+            st.caption(f"⚠️ {st.session_state.last_error}")
     
-    # Flatten holdings and enrich with account metadata
-    holdings = []
-    for account in accounts:
-        for holding in account.get('holdings', []):
-            # Create enriched holding with account metadata
-            enriched_holding = {
-                'ticker': holding['ticker'],
-                'shares': holding['shares'],
-                'cost_basis': holding['cost_basis'],
-                'currency': holding['currency'],
-                # Account metadata
-                'account_nickname': account['nickname'],
-                'account_holder': account['holder'],
-                'account_type': account['type'],
-                'account_base_currency': account['base_currency']
-            }
-            holdings.append(enriched_holding)
+    with col2:
+        st.markdown('<div aria-label="Update daily snapshot button: Save current portfolio prices to historical data for performance tracking">', unsafe_allow_html=True)
+        if st.button('Update daily snapshot', width='stretch', help='Save current prices to historical.csv'):
+            try:
+                if ledger is not None:
+                    written = fetch_and_store_snapshot(all_holdings, prices, HIST_CSV, fetched_at_iso=fetched_at_iso,
+                                                       ledger=ledger)
+                else:
+                    written = fetch_and_store_snapshot(holdings, prices, HIST_CSV, fetched_at_iso=fetched_at_iso)
+                st.success(f"Updated today's snapshot ({len(written)} holdings)")
+            except LockTimeout:
+                st.error('historical.csv is busy (a scheduled snapshot may be running) - try again shortly')
+        st.markdown('</div>', unsafe_allow_html=True)
     
-    return {
-        'accounts': accounts,
-        'holdings': holdings
+    with col3:
+        # Export historical snapshots (written only when the button is clicked)
+        if os.path.exists(HIST_CSV):
+            st.markdown('<div aria-label="Download snapshots button: Export historical portfolio data as CSV, gzip CSV or Parquet">', unsafe_allow_html=True)
+            with st.expander('Export options'):
+                export_fmt = st.selectbox('Format', list(EXPORT_FORMATS), key='export_format',
+                                          format_func=lambda f: {'csv': 'CSV', 'csv.gz': 'CSV (gzip)', 'parquet': 'Parquet'}[f])
+                export_range = st.date_input('Date range', value=(), key='export_range',
+                                             help='Leave empty to export every snapshot')
+                export_accounts = st.multiselect('Accounts', sorted(a['nickname'] for a in accounts), key='export_accounts')
+                export_tickers = st.multiselect('Tickers', sorted(all_tickers), key='export_tickers')
+            export_start = export_range[0] if len(export_range) > 0 else None
+            export_end = export_range[1] if len(export_range) > 1 else export_start
+            st.download_button(
+                'Download snapshots',
+                data=lambda: _export_payload(export_fmt, export_start, export_end,
+                                             tuple(export_accounts) or None, tuple(export_tickers) or None),
+                file_name=export_file_name(export_fmt, export_start, export_end),
+                mime=export_mime(export_fmt),
+                width='stretch',
+                help='Export historical snapshots (all of them unless filtered above)'
+            )
+            st.markdown('</div>', unsafe_allow_html=True)
+        else:
+            st.info('Historical dataset not started. Select "Update daily snapshot" to begin tracking performance.')
+
+
+def _trend_column_config():
+    return st.column_config.MultiselectColumn('Trend', options=list(TREND_OPTIONS), color=list(TREND_COLORS),
+                                              help='Gain or loss against cost')
+
+
+@st.fragment
+def _holdings_grid(frame):
+    """Holdings table filtered, sorted and paged on the server; controls rerun only this fragment."""
+    if frame.empty:
+        st.info('No holdings to display.')
+        return
+    c_search, c_accounts, c_currency, c_sort, c_order = st.columns([3, 2, 2, 2, 1])
+    search = c_search.text_input('Search', key='holdings_search', placeholder='Ticker or fund name')
+    account_options = sorted(frame['account'].unique())
+    accounts = c_accounts.multiselect('Accounts', account_options, key='holdings_accounts',
+                                      disabled=len(account_options) < 2)
+    currencies = c_currency.multiselect('Currency', sorted(frame['currency'].fillna('').str.upper().unique()),
+                                        key='holdings_currencies')
+    sort_by = c_sort.selectbox('Sort by', list(SORT_COLUMNS), format_func=SORT_COLUMNS.get, key='holdings_sort')
+    descending = c_order.toggle('Desc.', value=True, key='holdings_desc')
+
+    page_size = st.session_state.get('holdings_page_size', DEFAULT_PAGE_SIZE)
+    page = query_holdings(frame, search, accounts, currencies, sort_by, descending,
+                          st.session_state.get('holdings_page', 1), page_size)
+
+    # Row height ~35px + header ~42px + padding, cap between 200px and 600px
+    height = min(max(len(page.rows) * 35 + 42 + 20, 200), 600)
+    column_config = {
+        'fund_name': st.column_config.TextColumn('Fund/ETF', width='large'),
+        'account': st.column_config.TextColumn('Account'),
+        'currency': st.column_config.TextColumn('Currency'),
+        'trend': _trend_column_config(),
+        **{column: st.column_config.NumberColumn(label, format=COLUMN_FORMATS[column])
+           for column, label in (('allocation_pct', 'Allocation %'), ('price', 'Price'), ('gain_pct', 'Gain %'),
+                                 ('gain', 'Gain'), ('shares', 'Shares'), ('cost_basis', 'Cost/Share'),
+                                 ('current_value', 'Current Value'), ('cost_total', 'Total Cost'))},
     }
+    st.dataframe(page.rows, width='stretch', height=height, hide_index=True,
+                 column_order=DISPLAY_COLUMNS, column_config=column_config)
 
+    c_info, c_size, c_page = st.columns([4, 1, 1])
+    first = (page.page - 1) * page_size
+    c_info.caption(f'{first + 1 if page.total_rows else 0}-{first + len(page.rows)} of {page.total_rows} holdings'
+                   + (f' (filtered from {len(frame)})' if page.total_rows != len(frame) else ''))
+    c_size.selectbox('Rows per page', PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key='holdings_page_size')
+    if page.pages > 1:
+        # Filters may have shrunk the page count below the stored page
+        if st.session_state.get('holdings_page', 1) != page.page:
+            st.session_state['holdings_page'] = page.page
+        c_page.number_input(f'Page (of {page.pages})', min_value=1, max_value=page.pages, step=1, key='holdings_page')
 
-def main():
+
+def _render_dashboard(stages):
+    """Render the dashboard, marking each section as a tracing stage."""
+    stages.next('setup')
     st.set_page_config(page_title='PortoDash', layout='wide')
-    # Inject CSS for modern styling and accessibility
-    inject_modern_fintech_css()
-    inject_typography_css()
-    inject_accessibility_css()
+    # Theme and accessibility CSS as one precompiled stylesheet
+    inject_theme_css()
 
     # Skip link for screen readers
     from portodash.theme import render_skip_link
@@ -114,68 +606,36 @@ def main():
     if 'fetch_in_progress' not in st.session_state:
         st.session_state.fetch_in_progress = False
 
+    stages.next('load_portfolio')
     # Load portfolio first
     try:
-        cfg = load_portfolio(PORTFOLIO_PATH)
+        portfolio = load_portfolio(PORTFOLIO_PATH)
     except Exception as e:
         st.error(f'Could not load the portfolio configuration: {e}')
         return
 
-    holdings = cfg.get('holdings', [])
-    accounts = cfg.get('accounts', [])
+    holdings = list(portfolio.holdings)
+    accounts = portfolio.accounts
+    reporting = portfolio.base_currency
+
+    # Snapshots use the transaction ledger's as-of positions when one exists
+    try:
+        ledger = load_ledger(ledger_default_path(PORTFOLIO_PATH))
+    except Exception as e:
+        st.warning(f'Ignoring transactions.csv: {e}')
+        ledger = None
 
+    stages.next('sidebar')
     # Sidebar
     with st.sidebar:
-        st.markdown(render_sidebar_title(get_section_label("analytics")), unsafe_allow_html=True)
-        st.markdown("<hr class='sidebar-divider' />", unsafe_allow_html=True)
-
-        st.markdown(render_sidebar_subtitle(get_section_label("date")), unsafe_allow_html=True)
-        
-        # Date range selector with radio buttons for presets and custom option
-        st.markdown('<div aria-label="Performance period selector: Choose a preset or custom date range for the performance chart">', unsafe_allow_html=True)
-        
-        range_option = st.radio(
-            'Performance chart period',
-            options=['Last day', 'Last 7 days', 'Last 30 days', 'Custom'],
-            index=2,  # Default to 30 days
-            key='range_preset',
-            label_visibility='collapsed'
-        )
-        
-        # Map selection to days value
-        if range_option == 'Last day':
-            days = 1
-        elif range_option == 'Last 7 days':
-            days = 7
-        elif range_option == 'Last 30 days':
-            days = 30
-        else:  # Custom
-            days = st.slider(
-                'Days',
-                min_value=1,
-                max_value=30,
-                value=30,
-                step=1,
-                help='Select a custom date range',
-                key='custom_days_slider',
-                label_visibility='collapsed'
-            )
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        st.markdown("<hr class='sidebar-divider' />", unsafe_allow_html=True)
+        # The performance period selector lives in the performance section (a fragment)
         st.markdown(render_sidebar_title(get_section_label("filter")), unsafe_allow_html=True)
     
-    # Extract unique values for each filter dimension
-    all_nicknames = sorted(set(acc['nickname'] for acc in accounts))
-    all_holders = sorted(set(acc['holder'] for acc in accounts))
-    all_types = sorted(set(acc['type'] for acc in accounts))
-    
-    # Build account display map for showing details
-    account_display_map = {}
-    for account in accounts:
-        nickname = account['nickname']
-        account_display_map[nickname] = f"{account['type']} - {account['holder']}"
+    # Unique values for each filter dimension come precomputed with the portfolio
+    all_nicknames = portfolio.nicknames
+    all_holders = portfolio.holders
+    all_types = portfolio.types
+    account_by_nickname = portfolio.accounts_by_nickname
     
     # Initialize session state for filter selections (using widget keys directly)
     if 'filter_nicknames' not in st.session_state:
@@ -202,7 +662,7 @@ def main():
             selected_nicknames = st.multiselect(
                 "Select accounts",
                 options=all_nicknames,
-                format_func=lambda x: f"{x} — {account_display_map[x]}",
+                format_func=lambda x: f"{x} — {account_by_nickname[x].type} - {account_by_nickname[x].holder}",
                 help='Filter by specific account names',
                 key='filter_nicknames',
                 label_visibility='collapsed',
@@ -233,10 +693,7 @@ def main():
             )
             st.markdown('</div>', unsafe_allow_html=True)
     
-    # Rate limiting: cooldown period in seconds
-    COOLDOWN_SECONDS = 60
-    RATE_LIMIT_EXTENDED_COOLDOWN = 3600  # 1 hour if rate limited by yfinance
-    tz = pytz.timezone('America/Toronto')
+    tz = TIMEZONE
     now = datetime.now(tz)
     
     # Check if we're in cooldown period or rate limited
@@ -261,18 +718,17 @@ def main():
             st.session_state.fetch_in_progress = False
     
     # Get ALL tickers before filtering (needed for price fetching)
-    all_tickers = list(set(h['ticker'] for h in holdings))
+    all_tickers = list(portfolio.tickers)
+    # Targeted tickers not held yet still need a price to size the first buy
+    target_tickers = portfolio.target_tickers()
+    all_tickers += sorted(target_tickers - set(all_tickers))
+    if ledger is not None:
+        all_tickers += sorted(set(ledger.tickers) - set(all_tickers))
+    all_holdings = holdings
     
-    # Apply account filters - holdings must match ALL selected criteria (AND logic)
-    # Filter by nickname, holder, and type
-    if selected_nicknames or selected_holders or selected_types:
-        holdings = [
-            h for h in holdings
-            if (h.get('account_nickname') in selected_nicknames or not selected_nicknames)
-            and (h.get('account_holder') in selected_holders or not selected_holders)
-            and (h.get('account_type') in selected_types or not selected_types)
-        ]
-    # If all filters empty, show empty portfolio (user deselected everything)
+    # Apply account filters - holdings must match ALL selected criteria (AND logic);
+    # an empty selection for a dimension does not filter on it
+    holdings = portfolio.filter_holdings(selected_nicknames, selected_holders, selected_types)
     
     tickers = [h['ticker'] for h in holdings]
 
@@ -281,6 +737,7 @@ def main():
         if len(tickers) <= 10:
             st.caption(f"_{', '.join(tickers)}_")
 
+    stages.next('prices')
     # Fetch current prices ONLY on first load with no cache
     # Manual refresh happens later in Data Management section
     should_fetch = not st.session_state.prices_cache
@@ -368,6 +825,7 @@ def main():
         # Fallback: if parsing fails, use now
         fetch_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S %Z")
 
+    stages.next('status')
     # Show fetch time and scheduler status prominently
     st.markdown("---")
     st.markdown(render_section_header('Portfolio Status'), unsafe_allow_html=True)
@@ -382,37 +840,8 @@ def main():
             <span class="{badge_class} status-badge">{source_label}</span>
         """, unsafe_allow_html=True)
 
-    # Show scheduler status if available; prefer process check (psutil) then fall back to logs
-    def _detect_scheduler_running():
-        """Return (running_bool, method) where method is 'process' or 'log' or None."""
-        # Try psutil first
-        try:
-            import psutil
-            for p in psutil.process_iter(['cmdline']):
-                try:
-                    cmd = p.info.get('cmdline') or []
-                    if any('run_scheduler.py' in str(c) for c in cmd):
-                        return True, 'process'
-                except Exception:
-                    continue
-        except Exception:
-            # psutil not available; fall back to log inspection
-            pass
-
-        # Check today's scheduler log as a heuristic
-        log_path = os.path.join(BASE_DIR, 'logs', f'scheduler_{datetime.now().strftime("%Y%m%d")}.log')
-        try:
-            if os.path.exists(log_path):
-                # if log exists and was modified recently, consider scheduler running
-                mtime = datetime.fromtimestamp(os.path.getmtime(log_path), tz)
-                if (datetime.now(tz) - mtime).total_seconds() < 24 * 3600:
-                    return True, 'log'
-                return False, 'log'
-        except Exception:
-            pass
-
-        return False, None
-
+    # Show scheduler status if available; prefer the status file, then the
+    # (cached) process/log check
     with col2:
         # Prefer a persisted status file written by the scheduler (most reliable)
         status_file = os.path.join(BASE_DIR, 'logs', 'scheduler_status.json')
@@ -457,12 +886,20 @@ def main():
             else:
                 st.warning("Scheduler not detected. Run `python scripts/run_scheduler.py` to resume automated updates.")
 
-    # compute portfolio data; collect currencies per holding (optional field `currency`)
+    stages.next('fx_rates')
+    # One lookup for every currency in the portfolio (holdings and account base
+    # currencies), so changing the filters never reloads rates
+    portfolio_currencies = {h.get('currency', 'CAD').upper() for h in all_holdings}
+    portfolio_currencies.update(a.get('base_currency', 'CAD').upper() for a in accounts)
+    all_fx_rates = _cached_fx_rates(tuple(sorted(portfolio_currencies)), reporting)
     currencies = {h.get('currency', 'CAD').upper() for h in holdings}
-    # Request FX rates for any currencies that are not the base
-    fx_rates = get_fx_rates(currencies, base='CAD') if currencies else {}
+    fx_rates = {c: r for c, r in all_fx_rates.items() if c in currencies}
 
-    df = compute_portfolio_df(holdings, prices, fx_rates=fx_rates, base_currency='CAD')
+    stages.next('compute')
+    portfolio_mtime = _file_mtime(PORTFOLIO_PATH)
+    price_items = tuple(sorted(prices.items()))
+    selection = tuple(tuple(s or ()) for s in (selected_nicknames, selected_holders, selected_types))
+    df = _cached_portfolio_df(portfolio_mtime, selection, price_items, tuple(sorted(fx_rates.items())), reporting)
 
     # Check if we have any data to display
     if df.empty or len(holdings) == 0:
@@ -477,7 +914,8 @@ def main():
         len(st.session_state.get('filter_types', [])) < len(all_types)
     )
     
-    # Summary KPIs - all values in CAD
+    stages.next('overview')
+    # Summary KPIs - all values in the reporting currency
     # Use context-aware headers: "Portfolio" when viewing all, "Overview" when filtered
     overview_header = 'Overview' if filters_active else 'Portfolio Overview'
     st.markdown(render_section_header(overview_header), unsafe_allow_html=True)
@@ -489,15 +927,15 @@ def main():
     gain_pct = (total_gain / total_cost * 100) if total_cost != 0 else 0
 
     metrics_html = render_metric_grid(
-        render_metric_card('Portfolio Value', total_value, help_text='Total value in CAD'),
-        render_metric_card('Total Cost', total_cost, help_text='Total cost basis in CAD'),
+        render_metric_card('Portfolio Value', total_value, help_text=f'Total value in {reporting}'),
+        render_metric_card('Total Cost', total_cost, help_text=f'Total cost basis in {reporting}'),
         render_metric_card(
             'Total Gain',
             total_gain,
             delta=gain_pct,
             delta_is_percent=True,
             delta_precision=1,
-            help_text='Unrealized gain/loss in CAD',
+            help_text=f'Unrealized gain/loss in {reporting}',
             delta_label='vs cost',
         ),
     )
@@ -507,13 +945,14 @@ def main():
     if fx_rates:
         with st.expander("Multi-Currency Details", expanded=False):
             st.markdown(render_subsection_header('Exchange Rates'), unsafe_allow_html=True)
-            st.markdown(
-                "**Reporting currency:** CAD (Canadian Dollar)\n\n**Current exchange rates:**"
-            )
+            st.markdown(f"**Reporting currency:** {reporting}\n\n**Current exchange rates:**")
+            fx_ages = fx_rate_ages(fx_rates, reporting)
             for curr, rate in sorted(fx_rates.items()):
-                st.markdown(f"- 1 {curr} = **{rate:.4f}** CAD")
-            st.caption('Exchange rates cache for up to 12 hours (open.er-api.com).')
+                age = f" (fetched {fx_ages[curr]:.1f} h ago)" if curr in fx_ages else ""
+                st.markdown(f"- 1 {curr} = **{rate:.4f}** {reporting}{age}")
+            st.caption('The full rate table is cached for up to 12 hours (open.er-api.com); other currencies are derived from it.')
 
+    stages.next('insights')
     # Calculate portfolio insights and metrics
     # Split dataframe into holdings and remove the aggregate TOTAL row
     df_holdings = df[df['ticker'] != 'TOTAL'].copy()
@@ -523,9 +962,9 @@ def main():
         positive_positions = int((df_holdings['gain'] > 0).sum())
         positive_ratio = (positive_positions / positions_count * 100) if positions_count else 0
 
-        currency_series = df_holdings['currency'].fillna('CAD').str.upper()
+        currency_series = df_holdings['currency'].fillna(reporting).str.upper()
         portfolio_value = float(df_holdings['current_value'].sum())
-        foreign_mask = currency_series != 'CAD'
+        foreign_mask = currency_series != reporting
         foreign_value = float(df_holdings.loc[foreign_mask, 'current_value'].sum()) if portfolio_value else 0
         fx_exposure_pct = (foreign_value / portfolio_value * 100) if portfolio_value else 0
 
@@ -572,7 +1011,7 @@ def main():
                 )
             )
 
-        fx_help = 'All holdings in CAD'
+        fx_help = f'All holdings in {reporting}'
         if fx_exposure_pct > 0:
             fx_detail = f"{top_fx_label} exposure {top_fx_pct:.1f}%" if top_fx_label else 'Diversified foreign currencies'
             fx_help = f"{fx_detail}"
@@ -582,7 +1021,7 @@ def main():
                 'FX Exposure',
                 f"{fx_exposure_pct:.1f}%",
                 value_is_currency=False,
-                help_text=f"Share of value in non-CAD currencies ({fx_help})",
+                help_text=f"Share of value in non-{reporting} currencies ({fx_help})",
             )
         )
 
@@ -601,6 +1040,7 @@ def main():
         st.markdown(render_section_header(insights_header), unsafe_allow_html=True)
         st.markdown(render_metric_grid(*summary_cards), unsafe_allow_html=True)
 
+    stages.next('allocation')
     # Allocation chart
     st.markdown("---")
     st.markdown(render_section_header('Allocation'), unsafe_allow_html=True)
@@ -615,61 +1055,60 @@ def main():
     st.plotly_chart(pie, use_container_width=True, config={'displayModeBar': False})
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # Performance chart from snapshots
-    st.markdown("---")
-    st.markdown(render_section_header(f"Performance — Last {days} Days"), unsafe_allow_html=True)
-    
-    # Use snapshot-based chart (from historical.csv)
-    if os.path.exists(HIST_CSV):
-        # Semantic wrapper with ARIA label for screen readers
-        st.markdown(f'<div role="img" aria-label="Performance line chart showing portfolio value over the last {days} days with FX impact analysis">', unsafe_allow_html=True)
-        perf_fig = make_snapshot_performance_chart(HIST_CSV, days=days, fx_csv_path=FX_CSV, tickers=tickers)
-        st.plotly_chart(perf_fig, use_container_width=True, config={'displayModeBar': False})
-        st.markdown('</div>', unsafe_allow_html=True)
-    else:
-        st.info('No historical snapshots yet. Capture a daily snapshot to build your performance history.')
+    stages.next('performance')
+    visible_accounts = tuple(sorted({h.get('account_nickname') for h in holdings}))
+    account_meta = tuple((acc['nickname'], acc['holder'], acc['type']) for acc in accounts)
+    _performance_section(visible_accounts, account_meta, tuple(all_tickers))
 
+    stages.next('risk')
+    _risk_section(tuple(sorted({h['ticker'] for h in holdings})), df)
+
+    stages.next('rebalancing')
+    # Rebalancing against optional targets (household targets pool accounts without their own)
+    if target_tickers:
+        st.markdown("---")
+        st.markdown(render_section_header('Rebalancing'), unsafe_allow_html=True)
+        df_all = _cached_portfolio_df(portfolio_mtime, ((), (), ()), price_items, tuple(sorted(all_fx_rates.items())),
+                                      reporting)
+        trades = compute_rebalance_trades(
+            df_all, accounts, prices=prices, fx_rates=all_fx_rates, base_currency=reporting,
+            household_targets=portfolio.targets, tolerance=portfolio.tolerance,
+        )
+        visible_accounts = {h['account_nickname'] for h in holdings}
+        trades = trades[trades['account'].isin(visible_accounts)]
+        if trades.empty:
+            st.success('All targeted positions are within their tolerance bands.')
+        else:
+            trades = trades.copy()
+            trades[['current_pct', 'target_pct', 'post_pct']] *= 100
+            st.dataframe(
+                trades,
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    'account': st.column_config.TextColumn('Account'),
+                    'ticker': st.column_config.TextColumn('Fund/ETF'),
+                    'action': st.column_config.TextColumn('Action'),
+                    'shares': st.column_config.NumberColumn('Shares', format='%.0f'),
+                    'price': st.column_config.NumberColumn('Price', format='$%.2f'),
+                    'currency': st.column_config.TextColumn('Currency'),
+                    'trade_value': st.column_config.NumberColumn(f'Trade Value ({reporting})', format='$%.2f'),
+                    'current_pct': st.column_config.NumberColumn('Current', format='%.1f%%'),
+                    'target_pct': st.column_config.NumberColumn('Target', format='%.1f%%'),
+                    'post_pct': st.column_config.NumberColumn('After', format='%.1f%%'),
+                },
+            )
+            st.caption("Whole-share trades that bring each position back inside its tolerance band. Buys are limited to each account's own cash and sale proceeds in the fund's currency.")
+
+    stages.next('holdings')
     # Holdings section - detailed tables
     st.markdown("---")
     st.markdown(render_section_header('Holdings'), unsafe_allow_html=True)
     
-    # Helper function for styling gain percentages
-    def color_gain_pct(val):
-        if pd.isna(val) or val is None:
-            return ''
-        if val > 0:
-            return 'background-color: rgba(16, 185, 129, 0.12); color: #047857; font-weight: 600;'
-        if val < 0:
-            return 'background-color: rgba(239, 68, 68, 0.12); color: #B91C1C; font-weight: 600;'
-        return 'color: var(--pd-neutral);'
-    
     # Fetch fund names for all tickers in holdings
-    tickers_in_table = df_holdings['ticker'].unique().tolist()
-    fund_names_map = get_fund_names(tickers_in_table)
-    
-    # Add fund/ETF name column
-    df_holdings['fund_name'] = df_holdings['ticker'].map(
-        lambda t: format_ticker_with_name(t, fund_names_map.get(t, t))
-    )
-    
-    # Reorder columns according to UX requirements:
-    # Fund/ETF, Account, Currency, Allocation %, Price, Gain %, Gain, Shares, Cost/Share, Current Value, Total Cost
-    # Note: 'ticker' column is excluded from display (ticker info already included in fund_name)
-    cols = [
-        'fund_name',      # Fund/ETF
-        'account',        # Account
-        'currency',       # Currency
-        'allocation_pct', # Allocation %
-        'price',          # Price
-        'gain_pct',       # Gain %
-        'gain',           # Gain
-        'shares',         # Shares
-        'cost_basis',     # Cost/Share
-        'current_value',  # Current Value
-        'cost_total'      # Total Cost
-    ]
-    df_holdings = df_holdings[cols]
-    
+    fund_names_map = get_fund_names(df_holdings['ticker'].unique().tolist())
+    fund_names_map = {t: format_ticker_with_name(t, fund_names_map.get(t, t)) for t in fund_names_map}
+
     # Show account breakdown if viewing multiple accounts
     unique_accounts = set(h.get('account_nickname') for h in holdings if h.get('account_nickname'))
     if len(unique_accounts) > 1 and 'account' in df.columns:
@@ -682,146 +1121,84 @@ def main():
                 'gain': 'sum'
             }).reset_index()
             accounts_df['gain_pct'] = accounts_df['gain'] / accounts_df['cost_total']
+            accounts_df['trend'] = trend_column(accounts_df['gain'])
             accounts_df = accounts_df.sort_values('current_value', ascending=False)
-            
+
             # Reorder columns to place Gain % after Current Value
-            accounts_df = accounts_df[['account', 'current_value', 'gain_pct', 'cost_total', 'gain']]
+            accounts_df = accounts_df[['account', 'current_value', 'gain_pct', 'trend', 'cost_total', 'gain']]
 
             st.dataframe(
-                accounts_df.style
-                .format({
-                    'current_value': '${:,.2f}',
-                    'cost_total': '${:,.2f}',
-                    'gain': '${:,.2f}',
-                    'gain_pct': '{:.2%}'
-                })
-                .map(color_gain_pct, subset=['gain_pct'])
-                .set_table_attributes("class='data-table'"),
+                accounts_df,
                 width='stretch',
                 hide_index=True,  # Remove the index column (row numbers)
                 column_config={
                     'account': st.column_config.TextColumn('Account', width='medium'),
-                    'current_value': st.column_config.NumberColumn('Current Value'),
-                    'gain_pct': st.column_config.NumberColumn('Gain %'),
-                    'cost_total': st.column_config.NumberColumn('Total Cost'),
-                    'gain': st.column_config.NumberColumn('Gain'),
+                    'current_value': st.column_config.NumberColumn('Current Value', format='dollar'),
+                    'gain_pct': st.column_config.NumberColumn('Gain %', format='percent'),
+                    'trend': _trend_column_config(),
+                    'cost_total': st.column_config.NumberColumn('Total Cost', format='dollar'),
+                    'gain': st.column_config.NumberColumn('Gain', format='dollar'),
                 }
             )
-    
+
     st.markdown(render_subsection_header('All Holdings'), unsafe_allow_html=True)
-    
-    # Calculate dynamic table height based on number of rows
-    # Row height ~35px + header ~42px + padding, cap between 200px and 600px
-    num_rows = len(df_holdings)
-    row_height = 35
-    header_height = 42
-    padding = 20
-    dynamic_height = min(max(num_rows * row_height + header_height + padding, 200), 600)
-    
-    # Display holdings table (sortable) with dynamic height
-    # hide_index=True removes the first column (row numbers 0, 1, 2...)
-    st.dataframe(
-        df_holdings.style
-        .format({
-            'shares': '{:,.4f}',
-            'cost_basis': '{:,.4f}',
-            'price': '${:,.4f}',
-            'current_value': '${:,.2f}',
-            'cost_total': '${:,.2f}',
-            'gain': '${:,.2f}',
-            'allocation_pct': '{:.2%}',
-            'gain_pct': '{:.2%}'
-        })
-        .map(color_gain_pct, subset=['gain_pct'])
-        .set_table_attributes("class='data-table'"),
-        width='stretch',
-        height=dynamic_height,  # Dynamic height based on row count, capped at 600px
-        hide_index=True,  # Remove the index column (row numbers)
-        column_config={
-            'fund_name': st.column_config.TextColumn('Fund/ETF', width='large'),
-            'account': st.column_config.TextColumn('Account'),
-            'currency': st.column_config.TextColumn('Currency'),
-            'allocation_pct': st.column_config.NumberColumn('Allocation %'),
-            'price': st.column_config.NumberColumn('Price'),
-            'gain_pct': st.column_config.NumberColumn('Gain %'),
-            'gain': st.column_config.NumberColumn('Gain'),
-            'shares': st.column_config.NumberColumn('Shares'),
-            'cost_basis': st.column_config.NumberColumn('Cost/Share'),
-            'current_value': st.column_config.NumberColumn('Current Value'),
-            'cost_total': st.column_config.NumberColumn('Total Cost'),
-        },
-    )
+    _holdings_grid(holdings_frame(df, fund_names_map))
+
+    stages.next('data_management')
+    _data_management_section(can_refresh, tuple(all_tickers), ledger, all_holdings, holdings, prices, fetched_at_iso, accounts)
+
+
+def _render_performance_panel(spans):
+    """Optional debug panel with per-stage timings for this rerun and recent ones."""
+    with st.sidebar:
+        st.markdown("<hr class='sidebar-divider' />", unsafe_allow_html=True)
+        show = st.toggle('Performance panel', key='show_performance',
+                         help='Time each dashboard stage and library call (debugging aid)')
+    if not show or not spans:
+        return
+
+    summary = pd.DataFrame(tracing.summarize(spans))
+    stage_ms = {row['name']: row['total_ms'] for _, row in summary.iterrows() if row['depth'] <= 1}
+    history = st.session_state.setdefault('perf_history', deque(maxlen=PERF_HISTORY_SIZE))
+    history.append({'rerun_at': datetime.now().strftime('%H:%M:%S'), **stage_ms})
 
-    # Data Management
     st.markdown("---")
-    st.markdown(render_section_header('Data Management'), unsafe_allow_html=True)
-    
-    col1, col2, col3 = st.columns([1, 1, 1])
-    
-    with col1:
-        # Manual refresh button
-        refresh_disabled = not can_refresh
-        refresh_help = 'Fetch latest prices from Yahoo Finance'
-        
-        if st.session_state.rate_limited_until and now < st.session_state.rate_limited_until:
-            remaining_mins = int((st.session_state.rate_limited_until - now).total_seconds()) // 60
-            refresh_help = f'Rate limited - retry in {remaining_mins} minutes'
-        elif not can_refresh:
-            refresh_help = 'Cooldown active - wait before retrying'
-        
-        st.markdown('<div aria-label="Refresh prices button: Fetch latest prices from Yahoo Finance for all portfolio holdings">', unsafe_allow_html=True)
-        if st.button('Refresh prices', disabled=refresh_disabled, width='stretch', help=refresh_help):
-            # Trigger a manual refresh
-            with st.spinner('Fetching latest prices...'):
-                st.session_state.fetch_in_progress = True
-                
-                try:
-                    prices, fetched_at_iso, price_source = get_current_prices(all_tickers, csv_path=HIST_CSV)
-                    st.session_state.prices_cache = prices
-                    st.session_state.fetched_at_iso = fetched_at_iso
-                    st.session_state.price_source = price_source
-                    st.session_state.last_fetch_time = now
-                    st.session_state.last_error = None
-                    st.session_state.rate_limited_until = None
-                    st.success('Prices updated successfully')
-                    st.rerun()
-                except Exception as e:
-                    error_msg = str(e)
-                    if 'YFRateLimitError' in error_msg or 'Rate limited' in error_msg or 'Too Many Requests' in error_msg:
-                        st.session_state.rate_limited_until = now + timedelta(seconds=RATE_LIMIT_EXTENDED_COOLDOWN)
-                        st.session_state.last_error = "Rate limit reached"
-                        st.error(f'Rate limited - retry available in 1 hour')
-                    else:
-                        st.session_state.last_error = error_msg
-                        st.error(f'Fetch failed: {error_msg}')
-                    st.rerun()
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Show error message if present
-        if st.session_state.last_error:
-            st.caption(f"⚠️ {st.session_state.last_error}")
-    
-    with col2:
-        st.markdown('<div aria-label="Update daily snapshot button: Save current portfolio prices to historical data for performance tracking">', unsafe_allow_html=True)
-        if st.button('Update daily snapshot', width='stretch', help='Save current prices to historical.csv'):
-            written = fetch_and_store_snapshot(holdings, prices, HIST_CSV, fetched_at_iso=fetched_at_iso)
-            st.success(f"Updated today's snapshot ({len(written)} holdings)")
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with col3:
-        # Export historical CSV
-        if os.path.exists(HIST_CSV):
-            st.markdown('<div aria-label="Download snapshots CSV button: Export historical portfolio data to a CSV file">', unsafe_allow_html=True)
-            st.download_button(
-                'Download snapshots CSV', 
-                data=open(HIST_CSV, 'rb').read(), 
-                file_name='historical.csv',
-                width='stretch',
-                help='Export all historical snapshots'
-            )
-            st.markdown('</div>', unsafe_allow_html=True)
-        else:
-            st.info('Historical dataset not started. Select "Update daily snapshot" to begin tracking performance.')
+    with st.expander('Performance', expanded=True):
+        st.markdown(render_subsection_header('This rerun'), unsafe_allow_html=True)
+        summary['name'] = summary['depth'].map(lambda d: '\u2003' * int(d)) + summary['name']
+        st.dataframe(
+            summary[['name', 'calls', 'total_ms']],
+            width='stretch',
+            hide_index=True,
+            column_config={
+                'name': st.column_config.TextColumn('Stage / call'),
+                'calls': st.column_config.NumberColumn('Calls', format='%d'),
+                'total_ms': st.column_config.NumberColumn('Time (ms)', format='%.1f'),
+            },
+        )
+        st.markdown(render_subsection_header(f'Last {len(history)} reruns (ms)'), unsafe_allow_html=True)
+        st.dataframe(pd.DataFrame(list(history)).set_index('rerun_at').round(1), width='stretch')
+        st.download_button(
+            'Download Chrome trace',
+            data=json.dumps(tracing.to_chrome_trace(spans)),
+            file_name='portodash_trace.json',
+            mime='application/json',
+            help='Open in chrome://tracing or ui.perfetto.dev',
+        )
+
+
+def main():
+    # Tracing stays off (near-zero overhead) unless the panel or PORTODASH_TRACE asks for it;
+    # the flag only applies to this session's script thread
+    enabled = TRACE_FROM_ENV or st.session_state.get('show_performance', False)
+    with tracing.collect(enabled=enabled) as spans:
+        stages = tracing.Stages('app')
+        with tracing.span('app.main'):
+            try:
+                _render_dashboard(stages)
+            finally:
+                stages.close()
+    _render_performance_panel(spans)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Import-time benchmark per entry point.
+
+Runs each entry point's imports in a fresh interpreter under
+`python -X importtime`, sums the self times reported for every module and
+checks that heavy optional dependencies (yfinance, plotly, requests,
+apscheduler) are not imported where they should load lazily.
+
+Results are written to JSON and compared against a stored baseline; the
+script exits with status 1 on a regression or a forbidden import.
+
+Usage:
+    python benchmarks/bench_imports.py
+    python benchmarks/bench_imports.py --entry scheduler_status app
+    python benchmarks/bench_imports.py --update-baseline
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline_imports.json')
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'imports.json')
+
+# name -> (code run under -X importtime, modules that must not be imported)
+ENTRY_POINTS = {
+    'app': (
+        'import app',
+        ('yfinance', 'plotly.express', 'requests', 'apscheduler'),
+    ),
+    'run_scheduler': (
+        "import runpy; runpy.run_path('scripts/run_scheduler.py')",
+        ('yfinance', 'plotly', 'streamlit', 'apscheduler'),
+    ),
+    'scheduler_status': (
+        'from portodash.scheduler import get_scheduler_status',
+        ('yfinance', 'plotly', 'requests', 'apscheduler', 'pandas'),
+    ),
+    'cli': (
+        'from portodash import cli; cli.build_parser()',
+        ('yfinance', 'plotly', 'streamlit', 'requests', 'apscheduler', 'pandas'),
+    ),
+    'library': (
+        'import portodash.data_fetch, portodash.calculations, portodash.fx, portodash.fund_names, portodash.viz',
+        ('yfinance', 'plotly', 'requests'),
+    ),
+}
+
+# Differences below this many milliseconds are noise, whatever the ratio
+MIN_REGRESSION_MS = 20.0
+
+
+def parse_importtime(stderr):
+    """Return [(module, depth, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        module = parts[2].rstrip()
+        depth = (len(module) - len(module.lstrip())) // 2
+        rows.append((module.strip(), depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+def measure(code):
+    """Run code in a fresh interpreter; returns (total_ms, rows)."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'Import failed for {code!r}:\n{proc.stderr[-2000:]}')
+    rows = parse_importtime(proc.stderr)
+    return sum(r[2] for r in rows) / 1000.0, rows
+
+
+def run_entry(name, repeat):
+    code, forbidden = ENTRY_POINTS[name]
+    totals = []
+    rows = []
+    for _ in range(repeat):
+        total, rows = measure(code)
+        totals.append(total)
+    imported = {r[0] for r in rows}
+    top = sorted((r for r in rows if r[1] <= 1), key=lambda r: r[3], reverse=True)[:8]
+    return {
+        'median_ms': statistics.median(totals),
+        'min_ms': min(totals),
+        'runs': repeat,
+        'modules': len(imported),
+        'forbidden_imported': sorted(m for m in forbidden if m in imported),
+        'heaviest': [{'module': r[0], 'cumulative_ms': r[3] / 1000.0} for r in top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Track python -X importtime totals per entry point')
+    parser.add_argument('--entry', nargs='+', choices=list(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown vs baseline as a fraction (default 0.5 = 50%%)')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'entries': {},
+    }
+    failures = []
+    for name in args.entry:
+        data = run_entry(name, args.repeat)
+        results['entries'][name] = data
+        print(f"\n{name}: {data['median_ms']:.0f} ms (min {data['min_ms']:.0f} ms, {data['modules']} modules)")
+        for item in data['heaviest'][:5]:
+            print(f"  {item['module']:<40} {item['cumulative_ms']:>8.1f} ms")
+        if data['forbidden_imported']:
+            failures.append(f"{name} imports {', '.join(data['forbidden_imported'])} eagerly")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('entries', {})
+        for name, data in results['entries'].items():
+            base = baseline.get(name)
+            if not base:
+                continue
+            current, previous = data['median_ms'], base['median_ms']
+            if current > previous * (1 + args.tolerance) and current - previous > MIN_REGRESSION_MS:
+                failures.append(f"{name}: {previous:.0f} ms -> {current:.0f} ms ({current / previous:.2f}x)")
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the fetch -> compute -> chart pipeline.
+
+Generates synthetic portfolios, `historical.csv` and `fx_rates.csv` for a few
+scale tiers (see benchmarks/synthetic.py), then times:
+
+- get_cached_prices            (cache fallback read of historical.csv)
+- fetch_and_store_snapshot     (same-day replace on a full history)
+- compute_portfolio_df
+- make_allocation_pie
+- make_snapshot_performance_chart
+
+Results are written to JSON and compared against a stored baseline; the
+script exits with status 1 when a median time regresses past the tolerance.
+Network access is blocked for the whole run.
+
+Usage:
+    python benchmarks/bench_pipeline.py                     # all tiers, compare to baseline.json
+    python benchmarks/bench_pipeline.py --tiers small medium
+    python benchmarks/bench_pipeline.py --update-baseline   # record a new baseline
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from synthetic import flatten_holdings, latest_prices, make_portfolio, write_fx, write_history  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'pipeline.json')
+
+# name -> (accounts, tickers, holdings per account, days, repeats)
+TIERS = {
+    'small': (3, 10, 5, 90, 7),
+    'medium': (8, 40, 10, 365, 5),
+    'large': (20, 150, 15, 1095, 3),
+}
+
+# Differences below this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def block_network():
+    """Make any socket connection attempt fail loudly instead of reaching out."""
+    def refuse(*args, **kwargs):
+        raise RuntimeError('Network access is disabled during benchmarks')
+    socket.socket.connect = refuse
+    socket.create_connection = refuse
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times; returns (median, min) seconds and the last result."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'runs': repeat}, result
+
+
+def run_tier(name, workdir, repeat=None):
+    from portodash.cache import get_cached_prices
+    from portodash.calculations import compute_portfolio_df
+    from portodash.data_fetch import fetch_and_store_snapshot
+    from portodash.viz import make_allocation_pie, make_snapshot_performance_chart
+
+    n_accounts, n_tickers, per_account, days, default_repeat = TIERS[name]
+    repeat = repeat or default_repeat
+    hist_csv = os.path.join(workdir, f'{name}_historical.csv')
+    fx_csv = os.path.join(workdir, f'{name}_fx_rates.csv')
+
+    holdings = flatten_holdings(make_portfolio(n_accounts, n_tickers, per_account))
+    rows = write_history(hist_csv, holdings, days)
+    write_fx(fx_csv, days)
+    prices = latest_prices(hist_csv)
+    tickers = sorted(prices)
+    fx_rates = {'USD': 1.38}
+    fetched_at = datetime.utcnow().replace(hour=20, minute=0, second=0, microsecond=0).isoformat()
+
+    results = {}
+    results['get_cached_prices'], _ = timed(lambda: get_cached_prices(tickers, csv_path=hist_csv), repeat)
+    results['fetch_and_store_snapshot'], _ = timed(
+        lambda: fetch_and_store_snapshot(holdings, prices, hist_csv, fetched_at_iso=fetched_at), repeat)
+    results['compute_portfolio_df'], df = timed(
+        lambda: compute_portfolio_df(holdings, prices, fx_rates=fx_rates, base_currency='CAD'), repeat)
+    results['make_allocation_pie'], _ = timed(lambda: make_allocation_pie(df), repeat)
+    results['make_snapshot_performance_chart'], _ = timed(
+        lambda: make_snapshot_performance_chart(hist_csv, days=30, fx_csv_path=fx_csv), repeat)
+
+    size = {'accounts': n_accounts, 'tickers': n_tickers, 'holdings': len(holdings),
+            'days': days, 'rows': rows, 'csv_bytes': os.path.getsize(hist_csv)}
+    return {'size': size, 'timings': results}
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (tier, bench, baseline_s, current_s) regressions."""
+    regressions = []
+    for tier, data in results['tiers'].items():
+        base_tier = baseline.get('tiers', {}).get(tier)
+        if not base_tier:
+            continue
+        for bench, timing in data['timings'].items():
+            base = base_tier['timings'].get(bench)
+            if not base:
+                continue
+            current, previous = timing['median_s'], base['median_s']
+            if current > previous * (1 + tolerance) and current - previous > MIN_REGRESSION_SECONDS:
+                regressions.append((tier, bench, previous, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the fetch -> compute -> chart pipeline offline')
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS), default=list(TIERS))
+    parser.add_argument('--repeat', type=int, default=None, help='Runs per benchmark (default depends on tier)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown vs baseline as a fraction (default 0.5 = 50%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    args = parser.parse_args()
+
+    block_network()
+    results = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tiers': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for tier in args.tiers:
+            data = run_tier(tier, workdir, args.repeat)
+            results['tiers'][tier] = data
+            size = data['size']
+            print(f"\n{tier}: {size['accounts']} accounts, {size['tickers']} tickers, "
+                  f"{size['days']} days, {size['rows']:,} rows ({size['csv_bytes'] / 1024 / 1024:.1f} MB)")
+            for bench, timing in data['timings'].items():
+                print(f"  {bench:<34} {timing['median_s'] * 1000:>10.1f} ms  (min {timing['min_s'] * 1000:.1f} ms)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline found; run with --update-baseline to record one.')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for tier, bench, previous, current in regressions:
+        print(f"REGRESSION {tier}/{bench}: {previous * 1000:.1f} ms -> {current * 1000:.1f} ms "
+              f"({current / previous:.2f}x)")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.tolerance:.0%} of baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
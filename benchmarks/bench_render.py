@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Bytes sent and string work per dashboard rerun for the theme and metric cards.
+
+Builds the Streamlit ForwardMsgs for the theme stylesheet and the summary
+metric cards, the way `st.markdown` sends them, and applies Streamlit's
+message cache: messages of at least `global.minCachedMessageSize` bytes are
+sent once and as a content-hash reference on later reruns. Compares the
+legacy rendering (three unminified <style> blocks under Streamlit's default
+threshold, cards built from scratch) with the current one (one compiled
+stylesheet under the threshold in .streamlit/config.toml, memoized cards).
+
+Results are written to JSON; the script exits with status 1 when the current
+rendering sends more than --max-rerun-bytes on a repeated rerun.
+
+Usage:
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --reruns 500 --max-rerun-bytes 4096
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+# Streamlit reads .streamlit/config.toml from the working directory
+os.chdir(ROOT)
+
+from streamlit import config  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+from streamlit.runtime.forward_msg_cache import create_reference_msg, populate_hash_if_needed  # noqa: E402
+
+from portodash import theme  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'render.json')
+# Streamlit's own default for global.minCachedMessageSize
+STREAMLIT_DEFAULT_THRESHOLD = 10_000
+
+# Summary cards of one dashboard rerun: (label, value, keyword arguments)
+CARDS = [
+    ('Portfolio Value', 184_523.17, {'help_text': 'Total value in CAD'}),
+    ('Total Cost', 151_200.0, {'help_text': 'Total cost basis in CAD'}),
+    ('Unrealized Gain', 33_323.17, {'delta': 22.04, 'delta_label': 'vs cost'}),
+    ('USD/CAD', '1.3712', {'help_text': 'Bank of Canada'}),
+    ('Cash', 4_210.5, {'value_precision': 2}),
+    ('Holdings', 37, {'value_is_currency': False}),
+    ('1M Change', 2_845.12, {'delta': 1.57, 'delta_precision': 2}),
+    ('FX Effect', -512.4, {'delta': -512.4, 'delta_is_percent': False}),
+]
+
+
+def _markdown_msg(body):
+    msg = ForwardMsg()
+    msg.delta.new_element.markdown.body = body
+    msg.delta.new_element.markdown.allow_html = True
+    return msg
+
+
+def legacy_bodies():
+    cards = [theme.render_metric_card.__wrapped__(label, value, **kwargs) for label, value, kwargs in CARDS]
+    return [theme._base_css(), theme._typography_css(), theme._accessibility_css(), theme.render_metric_grid(*cards)]
+
+
+def current_bodies():
+    cards = [theme.render_metric_card(label, value, **kwargs) for label, value, kwargs in CARDS]
+    return [theme.style_tag(), theme.render_metric_grid(*cards)]
+
+
+def bytes_per_run(bodies, threshold):
+    """(first run bytes, repeated rerun bytes) for the given markdown bodies."""
+    first = rerun = 0
+    for body in bodies:
+        msg = _markdown_msg(body)
+        populate_hash_if_needed(msg)
+        size = msg.ByteSize()
+        first += size
+        # populate_hash_if_needed applies the configured threshold; re-apply ours
+        cacheable = size >= threshold
+        rerun += create_reference_msg(msg).ByteSize() if cacheable else size
+    return first, rerun
+
+
+def time_per_run(build, reruns):
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        build()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=200, help='Reruns timed per variant (default: %(default)s)')
+    parser.add_argument('--max-rerun-bytes', type=int, default=2048,
+                        help='Fail when a repeated rerun sends more (default: %(default)s)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args(argv)
+
+    threshold = int(config.get_option('global.minCachedMessageSize'))
+    variants = {
+        'legacy': (legacy_bodies, STREAMLIT_DEFAULT_THRESHOLD),
+        'compiled': (current_bodies, threshold),
+    }
+    results = {}
+    for name, (build, variant_threshold) in variants.items():
+        first, rerun = bytes_per_run(build(), variant_threshold)
+        results[name] = {'first_run_bytes': first, 'rerun_bytes': rerun, 'cache_threshold': variant_threshold,
+                         'median_build_us': time_per_run(build, args.reruns) * 1e6}
+
+    print(f"{'variant':<10} {'first run':>12} {'rerun':>10} {'build':>10}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['first_run_bytes']:>10} B {r['rerun_bytes']:>8} B {r['median_build_us']:>7.1f} us")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'created_at': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                   'css_version': theme.css_version(), 'results': results}, f, indent=2)
+
+    rerun = results['compiled']['rerun_bytes']
+    if rerun > args.max_rerun_bytes:
+        print(f'Regression: a repeated rerun sends {rerun} B (budget {args.max_rerun_bytes} B)', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
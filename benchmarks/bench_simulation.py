@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Benchmark the Monte Carlo projection engine.
+
+Reports paths per second and memory for a few path counts using synthetic
+correlated assets (no network access needed). "peak MB" is the Python
+allocations traced in this process; runs large enough to use worker
+processes also report "worker MB", the largest peak resident size of any
+worker so far (resource.getrusage, Unix only), since tracemalloc cannot see
+allocations made in the workers.
+
+Usage:
+    python benchmarks/bench_simulation.py [--assets 20] [--horizon 252] [--paths 10000 50000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portodash.simulation import PARALLEL_MIN_PATHS, simulate_paths
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def worker_peak_mb():
+    """Largest peak RSS of any terminated worker process so far, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def synthetic_parameters(n_assets, seed=0):
+    """Return (mu, cov) for n correlated assets with ~1% daily volatility."""
+    rng = np.random.default_rng(seed)
+    a = rng.normal(0, 0.01, (n_assets, n_assets))
+    cov = a @ a.T / n_assets + np.eye(n_assets) * 1e-4
+    mu = np.full(n_assets, 0.0003)
+    return mu, cov
+
+
+def run(n_paths, n_assets, horizon, processes):
+    mu, cov = synthetic_parameters(n_assets)
+    weights = np.full(n_assets, 1.0 / n_assets)
+    parallel = (processes or os.cpu_count() or 1) > 1 and n_paths >= PARALLEL_MIN_PATHS
+    tracemalloc.start()
+    start = time.perf_counter()
+    _, growth = simulate_paths(mu, cov, weights, horizon_days=horizon, n_paths=n_paths,
+                               seed=42, processes=processes)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'paths': n_paths,
+        'seconds': elapsed,
+        'paths_per_second': n_paths / elapsed,
+        'peak_mb': peak / 1024 / 1024,
+        # None when the run stayed in this process
+        'worker_mb': worker_peak_mb() if parallel else None,
+        'result_mb': growth.nbytes / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Monte Carlo projection throughput')
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--horizon', type=int, default=252)
+    parser.add_argument('--paths', type=int, nargs='+', default=[10_000, 50_000])
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Worker processes for large runs (default: CPU count, 1 = serial)')
+    args = parser.parse_args()
+
+    print(f"Assets: {args.assets}  Horizon: {args.horizon} days")
+    print(f"{'paths':>10} {'seconds':>9} {'paths/s':>12} {'peak MB':>9} {'worker MB':>10}")
+    for n in args.paths:
+        r = run(n, args.assets, args.horizon, args.processes)
+        worker = '-' if r['worker_mb'] is None else f"{r['worker_mb']:.1f}"
+        print(f"{r['paths']:>10,} {r['seconds']:>9.2f} {r['paths_per_second']:>12,.0f} {r['peak_mb']:>9.1f} {worker:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Synthetic portfolio data for offline benchmarks.
+
+Generates a portfolio (N accounts holding a subset of M tickers), D days of
+`historical.csv` snapshots ending today and a matching `fx_rates.csv`, in the
+same formats the app and the scheduler write.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from portodash.portfolio import parse_portfolio
+
+
+HOLDER_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor']
+ACCOUNT_TYPES = ['TFSA', 'RRSP', 'Roth IRA', 'Non-registered']
+
+
+def make_tickers(n_tickers):
+    """Every third ticker trades in USD (no .TO suffix), the rest on the TSX."""
+    return [f'SYN{i:03d}' if i % 3 == 0 else f'SYN{i:03d}.TO' for i in range(n_tickers)]
+
+
+def make_portfolio(n_accounts, n_tickers, holdings_per_account=10, seed=0):
+    """Return a portfolio.json-style dict with accounts and holdings."""
+    rng = np.random.default_rng(seed)
+    tickers = make_tickers(n_tickers)
+    accounts = []
+    for a in range(n_accounts):
+        held = rng.choice(tickers, size=min(holdings_per_account, n_tickers), replace=False)
+        accounts.append({
+            'nickname': f'Account {a:02d}',
+            'holder': HOLDER_NAMES[a % len(HOLDER_NAMES)],
+            'type': ACCOUNT_TYPES[a % len(ACCOUNT_TYPES)],
+            'base_currency': 'CAD',
+            'holdings': [
+                {
+                    'ticker': str(t),
+                    'shares': float(rng.integers(10, 1000)),
+                    'cost_basis': float(rng.uniform(10, 200)),
+                    'currency': 'CAD' if str(t).endswith('.TO') else 'USD',
+                }
+                for t in held
+            ],
+        })
+    return {'accounts': accounts}
+
+
+def flatten_holdings(portfolio):
+    """Holdings with account metadata attached, as the app loads them."""
+    return list(parse_portfolio(portfolio).holdings)
+
+
+def price_paths(tickers, days, seed=0):
+    """Geometric random walk closes (days x tickers) starting between 10 and 200."""
+    rng = np.random.default_rng(seed + 1)
+    start = rng.uniform(10, 200, len(tickers))
+    steps = rng.normal(0.0003, 0.01, (days, len(tickers)))
+    return pd.DataFrame(start * np.exp(np.cumsum(steps, axis=0)), columns=tickers)
+
+
+def snapshot_dates(days, end=None):
+    """One 20:00 UTC snapshot per day, ending today."""
+    end = end or datetime.utcnow().replace(hour=20, minute=0, second=0, microsecond=0)
+    return pd.DatetimeIndex([end - timedelta(days=days - 1 - i) for i in range(days)], tz='UTC')
+
+
+def write_history(csv_path, holdings, days, seed=0, end=None):
+    """Write D days of snapshots for holdings to csv_path; returns the row count."""
+    tickers = sorted({h['ticker'] for h in holdings})
+    prices = price_paths(tickers, days, seed)
+    dates = snapshot_dates(days, end)
+
+    col = {t: i for i, t in enumerate(tickers)}
+    idx = np.array([col[h['ticker']] for h in holdings])
+    shares = np.array([float(h['shares']) for h in holdings])
+    price = prices.to_numpy()[:, idx]                      # days x holdings
+    value = price * shares
+    total = value.sum(axis=1, keepdims=True)
+
+    n = len(holdings)
+    frame = pd.DataFrame({
+        'date': np.repeat(dates.astype(str), n),
+        'account': np.tile([h['account_nickname'] for h in holdings], days),
+        'ticker': np.tile([h['ticker'] for h in holdings], days),
+        'shares': np.tile(shares, days),
+        'cost_basis': np.tile([float(h['cost_basis']) for h in holdings], days),
+        'price': price.ravel(),
+        'current_value': value.ravel(),
+        'portfolio_value': np.repeat(total.ravel(), n),
+        'allocation_pct': (value / total).ravel(),
+    })
+    frame.to_csv(csv_path, index=False)
+    return len(frame)
+
+
+def write_fx(csv_path, days, seed=0, end=None):
+    """Write a daily USD->CAD series covering the snapshot dates."""
+    rng = np.random.default_rng(seed + 2)
+    dates = snapshot_dates(days + 1, end)
+    rates = 1.38 * np.exp(np.cumsum(rng.normal(0, 0.003, len(dates))))
+    pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'usd_cad': rates.round(4)}).to_csv(csv_path, index=False)
+
+
+def latest_prices(csv_path):
+    """ticker -> last price in a generated history (what a live fetch would return)."""
+    df = pd.read_csv(csv_path, usecols=['date', 'ticker', 'price'])
+    return df.groupby('ticker')['price'].last().to_dict()
@@ -0,0 +1,6 @@
+"""Run the headless CLI: python -m portodash --help"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
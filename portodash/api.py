@@ -0,0 +1,312 @@
+"""Local JSON API over valuation, cached prices, performance and scheduler status.
+
+Served by tornado (installed with Streamlit) as a separate process, see
+`scripts/run_api.py`. Endpoints (GET, JSON):
+
+- /api/health
+- /api/valuation?account=&holder=&type=&max_age_hours=72: compute_portfolio_df
+  on the latest prices in the snapshot history (no live fetch per request), in
+  the portfolio's base currency, with the FX rates used and when each was fetched
+- /api/prices?max_age_hours=72: latest cached price and timestamp per ticker
+- /api/performance?days=30&by=total|account|holder|type|ticker&account=&fixed_fx=1:
+  CAD value series from the snapshot history and fx_rates.csv
+- /api/scheduler: the scheduler's logs/scheduler_status.json
+
+Responses are cached in memory per (endpoint, query) under a data version:
+the mtime and size of every file the endpoint reads, plus the hour or day
+for windows measured from now. The ETag is derived from that version alone,
+so an If-None-Match revalidation is answered with 304 after a few stat calls
+without computing anything. Bodies are kept plain and gzipped, compressed
+once per version. pandas work runs in a thread pool so slow requests do not
+block the event loop, and concurrent misses for the same key share one
+computation.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Cached responses kept in memory (oldest evicted first)
+CACHE_ENTRIES = 256
+# Smaller bodies are sent uncompressed
+MIN_GZIP_BYTES = 512
+
+
+class ApiError(ValueError):
+    """Invalid request parameters (answered with 400)."""
+
+
+class Response(NamedTuple):
+    etag: str
+    body: bytes
+    gzipped: Optional[bytes]
+
+
+Query = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def _file_version(path: Optional[str]):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _one(query: Query, name: str, default=None, cast=str):
+    for key, values in query:
+        if key == name and values:
+            try:
+                return cast(values[-1])
+            except ValueError:
+                raise ApiError(f'Invalid {name}: {values[-1]!r}')
+    return default
+
+
+def _many(query: Query, name: str) -> Optional[list]:
+    for key, values in query:
+        if key == name:
+            return [v for value in values for v in value.split(',') if v] or None
+    return None
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'yes')
+
+
+class PortfolioApi:
+    """Endpoint implementations with versioned response caching.
+
+    Paths default to the files next to the portfolio, as in the CLI.
+    """
+
+    def __init__(self, portfolio_path: str, history_path: Optional[str] = None, fx_csv_path: Optional[str] = None,
+                 status_path: Optional[str] = None, workers: int = 4):
+        from .snapshot_store import history_path as default_history
+
+        base_dir = os.path.dirname(os.path.abspath(portfolio_path))
+        self.portfolio_path = portfolio_path
+        self.history_path = history_path or default_history(base_dir)
+        self.fx_csv_path = fx_csv_path or os.path.join(base_dir, 'fx_rates.csv')
+        if status_path is None:
+            from .scheduler import _status_file_path
+
+            status_path = _status_file_path()
+        self.status_path = status_path
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='portodash-api')
+        self._cache: Dict[tuple, Response] = {}
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        # name -> (files read, time bucket in seconds or None, compute(query))
+        self.endpoints: Dict[str, Tuple[Callable[[], Iterable[str]], Optional[int], Callable[[Query], object]]] = {
+            'health': (lambda: (), None, self.health),
+            'valuation': (self._valuation_files, 3600, self.valuation),
+            'prices': (self._price_files, 3600, self.prices),
+            'performance': (self._performance_files, 86400, self.performance),
+            'scheduler': (lambda: (self.status_path,), None, self.scheduler),
+        }
+
+    # Data versions
+
+    def _ledger_path(self) -> str:
+        from .ledger import default_path
+
+        return default_path(self.portfolio_path)
+
+    def _price_files(self):
+        return self.portfolio_path, self.history_path, self._ledger_path()
+
+    def _valuation_files(self):
+        from .fx import _cache_path
+
+        return self._price_files() + (_cache_path(),)
+
+    def _performance_files(self):
+        return self.portfolio_path, self.history_path, self.fx_csv_path
+
+    def etag(self, name: str, query: Query) -> str:
+        files, bucket, _ = self.endpoints[name]
+        version = [_file_version(path) for path in files()]
+        if bucket:
+            version.append(int(time.time() // bucket))
+        key = json.dumps([name, query, version], default=str)
+        return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+    async def response(self, name: str, query: Query, etag: Optional[str] = None) -> Response:
+        """Cached response for the current data version, computed once per version."""
+        etag = etag or self.etag(name, query)
+        key = (name, query)
+        cached = self._cache.get(key)
+        if cached is not None and cached.etag == etag:
+            return cached
+        pending = self._pending.get((key, etag))
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = self._pending[(key, etag)] = loop.run_in_executor(self._executor, self._render, name, query, etag)
+            pending.add_done_callback(lambda _: self._pending.pop((key, etag), None))
+        response = await pending
+        self._cache.pop(key, None)
+        self._cache[key] = response
+        while len(self._cache) > CACHE_ENTRIES:
+            self._cache.pop(next(iter(self._cache)))
+        return response
+
+    def _render(self, name: str, query: Query, etag: str) -> Response:
+        with span('api.' + name):
+            payload = self.endpoints[name][2](query)
+            body = json.dumps(payload, separators=(',', ':'), default=str, allow_nan=False).encode()
+            gzipped = gzip.compress(body, compresslevel=6) if len(body) >= MIN_GZIP_BYTES else None
+        return Response(etag, body, gzipped)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Endpoints
+
+    def health(self, query: Query) -> dict:
+        return {'status': 'ok', 'started_at': self.started_at, 'history': os.path.abspath(self.history_path)}
+
+    def _portfolio(self):
+        from .ledger import load_ledger
+        from .portfolio import load_portfolio
+
+        return load_portfolio(self.portfolio_path), load_ledger(self._ledger_path())
+
+    def _cached_prices(self, tickers, query: Query):
+        from .cache import get_cached_prices
+
+        max_age = _one(query, 'max_age_hours', 72.0, float)
+        return get_cached_prices(tickers, self.history_path, max_age_hours=max_age)
+
+    def prices(self, query: Query) -> dict:
+        portfolio, ledger = self._portfolio()
+        tickers = sorted(set(portfolio.tickers) | set(ledger.tickers if ledger is not None else ()))
+        prices, times = self._cached_prices(tickers, query)
+        return {'prices': {t: {'price': prices.get(t), 'as_of': times.get(t)} for t in tickers},
+                'missing': [t for t in tickers if prices.get(t) is None]}
+
+    def valuation(self, query: Query) -> dict:
+        from .calculations import compute_portfolio_df
+        from .fx import fx_rate_times, get_fx_rates
+
+        portfolio, _ = self._portfolio()
+        holdings = portfolio.filter_holdings(nicknames=_many(query, 'account'), holders=_many(query, 'holder'),
+                                             types=_many(query, 'type'))
+        tickers = sorted({h['ticker'] for h in holdings})
+        prices, times = self._cached_prices(tickers, query)
+        base = portfolio.base_currency
+        currencies = {h.get('currency', base).upper() for h in holdings}
+        fx_rates = get_fx_rates(currencies, base=base) if currencies else {}
+        fx_times = fx_rate_times(fx_rates, base)
+        fx = {'base_currency': base, 'fx_rates': fx_rates,
+              'fx_as_of': {c: ts.replace(tzinfo=timezone.utc).isoformat() for c, ts in fx_times.items()}}
+        df = compute_portfolio_df(holdings, prices, fx_rates=fx_rates, base_currency=base)
+        stamps = [t for t in times.values() if t]
+        if df.empty:
+            return {'as_of': None, 'total_value': 0.0, 'total_cost': 0.0, 'gain': 0.0, **fx,
+                    'missing': tickers, 'holdings': []}
+        total = df[df['ticker'] == 'TOTAL'].iloc[0]
+        rows = df[df['ticker'] != 'TOTAL']
+        return {
+            'as_of': max(stamps) if stamps else None,
+            'total_value': round(float(total['current_value']), 2),
+            'total_cost': round(float(total['cost_total']), 2),
+            'gain': round(float(total['gain']), 2),
+            **fx,
+            'missing': [t for t in tickers if prices.get(t) is None],
+            'holdings': json.loads(rows.to_json(orient='records')),
+        }
+
+    def performance(self, query: Query) -> dict:
+        from .performance import compute_breakdowns, load_snapshot_cube
+
+        by = _one(query, 'by', 'total')
+        if by not in ('total', 'account', 'holder', 'type', 'ticker'):
+            raise ApiError(f'Invalid by: {by!r}')
+        days = _one(query, 'days', None, int)
+        portfolio, _ = self._portfolio()
+        cube = load_snapshot_cube(self.history_path, self.fx_csv_path, days=days)
+        cube = cube.slice(accounts=_many(query, 'account'), tickers=_many(query, 'ticker'))
+        meta = {acc.nickname: {'holder': acc.holder, 'type': acc.type} for acc in portfolio.accounts}
+        frame = compute_breakdowns(cube, meta, fixed_fx=_flag(_one(query, 'fixed_fx', '0')))[by].round(2)
+        # Columnar: one date list and one value list per series
+        return {'dates': [d.strftime('%Y-%m-%d') for d in frame.index],
+                'series': {str(name): frame[name].tolist() for name in frame.columns}}
+
+    def scheduler(self, query: Query) -> dict:
+        if not os.path.exists(self.status_path):
+            return {'available': False}
+        with open(self.status_path) as f:
+            status = json.load(f)
+        updated = datetime.fromtimestamp(os.path.getmtime(self.status_path), timezone.utc).isoformat()
+        return {'available': True, 'updated_at': updated, **status}
+
+
+def make_app(api: PortfolioApi):
+    """tornado Application serving api under /api/<endpoint>."""
+    import tornado.web
+
+    class Handler(tornado.web.RequestHandler):
+        def initialize(self, name):
+            self.name = name
+
+        def compute_etag(self):
+            # ETags come from data versions, not from hashing each body
+            return None
+
+        def write_error(self, status_code, **kwargs):
+            self.finish({'error': self._reason})
+
+        async def get(self):
+            query = tuple(sorted((k, tuple(v.decode() for v in values))
+                                 for k, values in self.request.query_arguments.items()))
+            try:
+                etag = api.etag(self.name, query)
+                self.set_header('ETag', etag)
+                self.set_header('Cache-Control', 'no-cache')
+                self.set_header('Vary', 'Accept-Encoding')
+                if self.check_etag_header():
+                    self.set_status(304)
+                    return
+                response = await api.response(self.name, query, etag)
+            except ApiError as e:
+                self.set_status(400)
+                self.finish({'error': str(e)})
+                return
+            except Exception:
+                logger.exception('API request failed: %s', self.request.uri)
+                raise tornado.web.HTTPError(500)
+            self.set_header('Content-Type', 'application/json')
+            if response.gzipped is not None and 'gzip' in self.request.headers.get('Accept-Encoding', ''):
+                self.set_header('Content-Encoding', 'gzip')
+                self.finish(response.gzipped)
+            else:
+                self.finish(response.body)
+
+    routes = [(rf'/api/{name}', Handler, {'name': name}) for name in api.endpoints]
+    return tornado.web.Application(routes)
+
+
+async def serve(api: PortfolioApi, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    """Serve until cancelled."""
+    app = make_app(api)
+    server = app.listen(port, address=host)
+    logger.info('PortoDash API listening on http://%s:%d/api/', host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        api.close()
@@ -1,20 +1,90 @@
 """Cache utilities for price data."""
+import csv
 from datetime import datetime, timedelta
+import io
 import pandas as pd
 import os
 import logging
 import pytz
 
+from .snapshot_store import is_compact_store, read_compact
+from .sqlite_store import is_sqlite_store, latest_prices
+from .tracing import traced
+
 
 logger = logging.getLogger(__name__)
 
+# Bytes read per step when scanning historical.csv backwards
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def _parse_row_date(value):
+    """Parse a historical.csv date cell as a UTC datetime (naive values are UTC)."""
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        ts = pd.Timestamp(value).to_pydatetime()
+    return ts.replace(tzinfo=pytz.UTC) if ts.tzinfo is None else ts
+
+
+@traced()
+def read_csv_tail(csv_path, cutoff, block_size=TAIL_BLOCK_SIZE):
+    """Read the rows of a date-ordered CSV dated at or after `cutoff`.
+
+    The file is scanned backwards in `block_size` blocks and the scan stops at
+    the first row older than the cutoff, so the cost depends on the size of
+    the window rather than the length of the history. fetch_and_store_snapshot
+    always writes historical.csv in date order.
+
+    Returns (rows DataFrame with the file's columns, latest date in the file
+    or None when it has no data rows).
+    """
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        columns = next(csv.reader([header.decode('utf-8')]), [])
+        date_col = columns.index('date')
+
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        pending = b''
+        kept = []
+        latest = None
+        done = False
+        while pos > data_start and not done:
+            step = min(block_size, pos - data_start)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + pending).split(b'\n')
+            # The first piece may be the tail of a line that starts in an earlier block
+            pending = lines.pop(0) if pos > data_start else b''
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                when = _parse_row_date(next(csv.reader([line.decode('utf-8')]))[date_col])
+                latest = latest or when
+                if when < cutoff:
+                    done = True
+                    break
+                kept.append(line)
+        if not done and pending.strip():
+            when = _parse_row_date(next(csv.reader([pending.decode('utf-8')]))[date_col])
+            latest = latest or when
+            if when >= cutoff:
+                kept.append(pending)
+
+    body = b'\n'.join(reversed(kept))
+    rows = pd.read_csv(io.BytesIO(header + body), names=columns, header=0) if kept else pd.DataFrame(columns=columns)
+    return rows, latest
 
+
+@traced()
 def get_cached_prices(tickers, csv_path, max_age_hours=72):
     """Get most recent cached prices for tickers from historical CSV.
     
     Args:
         tickers: List of ticker symbols
-        csv_path: Path to historical.csv file
+        csv_path: Path to historical.csv file (or a SQLite or compact snapshot store)
         max_age_hours: Maximum age in hours for cached prices (default 72)
                       Increased from 24 to 72 to provide better fallback
                       during extended yfinance outages. ETF/mutual fund
@@ -30,29 +100,35 @@ def get_cached_prices(tickers, csv_path, max_age_hours=72):
         return {t: None for t in tickers}, {t: None for t in tickers}
         
     try:
-        # Read historical CSV
-        df = pd.read_csv(csv_path)
-        df['date'] = pd.to_datetime(df['date'], format='ISO8601')
-        
-        if df.empty:
-            logger.warning(f"Cache file is empty: {csv_path}")
-            return {t: None for t in tickers}, {t: None for t in tickers}
-
         # Get latest price for each ticker within max age
         now = pd.to_datetime(datetime.utcnow()).tz_localize(pytz.UTC)
         cutoff = now - timedelta(hours=max_age_hours)
-        
+
         logger.info(f"Cache cutoff time: {cutoff.isoformat()} (max_age={max_age_hours}h)")
 
-        # Ensure date column is tz-aware for comparison (should already be from ISO8601 format)
-        if df['date'].dt.tz is None:
-            df['date'] = df['date'].dt.tz_localize(pytz.UTC)
+        if is_sqlite_store(csv_path):
+            return latest_prices(csv_path, tickers, cutoff)
+
+        if is_compact_store(csv_path):
+            rows = read_compact(csv_path, columns=['date', 'ticker', 'price'])
+            latest_date = rows['date'].max() if len(rows) else None
+            recent = rows[rows['date'] >= cutoff].copy()
+        else:
+            # Only the tail of the file inside the window is read and parsed
+            recent, latest_date = read_csv_tail(csv_path, cutoff.to_pydatetime())
+        if latest_date is None:
+            logger.warning(f"Cache file is empty: {csv_path}")
+            return {t: None for t in tickers}, {t: None for t in tickers}
 
-        recent = df[df['date'] >= cutoff]
         if recent.empty:
-            logger.warning(f"No recent cache data within {max_age_hours} hours. Latest data: {df['date'].max()}")
+            logger.warning(f"No recent cache data within {max_age_hours} hours. Latest data: {latest_date}")
             return {t: None for t in tickers}, {t: None for t in tickers}
 
+        recent['date'] = pd.to_datetime(recent['date'], format='ISO8601')
+        # Ensure date column is tz-aware (should already be from ISO8601 format)
+        if recent['date'].dt.tz is None:
+            recent['date'] = recent['date'].dt.tz_localize(pytz.UTC)
+
         # Get most recent price for each ticker
         latest = recent.sort_values('date').groupby('ticker').last()
         
@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
 
+from .tracing import traced
 
+
+@traced()
 def compute_portfolio_df(holdings_list, prices_dict, fx_rates=None, base_currency='CAD'):
     """Return a DataFrame with portfolio calculations per ticker and totals.
 
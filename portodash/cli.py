@@ -0,0 +1,240 @@
+"""Headless command line interface: `python -m portodash <command>`.
+
+Commands:
+- value: current holdings, values and gains in the portfolio's base currency (live
+  prices, or --cached from the snapshot history)
+- snapshot: fetch prices and write today's snapshot, like the scheduler job (nothing
+  is written when no price is available)
+- history: CAD value per snapshot day, optionally per account or ticker
+- export: write a filtered export of the snapshot history (csv, csv.gz, parquet)
+
+Each command imports only the modules it needs, so `--help` and argument
+errors do not load pandas, and only live price fetches load yfinance. The
+snapshot history and fx_rates.csv default to the files next to the
+portfolio file, so cron jobs for portfolios in separate directories never
+share state; snapshot writes take the history's file lock and a busy lock
+exits with status 75 (EX_TEMPFAIL) so cron can retry.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+
+logger = logging.getLogger(__name__)
+
+# sysexits.h EX_TEMPFAIL: another process holds the history lock, retry later
+EXIT_LOCKED = 75
+
+
+def _default_portfolio() -> str:
+    if os.path.exists('portfolio.json'):
+        return 'portfolio.json'
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'portfolio.json')
+
+
+def _history(args) -> str:
+    if args.history:
+        return args.history
+    from .snapshot_store import history_path
+
+    return history_path(os.path.dirname(os.path.abspath(args.portfolio)))
+
+
+def _fx_csv(args) -> str:
+    return args.fx or os.path.join(os.path.dirname(os.path.abspath(args.portfolio)), 'fx_rates.csv')
+
+
+def _emit(df, fmt: str, meta: dict = None) -> None:
+    """Print a DataFrame as a table, CSV or JSON (records, plus meta fields)."""
+    if fmt == 'json':
+        records = json.loads(df.to_json(orient='records', date_format='iso'))
+        print(json.dumps({**meta, 'rows': records} if meta else records, indent=2))
+    elif fmt == 'csv':
+        df.to_csv(sys.stdout, index=False)
+    else:
+        import pandas as pd
+
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+            print(df.to_string(index=False))
+        for key, value in (meta or {}).items():
+            print(f'{key}: {value}', file=sys.stderr)
+
+
+def _load(args):
+    from .ledger import default_path, load_ledger
+    from .portfolio import load_portfolio
+
+    portfolio = load_portfolio(args.portfolio)
+    ledger = load_ledger(default_path(args.portfolio))
+    return portfolio, ledger
+
+
+def _prices(tickers, history: str, cached: bool, max_age: float):
+    if cached:
+        from .cache import get_cached_prices
+
+        prices, times = get_cached_prices(tickers, history, max_age_hours=max_age)
+        stamps = [t for t in times.values() if t]
+        return prices, max(stamps) if stamps else None, 'cache'
+    from .data_fetch import get_current_prices
+
+    return get_current_prices(tickers, csv_path=history, cache_max_age_hours=max_age)
+
+
+def cmd_value(args) -> int:
+    from .calculations import compute_portfolio_df
+    from .fx import fx_rate_ages, get_fx_rates
+
+    portfolio, _ = _load(args)
+    holdings = portfolio.filter_holdings(nicknames=args.account, holders=args.holder, types=args.type)
+    if not holdings:
+        print('No holdings match the filters', file=sys.stderr)
+        return 1
+    tickers = sorted({h['ticker'] for h in holdings})
+    prices, fetched_at, source = _prices(tickers, _history(args), args.cached, args.max_age)
+    missing = [t for t in tickers if prices.get(t) is None]
+    base = portfolio.base_currency
+    currencies = {h.get('currency', base).upper() for h in holdings}
+    fx_rates = get_fx_rates(currencies, base=base) if currencies else {}
+    df = compute_portfolio_df(holdings, prices, fx_rates=fx_rates, base_currency=base)
+
+    total = df[df['ticker'] == 'TOTAL'].iloc[0]
+    meta = {'portfolio': os.path.abspath(args.portfolio), 'fetched_at': fetched_at, 'source': source,
+            'base_currency': base, 'fx_rates': fx_rates, 'fx_age_hours': fx_rate_ages(fx_rates, base),
+            'total_value': round(float(total['current_value']), 2), 'total_cost': round(float(total['cost_total']), 2),
+            'gain': round(float(total['gain']), 2), 'missing_prices': missing}
+    _emit(df[df['ticker'] != 'TOTAL'], args.format, meta)
+    return 2 if missing and args.strict else 0
+
+
+def cmd_snapshot(args) -> int:
+    from .data_fetch import fetch_and_store_snapshot
+    from .locking import LockTimeout
+
+    portfolio, ledger = _load(args)
+    history = _history(args)
+    tickers = portfolio.tickers
+    if ledger is not None:
+        tickers = sorted(set(tickers) | set(ledger.tickers))
+    prices, fetched_at, source = _prices(tickers, history, args.cached, args.max_age)
+    missing = [t for t in tickers if prices.get(t) is None]
+    if len(missing) == len(tickers) or (missing and args.strict):
+        print(f"No price for {', '.join(missing)}; snapshot not written", file=sys.stderr)
+        return 2
+    try:
+        written = fetch_and_store_snapshot(list(portfolio.holdings), prices, history, fetched_at_iso=fetched_at,
+                                           ledger=ledger, lock_timeout=args.lock_timeout)
+    except LockTimeout as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_LOCKED
+    result = {'history': os.path.abspath(history), 'fetched_at': fetched_at, 'source': source,
+              'rows': len(written), 'missing_prices': missing}
+    if args.format == 'json':
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Wrote {len(written)} holdings to {result['history']} ({source}, {fetched_at})")
+    return 0
+
+
+def cmd_history(args) -> int:
+    from .performance import load_snapshot_cube
+
+    history = _history(args)
+    if not os.path.exists(history):
+        print(f'No snapshot history at {history}', file=sys.stderr)
+        return 1
+    cube = load_snapshot_cube(history, _fx_csv(args), days=args.days)
+    cube = cube.slice(accounts=args.account, tickers=args.ticker, days=args.days)
+    if args.by:
+        values = cube.values().T.groupby(level=args.by).sum().T
+    else:
+        values = cube.total().rename('value_cad').to_frame()
+    df = values.round(2).rename_axis('date').reset_index()
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    _emit(df, args.format)
+    return 0
+
+
+def cmd_export(args) -> int:
+    from .export import export_file_name, write_export
+
+    history = _history(args)
+    if not os.path.exists(history):
+        print(f'No snapshot history at {history}', file=sys.stderr)
+        return 1
+    out = args.output or export_file_name(args.export_format, args.start, args.end)
+    rows = write_export(history, out, args.export_format, start=args.start, end=args.end,
+                        accounts=args.account, tickers=args.ticker)
+    print(f'Exported {rows} rows to {out}', file=sys.stderr)
+    return 0
+
+
+def _date(value: str):
+    from datetime import date
+
+    return date.fromisoformat(value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='portodash', description='PortoDash without the dashboard')
+    parser.add_argument('--portfolio', default=_default_portfolio(), help='portfolio.json (default: %(default)s)')
+    parser.add_argument('--history', help='Snapshot history (default: historical.db or historical.csv next to the portfolio)')
+    parser.add_argument('--fx', help='fx_rates.csv (default: next to the portfolio)')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='Log to stderr (-vv for debug)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add(name, func, help, formats=('table', 'json', 'csv')):
+        sub = commands.add_parser(name, help=help, description=help)
+        sub.set_defaults(func=func)
+        if formats:
+            sub.add_argument('--format', choices=formats, default='table')
+        return sub
+
+    value = add('value', cmd_value, "Current holdings, values and gains in the portfolio's base currency")
+    value.add_argument('--account', action='append', help='Account nickname (repeatable)')
+    value.add_argument('--holder', action='append', help='Account holder (repeatable)')
+    value.add_argument('--type', action='append', help='Account type (repeatable)')
+
+    snapshot = add('snapshot', cmd_snapshot, "Fetch prices and write today's snapshot", formats=('table', 'json'))
+    snapshot.add_argument('--lock-timeout', type=float, default=10.0,
+                          help='Seconds to wait for another writer (default: %(default)s)')
+
+    for sub in (value, snapshot):
+        sub.add_argument('--cached', action='store_true', help='Use the latest prices in the snapshot history, no network')
+        sub.add_argument('--max-age', type=float, default=72, metavar='HOURS',
+                         help='Oldest snapshot-history price to fall back to (default: %(default)s)')
+        sub.add_argument('--strict', action='store_true', help='Exit with status 2 when a price is missing')
+
+    history = add('history', cmd_history, 'CAD value per snapshot day')
+    history.add_argument('--days', type=int, help='Only the last N days')
+    history.add_argument('--by', choices=['account', 'ticker'], help='One column per account or ticker')
+
+    export = add('export', cmd_export, 'Export snapshot rows', formats=None)
+    export.add_argument('--format', dest='export_format', choices=['csv', 'csv.gz', 'parquet'], default='csv')
+    export.add_argument('--start', type=_date, help='First day (YYYY-MM-DD)')
+    export.add_argument('--end', type=_date, help='Last day, inclusive (YYYY-MM-DD)')
+    export.add_argument('-o', '--output', help='Output file (default: historical_<start>_<end>.<ext>)')
+
+    for sub in (history, export):
+        sub.add_argument('--account', action='append', help='Account nickname (repeatable)')
+        sub.add_argument('--ticker', action='append', help='Ticker (repeatable)')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)],
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s', stream=sys.stderr)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Output piped into head & co.; silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except (OSError, ValueError) as e:
+        # Missing or invalid portfolio/history files (PortfolioError is a ValueError)
+        logger.debug('Command failed', exc_info=True)
+        print(f'portodash {args.command}: {e}', file=sys.stderr)
+        return 1
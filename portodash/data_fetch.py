@@ -1,18 +1,24 @@
 import os
+import numpy as np
 import pandas as pd
-import yfinance as yf
 from datetime import datetime
 import logging
 import pytz
 
 from .cache import get_cached_prices
+from .locking import LOCK_TIMEOUT, atomic_write, file_lock
+from .mapped_history import default_arrow_path, sync_history_arrow
+from .snapshot_store import is_compact_store, replace_compact_snapshots
+from .sqlite_store import is_sqlite_store, replace_snapshots
+from .tracing import span, traced
 
 
 logger = logging.getLogger(__name__)
 
 
+@traced()
 def get_current_prices(tickers, csv_path=None, cache_max_age_hours=72):
-    """Fetch most recent available adjusted close prices for tickers.
+    """Fetch the most recent available close prices for tickers.
 
     Returns a tuple: (prices_dict, fetched_at_iso, source)
 
@@ -39,6 +45,9 @@ def get_current_prices(tickers, csv_path=None, cache_max_age_hours=72):
     origins = {t: None for t in tickers}  # 'live' or 'cache'
     times = {t: None for t in tickers}  # ISO timestamps per-ticker
 
+    # yfinance is imported on first use to keep module import (and cold starts) cheap
+    import yfinance as yf
+
     # Import YFRateLimitError for detection (do this at function level)
     try:
         from yfinance.exceptions import YFRateLimitError
@@ -49,21 +58,26 @@ def get_current_prices(tickers, csv_path=None, cache_max_age_hours=72):
     # Attempt live fetch via yfinance with optimized parameters
     try:
         
-        data = yf.download(
-            tickers=" ".join(tickers), 
-            period="5d", 
-            interval="1d", 
-            group_by='ticker', 
-            threads=True,  # Enable parallel fetching
-            progress=False, 
-            auto_adjust=False,
-            timeout=30  # Extended timeout (default is 10s)
-        )
+        with span('yf.download', tickers=len(tickers)):
+            data = yf.download(
+                tickers=" ".join(tickers), 
+                period="5d", 
+                interval="1d", 
+                group_by='ticker', 
+                threads=True,  # Enable parallel fetching
+                progress=False, 
+                auto_adjust=False,
+                timeout=30  # Extended timeout (default is 10s)
+            )
 
+        # Snapshots value actual share counts, so use the traded close; dividends are
+        # added back separately (see portodash.distributions) rather than via Adj Close
+        levels = data.columns.get_level_values(-1) if isinstance(data.columns, pd.MultiIndex) else data.columns
+        field = 'Close' if 'Close' in levels else 'Adj Close'
         if isinstance(data.columns, pd.MultiIndex):
             for t in tickers:
                 try:
-                    ser = data[t]["Adj Close"].dropna()
+                    ser = data[t][field].dropna()
                     prices[t] = float(ser.iloc[-1])
                     origins[t] = 'live'
                     times[t] = datetime.utcnow().replace(tzinfo=pytz.UTC).isoformat()
@@ -73,7 +87,7 @@ def get_current_prices(tickers, csv_path=None, cache_max_age_hours=72):
         else:
             # single ticker or simplified DF
             try:
-                ser = data["Adj Close"].dropna()
+                ser = data[field].dropna()
                 last = float(ser.iloc[-1])
                 for t in tickers:
                     prices[t] = last
@@ -147,42 +161,52 @@ def get_current_prices(tickers, csv_path=None, cache_max_age_hours=72):
     return prices, fetched_at_iso, source
 
 
-def get_historical_prices(tickers, period="30d"):
+@traced()
+def get_historical_prices(tickers, period="30d", start=None):
     """Return DataFrame of adjusted close prices with dates as index and columns as tickers.
 
     period examples: '30d', '90d', '1y'
+    start: optional date/ISO string; when given it replaces period so callers
+    (e.g. the local price store) can fetch only the days they are missing.
     
     Optimized for yfinance:
     - threads=False: Historical data fetches are already optimized by Yahoo
     - progress=False: Cleaner output
     - timeout=30: Extended timeout for larger datasets
     """
+    import yfinance as yf
+
     try:
-        df = yf.download(
-            tickers=" ".join(tickers), 
-            period=period, 
-            interval="1d", 
-            auto_adjust=True, 
-            progress=False,
-            threads=False,  # Historical fetches don't benefit from threading
-            timeout=30
-        )
+        window = {'start': start} if start is not None else {'period': period}
+        with span('yf.download', tickers=len(tickers)):
+            df = yf.download(
+                tickers=" ".join(tickers), 
+                interval="1d", 
+                auto_adjust=True, 
+                progress=False,
+                threads=False,  # Historical fetches don't benefit from threading
+                timeout=30,
+                **window
+            )
+        # With auto_adjust=True yfinance returns adjusted prices under 'Close'
+        field = 'Adj Close' if 'Adj Close' in df.columns.get_level_values(0) else 'Close'
         # If multi-index columns (multiple tickers)
         if isinstance(df.columns, pd.MultiIndex):
-            adj = df['Adj Close']
+            adj = df[field]
             # Ensure all requested tickers are columns
             adj = adj.reindex(columns=tickers)
             return adj.dropna(how='all')
         else:
             # single ticker -> series
-            ser = df['Adj Close']
+            ser = df[field]
             return ser.to_frame(name=tickers[0])
     except Exception:
         # return empty df on failure
         return pd.DataFrame()
 
 
-def fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=None):
+@traced()
+def fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=None, ledger=None, lock_timeout=LOCK_TIMEOUT):
     """Update or append a daily snapshot for each holding to csv_path.
     
     If a snapshot already exists for today (same date), it will be replaced.
@@ -190,6 +214,10 @@ def fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=None):
 
     holdings: list of dicts with keys ticker, shares, cost_basis, account_nickname (or legacy 'account')
     prices: dict ticker->price
+    ledger: optional portodash.ledger.Ledger; when given, shares and cost basis are the
+        ledger's positions as of the snapshot date and holdings only supply account metadata
+    lock_timeout: seconds to wait for another process's write to finish before raising
+        portodash.locking.LockTimeout
     Writes rows: date,account,ticker,shares,cost_basis,price,current_value,portfolio_value,allocation_pct
     Note: 'account' column in CSV contains the account_nickname value for clarity
     """
@@ -203,6 +231,9 @@ def fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=None):
     
     # Parse the timestamp to get the date portion
     snapshot_date = pd.to_datetime(now).normalize()
+
+    if ledger is not None:
+        holdings = ledger.holdings_as_of(snapshot_date.date(), metadata=holdings)
     
     # calculate current values
     total = 0.0
@@ -235,31 +266,62 @@ def fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=None):
         })
 
     new_df = pd.DataFrame(rows)
-    
-    # If CSV exists, remove any existing snapshots for the same date
-    if os.path.exists(csv_path):
-        existing_df = pd.read_csv(csv_path)
-        existing_df['date'] = pd.to_datetime(existing_df['date'], format='ISO8601')
-        
-        # Ensure both dates are timezone-aware for comparison
-        if existing_df['date'].dt.tz is None:
-            existing_df['date'] = existing_df['date'].dt.tz_localize('UTC')
-        if snapshot_date.tz is None:
-            snapshot_date = snapshot_date.tz_localize('UTC')
-        
-        # Filter out snapshots from the same date (normalized to day)
-        existing_df = existing_df[existing_df['date'].dt.normalize() != snapshot_date]
-        
-        # Convert new_df dates to datetime with timezone for consistency
-        new_df['date'] = pd.to_datetime(new_df['date'])
-        if new_df['date'].dt.tz is None:
-            new_df['date'] = new_df['date'].dt.tz_localize('UTC')
-        
-        # Append new snapshot
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        combined_df.to_csv(csv_path, index=False)
-    else:
-        # First time - just write the new snapshot
-        new_df.to_csv(csv_path, index=False)
-    
+
+    if is_sqlite_store(csv_path):
+        # The database replaces the day's snapshot in one transaction (WAL mode)
+        replace_snapshots(csv_path, new_df, timeout=lock_timeout)
+        return new_df
+
+    if is_compact_store(csv_path):
+        # The compact store is rewritten under the same lock, keeping its retention tier
+        replace_compact_snapshots(csv_path, new_df, timeout=lock_timeout)
+        _sync_arrow_mirror(csv_path)
+        return new_df
+
+    # The scheduler and the app both write this file: the read-modify-write runs
+    # under an advisory lock and the result replaces the file atomically
+    stamp = pd.Timestamp(now)
+    stamp = stamp.tz_localize('UTC') if stamp.tz is None else stamp.tz_convert('UTC')
+    # New rows use the same date format as rows written by earlier versions
+    csv_rows = new_df.assign(date=str(stamp))
+    with file_lock(csv_path, timeout=lock_timeout):
+        # If CSV exists, remove any existing snapshots for the same date
+        if os.path.exists(csv_path):
+            # Existing rows are written back unchanged: dates stay the strings read
+            # (parsed separately for filtering and sorting) and round-trip parsing
+            # keeps the numbers, so a new day only adds bytes and the Arrow mirror appends
+            existing_df = pd.read_csv(csv_path, float_precision='round_trip', dtype={'date': str})
+            existing_dates = pd.to_datetime(existing_df['date'], format='ISO8601', utc=True)
+
+            # Filter out snapshots from the same date (normalized to day, in UTC)
+            keep = (existing_dates.dt.normalize() != stamp.normalize()).values
+            existing_df, existing_dates = existing_df[keep], existing_dates[keep]
+
+            # Append new snapshot, keeping the file in date order (back-dated
+            # snapshots land in place) for readers that scan from the end
+            combined_df = pd.concat([existing_df, csv_rows], ignore_index=True)
+            dates = np.concatenate([existing_dates.dt.tz_localize(None).to_numpy(),
+                                    np.full(len(csv_rows), stamp.tz_localize(None).to_datetime64())])
+            combined_df = combined_df.iloc[np.argsort(dates, kind='stable')]
+        else:
+            # First time - just write the new snapshot
+            combined_df = csv_rows
+
+        with atomic_write(csv_path, newline='') as f:
+            combined_df.to_csv(f, index=False)
+
+    new_df['date'] = stamp
+    _sync_arrow_mirror(csv_path)
     return new_df
+
+
+def _sync_arrow_mirror(path):
+    """Bring an existing Arrow mirror up to date instead of waiting for a rebuild.
+
+    New days in historical.csv are appended to it as record batches.
+    """
+    if os.path.exists(default_arrow_path(path)):
+        try:
+            sync_history_arrow(path)
+        except Exception:
+            logger.warning('Failed to update the Arrow mirror of %s', path, exc_info=True)
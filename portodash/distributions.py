@@ -0,0 +1,351 @@
+"""Dividend and split events with price-return and total-return series.
+
+Events and split-adjusted (but not dividend-adjusted) closes are downloaded
+in bulk with one `yf.download(actions=True)` call per refresh and kept in the
+price store directory (see `portodash.price_store`):
+
+- distributions.parquet: one row per (date, ticker) event with `dividend`
+  (per share, in the listing currency) and `split` (ratio, 0 when none)
+- closes.parquet: dates x tickers closes, split-adjusted only
+- distributions_state.json: last refresh date per ticker
+
+A ticker is downloaded in full the first time it is seen and afterwards only
+from a week before its last refresh. yfinance restates earlier dividends and
+closes for a split, so a top-up that brings in a split not stored yet
+downloads that ticker again from its first stored date and replaces its
+events and closes instead of merging them. Everything that builds series or charts
+reads these files only, so chart rebuilds never touch the network.
+
+The price store's `prices.parquet` keeps dividend-adjusted closes for the
+risk analytics; the price-return series here uses plain closes and the
+total-return series adds distributions back explicitly.
+"""
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import price_store
+from .tracing import span, traced
+
+
+logger = logging.getLogger(__name__)
+
+EVENTS_FILE = 'distributions.parquet'
+CLOSES_FILE = 'closes.parquet'
+STATE_FILE = 'distributions_state.json'
+
+# Re-download this many days before the last refresh to pick up late corrections
+REFRESH_OVERLAP_DAYS = 7
+
+_EVENT_COLUMNS = ['date', 'ticker', 'dividend', 'split']
+
+
+def _empty_events() -> pd.DataFrame:
+    return pd.DataFrame({
+        'date': pd.Series(dtype='datetime64[ns]'), 'ticker': pd.Series(dtype=object),
+        'dividend': pd.Series(dtype=float), 'split': pd.Series(dtype=float),
+    })
+
+
+def _load_state(path: Optional[str]) -> Dict[str, str]:
+    file_path = os.path.join(price_store.store_dir(path), STATE_FILE)
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logger.exception('Failed to read distributions state')
+        return {}
+
+
+def _save_state(state: Dict[str, str], path: Optional[str]) -> None:
+    file_path = os.path.join(price_store.store_dir(path), STATE_FILE)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, file_path)
+
+
+@traced()
+def load_events(tickers: Optional[Iterable[str]] = None, path: Optional[str] = None) -> pd.DataFrame:
+    """Stored dividend/split events (empty frame if nothing stored yet)."""
+    file_path = os.path.join(price_store.store_dir(path), EVENTS_FILE)
+    if not os.path.exists(file_path):
+        return _empty_events()
+    try:
+        events = pd.read_parquet(file_path)
+    except Exception:
+        logger.exception('Failed to read distributions store')
+        return _empty_events()
+    if tickers is not None:
+        events = events[events['ticker'].isin(list(tickers))].reset_index(drop=True)
+    return events
+
+
+def load_closes(tickers: Optional[Iterable[str]] = None, path: Optional[str] = None) -> pd.DataFrame:
+    """Stored split-adjusted closes (dates x tickers)."""
+    closes = price_store.load_prices(path, filename=CLOSES_FILE)
+    if tickers is not None and not closes.empty:
+        closes = closes.reindex(columns=list(tickers))
+    return closes
+
+
+def events_mtime(path: Optional[str] = None) -> Optional[float]:
+    """mtime of the events file, for use as a cache key."""
+    try:
+        return os.path.getmtime(os.path.join(price_store.store_dir(path), EVENTS_FILE))
+    except OSError:
+        return None
+
+
+def _download(tickers, start: str):
+    """Return (closes, events) for tickers from one bulk yfinance request."""
+    import yfinance as yf
+
+    with span('yf.download', tickers=len(tickers), actions=True):
+        df = yf.download(
+            tickers=' '.join(tickers),
+            start=start,
+            interval='1d',
+            actions=True,
+            auto_adjust=False,
+            group_by='column',
+            progress=False,
+            threads=False,
+            timeout=30,
+        )
+    if df is None or df.empty:
+        return pd.DataFrame(), _empty_events()
+    if not isinstance(df.columns, pd.MultiIndex):
+        df.columns = pd.MultiIndex.from_product([df.columns, tickers[:1]])
+
+    fields = df.columns.get_level_values(0)
+    closes = df['Close'].reindex(columns=tickers).dropna(how='all')
+    frames = []
+    for field, column in (('Dividends', 'dividend'), ('Stock Splits', 'split')):
+        if field not in fields:
+            continue
+        stacked = df[field].reindex(columns=tickers).stack()
+        stacked = stacked[stacked > 0]
+        frames.append(stacked.rename(column))
+    if not frames:
+        return closes, _empty_events()
+    events = pd.concat(frames, axis=1).fillna(0.0)
+    events.index.names = ['date', 'ticker']
+    events = events.reset_index()
+    for column in ('dividend', 'split'):
+        if column not in events:
+            events[column] = 0.0
+    dates = pd.to_datetime(events['date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    events['date'] = dates.dt.normalize()
+    return closes, events[_EVENT_COLUMNS]
+
+
+def merge_events(stored: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+    """Combine stored and newly downloaded events, preferring fresh rows."""
+    if fresh is None or fresh.empty:
+        return stored
+    combined = pd.concat([stored, fresh], ignore_index=True) if not stored.empty else fresh
+    combined = combined.drop_duplicates(['date', 'ticker'], keep='last')
+    return combined.sort_values(['date', 'ticker']).reset_index(drop=True)
+
+
+def _new_splits(stored: pd.DataFrame, fresh: pd.DataFrame):
+    """Tickers with a split in fresh that is not stored yet."""
+    splits = fresh[fresh['split'] > 0][['date', 'ticker']]
+    if splits.empty:
+        return []
+    known = set(zip(stored.loc[stored['split'] > 0, 'date'], stored.loc[stored['split'] > 0, 'ticker']))
+    return sorted({t for d, t in zip(splits['date'], splits['ticker']) if (d, t) not in known})
+
+
+@traced()
+def refresh_distributions(tickers: Iterable[str], path: Optional[str] = None, history: str = '5y',
+                          max_age_hours: float = 20.0) -> bool:
+    """Download events and closes for tickers that are new or stale; True if the store changed.
+
+    New tickers get `history` of data (yfinance period syntax); known ones
+    are topped up from a week before their last refresh, all in at most two
+    bulk requests.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    state = _load_state(path)
+    now = datetime.utcnow()
+    cutoff = (now - timedelta(hours=max_age_hours)).isoformat()
+
+    new = [t for t in tickers if t not in state]
+    stale = [t for t in tickers if t in state and state[t] < cutoff]
+    batches = []
+    if new:
+        batches.append((new, price_store._period_start(history).strftime('%Y-%m-%d'), False))
+    if stale:
+        since = pd.Timestamp(min(state[t] for t in stale)) - pd.Timedelta(days=REFRESH_OVERLAP_DAYS)
+        batches.append((stale, since.strftime('%Y-%m-%d'), True))
+    if not batches:
+        return False
+
+    events = load_events(path=path)
+    closes = load_closes(path=path)
+    refreshed = []
+    resplit = []
+    for batch, start, top_up in batches:
+        try:
+            fresh_closes, fresh_events = _download(batch, start)
+        except Exception:
+            logger.exception('Failed to download distributions for %s', ', '.join(batch))
+            continue
+        if fresh_closes.empty:
+            continue
+        if top_up:
+            resplit = _new_splits(events, fresh_events)
+        closes = price_store.merge_prices(closes, fresh_closes)
+        events = merge_events(events, fresh_events)
+        refreshed += [t for t in batch if t in fresh_closes.columns and fresh_closes[t].notna().any()]
+
+    if resplit:
+        # Earlier dividends and closes are restated for the split: replace the stored ones
+        first = [d for d in (closes[t].first_valid_index() for t in resplit if t in closes.columns) if d is not None]
+        start = min(first) if first else price_store._period_start(history)
+        try:
+            fresh_closes, fresh_events = _download(resplit, start.strftime('%Y-%m-%d'))
+        except Exception:
+            logger.exception('Failed to re-download %s after a split', ', '.join(resplit))
+            fresh_closes = pd.DataFrame()
+        replaced = [t for t in resplit if t in fresh_closes.columns and fresh_closes[t].notna().any()]
+        if replaced:
+            events = merge_events(events[~events['ticker'].isin(replaced)].reset_index(drop=True),
+                                  fresh_events[fresh_events['ticker'].isin(replaced)])
+            closes = price_store.merge_prices(closes.drop(columns=replaced), fresh_closes[replaced])
+
+    if not refreshed:
+        return False
+    try:
+        price_store.save_prices(closes, path, filename=CLOSES_FILE)
+        file_path = os.path.join(price_store.store_dir(path), EVENTS_FILE)
+        events.to_parquet(file_path + '.tmp', index=False)
+        os.replace(file_path + '.tmp', file_path)
+        state.update({t: now.isoformat(timespec='seconds') for t in refreshed})
+        _save_state(state, path)
+    except Exception:
+        logger.exception('Failed to write distributions store')
+        return False
+    return True
+
+
+def raw_dividends(events: pd.DataFrame) -> pd.DataFrame:
+    """Events with dividends restated per share as actually paid.
+
+    yfinance restates past dividends for later splits; multiplying by every
+    split ratio after the ex-date gives the amount per share held at the time,
+    which is what snapshot share counts refer to.
+    """
+    events = events.sort_values(['ticker', 'date']).reset_index(drop=True)
+    ratio = events['split'].where(events['split'] > 0, 1.0)
+    # Product of the split ratios strictly after each row, within its ticker
+    later = ratio[::-1].groupby(events['ticker'][::-1]).cumprod()[::-1] / ratio
+    out = events.copy()
+    out['dividend'] = events['dividend'] * later
+    return out[out['dividend'] > 0].reset_index(drop=True)
+
+
+@traced()
+def cube_distributions(cube, events: pd.DataFrame) -> pd.DataFrame:
+    """Cash distributions (native currency) per snapshot date and cube column.
+
+    A dividend counts the shares held at the last snapshot before its
+    ex-date and is credited at the first snapshot on or after it, so only
+    events inside the cube's date range contribute.
+    """
+    cash = pd.DataFrame(0.0, index=cube.shares.index, columns=cube.shares.columns)
+    if cube.empty or events is None or events.empty:
+        return cash
+    tickers = cube.shares.columns.get_level_values('ticker')
+    events = raw_dividends(events[events['ticker'].isin(set(tickers))])
+    if events.empty:
+        return cash
+
+    snap_days = cube.shares.index.tz_convert('UTC').tz_localize(None).normalize().values
+    credit = np.searchsorted(snap_days, events['date'].values.astype(snap_days.dtype), side='left')
+    shares = cube.shares.to_numpy()
+    out = np.zeros(cash.shape)
+    col_index = pd.Series(np.arange(len(tickers))).groupby(np.asarray(tickers)).apply(list).to_dict()
+    for ticker, dividend, pos in zip(events['ticker'], events['dividend'], credit):
+        if pos == 0 or pos >= len(snap_days):
+            continue
+        cols = col_index[ticker]
+        out[pos, cols] += dividend * shares[pos - 1, cols]
+    return pd.DataFrame(out, index=cash.index, columns=cash.columns)
+
+
+def total_return_values(cube, events: pd.DataFrame, fixed_fx: bool = False) -> Optional[pd.Series]:
+    """Portfolio value plus cumulative distributions received (CAD), or None without any."""
+    cash = cube_distributions(cube, events)
+    if not cash.to_numpy().any():
+        return None
+    received = (cash * cube.fx_factors(fixed_fx=fixed_fx)).sum(axis=1).cumsum()
+    return cube.total(fixed_fx=fixed_fx) + received
+
+
+@traced()
+def return_series(shares: Dict[str, float], closes: pd.DataFrame, events: pd.DataFrame,
+                  start=None, fx_rates: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """Price-return and total-return value of constant share counts over stored closes.
+
+    shares: ticker -> shares held throughout the window
+    fx_rates: optional ticker -> multiplier into the base currency (fixed FX)
+    Returns a frame indexed by date with 'price_return' and 'total_return'
+    columns; both start at the same value and total return reinvests each
+    distribution on its ex-date.
+    """
+    tickers = [t for t in shares if t in closes.columns]
+    if not tickers:
+        return pd.DataFrame(columns=['price_return', 'total_return'])
+    prices = closes[tickers].sort_index().ffill()
+    if start is not None:
+        prices = prices[prices.index >= pd.Timestamp(start)]
+    prices = prices.dropna(how='all').bfill().dropna(axis=1)
+    tickers = list(prices.columns)
+    if prices.empty or not tickers:
+        return pd.DataFrame(columns=['price_return', 'total_return'])
+
+    # Dividends on non-trading days apply to the next close
+    dividends = np.zeros(prices.shape)
+    divs = events[events['ticker'].isin(tickers) & (events['dividend'] > 0)]
+    if not divs.empty:
+        pos = np.searchsorted(prices.index.values, divs['date'].values.astype(prices.index.values.dtype))
+        keep = (pos > 0) & (pos < len(prices.index))
+        cols = pd.Index(tickers).get_indexer(divs['ticker'])
+        np.add.at(dividends, (pos[keep], cols[keep]), divs['dividend'].values[keep])
+
+    growth = ((prices + dividends) / prices.shift(1)).fillna(1.0).cumprod()
+    weights = np.array([shares[t] * (fx_rates or {}).get(t, 1.0) for t in tickers])
+    price_value = prices.to_numpy() @ weights
+    total_value = (growth.to_numpy() * prices.iloc[0].to_numpy()) @ weights
+    return pd.DataFrame({'price_return': price_value, 'total_return': total_value}, index=prices.index)
+
+
+def get_return_series(holdings, period: str = '1y', path: Optional[str] = None,
+                      fx_rates: Optional[Dict[str, float]] = None, base_currency: str = 'CAD') -> pd.DataFrame:
+    """return_series for holdings from the local store only (no network).
+
+    fx_rates maps currency -> rate into base_currency, as for compute_portfolio_df.
+    """
+    shares: Dict[str, float] = {}
+    multipliers: Dict[str, float] = {}
+    for h in holdings:
+        t = h['ticker']
+        shares[t] = shares.get(t, 0.0) + float(h.get('shares', 0))
+        currency = (h.get('currency') or base_currency).upper()
+        if fx_rates and currency != base_currency.upper() and fx_rates.get(currency):
+            multipliers[t] = float(fx_rates[currency])
+    closes = load_closes(shares, path)
+    events = load_events(shares, path)
+    return return_series(shares, closes, events, start=price_store._period_start(period), fx_rates=multipliers)
@@ -0,0 +1,204 @@
+"""On-demand exports of snapshot history.
+
+Exports are written by a streaming writer: historical.csv (or a compact
+store's rows.parquet, or the SQLite store) is read in chunks, each chunk is filtered (date range, accounts, tickers) and appended
+to the output, so only one chunk is in memory at a time whatever the size
+of the history. Supported formats:
+
+- csv: the historical.csv columns and values
+- csv.gz: the same, gzip-compressed
+- parquet: dates as UTC timestamps, zstd-compressed, one row group per chunk
+
+Finished exports are kept in `logs/exports/` keyed by the source file's
+mtime/size and the filters, so repeated downloads of an unchanged history
+reuse the file. An unfiltered plain CSV export is the source file itself.
+"""
+import contextlib
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+
+from .snapshot_store import CSV_COLUMNS, is_compact_store, iter_compact
+from .sqlite_store import is_sqlite_store, iter_rows, read_rows
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+CHUNK_ROWS = 50_000
+# Cached exports kept per directory (oldest are removed first)
+EXPORT_KEEP = 8
+
+
+def default_export_dir(csv_path: str) -> str:
+    """logs/exports/ next to historical.csv."""
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), 'logs', 'exports')
+
+
+def _utc(value, end_of_day: bool = False) -> Optional[pd.Timestamp]:
+    """Bound for a date filter; plain dates cover the whole day."""
+    if value is None:
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value + timedelta(days=1) if end_of_day else value, time())
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+def iter_history_chunks(csv_path: str, start=None, end=None, accounts: Optional[Iterable[str]] = None,
+                        tickers: Optional[Iterable[str]] = None, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Yield filtered chunks of snapshot rows with the source's columns and values.
+
+    `start` is inclusive and `end` exclusive; a `date` for `end` includes
+    that whole day. historical.csv and compact stores are in date order, so
+    reading stops at the first chunk past `end`.
+    """
+    start, end = _utc(start), _utc(end, end_of_day=True)
+    if is_sqlite_store(csv_path):
+        # Filters run in SQL against the store's indexes
+        yield from iter_rows(csv_path, chunksize or CHUNK_ROWS, start=start, end=end, accounts=accounts, tickers=tickers)
+        return
+    accounts = set(accounts) if accounts is not None else None
+    tickers = set(tickers) if tickers is not None else None
+    if is_compact_store(csv_path):
+        chunks = iter_compact(csv_path, chunksize or CHUNK_ROWS)
+    else:
+        chunks = pd.read_csv(csv_path, chunksize=chunksize or CHUNK_ROWS, dtype={'account': str, 'ticker': str})
+    for chunk in chunks:
+        mask = pd.Series(True, index=chunk.index)
+        if start is not None or end is not None:
+            dates = pd.to_datetime(chunk['date'], format='ISO8601', utc=True)
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                mask &= dates < end
+                if len(dates) and dates.iloc[0] >= end:
+                    break
+        if accounts is not None:
+            mask &= chunk['account'].isin(accounts)
+        if tickers is not None:
+            mask &= chunk['ticker'].isin(tickers)
+        if mask.any():
+            yield chunk[mask.values]
+
+
+def _empty_rows(csv_path: str) -> pd.DataFrame:
+    if is_compact_store(csv_path):
+        return next(iter_compact(csv_path, 1), pd.DataFrame(columns=CSV_COLUMNS)).head(0)
+    if is_sqlite_store(csv_path):
+        return read_rows(csv_path, tickers=[])
+    return pd.read_csv(csv_path, nrows=0)
+
+
+@traced()
+def write_export(csv_path: str, out_path: str, fmt: str = 'csv', **filters) -> int:
+    """Stream a filtered export of csv_path to out_path; returns the rows written."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    # A unique temporary name per call, so concurrent exports of the same
+    # file (two sessions, or two exports on one session) never share it
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(out_path) + '.', suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        rows = _write_rows(csv_path, tmp, fmt, filters)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, out_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    return rows
+
+
+def _write_rows(csv_path: str, path: str, fmt: str, filters: dict) -> int:
+    rows = 0
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in iter_history_chunks(csv_path, **filters):
+                chunk = chunk.assign(date=pd.to_datetime(chunk['date'], format='ISO8601', utc=True))
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+            if writer is None:
+                # Keep the columns even when nothing matched
+                pq.write_table(pa.Table.from_pandas(_empty_rows(csv_path), preserve_index=False), path)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        opener = gzip.open if fmt == 'csv.gz' else open
+        with opener(path, 'wt', newline='') as f:
+            header = True
+            for chunk in iter_history_chunks(csv_path, **filters):
+                chunk.to_csv(f, index=False, header=header)
+                header = False
+                rows += len(chunk)
+            if header:
+                _empty_rows(csv_path).to_csv(f, index=False)
+    return rows
+
+
+def export_file_name(fmt: str = 'csv', start=None, end=None) -> str:
+    """Download name such as historical_2025-01-01_2025-06-30.csv.gz."""
+    parts = ['historical'] + [str(pd.Timestamp(d).date()) for d in (start, end) if d is not None]
+    return '_'.join(parts) + FORMATS[fmt][0]
+
+
+def export_mime(fmt: str = 'csv') -> str:
+    return FORMATS[fmt][1]
+
+
+def _prune(export_dir: str, keep: int) -> None:
+    files = sorted((os.path.join(export_dir, name) for name in os.listdir(export_dir)
+                    if name.startswith('export_') and not name.endswith('.tmp')), key=os.path.getmtime)
+    for path in files[:-keep]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.debug('Could not remove old export %s: %s', path, e)
+
+
+@traced()
+def export_history(csv_path: str, fmt: str = 'csv', start=None, end=None, accounts: Optional[Iterable[str]] = None,
+                   tickers: Optional[Iterable[str]] = None, export_dir: Optional[str] = None) -> str:
+    """Path of an export of csv_path, written on first request and reused while the source is unchanged."""
+    filters = {'start': start, 'end': end,
+               'accounts': sorted(accounts) if accounts is not None else None,
+               'tickers': sorted(tickers) if tickers is not None else None}
+    if fmt == 'csv' and all(v is None for v in filters.values()) and not (is_compact_store(csv_path) or is_sqlite_store(csv_path)):
+        return csv_path
+
+    stat = os.stat(csv_path)
+    key = json.dumps({'fmt': fmt, 'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'path': os.path.abspath(csv_path),
+                      **{k: v if not isinstance(v, (date, datetime)) else v.isoformat() for k, v in filters.items()}},
+                     sort_keys=True, default=str)
+    export_dir = export_dir or default_export_dir(csv_path)
+    out_path = os.path.join(export_dir, 'export_' + hashlib.sha1(key.encode()).hexdigest()[:16] + FORMATS[fmt][0])
+    if os.path.exists(out_path):
+        os.utime(out_path)
+        return out_path
+
+    os.makedirs(export_dir, exist_ok=True)
+    rows = write_export(csv_path, out_path, fmt, **filters)
+    logger.info('Exported %d snapshot rows to %s', rows, out_path)
+    _prune(export_dir, EXPORT_KEEP)
+    return out_path
@@ -7,7 +7,7 @@ import json
 import os
 from typing import Dict
 
-import yfinance as yf
+from .tracing import traced
 
 
 def get_cache_path() -> str:
@@ -47,6 +47,7 @@ def save_fund_names_cache(cache: Dict[str, str]) -> None:
         pass  # Fail silently if cache can't be written
 
 
+@traced()
 def fetch_fund_name(ticker: str) -> str:
     """Fetch the long name for a ticker from yfinance.
     
@@ -57,6 +58,8 @@ def fetch_fund_name(ticker: str) -> str:
         The long name, or the ticker itself if fetch fails.
     """
     try:
+        import yfinance as yf
+
         info = yf.Ticker(ticker).info
         # Try different possible name fields
         name = info.get('longName') or info.get('shortName') or ticker
@@ -65,6 +68,7 @@ def fetch_fund_name(ticker: str) -> str:
         return ticker
 
 
+@traced()
 def get_fund_names(tickers: list) -> Dict[str, str]:
     """Get fund names for a list of tickers, using cache when available.
     
@@ -1,18 +1,41 @@
 """Foreign exchange helper: fetch rates and cache them locally.
 
-We store cached rates in `logs/fx_rates.json` to avoid frequent network calls.
+We store the complete rate table from open.er-api.com in `logs/fx_rates.json`
+to avoid frequent network calls: quotes as units of each currency per one
+unit of the table's base, with the time each quote was fetched. Rates for any
+base are triangulated from that one table, so adding a currency or asking
+for another base does not hit the network while the table is fresh.
 Rates returned map currency code -> rate_to_base (e.g. USD -> 1.34 means 1 USD = 1.34 CAD).
 """
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 import os
 import logging
-from typing import Iterable, Dict
+import threading
+from typing import Iterable, Dict, NamedTuple, Optional, Tuple
 
-import requests
+from .locking import atomic_write
+from .tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
+CACHE_VERSION = 2
+
+
+class FxTable(NamedTuple):
+    base: str
+    # currency -> units of currency per 1 base (base itself is 1.0)
+    quotes: Dict[str, float]
+    # currency -> when its quote was fetched (naive UTC)
+    as_of: Dict[str, datetime]
+    fetched_at: datetime
+    # False for tables migrated from the old per-request cache
+    complete: bool
+
+
+_table_cache: Dict[str, Tuple[Tuple[int, int], Optional[FxTable]]] = {}
+_table_lock = threading.Lock()
+
 
 def _cache_path():
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -24,70 +47,162 @@ def _cache_path():
     return os.path.join(logs, 'fx_rates.json')
 
 
-def get_fx_rates(currencies: Iterable[str], base: str = 'CAD', max_age_hours: int = 12) -> Dict[str, float]:
+def _parse_table(data: dict) -> Optional[FxTable]:
+    if data.get('version') == CACHE_VERSION:
+        as_of = {c: datetime.fromisoformat(ts) for c, ts in data['as_of'].items()}
+        return FxTable(data['base'], {c: float(q) for c, q in data['quotes'].items()}, as_of,
+                       datetime.fromisoformat(data['fetched_at']), bool(data.get('complete', True)))
+    ts = data.get('_fetched_at')
+    if ts:
+        # Old format: only the requested currencies, as CAD per unit
+        fetched = datetime.fromisoformat(ts)
+        quotes = {c: 1.0 / float(r) for c, r in data.get('rates', {}).items() if r}
+        quotes['CAD'] = 1.0
+        return FxTable('CAD', quotes, dict.fromkeys(quotes, fetched), fetched, False)
+    return None
+
+
+def load_fx_table(path: Optional[str] = None) -> Optional[FxTable]:
+    """The cached rate table, or None; re-read only when the file changes."""
+    path = path or _cache_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    version = (st.st_mtime_ns, st.st_size)
+    with _table_lock:
+        cached = _table_cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    try:
+        with open(path, 'r') as fh:
+            table = _parse_table(json.load(fh))
+    except Exception:
+        logger.debug('Failed to read fx cache', exc_info=True)
+        table = None
+    with _table_lock:
+        _table_cache[path] = (version, table)
+    return table
+
+
+def _save_table(table: FxTable, path: str) -> None:
+    data = {
+        'version': CACHE_VERSION,
+        'base': table.base,
+        'fetched_at': table.fetched_at.isoformat(),
+        'complete': table.complete,
+        'quotes': table.quotes,
+        'as_of': {c: ts.isoformat() for c, ts in table.as_of.items()},
+    }
+    # replaced atomically: concurrent CLI/cron runs share it
+    with atomic_write(path) as fh:
+        json.dump(data, fh)
+
+
+def _fetch_table(base: str, previous: Optional[FxTable], now: datetime) -> Optional[FxTable]:
+    """Fetch the full table for base, keeping older quotes the feed no longer lists."""
+    import requests  # deferred: only needed when the cache is stale
+
+    url = f'https://open.er-api.com/v6/latest/{base}'
+    with span('fx.request', base=base):
+        r = requests.get(url, timeout=10)
+    r.raise_for_status()
+    j = r.json()
+    if not j.get('result') == 'success':
+        logger.error(f"FX API returned non-success: {j}")
+        return None
+
+    # rates: currency -> units of currency per 1 base
+    quotes = {c.upper(): float(v) for c, v in j.get('rates', {}).items() if v}
+    quotes[base] = 1.0
+    as_of = dict.fromkeys(quotes, now)
+    if previous is not None and base in previous.quotes:
+        # Re-express older quotes in the new base
+        scale = 1.0 / previous.quotes[base]
+        for c, q in previous.quotes.items():
+            if c not in quotes:
+                quotes[c] = q * scale
+                as_of[c] = previous.as_of[c]
+    return FxTable(base, quotes, as_of, now, True)
+
+
+def cross_rate(table: FxTable, currency: str, base: str) -> Optional[float]:
+    """Units of base per 1 currency, triangulated through the table's base."""
+    q_currency = table.quotes.get(currency.upper())
+    q_base = table.quotes.get(base.upper())
+    if not q_currency or not q_base:
+        return None
+    return q_base / q_currency
+
+
+@traced()
+def get_fx_table(currencies: Iterable[str] = (), base: str = 'CAD', max_age_hours: float = 12) -> Optional[FxTable]:
+    """The cached rate table, refreshed when it is older than max_age_hours.
+
+    The table is also refreshed when it predates full-table caching and lacks
+    one of currencies or base. A failed refresh falls back to the stale table.
+    """
+    wanted = {c.upper() for c in currencies if c} | {base.upper()}
+    path = _cache_path()
+    table = load_fx_table(path)
+    now = datetime.utcnow()
+    if table is not None:
+        fresh = (now - table.fetched_at).total_seconds() < max_age_hours * 3600
+        if fresh and (table.complete or wanted <= set(table.quotes)):
+            return table
+
+    try:
+        fetched = _fetch_table(table.base if table is not None and table.complete else base.upper(), table, now)
+    except Exception:
+        logger.exception('Failed to fetch FX rates')
+        fetched = None
+    if fetched is None:
+        if table is not None:
+            logger.warning('Using FX rates cached at %s', table.fetched_at.isoformat())
+        return table
+    try:
+        _save_table(fetched, path)
+    except Exception:
+        logger.debug('Failed to write fx cache', exc_info=True)
+    return fetched
+
+
+@traced()
+def get_fx_rates(currencies: Iterable[str], base: str = 'CAD', max_age_hours: float = 12) -> Dict[str, float]:
     """Return a mapping currency -> rate_to_base.
 
     currencies: iterable of currency codes (e.g. ['USD','EUR']). If a currency equals base it will be skipped.
-    base: base currency code (default 'CAD').
+    base: base currency code (default 'CAD'); any base is triangulated from the cached table.
 
-    This will attempt to read cached values from logs/fx_rates.json if not older than max_age_hours.
-    Otherwise it will query exchangerate.host for latest rates.
+    The table in logs/fx_rates.json is used while younger than max_age_hours,
+    otherwise the full table is fetched from open.er-api.com. Currencies the
+    table does not quote are left out.
     """
     currs = {c.upper() for c in currencies if c and c.upper() != base.upper()}
     if not currs:
         return {}
+    table = get_fx_table(currs, base, max_age_hours)
+    if table is None:
+        return {}
+    rates = {c: cross_rate(table, c, base) for c in currs}
+    return {c: r for c, r in rates.items() if r is not None}
 
-    cache_file = _cache_path()
-    now = datetime.utcnow()
-    # try cache
-    try:
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as fh:
-                data = json.load(fh)
-            ts = data.get('_fetched_at')
-            if ts:
-                fetched = datetime.fromisoformat(ts)
-                if (now - fetched).total_seconds() < max_age_hours * 3600:
-                    rates = data.get('rates', {})
-                    # return only requested currencies present
-                    return {c: rates.get(c) for c in currs if rates.get(c) is not None}
-    except Exception:
-        logger.debug('Failed to read fx cache', exc_info=True)
 
-    # Fetch from open.er-api.com (free, no API key required)
-    try:
-        # Fetch rates with base currency
-        url = f'https://open.er-api.com/v6/latest/{base.upper()}'
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        j = r.json()
-        
-        if not j.get('result') == 'success':
-            logger.error(f"FX API returned non-success: {j}")
-            return {}
-            
-        base_rates = j.get('rates', {})  # rates: currency -> value (currency per base)
-
-        # Convert: base_rates[c] = CURRENCY per BASE
-        # So 1 BASE = base_rates[c] CURRENCY
-        # We want: 1 CURRENCY = ? BASE
-        # Answer: 1 CURRENCY = 1 / base_rates[c] BASE
-        out = {}
-        for c in currs:
-            v = base_rates.get(c)
-            if v is None or v == 0:
-                continue
-            out[c] = 1.0 / float(v)
-
-        # persist cache
-        try:
-            with open(cache_file, 'w') as fh:
-                json.dump({'_fetched_at': now.isoformat(), 'rates': out}, fh)
-        except Exception:
-            logger.debug('Failed to write fx cache', exc_info=True)
-
-        return out
-    except Exception:
-        logger.exception('Failed to fetch FX rates')
-        # fallback: empty
+def fx_rate_times(currencies: Iterable[str], base: str = 'CAD') -> Dict[str, datetime]:
+    """When each currency's cached rate against base was fetched (naive UTC, no network).
+
+    A cross rate is as old as the older of its two quotes; currencies without
+    a cached quote are left out.
+    """
+    table = load_fx_table()
+    if table is None or base.upper() not in table.as_of:
         return {}
+    base_as_of = table.as_of[base.upper()]
+    return {c: min(table.as_of[c], base_as_of)
+            for c in {c.upper() for c in currencies if c and c.upper() != base.upper()} if c in table.as_of}
+
+
+def fx_rate_ages(currencies: Iterable[str], base: str = 'CAD') -> Dict[str, float]:
+    """Hours since each currency's cached rate against base was fetched (see fx_rate_times)."""
+    now = datetime.utcnow()
+    return {c: (now - ts).total_seconds() / 3600 for c, ts in fx_rate_times(currencies, base).items()}
@@ -0,0 +1,110 @@
+"""Server-side filtering, sorting and paging for the holdings table.
+
+The dashboard used to send every holding to the browser through a pandas
+Styler, which formats and styles each cell in Python. Here the
+`compute_portfolio_df` rows are filtered with column masks, ordered by
+sorting the sort column alone, and only the requested page of rows is
+materialized; formatting and gain coloring are left to Streamlit column
+config (`COLUMN_FORMATS`, and the `trend` column whose option colors mark
+gains and losses).
+"""
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .tracing import traced
+
+
+DISPLAY_COLUMNS = [
+    'fund_name', 'account', 'currency', 'allocation_pct', 'price', 'gain_pct', 'trend',
+    'gain', 'shares', 'cost_basis', 'current_value', 'cost_total',
+]
+
+# Sort choices offered by the dashboard: column -> label
+SORT_COLUMNS = {
+    'current_value': 'Current Value',
+    'allocation_pct': 'Allocation %',
+    'gain': 'Gain',
+    'gain_pct': 'Gain %',
+    'fund_name': 'Fund/ETF',
+    'account': 'Account',
+    'currency': 'Currency',
+    'shares': 'Shares',
+    'price': 'Price',
+    'cost_total': 'Total Cost',
+}
+
+PAGE_SIZES = (25, 50, 100, 250)
+DEFAULT_PAGE_SIZE = 50
+
+# Options of the trend column, in the order of TREND_COLORS
+TREND_OPTIONS = ('Gain', 'Loss', 'Flat')
+TREND_COLORS = ('#047857', '#B91C1C', '#6B7280')
+
+# Column config formats (Streamlit NumberColumn); percentages are fractions
+COLUMN_FORMATS = {
+    'allocation_pct': 'percent',
+    'gain_pct': 'percent',
+    'price': '$%.4f',
+    'shares': '%.4f',
+    'cost_basis': '%.4f',
+    'gain': 'dollar',
+    'current_value': 'dollar',
+    'cost_total': 'dollar',
+}
+
+
+class HoldingsPage(NamedTuple):
+    rows: pd.DataFrame
+    total_rows: int
+    page: int
+    pages: int
+
+
+def trend_column(gain: pd.Series) -> list:
+    """One-option lists ('Gain', 'Loss' or 'Flat') for a MultiselectColumn colored by TREND_COLORS."""
+    values = gain.to_numpy(dtype=float)
+    options = [[option] for option in TREND_OPTIONS]
+    return [options[i] for i in np.where(values > 0, 0, np.where(values < 0, 1, 2))]
+
+
+def holdings_frame(df: pd.DataFrame, fund_names: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Holding rows of a compute_portfolio_df result with display and trend columns.
+
+    fund_names maps tickers to display names (default: the ticker).
+    """
+    rows = df[df['ticker'] != 'TOTAL'].reset_index(drop=True)
+    names = fund_names or {}
+    return rows.assign(fund_name=[names.get(t, t) for t in rows['ticker']], trend=trend_column(rows['gain']))
+
+
+@traced()
+def query_holdings(frame: pd.DataFrame, search: str = '', accounts: Optional[Iterable[str]] = None,
+                   currencies: Optional[Iterable[str]] = None, sort_by: str = 'current_value',
+                   descending: bool = True, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> HoldingsPage:
+    """Filter, sort and slice holdings_frame output; page numbers start at 1 and are clamped."""
+    mask = np.ones(len(frame), dtype=bool)
+    if search:
+        needle = search.strip().lower()
+        mask &= (frame['fund_name'].str.lower().str.contains(needle, regex=False, na=False).to_numpy()
+                 | frame['ticker'].str.lower().str.contains(needle, regex=False, na=False).to_numpy())
+    if accounts:
+        mask &= frame['account'].isin(list(accounts)).to_numpy()
+    if currencies:
+        mask &= frame['currency'].fillna('').str.upper().isin([c.upper() for c in currencies]).to_numpy()
+
+    positions = np.flatnonzero(mask)
+    column = frame[sort_by].iloc[positions]
+    if not pd.api.types.is_numeric_dtype(column):
+        column = column.fillna('').astype(str).str.lower()
+    # Stable sort of the one column; missing values last in either direction
+    order = column.reset_index(drop=True).sort_values(ascending=not descending, kind='stable',
+                                                      na_position='last').index.to_numpy()
+
+    total = len(positions)
+    pages = max(1, -(-total // page_size))
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    rows = frame.iloc[positions[order[start:start + page_size]]]
+    return HoldingsPage(rows.reset_index(drop=True), total, page, pages)
@@ -0,0 +1,385 @@
+"""Optional transaction ledger with as-of positions.
+
+Transactions live in an append-friendly CSV (default `transactions.csv` next
+to `portfolio.json`), one row per event:
+
+    date,account,type,ticker,shares,price,fees,amount,ratio,to_account,currency,lot
+
+Types:
+- BUY / SELL: `shares` at `price` (plus `fees`)
+- DIVIDEND: cash `amount`; with `shares` it is reinvested (DRIP) at that cost
+- SPLIT: multiply shares by `ratio` (2 for a 2-for-1), cost unchanged
+- TRANSFER: move `shares` and their average cost to `to_account`
+
+`lot` optionally names the lot a BUY opens, or the lots a SELL/TRANSFER
+disposes of, for specific identification in portodash.lots.
+
+Positions use average cost; a SELL or TRANSFER of more shares than the
+account holds is an error, as in portodash.lots. Transactions are replayed in date order once,
+with a checkpoint of all positions every CHECKPOINT_EVERY rows, so an as-of
+query starts from the nearest checkpoint instead of the first transaction.
+Appending rows only parses and replays the new bytes; the bytes read before
+are hashed so that an edit in place (even one that keeps the file size)
+starts the replay over.
+"""
+from bisect import bisect_right
+import csv
+from datetime import date, datetime
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .locking import atomic_write
+from .portfolio import Holding
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['date', 'account', 'type', 'ticker', 'shares', 'price', 'fees', 'amount', 'ratio', 'to_account', 'currency',
+           'lot']
+TYPES = ('BUY', 'SELL', 'DIVIDEND', 'SPLIT', 'TRANSFER')
+CHECKPOINT_EVERY = 256
+
+
+class LedgerError(ValueError):
+    """Raised for malformed transaction rows and disposals of shares not held."""
+
+
+class Transaction(NamedTuple):
+    day: int            # proleptic ordinal of the trade date
+    account: str
+    type: str
+    ticker: str
+    shares: float = 0.0
+    price: float = 0.0
+    fees: float = 0.0
+    amount: float = 0.0
+    ratio: float = 1.0
+    to_account: str = ''
+    currency: str = ''
+    lot: str = ''       # BUY: lot label; SELL/TRANSFER: ';'-separated lots to dispose (specific ID)
+    line: int = 0       # CSV line number, for error messages (0 when not read from a file)
+
+
+class Position(NamedTuple):
+    """Average-cost position; cost in the holding's currency."""
+
+    shares: float = 0.0
+    cost: float = 0.0
+    realized: float = 0.0
+    dividends: float = 0.0
+
+    @property
+    def cost_basis(self) -> float:
+        return self.cost / self.shares if self.shares else 0.0
+
+
+Key = Tuple[str, str]
+_EMPTY = Position()
+# Shares below this are float noise, not a short position
+_SHARES_TOLERANCE = 1e-9
+
+
+def _to_day(value) -> int:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    # Accept 'YYYY-MM-DD' and full ISO timestamps; only the date part matters
+    return date.fromisoformat(str(value).strip()[:10]).toordinal()
+
+
+def _float(row: dict, key: str, default: float, line: int) -> float:
+    value = (row.get(key) or '').strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise LedgerError(f'line {line}: {key} must be a number, got {value!r}') from None
+
+
+def parse_row(row: dict, line: int = 0) -> Transaction:
+    """Validate one CSV row (dict of strings) into a Transaction."""
+    kind = (row.get('type') or '').strip().upper()
+    if kind not in TYPES:
+        raise LedgerError(f"line {line}: type must be one of {', '.join(TYPES)}, got {row.get('type')!r}")
+    account = (row.get('account') or '').strip()
+    ticker = (row.get('ticker') or '').strip()
+    if not account or not ticker:
+        raise LedgerError(f'line {line}: account and ticker are required')
+    try:
+        day = _to_day(row.get('date') or '')
+    except ValueError:
+        raise LedgerError(f"line {line}: invalid date {row.get('date')!r}") from None
+    txn = Transaction(
+        day, account, kind, ticker,
+        shares=_float(row, 'shares', 0.0, line),
+        price=_float(row, 'price', 0.0, line),
+        fees=_float(row, 'fees', 0.0, line),
+        amount=_float(row, 'amount', 0.0, line),
+        ratio=_float(row, 'ratio', 1.0, line),
+        to_account=(row.get('to_account') or '').strip(),
+        currency=(row.get('currency') or '').strip().upper(),
+        lot=(row.get('lot') or '').strip(),
+        line=line,
+    )
+    if kind in ('BUY', 'SELL', 'TRANSFER') and txn.shares <= 0:
+        raise LedgerError(f'line {line}: {kind} needs a positive shares value')
+    if kind == 'SPLIT' and txn.ratio <= 0:
+        raise LedgerError(f'line {line}: SPLIT needs a positive ratio')
+    if kind == 'TRANSFER' and not txn.to_account:
+        raise LedgerError(f'line {line}: TRANSFER needs to_account')
+    return txn
+
+
+def _check_held(txn: Transaction, pos: Position) -> None:
+    if txn.shares > pos.shares + _SHARES_TOLERANCE:
+        where = f'line {txn.line}: ' if txn.line else ''
+        raise LedgerError(f'{where}{txn.type} of {txn.shares:g} {txn.ticker} in {txn.account} on '
+                          f'{date.fromordinal(txn.day)} exceeds the {pos.shares:g} shares held')
+
+
+def apply(positions: Dict[Key, Position], txn: Transaction) -> None:
+    """Apply one transaction to positions in place.
+
+    Raises LedgerError for a SELL or TRANSFER of more shares than the account
+    holds, as portodash.lots does for the same rows.
+    """
+    key = (txn.account, txn.ticker)
+    pos = positions.get(key, _EMPTY)
+    if txn.type == 'BUY':
+        positions[key] = pos._replace(shares=pos.shares + txn.shares,
+                                      cost=pos.cost + txn.shares * txn.price + txn.fees)
+    elif txn.type == 'SELL':
+        _check_held(txn, pos)
+        sold = min(txn.shares, pos.shares)
+        removed = pos.cost_basis * sold
+        proceeds = sold * txn.price - txn.fees
+        positions[key] = pos._replace(shares=pos.shares - sold, cost=pos.cost - removed,
+                                      realized=pos.realized + proceeds - removed)
+    elif txn.type == 'DIVIDEND':
+        if txn.shares > 0:
+            positions[key] = pos._replace(shares=pos.shares + txn.shares, cost=pos.cost + txn.amount,
+                                          dividends=pos.dividends + txn.amount)
+        else:
+            positions[key] = pos._replace(dividends=pos.dividends + txn.amount)
+    elif txn.type == 'SPLIT':
+        positions[key] = pos._replace(shares=pos.shares * txn.ratio)
+    elif txn.type == 'TRANSFER':
+        _check_held(txn, pos)
+        moved = min(txn.shares, pos.shares)
+        moved_cost = pos.cost_basis * moved
+        positions[key] = pos._replace(shares=pos.shares - moved, cost=pos.cost - moved_cost)
+        dest_key = (txn.to_account, txn.ticker)
+        dest = positions.get(dest_key, _EMPTY)
+        positions[dest_key] = dest._replace(shares=dest.shares + moved, cost=dest.cost + moved_cost)
+
+
+class Ledger:
+    """Transactions from one CSV file with checkpointed as-of positions."""
+
+    def __init__(self, path: Optional[str] = None, transactions: Iterable[Transaction] = ()):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+        self.extend(transactions)
+        if path:
+            self.refresh()
+
+    def _reset(self) -> None:
+        self._txns: List[Transaction] = []
+        self._days: List[int] = []
+        # _checkpoints[i] holds positions after the first i * CHECKPOINT_EVERY transactions
+        self._checkpoints: List[Dict[Key, Position]] = [{}]
+        self._currencies: Dict[Key, str] = {}
+        self._fieldnames: Optional[List[str]] = None
+        self._rows_read = 0
+        self._offset = 0
+        # Hash of the bytes before _offset
+        self._consumed = hashlib.blake2b()
+        self._stat = None
+
+    @property
+    def transactions(self) -> List[Transaction]:
+        return list(self._txns)
+
+    def __len__(self):
+        return len(self._txns)
+
+    @property
+    def tickers(self) -> List[str]:
+        """Every ticker that appears in the ledger."""
+        with self._lock:
+            return sorted({t.ticker for t in self._txns})
+
+    def extend(self, transactions: Iterable[Transaction]) -> None:
+        """Add transactions, replaying only from the first one that changes history."""
+        new = sorted(transactions, key=lambda t: t.day)
+        if not new:
+            return
+        with self._lock:
+            for t in new:
+                if t.currency:
+                    self._currencies.setdefault((t.account, t.ticker), t.currency)
+            if self._days and new[0].day < self._days[-1]:
+                # Back-dated rows: merge (stable, so same-day order follows the file) and
+                # drop checkpoints that no longer describe a prefix of the history
+                first = bisect_right(self._days, new[0].day)
+                self._txns = self._txns[:first] + sorted(self._txns[first:] + new, key=lambda t: t.day)
+                del self._checkpoints[first // CHECKPOINT_EVERY + 1:]
+            else:
+                self._txns.extend(new)
+            self._days = [t.day for t in self._txns]
+            self._build_checkpoints()
+
+    def _build_checkpoints(self) -> None:
+        done = (len(self._checkpoints) - 1) * CHECKPOINT_EVERY
+        positions = dict(self._checkpoints[-1])
+        for i in range(done, len(self._txns)):
+            apply(positions, self._txns[i])
+            if (i + 1) % CHECKPOINT_EVERY == 0:
+                self._checkpoints.append(dict(positions))
+
+    def refresh(self) -> bool:
+        """Read rows appended to the CSV since the last call; True if anything changed."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        st = os.stat(self.path)
+        stat = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if stat == self._stat:
+                return False
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if len(data) < self._offset or \
+                    hashlib.blake2b(memoryview(data)[:self._offset]).digest() != self._consumed.digest():
+                # File was rewritten or edited rather than appended to: start over
+                self._reset()
+            chunk = data[self._offset:]
+            # Only consume complete lines; a partially written last row waits for the next refresh
+            complete = chunk[:chunk.rfind(b'\n') + 1]
+            rows = self._parse(complete.decode('utf-8-sig' if self._offset == 0 else 'utf-8'))
+            self._offset += len(complete)
+            self._consumed.update(complete)
+            self._stat = stat
+            try:
+                self.extend(rows)
+            except LedgerError:
+                # Replaying failed part-way: read the whole file again next time
+                self._reset()
+                raise
+            return True
+
+    def _parse(self, text: str) -> List[Transaction]:
+        if not text:
+            return []
+        reader = csv.DictReader(io.StringIO(text), fieldnames=self._fieldnames)
+        fieldnames = reader.fieldnames
+        out = []
+        n = 0
+        for n, row in enumerate(reader, start=1):
+            if not any((v or '').strip() for v in row.values() if isinstance(v, str)):
+                continue
+            out.append(parse_row(row, line=self._rows_read + n + 1))
+        # Only remember progress once the whole chunk parsed
+        self._fieldnames = fieldnames
+        self._rows_read += n
+        return out
+
+    def positions_as_of(self, as_of=None) -> Dict[Key, Position]:
+        """Positions after every transaction dated on or before as_of (default: all)."""
+        with self._lock:
+            n = len(self._txns) if as_of is None else bisect_right(self._days, _to_day(as_of))
+            index = min(n // CHECKPOINT_EVERY, len(self._checkpoints) - 1)
+            positions = dict(self._checkpoints[index])
+            for i in range(index * CHECKPOINT_EVERY, n):
+                apply(positions, self._txns[i])
+        return positions
+
+    @traced()
+    def holdings_as_of(self, as_of=None, metadata: Iterable = ()) -> List[Holding]:
+        """Open positions as holdings in the portfolio format.
+
+        metadata: holdings (e.g. Portfolio.holdings) supplying each account's
+        holder/type/base currency and each position's currency.
+        """
+        accounts = {}
+        currencies = {}
+        for h in metadata:
+            accounts.setdefault(h['account_nickname'], (h.get('account_holder', ''), h.get('account_type', ''),
+                                                        h.get('account_base_currency', 'CAD')))
+            currencies.setdefault((h['account_nickname'], h['ticker']), h.get('currency'))
+
+        out = []
+        for (account, ticker), pos in self.positions_as_of(as_of).items():
+            if pos.shares <= 1e-9:
+                continue
+            holder, acc_type, base = accounts.get(account, ('', '', 'CAD'))
+            currency = self._currencies.get((account, ticker)) or currencies.get((account, ticker)) or base
+            out.append(Holding(ticker, round(pos.shares, 6), round(pos.cost_basis, 6), currency,
+                               account, holder, acc_type, base))
+        return out
+
+
+def default_path(portfolio_path: str) -> str:
+    """transactions.csv next to portfolio.json."""
+    return os.path.join(os.path.dirname(os.path.abspath(portfolio_path)), 'transactions.csv')
+
+
+_ledgers: Dict[str, Ledger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def load_ledger(path: str) -> Optional[Ledger]:
+    """Return the shared Ledger for path (refreshed with appended rows), or None if absent."""
+    if not path or not os.path.exists(path):
+        return None
+    path = os.path.abspath(path)
+    with _ledgers_lock:
+        ledger = _ledgers.get(path)
+        if ledger is None:
+            ledger = _ledgers[path] = Ledger(path)
+            return ledger
+    ledger.refresh()
+    return ledger
+
+
+def _header(path: str) -> List[str]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+
+def append_transactions(path: str, rows: Iterable[dict]) -> None:
+    """Append transaction dicts (COLUMNS keys) to the CSV, writing a header for a new file.
+
+    Rows follow the existing file's header, so older files without the `lot`
+    column keep their layout; such a file is rewritten with the missing
+    columns only when a new row fills one in.
+    """
+    rows = list(rows)
+    for n, row in enumerate(rows):
+        parse_row({k: '' if v is None else str(v) for k, v in row.items()}, line=n + 1)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    fieldnames = COLUMNS if new_file else _header(path)
+    missing = [k for k in COLUMNS if k not in fieldnames and any(row.get(k) not in (None, '') for row in rows)]
+    if missing:
+        fieldnames = fieldnames + missing
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            existing = list(csv.DictReader(f))
+        with atomic_write(path, newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(existing)
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow({k: '' if row.get(k) is None else row.get(k) for k in fieldnames})
@@ -0,0 +1,103 @@
+"""Advisory file locks and atomic writes for files shared between processes.
+
+historical.csv is rewritten by the scheduler process and by the Streamlit
+app. Writers take an exclusive advisory lock on a sidecar `<file>.lock`
+(flock on POSIX, msvcrt on Windows) for the whole read-modify-write, waiting
+at most `timeout` seconds, and replace the file through a temporary file
+plus `os.replace`, so readers that do not lock always see either the old or
+the new complete file.
+
+The lock file is left in place: deleting it while another process waits on
+it would let two writers in at once.
+"""
+import contextlib
+import logging
+import os
+import stat
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds a writer waits for the lock before giving up
+LOCK_TIMEOUT = 10.0
+_POLL_INTERVAL = 0.02
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a file lock is not acquired within the timeout."""
+
+
+def lock_path(path: str) -> str:
+    return path + '.lock'
+
+
+def _try_lock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def file_lock(path: str, timeout: float = LOCK_TIMEOUT):
+    """Hold an exclusive advisory lock for `path` (via `path.lock`).
+
+    Raises LockTimeout if another process keeps the lock for longer than
+    `timeout` seconds.
+    """
+    fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    locked = False
+    try:
+        while not locked:
+            try:
+                _try_lock(fd)
+                locked = True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f'Timed out after {timeout:.0f}s waiting for the lock on {path}')
+                time.sleep(_POLL_INTERVAL)
+        yield
+    finally:
+        if locked:
+            _unlock(fd)
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = 'w', **kwargs):
+    """Open a temporary file next to `path` that replaces it on success.
+
+    On error the temporary file is removed and `path` is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files; keep the permissions of the file being replaced
+        mode_bits = stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644
+        os.chmod(tmp, mode_bits)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
@@ -0,0 +1,354 @@
+"""Lot-level cost basis: FIFO, average cost and specific identification.
+
+Each (account, ticker) keeps its open lots in a `LotBook`: parallel numpy
+arrays of lot id, acquisition day, shares and per-share cost that grow by
+doubling. Disposals work on the whole array at once:
+
+- 'fifo': oldest lots first (cumulative-sum cut)
+- 'average': every open lot shrinks pro rata, so the realized cost is the
+  average cost (Canadian ACB style) and the remaining average is unchanged
+- 'specific': the lots named in the transaction's `lot` column, in order
+
+The method can be set per account (e.g. average cost for a Canadian taxable
+account, FIFO for a US one). Amounts stay in each holding's own currency.
+
+`LotEngine.unrealized(prices)` values every open lot with one gather and one
+multiply over a cached flat view of all books, so repricing tens of
+thousands of lots takes a few milliseconds.
+"""
+from datetime import date
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .ledger import Transaction, _to_day
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('fifo', 'average', 'specific')
+_EPS = 1e-9
+
+Key = Tuple[str, str]
+
+
+class LotError(ValueError):
+    """Raised when a disposal cannot be matched to open lots."""
+
+
+class LotBook:
+    """Open lots for one (account, ticker) in growable parallel arrays."""
+
+    __slots__ = ('account', 'ticker', 'ids', 'days', 'shares', 'cost', 'n', 'labels', '_next_id')
+
+    def __init__(self, account: str, ticker: str, capacity: int = 8):
+        self.account = account
+        self.ticker = ticker
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.days = np.zeros(capacity, dtype=np.int64)
+        self.shares = np.zeros(capacity, dtype=np.float64)
+        self.cost = np.zeros(capacity, dtype=np.float64)   # per share
+        self.n = 0
+        self.labels: Dict[str, int] = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def total_shares(self) -> float:
+        return float(self.shares[:self.n].sum())
+
+    @property
+    def total_cost(self) -> float:
+        n = self.n
+        return float(self.shares[:n] @ self.cost[:n])
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('ids', 'days', 'shares', 'cost'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def add(self, day, shares, cost, label: str = '', lot_ids=None, labels=None) -> None:
+        """Open lots; day, shares and cost (per share) are scalars or equal-length arrays.
+
+        label names a single new lot; labels gives one label ('' for none) per lot.
+        """
+        shares = np.atleast_1d(np.asarray(shares, dtype=np.float64))
+        count = len(shares)
+        self._grow(self.n + count)
+        sl = slice(self.n, self.n + count)
+        if lot_ids is None:
+            lot_ids = np.arange(self._next_id, self._next_id + count)
+            self._next_id += count
+        if label and count == 1:
+            self.labels[label] = int(lot_ids[0])
+        for name, lot_id in zip(labels or (), lot_ids):
+            if name:
+                self.labels[name] = int(lot_id)
+        self.ids[sl] = lot_ids
+        self.days[sl] = day
+        self.shares[sl] = shares
+        self.cost[sl] = cost
+        self.n += count
+
+    def take(self, amount: float, method: str, lots: Iterable[str] = ()) -> np.ndarray:
+        """Remove `amount` shares; returns the shares taken from each open lot (length n)."""
+        n = self.n
+        shares = self.shares[:n]
+        held = shares.sum()
+        if amount > held + _EPS:
+            raise LotError(f'cannot dispose of {amount:g} {self.ticker} in {self.account}: only {held:g} held')
+        if method == 'average':
+            taken = shares * (amount / held) if held > 0 else np.zeros(n)
+        else:
+            if method == 'specific':
+                lots = [lot for lot in lots if lot]
+                order = self._order_for(lots)
+            else:
+                order = np.argsort(self.days[:n], kind='stable')
+            ordered = shares[order]
+            before = np.cumsum(ordered) - ordered
+            taken = np.zeros(n)
+            taken[order] = np.clip(amount - before, 0.0, ordered)
+            if method == 'specific' and taken.sum() < amount - _EPS:
+                raise LotError(f'cannot dispose of {amount:g} {self.ticker} in {self.account}: lots '
+                               f"{';'.join(lots)} hold only {taken.sum():g}")
+        self.shares[:n] -= taken
+        return taken
+
+    def _order_for(self, lots: Iterable[str]) -> np.ndarray:
+        labels = [lot for lot in lots if lot]
+        if not labels:
+            raise LotError(f'specific identification for {self.ticker} in {self.account} needs a lot label')
+        ids = self.ids[:self.n]
+        order = []
+        for label in labels:
+            if label not in self.labels:
+                raise LotError(f'unknown lot {label!r} for {self.ticker} in {self.account}')
+            match = np.flatnonzero(ids == self.labels[label])
+            if not len(match):
+                raise LotError(f'lot {label!r} for {self.ticker} in {self.account} is already closed')
+            order.append(int(match[0]))
+        return np.asarray(order, dtype=np.int64)
+
+    def compact(self) -> None:
+        """Drop closed lots."""
+        n = self.n
+        keep = np.flatnonzero(self.shares[:n] > _EPS)
+        if len(keep) == n:
+            return
+        for name in ('ids', 'days', 'shares', 'cost'):
+            arr = getattr(self, name)
+            arr[:len(keep)] = arr[keep]
+        self.n = len(keep)
+
+    def split(self, ratio: float) -> None:
+        n = self.n
+        self.shares[:n] *= ratio
+        self.cost[:n] /= ratio
+
+
+class LotEngine:
+    """Lot books for every (account, ticker) plus the realized gains log."""
+
+    def __init__(self, method: Union[str, Dict[str, str]] = 'fifo'):
+        self.method = method
+        self.books: Dict[Key, LotBook] = {}
+        self._realized: List[tuple] = []
+        self._version = 0
+        self._flat = None
+        for m in (method.values() if isinstance(method, dict) else [method]):
+            if m not in METHODS:
+                raise ValueError(f"method must be one of {', '.join(METHODS)}, got {m!r}")
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Transaction], method='fifo', as_of=None) -> 'LotEngine':
+        """Replay transactions (in date order) dated on or before as_of."""
+        engine = cls(method)
+        cutoff = None if as_of is None else _to_day(as_of)
+        for txn in sorted(transactions, key=lambda t: t.day):
+            if cutoff is not None and txn.day > cutoff:
+                break
+            engine.apply(txn)
+        return engine
+
+    @classmethod
+    def from_ledger(cls, ledger, method='fifo', as_of=None) -> 'LotEngine':
+        return cls.from_transactions(ledger.transactions, method=method, as_of=as_of)
+
+    def method_for(self, account: str) -> str:
+        if isinstance(self.method, dict):
+            return self.method.get(account, 'fifo')
+        return self.method
+
+    def book(self, account: str, ticker: str) -> LotBook:
+        key = (account, ticker)
+        book = self.books.get(key)
+        if book is None:
+            book = self.books[key] = LotBook(account, ticker)
+        return book
+
+    def apply(self, txn: Transaction) -> None:
+        book = self.book(txn.account, txn.ticker)
+        self._version += 1
+        if txn.type == 'BUY':
+            book.add(txn.day, txn.shares, txn.price + txn.fees / txn.shares, label=txn.lot)
+        elif txn.type == 'SELL':
+            taken = self._dispose(book, txn)
+            n = book.n
+            mask = taken > 0
+            if mask.any():
+                fee_share = txn.fees / txn.shares
+                self._realized.append((
+                    txn.account, txn.ticker, txn.day, book.ids[:n][mask].copy(), book.days[:n][mask].copy(),
+                    taken[mask], taken[mask] * (txn.price - fee_share), taken[mask] * book.cost[:n][mask],
+                ))
+            book.compact()
+        elif txn.type == 'DIVIDEND':
+            if txn.shares > 0:
+                book.add(txn.day, txn.shares, txn.amount / txn.shares, label=txn.lot)
+        elif txn.type == 'SPLIT':
+            book.split(txn.ratio)
+        elif txn.type == 'TRANSFER':
+            taken = self._dispose(book, txn)
+            n = book.n
+            mask = taken > 0
+            dest = self.book(txn.to_account, txn.ticker)
+            # Moved lots keep their acquisition day, cost and label
+            if mask.any():
+                names = {lot_id: name for name, lot_id in book.labels.items()}
+                dest.add(book.days[:n][mask], taken[mask], book.cost[:n][mask],
+                         labels=[names.get(int(lot_id), '') for lot_id in book.ids[:n][mask]])
+            book.compact()
+
+    def _dispose(self, book: LotBook, txn: Transaction) -> np.ndarray:
+        method = 'specific' if txn.lot else self.method_for(txn.account)
+        if method == 'specific' and not txn.lot:
+            raise LotError(f'{txn.type} of {txn.ticker} in {txn.account} on '
+                           f'{date.fromordinal(txn.day)} needs a lot for specific identification')
+        return book.take(txn.shares, method, txn.lot.split(';'))
+
+    def _flat_view(self):
+        """Concatenated open lots of all books, rebuilt only after a transaction."""
+        if self._flat is not None and self._flat[0] == self._version:
+            return self._flat[1]
+        books = [b for b in self.books.values() if b.n]
+        counts = np.array([b.n for b in books], dtype=np.int64)
+        keys = [(b.account, b.ticker) for b in books]
+        tickers = sorted({b.ticker for b in books})
+        ticker_pos = {t: i for i, t in enumerate(tickers)}
+        flat = {
+            'keys': keys,
+            'tickers': tickers,
+            'book': np.repeat(np.arange(len(books)), counts),
+            'ticker': np.repeat(np.array([ticker_pos[b.ticker] for b in books], dtype=np.int64), counts),
+            'ids': np.concatenate([b.ids[:b.n] for b in books]) if books else np.zeros(0, np.int64),
+            'days': np.concatenate([b.days[:b.n] for b in books]) if books else np.zeros(0, np.int64),
+            'shares': np.concatenate([b.shares[:b.n] for b in books]) if books else np.zeros(0),
+            'cost': np.concatenate([b.cost[:b.n] for b in books]) if books else np.zeros(0),
+        }
+        self._flat = (self._version, flat)
+        return flat
+
+    def unrealized_arrays(self, prices: Dict[str, float]):
+        """(flat view, price per lot, unrealized gain per lot); missing prices are NaN."""
+        flat = self._flat_view()
+        price_vec = np.array([prices.get(t) if prices.get(t) is not None else np.nan for t in flat['tickers']],
+                             dtype=np.float64)
+        lot_price = price_vec[flat['ticker']] if len(price_vec) else np.zeros(0)
+        return flat, lot_price, flat['shares'] * (lot_price - flat['cost'])
+
+    @traced()
+    def unrealized(self, prices: Dict[str, float], as_of=None) -> pd.DataFrame:
+        """One row per open lot with market value and unrealized gain."""
+        flat, lot_price, gain = self.unrealized_arrays(prices)
+        accounts = sorted({k[0] for k in flat['keys']})
+        account_code = np.array([accounts.index(k[0]) for k in flat['keys']], dtype=np.int64)
+        as_of_day = _to_day(as_of) if as_of is not None else date.today().toordinal()
+        return pd.DataFrame({
+            'account': pd.Categorical.from_codes(account_code[flat['book']], accounts) if accounts else [],
+            'ticker': pd.Categorical.from_codes(flat['ticker'], flat['tickers']) if accounts else [],
+            'lot_id': flat['ids'],
+            'acquired': _ordinals_to_dates(flat['days']),
+            'shares': flat['shares'],
+            'cost_basis': flat['cost'],
+            'price': lot_price,
+            'market_value': flat['shares'] * lot_price,
+            'unrealized_gain': gain,
+            'holding_days': as_of_day - flat['days'],
+        })
+
+    @traced()
+    def realized(self, year: Optional[int] = None) -> pd.DataFrame:
+        """One row per lot (part) disposed of, optionally for one calendar year."""
+        columns = ['account', 'ticker', 'sold', 'lot_id', 'acquired', 'shares', 'proceeds', 'cost', 'gain']
+        if not self._realized:
+            return pd.DataFrame(columns=columns)
+        sizes = [len(r[3]) for r in self._realized]
+        proceeds = np.concatenate([r[6] for r in self._realized])
+        cost = np.concatenate([r[7] for r in self._realized])
+        df = pd.DataFrame({
+            'account': np.repeat([r[0] for r in self._realized], sizes),
+            'ticker': np.repeat([r[1] for r in self._realized], sizes),
+            'sold': _ordinals_to_dates(np.repeat([r[2] for r in self._realized], sizes)),
+            'lot_id': np.concatenate([r[3] for r in self._realized]),
+            'acquired': _ordinals_to_dates(np.concatenate([r[4] for r in self._realized])),
+            'shares': np.concatenate([r[5] for r in self._realized]),
+            'proceeds': proceeds,
+            'cost': cost,
+            'gain': proceeds - cost,
+        })
+        if year is not None:
+            df = df[df['sold'].dt.year == year].reset_index(drop=True)
+        return df
+
+    @traced()
+    def summary(self, prices: Dict[str, float]) -> pd.DataFrame:
+        """Per (account, ticker): shares, cost, market value, unrealized and realized gains."""
+        flat, lot_price, gain = self.unrealized_arrays(prices)
+        keys = flat['keys']
+        size = len(keys)
+        book = flat['book']
+        shares = np.bincount(book, weights=flat['shares'], minlength=size)
+        cost = np.bincount(book, weights=flat['shares'] * flat['cost'], minlength=size)
+        value = np.bincount(book, weights=flat['shares'] * lot_price, minlength=size)
+        realized = self.realized().groupby(['account', 'ticker'])['gain'].sum().to_dict()
+        rows = pd.DataFrame({
+            'account': [k[0] for k in keys],
+            'ticker': [k[1] for k in keys],
+            'lots': np.bincount(book, minlength=size),
+            'shares': shares,
+            'cost': cost,
+            'cost_basis': np.divide(cost, shares, out=np.zeros(size), where=shares > 0),
+            'market_value': value,
+            'unrealized_gain': value - cost,
+            'realized_gain': [realized.get(k, 0.0) for k in keys],
+        })
+        # Positions that were fully sold still report their realized gains
+        open_keys = set(keys)
+        closed = [k for k in realized if k not in open_keys]
+        if closed:
+            rows = pd.concat([rows, pd.DataFrame({
+                'account': [k[0] for k in closed], 'ticker': [k[1] for k in closed], 'lots': 0,
+                'shares': 0.0, 'cost': 0.0, 'cost_basis': 0.0, 'market_value': 0.0,
+                'unrealized_gain': 0.0, 'realized_gain': [realized[k] for k in closed],
+            })], ignore_index=True)
+        return rows.sort_values(['account', 'ticker']).reset_index(drop=True)
+
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _ordinals_to_dates(days: np.ndarray) -> pd.Series:
+    return pd.Series((np.asarray(days, dtype=np.int64) - _EPOCH).astype('datetime64[D]'))
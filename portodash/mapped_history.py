@@ -0,0 +1,332 @@
+"""Memory-mapped Arrow IPC mirror of the snapshot history for range reads.
+
+Charts only ever show the last N days, but reading historical.csv (or the
+compact store) materializes every snapshot ever taken. The mirror,
+`historical.arrow` next to the source, is an uncompressed Arrow IPC file:
+
+- rows are sorted by `date`, stored as UTC nanosecond timestamps
+- account and ticker are dictionary-encoded
+- the schema metadata carries a sparse date index: the date of every
+  INDEX_STRIDE-th row
+
+The file is opened with `pyarrow.memory_map`, so nothing is read until a
+query touches it. A range query binary-searches the sparse index, then a
+single block of the mapped date column, and slices the mapped buffers; the
+numeric and date columns of the resulting DataFrame are views over the
+mapping, and only the account/ticker labels of the selected rows are
+materialized. Memory use follows the size of the window, not the history.
+
+The mirror is brought up to date whenever the source is newer. For
+historical.csv it records how many source bytes it holds and their hash: if
+the new file starts with exactly those bytes and the new rows are not dated
+before the mirror's last row (a new daily snapshot), only the new rows are
+parsed and added as a record batch. Appending rewrites the .arrow file from
+its own mapped batches, not from the CSV; after MAX_BATCHES batches they are
+merged into one. Any other change (a replaced or back-dated snapshot, a
+compact or SQLite store) rebuilds the mirror from the source.
+"""
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .snapshot_store import META_FILE, is_compact_store, read_history
+from .sqlite_store import is_sqlite_store
+from .tracing import span, traced
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_STRIDE = 4096
+INDEX_KEY = b'portodash.date_index'
+# Size and blake2b hash of the source bytes the mirror was built from (CSV sources)
+SOURCE_KEY = b'portodash.source'
+MAX_BATCHES = 64
+
+# path -> (mtime_ns, MappedHistory), least recently used first; replaced when the file is rewritten
+MAX_OPEN = 8
+_OPEN: 'OrderedDict[str, tuple]' = OrderedDict()
+_open_lock = threading.Lock()
+# Serializes mirror updates within the process (os.replace keeps other processes safe)
+_sync_lock = threading.Lock()
+
+
+def default_arrow_path(source_path: str) -> str:
+    """historical.arrow next to historical.csv (or historical.store/)."""
+    root, _ = os.path.splitext(os.path.abspath(source_path.rstrip(os.sep)))
+    return root + '.arrow'
+
+
+def _source_mtime(source_path: str) -> float:
+    if is_compact_store(source_path):
+        return os.path.getmtime(os.path.join(source_path, META_FILE))
+    return os.path.getmtime(source_path)
+
+
+def _utc_stamps(dates: pd.Series) -> np.ndarray:
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='ISO8601', utc=True)
+    if dates.dt.tz is None:
+        dates = dates.dt.tz_localize('UTC')
+    return dates.dt.tz_convert('UTC').to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _metadata(stamps: np.ndarray, stride: int, source: Optional[dict]) -> dict:
+    metadata = {INDEX_KEY: json.dumps({'stride': stride, 'dates': stamps[::stride].tolist()})}
+    if source is not None:
+        metadata[SOURCE_KEY] = json.dumps(source)
+    return metadata
+
+
+def _write_batches(path: str, schema, batches) -> None:
+    import pyarrow as pa
+
+    tmp = path + '.tmp'
+    with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    # Readers holding the old mapping keep the old inode until they reopen
+    os.replace(tmp, path)
+
+
+@traced()
+def write_history_arrow(df: pd.DataFrame, path: str, stride: int = INDEX_STRIDE, source: Optional[dict] = None) -> int:
+    """Write snapshot rows to an Arrow IPC file sorted by date; returns the row count.
+
+    source: size and hash of the CSV bytes df was parsed from, which lets
+    sync_history_arrow append later rows instead of rebuilding.
+    """
+    import pyarrow as pa
+
+    stamps = _utc_stamps(df['date'])
+    order = np.argsort(stamps, kind='stable')
+    stamps = stamps[order]
+
+    arrays, names = [pa.array(stamps).view(pa.timestamp('ns', tz='UTC'))], ['date']
+    for column in df.columns:
+        if column == 'date':
+            continue
+        values = df[column].to_numpy()[order]
+        if pd.api.types.is_numeric_dtype(df[column]):
+            # Plain numpy conversion keeps NaN as NaN (not null), so reads stay zero-copy
+            arrays.append(pa.array(values.astype(np.float64)))
+        else:
+            arrays.append(pa.array(values.astype(str)).dictionary_encode())
+        names.append(column)
+
+    table = pa.Table.from_arrays(arrays, names=names).replace_schema_metadata(_metadata(stamps, stride, source))
+    # One record batch keeps every column a single contiguous buffer
+    _write_batches(path, table.schema, table.to_batches(max_chunksize=max(len(table), 1)) or
+                   [pa.RecordBatch.from_arrays(arrays, schema=table.schema)])
+    return len(table)
+
+
+class MappedHistory:
+    """Read-only view of a history .arrow file mapped into memory."""
+
+    def __init__(self, path: str):
+        import pyarrow as pa
+
+        self.path = path
+        self._source = pa.memory_map(path, 'r')
+        self.table = pa.ipc.open_file(self._source).read_all()
+        metadata = self.table.schema.metadata or {}
+        index = json.loads(metadata.get(INDEX_KEY, b'{}'))
+        self.stride = int(index.get('stride', INDEX_STRIDE))
+        self.index = np.asarray(index.get('dates', []), dtype=np.int64)
+        self.source = json.loads(metadata[SOURCE_KEY]) if SOURCE_KEY in metadata else None
+        chunks = [c.view(pa.int64()).to_numpy(zero_copy_only=True) for c in self.table.column('date').chunks]
+        # Appended batches: only the date column is joined, other columns stay per batch
+        self._dates = chunks[0] if len(chunks) == 1 else np.concatenate(chunks) if chunks else np.zeros(0, np.int64)
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    @property
+    def num_batches(self) -> int:
+        return self.table.column(0).num_chunks if self.table.num_columns else 0
+
+    def row_at(self, when) -> int:
+        """Position of the first row dated at or after `when`."""
+        target = pd.Timestamp(when)
+        target = (target.tz_localize('UTC') if target.tz is None else target.tz_convert('UTC')).value
+        block = int(np.searchsorted(self.index, target, side='left'))
+        if block == 0:
+            return 0
+        lo = (block - 1) * self.stride
+        hi = min(block * self.stride, len(self._dates))
+        return lo + int(np.searchsorted(self._dates[lo:hi], target, side='left'))
+
+    @traced()
+    def frame(self, start=None, end=None, columns=None) -> pd.DataFrame:
+        """Rows dated in [start, end) as a DataFrame of views over the mapping."""
+        first = self.row_at(start) if start is not None else 0
+        stop = self.row_at(end) if end is not None else len(self)
+        data = {}
+        for name in columns or self.columns:
+            if name == 'date':
+                data[name] = pd.DatetimeIndex(self._dates[first:stop].view('datetime64[ns]'), copy=False).tz_localize('UTC')
+                continue
+            chunks = self.table.column(name).slice(first, stop - first).chunks
+            if hasattr(self.table.schema.field(name).type, 'index_type'):
+                parts = [c.dictionary.to_numpy(zero_copy_only=False)[c.indices.to_numpy(zero_copy_only=True)]
+                         for c in chunks]
+                data[name] = np.concatenate(parts) if parts else np.zeros(0, dtype=object)
+            else:
+                parts = [c.to_numpy(zero_copy_only=True) for c in chunks]
+                # A window inside one batch stays a view; one spanning batches is copied
+                data[name] = parts[0] if len(parts) == 1 else np.concatenate(parts) if parts else np.zeros(0)
+        return pd.DataFrame(data, copy=False)
+
+
+def open_history(path: str) -> MappedHistory:
+    """Shared MappedHistory for `path`, reopened when the file is replaced."""
+    mtime = os.stat(path).st_mtime_ns
+    with _open_lock:
+        cached = _OPEN.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _OPEN[path] = (mtime, MappedHistory(path))
+        _OPEN.move_to_end(path)
+        while len(_OPEN) > MAX_OPEN:
+            _OPEN.popitem(last=False)
+    return cached[1]
+
+
+def _is_csv(source_path: str) -> bool:
+    return os.path.isfile(source_path) and not is_compact_store(source_path) and not is_sqlite_store(source_path)
+
+
+def _hash_prefix(f, size: int):
+    """blake2b of the next `size` bytes of f, or None if the file is shorter."""
+    hasher = hashlib.blake2b()
+    while size > 0:
+        block = f.read(min(size, 1 << 20))
+        if not block:
+            return None
+        hasher.update(block)
+        size -= len(block)
+    return hasher
+
+
+def _rebuild(source_path: str, arrow_path: str) -> int:
+    if not _is_csv(source_path):
+        return write_history_arrow(read_history(source_path), arrow_path)
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    source = {'size': len(data), 'hash': hashlib.blake2b(data).hexdigest()}
+    return write_history_arrow(pd.read_csv(io.BytesIO(data)), arrow_path, source=source)
+
+
+def _append(source_path: str, arrow_path: str) -> Optional[int]:
+    """Add CSV rows written after the mirror was built; None when it needs a rebuild."""
+    import pyarrow as pa
+
+    history = MappedHistory(arrow_path)
+    state = history.source
+    if not state or not _is_csv(source_path):
+        return None
+    with open(source_path, 'rb') as f:
+        header = f.readline()
+        f.seek(0)
+        hasher = _hash_prefix(f, state['size'])
+        if hasher is None or hasher.hexdigest() != state['hash']:
+            return None
+        tail = f.read()
+    tail = tail[:tail.rfind(b'\n') + 1]
+    if not tail:
+        os.utime(arrow_path)
+        return 0
+    df = pd.read_csv(io.BytesIO(header + tail))
+    if ['date'] + [c for c in df.columns if c != 'date'] != history.columns:
+        return None
+    stamps = _utc_stamps(df['date'])
+    if len(history) and stamps.min() < history._dates[-1]:
+        return None
+    order = np.argsort(stamps, kind='stable')
+    stamps = stamps[order]
+
+    schema = history.table.schema
+    arrays = [pa.array(stamps).view(schema.field('date').type)]
+    dictionaries = {}
+    for name in history.columns[1:]:
+        kind = schema.field(name).type
+        values = df[name].to_numpy()[order]
+        if not hasattr(kind, 'index_type'):
+            try:
+                arrays.append(pa.array(values.astype(np.float64)))
+            except (TypeError, ValueError):
+                return None
+            continue
+        # Extend the shared dictionary so the existing batches' indices stay valid
+        chunks = history.table.column(name).chunks
+        old = chunks[0].dictionary if chunks else pa.array([], type=kind.value_type)
+        labels = values.astype(str)
+        new = pd.unique(labels[~np.isin(labels, old.to_numpy(zero_copy_only=False))])
+        dictionary = pa.concat_arrays([old, pa.array(new, type=kind.value_type)])
+        dictionaries[name] = dictionary
+        indices = pd.Index(dictionary.to_numpy(zero_copy_only=False)).get_indexer(labels)
+        arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, type=kind.index_type), dictionary))
+
+    all_stamps = np.concatenate([history._dates, stamps])
+    hasher.update(tail)
+    source = {'size': state['size'] + len(tail), 'hash': hasher.hexdigest()}
+    schema = schema.with_metadata(_metadata(all_stamps, history.stride, source))
+    batches = []
+    for batch in history.table.to_batches():
+        columns = [pa.DictionaryArray.from_arrays(column.indices, dictionaries[name]) if name in dictionaries
+                   else column for name, column in zip(batch.schema.names, batch.columns)]
+        batches.append(pa.RecordBatch.from_arrays(columns, schema=schema))
+    batches.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+    if len(batches) > MAX_BATCHES:
+        batches = pa.Table.from_batches(batches, schema=schema).combine_chunks().to_batches(
+            max_chunksize=len(all_stamps))
+    _write_batches(arrow_path, schema, batches)
+    return len(stamps)
+
+
+@traced()
+def sync_history_arrow(source_path: str, arrow_path: Optional[str] = None) -> str:
+    """Bring the .arrow mirror up to date when it is missing or older than the source."""
+    arrow_path = arrow_path or default_arrow_path(source_path)
+
+    def stale():
+        return not os.path.exists(arrow_path) or os.path.getmtime(arrow_path) < _source_mtime(source_path)
+
+    if not stale():
+        return arrow_path
+    with _sync_lock:
+        if not stale():
+            return arrow_path
+        rows = None
+        if os.path.exists(arrow_path):
+            try:
+                with span('mapped_history.append'):
+                    rows = _append(source_path, arrow_path)
+            except Exception:
+                logger.debug('Appending to %s failed, rebuilding it', arrow_path, exc_info=True)
+        if rows is not None:
+            logger.info('Appended %d rows to %s', rows, arrow_path)
+            return arrow_path
+        with span('mapped_history.rebuild'):
+            rows = _rebuild(source_path, arrow_path)
+        logger.info('Rebuilt %s (%d rows)', arrow_path, rows)
+    return arrow_path
+
+
+def read_history_range(source_path: str, days: Optional[int] = None, start=None, columns=None,
+                       arrow_path: Optional[str] = None) -> pd.DataFrame:
+    """Snapshot rows from the last `days` (or since `start`) via the mapped mirror."""
+    if days is not None:
+        start = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days)
+    return open_history(sync_history_arrow(source_path, arrow_path)).frame(start=start, columns=columns)
@@ -0,0 +1,218 @@
+"""Grouped snapshot value series for the performance chart.
+
+`historical.csv` is read once and pivoted into a cube of shares and prices
+indexed by snapshot date with (account, ticker) columns. Filters slice the cube
+and every breakdown (account, holder, account type, ticker) comes out of a
+single column groupby, so switching views never re-scans snapshot rows.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .mapped_history import read_history_range
+from .snapshot_store import read_history
+from .sqlite_store import is_sqlite_store, read_rows
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+# Breakdown dimensions produced by compute_breakdowns (plus 'total')
+DIMENSIONS = ('account', 'holder', 'type', 'ticker')
+
+
+def is_usd_ticker(ticker: str) -> bool:
+    """Infer currency from ticker (TSX tickers end with .TO, everything else is USD)."""
+    return not str(ticker).endswith('.TO')
+
+
+@dataclass(frozen=True)
+class SnapshotCube:
+    """Shares and prices per snapshot date and (account, ticker) column.
+
+    shares/prices: DataFrames indexed by the latest snapshot timestamp of each
+        day (UTC) with MultiIndex columns ('account', 'ticker')
+    fx: USD->CAD rate per index date (forward-filled), or None without FX data
+    """
+
+    shares: pd.DataFrame
+    prices: pd.DataFrame
+    fx: Optional[pd.Series] = None
+
+    @property
+    def empty(self) -> bool:
+        return self.shares.empty or self.shares.shape[1] == 0
+
+    @property
+    def has_usd(self) -> bool:
+        return any(is_usd_ticker(t) for t in self.shares.columns.get_level_values('ticker'))
+
+    def slice(self, accounts: Optional[Iterable[str]] = None, tickers: Optional[Iterable[str]] = None,
+              days: Optional[int] = None, start: Optional[pd.Timestamp] = None) -> 'SnapshotCube':
+        """Return a sub-cube restricted to accounts, tickers and the last N days.
+
+        start (UTC) keeps the dates from then on instead of counting back from now.
+        """
+        mask = pd.Series(True, index=self.shares.columns)
+        if accounts is not None:
+            mask &= self.shares.columns.get_level_values('account').isin(list(accounts))
+        if tickers is not None:
+            mask &= self.shares.columns.get_level_values('ticker').isin(list(tickers))
+        rows = slice(None)
+        if start is not None or days is not None:
+            cutoff = pd.Timestamp(start) if start is not None else pd.Timestamp.now(tz='UTC') - timedelta(days=days)
+            rows = self.shares.index >= cutoff
+        cols = mask.values
+        fx = self.fx[rows] if self.fx is not None else None
+        return SnapshotCube(self.shares.loc[rows, cols], self.prices.loc[rows, cols], fx)
+
+    def native_values(self) -> pd.DataFrame:
+        """Value per column in each holding's native currency."""
+        return (self.shares * self.prices).fillna(0.0)
+
+    def fx_factors(self, fixed_fx: bool = False) -> pd.DataFrame:
+        """Multipliers converting native values to CAD (1.0 for CAD tickers).
+
+        With fixed_fx=True the first rate of the window is applied to every
+        date, which isolates market performance from currency moves.
+        """
+        usd = np.array([is_usd_ticker(t) for t in self.shares.columns.get_level_values('ticker')], dtype=bool)
+        rate = np.ones(len(self.shares.index))
+        if self.fx is not None and not self.fx.dropna().empty:
+            first_rate = self.fx.dropna().iloc[0]
+            rate = np.full(len(self.fx), first_rate) if fixed_fx else self.fx.fillna(first_rate).values
+        factors = np.where(usd[None, :], rate[:, None], 1.0)
+        return pd.DataFrame(factors, index=self.shares.index, columns=self.shares.columns)
+
+    def values(self, fixed_fx: bool = False) -> pd.DataFrame:
+        """Value per column converted to CAD."""
+        return self.native_values() * self.fx_factors(fixed_fx=fixed_fx)
+
+    def total(self, fixed_fx: bool = False) -> pd.Series:
+        """Total portfolio value per date in CAD."""
+        return self.values(fixed_fx=fixed_fx).sum(axis=1)
+
+
+def _empty_cube() -> SnapshotCube:
+    cols = pd.MultiIndex.from_arrays([[], []], names=['account', 'ticker'])
+    empty = pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC', name='date'), columns=cols, dtype=float)
+    return SnapshotCube(empty, empty.copy(), None)
+
+
+@traced()
+def load_fx_series(fx_csv_path: Optional[str]) -> Optional[pd.Series]:
+    """Load the USD->CAD series from fx_rates.csv indexed by UTC date."""
+    if not fx_csv_path or not os.path.exists(fx_csv_path):
+        return None
+    try:
+        fx_df = pd.read_csv(fx_csv_path)
+        # FX rates CSV should be simple YYYY-MM-DD format, but handle ISO8601 too
+        dates = pd.to_datetime(fx_df['date'], format='mixed')
+        if dates.dt.tz is None:
+            dates = dates.dt.tz_localize('UTC')
+        ser = pd.Series(fx_df['usd_cad'].astype(float).values, index=dates.dt.normalize())
+        return ser[~ser.index.duplicated(keep='last')].sort_index()
+    except Exception:
+        logger.exception('Could not load FX rates')
+        return None
+
+
+@traced()
+def build_snapshot_cube(rows: pd.DataFrame, fx_rates: Optional[pd.Series] = None) -> SnapshotCube:
+    """Pivot snapshot rows (date, account, ticker, shares, price) into a cube.
+
+    Only the latest snapshot of each day is kept, matching how
+    fetch_and_store_snapshot replaces same-day snapshots.
+    """
+    if rows is None or rows.empty:
+        return _empty_cube()
+
+    df = rows[['date', 'account', 'ticker', 'shares', 'price']].copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+    if df['date'].dt.tz is None:
+        df['date'] = df['date'].dt.tz_localize('UTC')
+    else:
+        df['date'] = df['date'].dt.tz_convert('UTC')
+
+    # Deduplicate: keep only the rows with the max timestamp for each day
+    day = df['date'].dt.normalize()
+    df = df[df['date'] == df.groupby(day)['date'].transform('max')]
+
+    grouped = df.groupby(['date', 'account', 'ticker']).agg(shares=('shares', 'sum'), price=('price', 'last'))
+    shares = grouped['shares'].unstack(['account', 'ticker']).sort_index()
+    prices = grouped['price'].unstack(['account', 'ticker']).reindex_like(shares)
+    shares = shares.fillna(0.0)
+    shares.columns.names = prices.columns.names = ['account', 'ticker']
+
+    fx = None
+    if fx_rates is not None and not fx_rates.empty:
+        # Forward-fill FX onto snapshot dates (FX rows are date-only, snapshots are at ~20:00)
+        days = shares.index.normalize()
+        fx_all = fx_rates.reindex(fx_rates.index.union(days)).ffill()
+        fx = pd.Series(fx_all.reindex(days).values, index=shares.index)
+
+    return SnapshotCube(shares, prices, fx)
+
+
+@traced()
+def load_snapshot_cube(csv_path: str, fx_csv_path: Optional[str] = None, days: Optional[int] = None,
+                       tickers: Optional[Iterable[str]] = None) -> SnapshotCube:
+    """Read historical.csv or a compact store (and optionally fx_rates.csv) into a SnapshotCube.
+
+    With `days`, only the last N days are read, through the memory-mapped
+    Arrow mirror (see mapped_history) or the SQLite store's date index, so the
+    cost follows the window rather than the whole history. With `tickers`, the
+    SQLite store reads only those tickers' positions through its ticker index;
+    other backends slice the cube after reading.
+    """
+    if not os.path.exists(csv_path):
+        return _empty_cube()
+    columns = ['date', 'account', 'ticker', 'shares', 'price']
+    if is_sqlite_store(csv_path) and (days is not None or tickers is not None):
+        start = pd.Timestamp.now(tz='UTC') - timedelta(days=days) if days is not None else None
+        rows = read_rows(csv_path, start=start, tickers=tickers, columns=columns)
+        return build_snapshot_cube(rows, load_fx_series(fx_csv_path)).slice(days=days)
+    if tickers is not None:
+        return load_snapshot_cube(csv_path, fx_csv_path, days).slice(tickers=tickers)
+    if days is not None:
+        try:
+            rows = read_history_range(csv_path, days=days, columns=columns)
+            return build_snapshot_cube(rows, load_fx_series(fx_csv_path)).slice(days=days)
+        except Exception as e:
+            logger.warning('Mapped history unavailable for %s, reading it in full: %s', csv_path, e)
+            return load_snapshot_cube(csv_path, fx_csv_path).slice(days=days)
+    rows = read_history(csv_path, columns=columns)
+    return build_snapshot_cube(rows, load_fx_series(fx_csv_path))
+
+
+@traced()
+def compute_breakdowns(cube: SnapshotCube, account_meta: Optional[Dict[str, dict]] = None,
+                       fixed_fx: bool = False) -> Dict[str, pd.DataFrame]:
+    """Return CAD value series per account, holder, account type and ticker.
+
+    account_meta maps account nickname -> {'holder': ..., 'type': ...}; accounts
+    missing from it are grouped under 'Unknown'. All breakdowns share a single
+    valuation of the cube, and the result also carries a 'total' frame.
+    """
+    account_meta = account_meta or {}
+    values = cube.values(fixed_fx=fixed_fx)
+    if cube.empty:
+        empty = pd.DataFrame(index=values.index, dtype=float)
+        return {dim: empty.copy() for dim in DIMENSIONS + ('total',)}
+    accounts = values.columns.get_level_values('account')
+    keys = {
+        'account': accounts,
+        'holder': accounts.map(lambda a: account_meta.get(a, {}).get('holder', 'Unknown')),
+        'type': accounts.map(lambda a: account_meta.get(a, {}).get('type', 'Unknown')),
+        'ticker': values.columns.get_level_values('ticker'),
+    }
+    by_column = values.T
+    out = {dim: by_column.groupby(list(key)).sum().T for dim, key in keys.items()}
+    out['total'] = values.sum(axis=1).to_frame(name='Portfolio Value')
+    return out
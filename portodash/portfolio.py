@@ -0,0 +1,281 @@
+"""Portfolio configuration model shared by the dashboard and scripts.
+
+`portfolio.json` is parsed once per file version (keyed on mtime and size)
+into `Account` and `Holding` objects plus lookup indexes, so Streamlit reruns
+and sidebar filters do not re-read or re-flatten the file.
+
+Holdings and accounts keep dict-style access (`h['ticker']`, `h.get(...)`)
+so they can be passed straight to compute_portfolio_df,
+fetch_and_store_snapshot and the other helpers that take plain dicts.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURRENCY = 'CAD'
+
+
+class PortfolioError(ValueError):
+    """Raised when portfolio.json does not match the expected schema."""
+
+
+class _Record:
+    """Read-only mapping view over __slots__ attributes."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        fields = ', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__[:3])
+        return f'{type(self).__name__}({fields}, ...)'
+
+
+class Holding(_Record):
+    """One position, with its account's metadata attached."""
+
+    __slots__ = ('ticker', 'shares', 'cost_basis', 'currency', 'account_nickname',
+                 'account_holder', 'account_type', 'account_base_currency')
+
+    def __init__(self, ticker: str, shares: float, cost_basis: float, currency: str,
+                 account_nickname: str, account_holder: str, account_type: str,
+                 account_base_currency: str):
+        self.ticker = ticker
+        self.shares = shares
+        self.cost_basis = cost_basis
+        self.currency = currency
+        self.account_nickname = account_nickname
+        self.account_holder = account_holder
+        self.account_type = account_type
+        self.account_base_currency = account_base_currency
+
+
+class Account(_Record):
+    """An account with its holdings and optional rebalancing settings."""
+
+    __slots__ = ('nickname', 'holder', 'type', 'base_currency', 'holdings',
+                 'targets', 'cash', 'tolerance')
+
+    def __init__(self, nickname: str, holder: str, type: str, base_currency: str,
+                 holdings: Tuple[Holding, ...], targets: Optional[Dict[str, float]] = None,
+                 cash: float = 0.0, tolerance: Optional[float] = None):
+        self.nickname = nickname
+        self.holder = holder
+        self.type = type
+        self.base_currency = base_currency
+        self.holdings = holdings
+        self.targets = targets
+        self.cash = cash
+        self.tolerance = tolerance
+
+    def get(self, key, default=None):
+        # Unset optional settings behave like missing keys in the JSON
+        value = super().get(key, default)
+        return default if value is None else value
+
+
+class Portfolio:
+    """Parsed portfolio.json with precomputed lookup indexes.
+
+    by_ticker / by_account: holdings per ticker / account nickname
+    accounts_by_holder / accounts_by_type: account nicknames per holder / type
+    """
+
+    __slots__ = ('accounts', 'holdings', 'targets', 'tolerance', 'base_currency', 'nicknames', 'holders', 'types',
+                 'tickers', 'by_ticker', 'by_account', 'accounts_by_nickname',
+                 'accounts_by_holder', 'accounts_by_type')
+
+    def __init__(self, accounts: Iterable[Account], targets: Optional[Dict[str, float]] = None,
+                 tolerance: Optional[float] = None, base_currency: str = DEFAULT_CURRENCY):
+        self.accounts: Tuple[Account, ...] = tuple(accounts)
+        self.holdings: Tuple[Holding, ...] = tuple(h for acc in self.accounts for h in acc.holdings)
+        self.targets: Dict[str, float] = dict(targets or {})
+        self.tolerance = tolerance
+        # Household reporting currency (top-level "base_currency")
+        self.base_currency = base_currency
+
+        self.accounts_by_nickname = {acc.nickname: acc for acc in self.accounts}
+        self.by_account: Dict[str, Tuple[Holding, ...]] = {acc.nickname: acc.holdings for acc in self.accounts}
+        by_ticker: Dict[str, List[Holding]] = {}
+        for h in self.holdings:
+            by_ticker.setdefault(h.ticker, []).append(h)
+        self.by_ticker = {t: tuple(hs) for t, hs in by_ticker.items()}
+        self.accounts_by_holder = _group(self.accounts, 'holder')
+        self.accounts_by_type = _group(self.accounts, 'type')
+
+        self.nicknames = sorted(self.accounts_by_nickname)
+        self.holders = sorted(self.accounts_by_holder)
+        self.types = sorted(self.accounts_by_type)
+        self.tickers = sorted(self.by_ticker)
+
+    def target_tickers(self) -> set:
+        """Tickers named in household or account targets."""
+        out = set(self.targets)
+        for acc in self.accounts:
+            out.update(acc.targets or {})
+        return out
+
+    def select_accounts(self, nicknames=None, holders=None, types=None) -> List[str]:
+        """Account nicknames matching every non-empty criterion (in file order)."""
+        selected = set(self.accounts_by_nickname)
+        if nicknames:
+            selected &= set(nicknames)
+        if holders:
+            selected &= {n for h in holders for n in self.accounts_by_holder.get(h, ())}
+        if types:
+            selected &= {n for t in types for n in self.accounts_by_type.get(t, ())}
+        return [acc.nickname for acc in self.accounts if acc.nickname in selected]
+
+    def filter_holdings(self, nicknames=None, holders=None, types=None) -> List[Holding]:
+        """Holdings of the accounts matching select_accounts (empty criteria are ignored)."""
+        if not (nicknames or holders or types):
+            return list(self.holdings)
+        return [h for n in self.select_accounts(nicknames, holders, types) for h in self.by_account[n]]
+
+
+def _group(accounts: Iterable[Account], attr: str) -> Dict[str, Tuple[str, ...]]:
+    out: Dict[str, List[str]] = {}
+    for acc in accounts:
+        out.setdefault(getattr(acc, attr), []).append(acc.nickname)
+    return {k: tuple(v) for k, v in out.items()}
+
+
+def _number(value, where: str, minimum: Optional[float] = None) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PortfolioError(f'{where} must be a number, got {value!r}')
+    if minimum is not None and value < minimum:
+        raise PortfolioError(f'{where} must be >= {minimum}, got {value!r}')
+    return float(value)
+
+
+def _text(obj: dict, key: str, where: str) -> str:
+    value = obj.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise PortfolioError(f'{where}.{key} is required and must be a non-empty string')
+    return value
+
+
+def _targets(value, where: str) -> Optional[Dict[str, float]]:
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise PortfolioError(f'{where} must be an object mapping tickers to weights')
+    weights = {str(t): _number(w, f'{where}.{t}', minimum=0.0) for t, w in value.items()}
+    if sum(weights.values()) > 1.0 + 1e-9:
+        raise PortfolioError(f'{where} weights add up to more than 1.0')
+    return weights
+
+
+def _tolerance(value, where: str) -> Optional[float]:
+    if value is None:
+        return None
+    tol = _number(value, where, minimum=0.0)
+    if tol >= 1.0:
+        raise PortfolioError(f'{where} must be a fraction below 1.0, got {value!r}')
+    return tol
+
+
+def parse_portfolio(data: dict) -> Portfolio:
+    """Validate the account-centric portfolio structure and build a Portfolio."""
+    if not isinstance(data, dict) or 'accounts' not in data:
+        raise PortfolioError(
+            "Portfolio file must use new account-centric structure with 'accounts' key. "
+            "See portfolio.json.sample for the required format."
+        )
+    if not isinstance(data['accounts'], list):
+        raise PortfolioError("'accounts' must be a list")
+
+    accounts = []
+    seen = set()
+    for i, raw in enumerate(data['accounts']):
+        where = f'accounts[{i}]'
+        if not isinstance(raw, dict):
+            raise PortfolioError(f'{where} must be an object')
+        nickname = _text(raw, 'nickname', where)
+        if nickname in seen:
+            raise PortfolioError(f'{where}.nickname {nickname!r} is used by more than one account')
+        seen.add(nickname)
+        holder = _text(raw, 'holder', where)
+        acc_type = _text(raw, 'type', where)
+        base = _text(raw, 'base_currency', where).upper()
+
+        holdings = []
+        raw_holdings = raw.get('holdings', [])
+        if not isinstance(raw_holdings, list):
+            raise PortfolioError(f'{where}.holdings must be a list')
+        for j, h in enumerate(raw_holdings):
+            hwhere = f'{where}.holdings[{j}]'
+            if not isinstance(h, dict):
+                raise PortfolioError(f'{hwhere} must be an object')
+            currency = h.get('currency', base)
+            if not isinstance(currency, str) or not currency:
+                raise PortfolioError(f'{hwhere}.currency must be a currency code')
+            holdings.append(Holding(
+                ticker=_text(h, 'ticker', hwhere),
+                shares=_number(h.get('shares'), f'{hwhere}.shares', minimum=0.0),
+                cost_basis=_number(h.get('cost_basis'), f'{hwhere}.cost_basis', minimum=0.0),
+                currency=currency.upper(),
+                account_nickname=nickname,
+                account_holder=holder,
+                account_type=acc_type,
+                account_base_currency=base,
+            ))
+
+        accounts.append(Account(
+            nickname, holder, acc_type, base, tuple(holdings),
+            targets=_targets(raw.get('targets'), f'{where}.targets'),
+            cash=_number(raw.get('cash', 0.0), f'{where}.cash', minimum=0.0),
+            tolerance=_tolerance(raw.get('tolerance'), f'{where}.tolerance'),
+        ))
+
+    return Portfolio(
+        accounts,
+        targets=_targets(data.get('targets'), 'targets'),
+        tolerance=_tolerance(data.get('tolerance'), 'tolerance'),
+        base_currency=_text(data, 'base_currency', 'portfolio').upper() if 'base_currency' in data else DEFAULT_CURRENCY,
+    )
+
+
+_cache: Dict[str, Tuple[Tuple[int, int], Portfolio]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_portfolio(path: str) -> Portfolio:
+    """Load and validate portfolio.json, reusing the parsed result until the file changes."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise PortfolioError(f'{os.path.basename(path)} is not valid JSON: {e}') from e
+    portfolio = parse_portfolio(data)
+    with _cache_lock:
+        _cache[path] = (key, portfolio)
+    return portfolio
@@ -0,0 +1,178 @@
+"""Local store of daily adjusted close prices.
+
+Price history is kept in `logs/prices/prices.parquet` (dates x tickers) so the
+dashboard only asks Yahoo Finance for days it has not seen yet.
+`prices_state.json` records, per ticker, the earliest start ever requested and
+the last day the store was checked, so each ticker is downloaded in full once
+per requested period and topped up at most once a day (weekends, holidays,
+young listings and failed downloads included). Derived analytics (see
+`portodash.risk`) are cached next to it in the same directory.
+"""
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from .data_fetch import get_historical_prices
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+PRICES_FILE = 'prices.parquet'
+STATE_FILE = 'prices_state.json'
+
+# yfinance period strings -> days of history to seed a new ticker with
+_PERIOD_DAYS = {'d': 1, 'mo': 31, 'y': 366}
+
+
+def store_dir(path: Optional[str] = None) -> str:
+    """Return (and create) the price store directory, default logs/prices."""
+    if path is None:
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        path = os.path.join(root, 'logs', 'prices')
+    try:
+        os.makedirs(path, exist_ok=True)
+    except Exception:
+        pass
+    return path
+
+
+def cache_key(*parts) -> str:
+    """Short stable hash used to name derived cache files in the store."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+@traced()
+def load_prices(path: Optional[str] = None, filename: str = PRICES_FILE) -> pd.DataFrame:
+    """Load the stored price frame (empty DataFrame if nothing stored yet)."""
+    file_path = os.path.join(store_dir(path), filename)
+    if not os.path.exists(file_path):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(file_path)
+    except Exception:
+        logger.exception('Failed to read price store')
+        return pd.DataFrame()
+
+
+@traced()
+def save_prices(prices: pd.DataFrame, path: Optional[str] = None, filename: str = PRICES_FILE) -> None:
+    """Persist the price frame, sorted by date with duplicate dates collapsed."""
+    prices = prices[~prices.index.duplicated(keep='last')].sort_index()
+    prices.columns = [str(c) for c in prices.columns]
+    file_path = os.path.join(store_dir(path), filename)
+    tmp_path = file_path + '.tmp'
+    prices.to_parquet(tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def _load_state(path: Optional[str]) -> Dict[str, Dict[str, str]]:
+    file_path = os.path.join(store_dir(path), STATE_FILE)
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logger.exception('Failed to read price store state')
+        return {}
+
+
+def _save_state(state: Dict[str, Dict[str, str]], path: Optional[str]) -> None:
+    file_path = os.path.join(store_dir(path), STATE_FILE)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, file_path)
+
+
+def store_mtime(path: Optional[str] = None) -> Optional[float]:
+    """mtime of the price file, for use as a cache key."""
+    try:
+        return os.path.getmtime(os.path.join(store_dir(path), PRICES_FILE))
+    except OSError:
+        return None
+
+
+def _period_start(period: str) -> pd.Timestamp:
+    for suffix, days in _PERIOD_DAYS.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return pd.Timestamp(datetime.utcnow().date() - timedelta(days=int(period[:-len(suffix)]) * days))
+    return pd.Timestamp(datetime.utcnow().date() - timedelta(days=366))
+
+
+def merge_prices(stored: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+    """Combine stored and newly downloaded prices, preferring fresh values."""
+    if fresh is None or fresh.empty:
+        return stored
+    fresh = fresh.copy()
+    fresh.index = pd.to_datetime(fresh.index).tz_localize(None).normalize()
+    if stored.empty:
+        return fresh.sort_index()
+    combined = fresh.combine_first(stored)
+    return combined[~combined.index.duplicated(keep='last')].sort_index()
+
+
+@traced()
+def get_price_history(tickers: Iterable[str], period: str = '1y', path: Optional[str] = None,
+                      refresh: bool = True) -> pd.DataFrame:
+    """Return adjusted closes (dates x tickers) for tickers, covering `period`.
+
+    Stored history is reused: a ticker is downloaded for the full period only
+    when no earlier call asked for a start this early, and otherwise topped up
+    from its last stored date once per day. With refresh=False no network
+    call is made.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    stored = load_prices(path)
+    start = _period_start(period)
+
+    if refresh and tickers:
+        state = _load_state(path)
+        today = datetime.utcnow().date().isoformat()
+        start_iso = start.strftime('%Y-%m-%d')
+
+        def _covered(t):
+            if t in state:
+                return state[t].get('start', today) <= start_iso
+            # Stored before the state file existed: trust data reaching back to the start
+            return (t in stored.columns and not stored[t].dropna().empty
+                    and stored[t].first_valid_index() <= start + pd.Timedelta(days=7))
+
+        missing = [t for t in tickers if not _covered(t)]
+        stale = [t for t in tickers if t not in missing and state.get(t, {}).get('checked', '') < today]
+
+        updated = stored
+        if missing:
+            updated = merge_prices(updated, get_historical_prices(missing, start=start_iso))
+        if stale:
+            known = [t for t in stale if t in stored.columns]
+            last = stored[known].dropna(how='all').index.max() if known else pd.NaT
+            since = (last + pd.Timedelta(days=1)).strftime('%Y-%m-%d') if pd.notna(last) else start_iso
+            if since <= today:
+                updated = merge_prices(updated, get_historical_prices(stale, start=since))
+
+        if missing or stale:
+            # Record the check even when nothing came back, so it is not retried until tomorrow
+            for t in missing + stale:
+                entry = state.setdefault(t, {'start': start_iso})
+                if t in missing:
+                    entry['start'] = min(entry.get('start', start_iso), start_iso)
+                entry['checked'] = today
+            try:
+                if updated is not stored:
+                    save_prices(updated, path)
+                _save_state(state, path)
+            except Exception:
+                logger.exception('Failed to write price store')
+            stored = updated
+
+    if stored.empty:
+        return pd.DataFrame(columns=tickers)
+    frame = stored.reindex(columns=tickers)
+    return frame[frame.index >= start].dropna(how='all')
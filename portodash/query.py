@@ -0,0 +1,187 @@
+"""Optional DuckDB query layer over the local stores.
+
+Requires `duckdb` (pip install duckdb); the rest of PortoDash works without
+it. `connect()` opens an in-memory DuckDB database and registers:
+
+- snapshots: one row per holding for the latest snapshot of each day
+  (historical.csv, a compact store or historical.db, read through the
+  memory-mapped Arrow mirror) with native and CAD values, cost in CAD and
+  the account's holder and type
+- fx: the USD->CAD series from fx_rates.csv (as-of joined onto snapshots)
+- prices: daily closes from the price store (logs/prices/prices.parquet),
+  one row per (date, ticker)
+- distributions: dividend and split events, when the store exists
+- accounts: nickname, holder and type from portfolio.json
+
+Queries run inside DuckDB's vectorized engine across all cores, so
+multi-year aggregations do not go through single-threaded pandas. QUERIES
+holds the prepared queries the dashboard uses; `scripts/query_sql.py`
+runs them or arbitrary SQL from the command line.
+"""
+import importlib.util
+import logging
+import os
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from .distributions import EVENTS_FILE
+from .mapped_history import open_history, sync_history_arrow
+from .price_store import PRICES_FILE, store_dir
+from .tracing import span, traced
+
+
+logger = logging.getLogger(__name__)
+
+# Snapshot rows -> CAD values. FX is as-of joined by day; USD rows before the
+# first stored rate use that first rate, as SnapshotCube.fx_factors does.
+_SNAPSHOTS_VIEW = """
+CREATE OR REPLACE VIEW snapshots AS
+WITH rows AS (
+    SELECT date AT TIME ZONE 'UTC' AS ts, CAST(date AT TIME ZONE 'UTC' AS DATE) AS day,
+           CAST(account AS VARCHAR) AS account, CAST(ticker AS VARCHAR) AS ticker,
+           shares, cost_basis, price,
+           CASE WHEN CAST(ticker AS VARCHAR) LIKE '%.TO' THEN 'CAD' ELSE 'USD' END AS currency
+    FROM snapshot_rows
+    QUALIFY ts = max(ts) OVER (PARTITION BY day)
+), rated AS (
+    SELECT rows.*, coalesce(fx.usd_cad, (SELECT usd_cad FROM fx ORDER BY day LIMIT 1), 1.0) AS usd_cad
+    FROM rows ASOF LEFT JOIN fx ON rows.day >= fx.day
+)
+SELECT ts AS date, day, rated.account, coalesce(a.holder, 'Unknown') AS holder, coalesce(a.type, 'Unknown') AS type,
+       ticker, currency, shares, cost_basis, price,
+       shares * price AS native_value,
+       CASE WHEN currency = 'USD' THEN usd_cad ELSE 1.0 END AS fx_rate,
+       shares * price * CASE WHEN currency = 'USD' THEN usd_cad ELSE 1.0 END AS value_cad,
+       shares * cost_basis * CASE WHEN currency = 'USD' THEN usd_cad ELSE 1.0 END AS cost_cad
+FROM rated LEFT JOIN accounts a ON a.account = rated.account
+"""
+
+# Prepared queries used by the dashboard; $name parameters are bound by run()
+QUERIES = {
+    # Unrealized gain and value at the last snapshot of each period, per account type
+    'gain_by_type': """
+        WITH period_end AS (
+            SELECT date_trunc($period, day) AS period, max(day) AS day FROM snapshots GROUP BY 1
+        ), totals AS (
+            SELECT p.period, s.type, sum(s.value_cad) AS value_cad, sum(s.cost_cad) AS cost_cad
+            FROM snapshots s JOIN period_end p ON s.day = p.day
+            GROUP BY 1, 2
+        )
+        SELECT CAST(period AS DATE) AS period, type, value_cad, cost_cad, value_cad - cost_cad AS gain_cad,
+               value_cad - lag(value_cad) OVER (PARTITION BY type ORDER BY period) AS value_change_cad
+        FROM totals ORDER BY period, type
+    """,
+    # CAD value change caused by USD/CAD moves since $start: actual value minus
+    # value at the window's first rate (the "Fixed FX" series of the chart)
+    'fx_contribution_by_holder': """
+        WITH window_rows AS (SELECT * FROM snapshots WHERE day >= $start),
+        first_rate AS (SELECT arg_min(fx_rate, day) AS rate FROM window_rows WHERE currency = 'USD'),
+        last_day AS (SELECT max(day) AS day FROM window_rows)
+        SELECT holder, sum(value_cad) AS value_cad,
+               sum(CASE WHEN currency = 'USD' THEN native_value * (fx_rate - (SELECT rate FROM first_rate)) ELSE 0 END)
+                   AS fx_contribution_cad
+        FROM window_rows WHERE day = (SELECT day FROM last_day)
+        GROUP BY holder ORDER BY holder
+    """,
+    # CAD value per day and holder/type/account (multi-year series without pandas pivots)
+    'daily_value': """
+        SELECT day, account, holder, type, sum(value_cad) AS value_cad, sum(cost_cad) AS cost_cad
+        FROM snapshots WHERE day >= $start GROUP BY ALL ORDER BY day, account
+    """,
+}
+
+# Defaults for prepared query parameters
+QUERY_DEFAULTS = {'period': 'quarter', 'start': '1900-01-01'}
+
+
+class QueryLayerUnavailable(ImportError):
+    """Raised when duckdb is not installed."""
+
+
+def is_available() -> bool:
+    return importlib.util.find_spec('duckdb') is not None
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise QueryLayerUnavailable('The SQL query layer needs duckdb: pip install duckdb') from e
+    return duckdb
+
+
+def _register_fx(con, fx_csv_path: Optional[str]) -> None:
+    if fx_csv_path and os.path.exists(fx_csv_path):
+        con.execute(f"CREATE OR REPLACE VIEW fx AS SELECT CAST(CAST(date AS TIMESTAMP) AS DATE) AS day, "
+                    f"CAST(usd_cad AS DOUBLE) AS usd_cad FROM read_csv('{_quote(fx_csv_path)}', header = true, "
+                    f"all_varchar = true) QUALIFY row_number() OVER (PARTITION BY day) = 1")
+    else:
+        con.execute('CREATE OR REPLACE VIEW fx AS SELECT CAST(NULL AS DATE) AS day, CAST(NULL AS DOUBLE) AS usd_cad '
+                    'WHERE false')
+
+
+def _register_prices(con, price_dir: str) -> None:
+    prices_path = os.path.join(price_dir, PRICES_FILE)
+    if os.path.exists(prices_path):
+        # The price store is wide (dates x tickers); the view is long
+        con.execute(f"CREATE OR REPLACE VIEW prices AS SELECT CAST(__index_level_0__ AS DATE) AS day, ticker, close "
+                    f"FROM (UNPIVOT read_parquet('{_quote(prices_path)}') ON COLUMNS(* EXCLUDE (__index_level_0__)) "
+                    f"INTO NAME ticker VALUE close)")
+    else:
+        con.execute('CREATE OR REPLACE VIEW prices AS SELECT CAST(NULL AS DATE) AS day, CAST(NULL AS VARCHAR) AS ticker, '
+                    'CAST(NULL AS DOUBLE) AS close WHERE false')
+    events_path = os.path.join(price_dir, EVENTS_FILE)
+    if os.path.exists(events_path):
+        con.execute(f"CREATE OR REPLACE VIEW distributions AS SELECT * FROM read_parquet('{_quote(events_path)}')")
+
+
+def _quote(path: str) -> str:
+    return path.replace("'", "''")
+
+
+@traced()
+def connect(history_path: str, fx_csv_path: Optional[str] = None, price_dir: Optional[str] = None,
+            accounts: Optional[Iterable[dict]] = None, threads: Optional[int] = None):
+    """Open an in-memory DuckDB connection with the PortoDash stores registered as views.
+
+    accounts: portfolio accounts (dicts with nickname, holder, type) used
+    for the holder/type columns; threads defaults to every core.
+    """
+    duckdb = _duckdb()
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")
+    if threads:
+        con.execute(f'SET threads = {int(threads)}')
+
+    account_rows = pd.DataFrame([(a['nickname'], a.get('holder', 'Unknown'), a.get('type', 'Unknown'))
+                                 for a in accounts or ()], columns=['account', 'holder', 'type'], dtype=object)
+    con.register('accounts', account_rows)
+    with span('query.snapshots'):
+        if os.path.exists(history_path):
+            # Registered zero-copy: DuckDB scans the memory-mapped Arrow buffers
+            con.register('snapshot_rows', open_history(sync_history_arrow(history_path)).table)
+        else:
+            con.execute('CREATE VIEW snapshot_rows AS SELECT CAST(NULL AS TIMESTAMPTZ) AS date, '
+                        'CAST(NULL AS VARCHAR) AS account, CAST(NULL AS VARCHAR) AS ticker, CAST(NULL AS DOUBLE) AS shares, '
+                        'CAST(NULL AS DOUBLE) AS cost_basis, CAST(NULL AS DOUBLE) AS price WHERE false')
+    _register_fx(con, fx_csv_path)
+    _register_prices(con, price_dir or store_dir())
+    con.execute(_SNAPSHOTS_VIEW)
+    return con
+
+
+@traced()
+def run(con, name: str, **params) -> pd.DataFrame:
+    """Run a prepared query from QUERIES and return a DataFrame."""
+    sql = QUERIES[name]
+    values = {k: v for k, v in {**QUERY_DEFAULTS, **params}.items() if f'${k}' in sql}
+    if 'start' in values:
+        values['start'] = pd.Timestamp(values['start']).date()
+    return con.execute(sql, values).df()
+
+
+@traced()
+def sql(con, query: str) -> pd.DataFrame:
+    """Run arbitrary SQL against the registered views."""
+    return con.execute(query).df()
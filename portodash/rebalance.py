@@ -0,0 +1,292 @@
+"""Rebalancing trades against target allocations.
+
+Targets are optional in `portfolio.json`:
+
+- per account: ``"targets": {"XEQT.TO": 0.8, "ZAG.TO": 0.2}`` plus optional
+  ``"cash"`` (in the account's base currency) and ``"tolerance"``
+- household: top-level ``"targets"`` / ``"tolerance"``, applied to the pooled
+  accounts that do not define their own targets
+
+Weights are fractions of the account (or household) value including cash; any
+remainder below 1.0 stays in cash. Positions outside their tolerance band are
+traded in whole shares just far enough to land back inside the band, and buys
+are scaled down when the account's cash plus sale proceeds cannot cover them.
+
+Cash is kept per account and currency: an account's `cash` is in its base
+currency and a sale credits the account in the currency of the fund sold. A
+buy only spends cash the same account holds in the fund's currency, so no
+currency is converted implicitly. A fund nobody holds is assumed to trade in
+the buying account's base currency.
+"""
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .tracing import traced
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE = 0.05
+
+TRADE_COLUMNS = [
+    'account', 'ticker', 'action', 'shares', 'price', 'currency',
+    'trade_value', 'current_pct', 'target_pct', 'post_pct',
+]
+
+
+def _fx_to_base(currency: str, fx_rates: Optional[Dict[str, float]], base_currency: str) -> float:
+    if not currency or currency.upper() == base_currency.upper() or not fx_rates:
+        return 1.0
+    return float(fx_rates.get(currency.upper()) or 1.0)
+
+
+HOUSEHOLD = '__household__'
+
+# (account, currency) -> cash available, in base currency
+Buckets = Dict[Tuple[str, str], float]
+
+
+def _new_position(account: str, ticker: str, currency: str, prices: Dict[str, float],
+                  fx_rates: Optional[Dict[str, float]], base_currency: str) -> dict:
+    """A zero-share position row for a targeted ticker the account does not hold."""
+    native = prices.get(ticker)
+    price = float(native) * _fx_to_base(currency, fx_rates, base_currency) if native else np.nan
+    return {'account': account, 'ticker': ticker, 'currency': currency, 'shares': 0.0, 'price': price, 'value': 0.0}
+
+
+def _positions(df: pd.DataFrame, accounts: Iterable[dict], prices: Dict[str, float],
+               fx_rates: Optional[Dict[str, float]], base_currency: str) -> pd.DataFrame:
+    """One row per (account, ticker) covering holdings and targeted tickers.
+
+    Columns: account, ticker, currency, shares, price (base currency),
+    value (base currency), target (weight or NaN when the account has none).
+    """
+    held = df[df['ticker'] != 'TOTAL'] if not df.empty else df
+    if held.empty:
+        held = pd.DataFrame(columns=['account', 'ticker', 'currency', 'shares', 'price', 'current_value'])
+    pos = (held.groupby(['account', 'ticker'], as_index=False)
+           .agg(currency=('currency', 'first'), shares=('shares', 'sum'),
+                price=('price', 'first'), value=('current_value', 'sum')))
+
+    targets = []
+    extra = []
+    held_keys = set(zip(pos['account'], pos['ticker']))
+    known = dict(zip(pos['ticker'], pos['currency']))
+    for acc in accounts:
+        for ticker, weight in (acc.get('targets') or {}).items():
+            targets.append((acc['nickname'], ticker, float(weight)))
+            if (acc['nickname'], ticker) not in held_keys:
+                currency = known.get(ticker) or acc.get('base_currency', base_currency)
+                extra.append(_new_position(acc['nickname'], ticker, currency, prices, fx_rates, base_currency))
+    if extra:
+        pos = pd.concat([pos, pd.DataFrame(extra)], ignore_index=True)
+
+    target_df = pd.DataFrame(targets, columns=['account', 'ticker', 'target'])
+    pos = pos.merge(target_df, on=['account', 'ticker'], how='left')
+    has_targets = {acc['nickname'] for acc in accounts if acc.get('targets')}
+    # Holdings missing from an account's targets are targeted at zero
+    pos.loc[pos['account'].isin(has_targets) & pos['target'].isna(), 'target'] = 0.0
+    return pos
+
+
+def _band_trades(value, price, target, total, tolerance, cash) -> np.ndarray:
+    """Signed whole-share trades bringing each position inside its band.
+
+    All arrays are aligned per position and share one pool (`total`, `cash`).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = value / total
+        over = (value - (target + tolerance) * total) / price
+        under = ((target - tolerance) * total - value) / price
+    sells = np.where((weight > target + tolerance) & (price > 0), np.ceil(np.nan_to_num(over)), 0.0)
+    buys = np.where((weight < target - tolerance) & (price > 0), np.ceil(np.nan_to_num(under)), 0.0)
+
+    # Buys are funded by cash plus sale proceeds; scale them down if short
+    available = cash + np.sum(sells * np.nan_to_num(price))
+    cost = np.sum(buys * np.nan_to_num(price))
+    if cost > available and cost > 0:
+        buys = np.floor(buys * max(available, 0.0) / cost)
+    return buys - sells
+
+
+@traced()
+def compute_rebalance_trades(df: pd.DataFrame, accounts: Iterable[dict], prices: Optional[Dict[str, float]] = None,
+                             fx_rates: Optional[Dict[str, float]] = None, base_currency: str = 'CAD',
+                             household_targets: Optional[Dict[str, float]] = None,
+                             tolerance: Optional[float] = None) -> pd.DataFrame:
+    """Return the trades needed to bring allocations back within tolerance.
+
+    df: compute_portfolio_df output (prices already in base currency)
+    accounts: account dicts from portfolio.json (targets, cash, tolerance, base_currency)
+    prices: native prices, needed only for targeted tickers not currently held
+    household_targets: weights applied across accounts without their own targets
+    Returns one row per trade with TRADE_COLUMNS; price is in the holding's
+    currency and trade_value (positive = buy) in base currency.
+    """
+    accounts = list(accounts)
+    prices = prices or {}
+    default_tol = DEFAULT_TOLERANCE if tolerance is None else tolerance
+    pos = _positions(df, accounts, prices, fx_rates, base_currency)
+    if pos.empty:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+
+    acc_by_name = {acc['nickname']: acc for acc in accounts}
+    account_currency = {name: acc.get('base_currency', base_currency) for name, acc in acc_by_name.items()}
+    buckets: Buckets = {
+        (name, account_currency[name]): float(acc.get('cash', 0.0)) * _fx_to_base(account_currency[name], fx_rates,
+                                                                                   base_currency)
+        for name, acc in acc_by_name.items()
+    }
+    cash = {name: buckets[(name, account_currency[name])] for name in acc_by_name}
+    pos['pool'] = pos['account']
+    pos['tolerance'] = pos['account'].map(
+        lambda a: float(acc_by_name.get(a, {}).get('tolerance', default_tol)))
+
+    if household_targets:
+        # Accounts without their own targets are rebalanced together
+        pooled = pos['target'].isna()
+        pos.loc[pooled, 'pool'] = HOUSEHOLD
+        pos.loc[pooled, 'target'] = pos.loc[pooled, 'ticker'].map(household_targets).fillna(0.0)
+        pos.loc[pooled, 'tolerance'] = default_tol
+        pooled_accounts = set(pos.loc[pooled, 'account'])
+        cash[HOUSEHOLD] = sum(cash.get(a, 0.0) for a in pooled_accounts)
+
+        # Every pooled account may buy a household ticker it does not hold yet
+        known = dict(zip(pos['ticker'], pos['currency']))
+        held_keys = set(zip(pos.loc[pooled, 'account'], pos.loc[pooled, 'ticker']))
+        extra = [_new_position(a, t, known.get(t) or account_currency.get(a, base_currency), prices, fx_rates,
+                               base_currency)
+                 for a in sorted(pooled_accounts) for t in household_targets if (a, t) not in held_keys]
+        if extra:
+            pos = pd.concat([pos, pd.DataFrame(extra).assign(
+                target=lambda e: e['ticker'].map(household_targets).astype(float),
+                pool=HOUSEHOLD, tolerance=default_tol)], ignore_index=True)
+
+    pos = pos[pos['target'].notna()].copy()
+    if pos.empty:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+
+    pos['trade'] = 0.0
+    for pool, idx in pos.groupby('pool').groups.items():
+        p = pos.loc[idx]
+        if pool == HOUSEHOLD:
+            _household_trades(pos, p, cash[pool], buckets)
+            continue
+        total = p['value'].sum() + cash.get(pool, 0.0)
+        if total <= 0:
+            continue
+        pos.loc[idx, 'trade'] = _band_trades(
+            p['value'].to_numpy(float), p['price'].to_numpy(float), p['target'].to_numpy(float),
+            total, p['tolerance'].to_numpy(float), cash.get(pool, 0.0))
+        _fund_buys(pos, idx, buckets)
+
+    return _format_trades(pos, cash, fx_rates, base_currency)
+
+
+def _credit_sales(pos: pd.DataFrame, idx, buckets: Buckets) -> None:
+    """Add sale proceeds to each selling account's cash in the currency of the fund sold."""
+    for i in idx:
+        trade = pos.at[i, 'trade']
+        if trade < 0:
+            key = (pos.at[i, 'account'], pos.at[i, 'currency'])
+            buckets[key] = buckets.get(key, 0.0) - trade * pos.at[i, 'price']
+
+
+def _affordable(buckets: Buckets, key: Tuple[str, str], price: float, shares: float) -> float:
+    """Whole shares (at most shares) the account's cash in that currency pays for; spends it."""
+    cash = buckets.get(key, 0.0)
+    if not price > 0 or cash <= 0:
+        return 0.0
+    bought = min(shares, np.floor(cash / price + 1e-9))
+    buckets[key] = cash - bought * price
+    return bought
+
+
+def _fund_buys(pos: pd.DataFrame, idx, buckets: Buckets) -> None:
+    """Cap one account's buys at its cash (plus proceeds) in each fund's currency."""
+    _credit_sales(pos, idx, buckets)
+    buys = [i for i in idx if pos.at[i, 'trade'] > 0]
+    for i in sorted(buys, key=lambda i: -pos.at[i, 'trade'] * pos.at[i, 'price']):
+        pos.at[i, 'trade'] = _affordable(buckets, (pos.at[i, 'account'], pos.at[i, 'currency']),
+                                         pos.at[i, 'price'], pos.at[i, 'trade'])
+
+
+def _household_trades(pos: pd.DataFrame, p: pd.DataFrame, pool_cash: float, buckets: Buckets) -> None:
+    """Compute household-level trades per ticker and place them in accounts.
+
+    Sells come from the accounts holding the most shares first, moving on to
+    the next holder until the household sell is filled. Buys go first to the
+    accounts already holding the fund (most shares first), then to the other
+    pooled accounts by size, each limited to that account's cash in the
+    fund's currency; what no account can pay for is not bought.
+    """
+    by_ticker = p.groupby('ticker').agg(value=('value', 'sum'), price=('price', 'first'),
+                                        target=('target', 'first'), tolerance=('tolerance', 'first'))
+    # Size each household trade on the price of a held row when there is one
+    held_price = p[p['shares'] > 0].groupby('ticker')['price'].first()
+    by_ticker['price'] = held_price.reindex(by_ticker.index).fillna(by_ticker['price'])
+    total = by_ticker['value'].sum() + pool_cash
+    if total <= 0:
+        return
+    trades = _band_trades(by_ticker['value'].to_numpy(float), by_ticker['price'].to_numpy(float),
+                          by_ticker['target'].to_numpy(float), total,
+                          by_ticker['tolerance'].to_numpy(float), pool_cash)
+    account_size = p.groupby('account')['value'].sum()
+    rank = {a: r for r, a in enumerate(account_size.sort_values(ascending=False, kind='stable').index)}
+
+    def placement(ticker):
+        rows = p[p['ticker'] == ticker]
+        return sorted(rows.index, key=lambda i: (-rows.at[i, 'shares'], rank[rows.at[i, 'account']]))
+
+    for ticker, trade in zip(by_ticker.index, trades):
+        remaining = -trade
+        for i in placement(ticker):
+            if remaining <= 0:
+                break
+            sold = min(remaining, float(pos.at[i, 'shares']))
+            pos.at[i, 'trade'] = -sold
+            remaining -= sold
+    _credit_sales(pos, p.index, buckets)
+
+    wanted = [(t, n) for t, n in zip(by_ticker.index, trades) if n > 0]
+    for ticker, remaining in sorted(wanted, key=lambda tn: -tn[1] * by_ticker.at[tn[0], 'price']):
+        for i in placement(ticker):
+            if remaining <= 0:
+                break
+            bought = _affordable(buckets, (pos.at[i, 'account'], pos.at[i, 'currency']), pos.at[i, 'price'],
+                                 remaining)
+            pos.at[i, 'trade'] = bought
+            remaining -= bought
+
+
+def _format_trades(pos: pd.DataFrame, cash: Dict[str, float], fx_rates, base_currency: str) -> pd.DataFrame:
+    trades = pos[pos['trade'] != 0].copy()
+    if trades.empty:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+
+    # Trades move value between positions and cash, so each pool's total is unchanged
+    pool_total = pos.groupby('pool')['value'].sum() + pd.Series(cash).reindex(pos['pool'].unique()).fillna(0.0)
+    pos_value_by_pool_ticker = pos.groupby(['pool', 'ticker'])[['value']].sum()
+    pos_trade_by_pool_ticker = (pos['trade'] * pos['price']).groupby([pos['pool'], pos['ticker']]).sum()
+
+    key = list(zip(trades['pool'], trades['ticker']))
+    totals = trades['pool'].map(pool_total).to_numpy(float)
+    current = pos_value_by_pool_ticker.loc[key, 'value'].to_numpy(float)
+    traded = pos_trade_by_pool_ticker.loc[key].to_numpy(float)
+    fx = trades['currency'].map(lambda c: _fx_to_base(c, fx_rates, base_currency)).to_numpy(float)
+
+    out = pd.DataFrame({
+        'account': trades['account'].to_numpy(),
+        'ticker': trades['ticker'].to_numpy(),
+        'action': np.where(trades['trade'] > 0, 'BUY', 'SELL'),
+        'shares': np.abs(trades['trade'].to_numpy(float)),
+        'price': trades['price'].to_numpy(float) / fx,
+        'currency': trades['currency'].to_numpy(),
+        'trade_value': (trades['trade'] * trades['price']).to_numpy(float),
+        'current_pct': current / totals,
+        'target_pct': trades['target'].to_numpy(float),
+        'post_pct': (current + traded) / totals,
+    })
+    return out.sort_values(['account', 'action', 'ticker']).reset_index(drop=True)
@@ -0,0 +1,362 @@
+"""Time-weighted and money-weighted returns over snapshot history.
+
+Share count changes between snapshots are treated as external cash flows
+(valued at that day's price in CAD), so buying more units no longer shows up
+as performance. Daily time-weighted returns are chain-linked across all
+accounts at once; money-weighted returns solve the IRR of the same flows.
+
+`ReturnsEngine` keeps that work incremental over a growing history: it holds
+the last chain-linked TWR index and the running IRR cash flows per group, and
+each update links only the snapshots added since the previous one.
+"""
+from dataclasses import dataclass, field
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .performance import SnapshotCube
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+TOTAL = 'TOTAL'
+
+
+@dataclass
+class ReturnsResult:
+    """Return series per group (one column per account plus TOTAL).
+
+    values: CAD value per date
+    flows: external cash flow per date (positive = money added)
+    daily_returns: time-weighted daily return per date
+    twr_index: chain-linked growth of 1.0 since the first snapshot
+    irr: annualized money-weighted return per group (None if unsolvable)
+    """
+
+    values: pd.DataFrame
+    flows: pd.DataFrame
+    daily_returns: pd.DataFrame
+    twr_index: pd.DataFrame
+    irr: Dict[str, Optional[float]] = field(default_factory=dict)
+
+    def twr(self, group: str = TOTAL) -> Optional[float]:
+        """Cumulative time-weighted return over the whole series."""
+        if group not in self.twr_index.columns or self.twr_index.empty:
+            return None
+        ser = self.twr_index[group]
+        return float(ser.iloc[-1] / ser.iloc[0] - 1.0)
+
+    @property
+    def years(self) -> float:
+        """Length of the series in years (the IRR's time unit)."""
+        index = self.values.index
+        return (index[-1] - index[0]).total_seconds() / (365.0 * 86400) if len(index) else 0.0
+
+    def mwr(self, group: str = TOTAL) -> Optional[float]:
+        """Money-weighted return over the whole series (the IRR compounded, not annualized)."""
+        irr = self.irr.get(group)
+        if irr is None:
+            return None
+        return float((1.0 + irr) ** self.years - 1.0)
+
+    def slice(self, start: Optional[pd.Timestamp] = None) -> 'ReturnsResult':
+        """Returns over the dates from start on, as compute_returns would give for that window.
+
+        The TWR index is rebased to 1.0 on the first date and the IRR is solved
+        again over the window's flows, with its opening value as the first one.
+        """
+        if start is None:
+            return self
+        rows = self.values.index >= pd.Timestamp(start)
+        values, flows = self.values.loc[rows], self.flows.loc[rows].copy()
+        daily = self.daily_returns.loc[rows].copy()
+        if len(flows):
+            flows.iloc[0] = 0.0
+            daily.iloc[0] = 0.0
+        twr_index = (1.0 + daily).cumprod()
+        return ReturnsResult(values, flows, daily, twr_index, _irr_by_group(values, flows))
+
+
+def _group_keys(columns: pd.MultiIndex) -> np.ndarray:
+    return np.asarray(columns.get_level_values('account'))
+
+
+def _column_frames(cube: SnapshotCube):
+    """Return shares and CAD prices (forward-filled so exits can be valued)."""
+    prices = (cube.prices.ffill() * cube.fx_factors()).fillna(0.0)
+    return cube.shares.fillna(0.0), prices
+
+
+def _aggregate(frame: pd.DataFrame, keys: np.ndarray) -> pd.DataFrame:
+    """Sum (account, ticker) columns per account and add a TOTAL column."""
+    if frame.shape[1] == 0:
+        return pd.DataFrame({TOTAL: np.zeros(len(frame))}, index=frame.index)
+    out = frame.T.groupby(keys).sum().T
+    out[TOTAL] = frame.sum(axis=1)
+    return out
+
+
+def _linked_returns(values: pd.DataFrame, flows: pd.DataFrame) -> pd.DataFrame:
+    """Daily TWR r_t = (V_t - F_t) / V_{t-1} - 1, zero when there was no prior value."""
+    prev_arr = values.shift(1).to_numpy(dtype=float)
+    gain = values.to_numpy(dtype=float) - flows.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(prev_arr > 0, gain / prev_arr - 1.0, 0.0)
+    return pd.DataFrame(np.nan_to_num(r), index=values.index, columns=values.columns)
+
+
+def _brent(f, a: float, b: float, tol: float = 1e-10, maxiter: int = 100) -> Optional[float]:
+    """Brent's method root finder on a sign-changing bracket [a, b]."""
+    fa, fb = f(a), f(b)
+    if np.isnan(fa) or np.isnan(fb) or fa * fb > 0:
+        return None
+    if abs(fa) < abs(fb):
+        a, b, fa, fb = b, a, fb, fa
+    c, fc, d, mflag = a, fa, a, True
+    for _ in range(maxiter):
+        if fb == 0 or abs(b - a) < tol:
+            return b
+        if fa != fc and fb != fc:
+            s = (a * fb * fc / ((fa - fb) * (fa - fc)) + b * fa * fc / ((fb - fa) * (fb - fc))
+                 + c * fa * fb / ((fc - fa) * (fc - fb)))
+        else:
+            s = b - fb * (b - a) / (fb - fa)
+        cond = (
+            not ((3 * a + b) / 4 < s < b or b < s < (3 * a + b) / 4)
+            or (mflag and abs(s - b) >= abs(b - c) / 2)
+            or (not mflag and abs(s - b) >= abs(c - d) / 2)
+        )
+        if cond:
+            s = (a + b) / 2
+            mflag = True
+        else:
+            mflag = False
+        fs = f(s)
+        d, c, fc = c, b, fb
+        if fa * fs < 0:
+            b, fb = s, fs
+        else:
+            a, fa = s, fs
+        if abs(fa) < abs(fb):
+            a, b, fa, fb = b, a, fb, fa
+    return b
+
+
+def xirr(amounts: Sequence[float], years: Sequence[float], guess: float = 0.1) -> Optional[float]:
+    """Annualized internal rate of return for dated cash flows.
+
+    amounts: cash flows from the investor's perspective (negative = invested)
+    years: time of each flow in years since the first one
+    Uses Newton's method and falls back to Brent's method on a wide bracket.
+    """
+    cf = np.asarray(amounts, dtype=float)
+    t = np.asarray(years, dtype=float)
+    if cf.size < 2 or not (np.any(cf > 0) and np.any(cf < 0)):
+        return None
+
+    def npv(rate):
+        return float(np.sum(cf * np.power(1.0 + rate, -t)))
+
+    rate = guess
+    for _ in range(50):
+        disc = np.power(1.0 + rate, -t)
+        value = np.sum(cf * disc)
+        deriv = np.sum(-t * cf * disc / (1.0 + rate))
+        if deriv == 0 or not np.isfinite(deriv):
+            break
+        step = value / deriv
+        rate -= step
+        if rate <= -1.0 or not np.isfinite(rate):
+            break
+        if abs(step) < 1e-10:
+            return float(rate)
+
+    return _brent(npv, -0.9999, 100.0)
+
+
+def _irr_by_group(values: pd.DataFrame, flows: pd.DataFrame) -> Dict[str, Optional[float]]:
+    """Money-weighted return per group: initial value and flows in, final value out."""
+    out = {}
+    if values.empty:
+        return out
+    index = values.index
+    years = np.asarray((index - index[0]).total_seconds(), dtype=float) / (365.0 * 86400)
+    for group in values.columns:
+        v = values[group].to_numpy(dtype=float)
+        f = flows[group].to_numpy(dtype=float).copy()
+        f[0] = v[0]  # opening value is the first contribution
+        amounts = -f
+        amounts[-1] += v[-1]
+        nz = amounts != 0
+        if not nz.any():
+            out[group] = None
+            continue
+        out[group] = xirr(amounts[nz], years[nz] - years[nz][0])
+    return out
+
+
+@traced()
+def compute_returns(cube: SnapshotCube) -> ReturnsResult:
+    """Compute TWR and IRR per account and for the total in one vectorized pass."""
+    shares, prices = _column_frames(cube)
+    keys = _group_keys(shares.columns)
+    values = _aggregate(shares * prices, keys)
+    col_flows = shares.diff().fillna(0.0) * prices
+    if len(col_flows):
+        col_flows.iloc[0] = 0.0
+    flows = _aggregate(col_flows, keys)
+    daily = _linked_returns(values, flows)
+    index = (1.0 + daily).cumprod()
+    return ReturnsResult(values, flows, daily, index, _irr_by_group(values, flows))
+
+
+class ReturnsEngine:
+    """Incremental returns over a growing snapshot history for one account selection.
+
+    Every snapshot but the last is final (the last day can still be replaced by
+    fetch_and_store_snapshot). The engine keeps, per group, the TWR index and
+    value at the last final snapshot plus the nonzero IRR cash flows so far,
+    and per (account, ticker) column the shares and price there. An update
+    links only the snapshots after it, so a new daily snapshot adds constant
+    work; if that snapshot no longer matches the cube, history was edited and
+    everything is recomputed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._result: Optional[ReturnsResult] = None
+        self._final = None
+        self._shares: Optional[pd.Series] = None
+        self._prices: Optional[pd.Series] = None
+        self._cash_flows: Dict[str, Tuple[List[float], List[float]]] = {}
+        self._irr_guesses: Dict[str, Optional[float]] = {}
+
+    def _matches(self, cube: SnapshotCube) -> bool:
+        if self._result is None or self._final not in cube.shares.index:
+            return False
+        shares = cube.shares.loc[self._final]
+        if shares.drop(self._shares.index, errors='ignore').any():
+            return False
+        prices = cube.prices.loc[self._final].reindex(self._prices.index).fillna(self._prices)
+        return (np.allclose(shares.reindex(self._shares.index).fillna(0.0).values, self._shares.values)
+                and np.allclose(prices.values, self._prices.values, equal_nan=True))
+
+    @traced()
+    def update(self, cube: SnapshotCube) -> ReturnsResult:
+        """Return results for the cube's full history, linking only snapshots added since the last update."""
+        with self._lock:
+            if cube.empty:
+                self._reset()
+                return compute_returns(cube)
+            if self._matches(cube):
+                tail = cube.slice(start=self._final)
+                # Carry prices forward from the final snapshot so exits are still valued
+                native = tail.prices.copy()
+                native.iloc[0] = native.iloc[0].fillna(self._prices.reindex(native.columns))
+                native = native.ffill()
+                result = self._extend(SnapshotCube(tail.shares, native, tail.fx))
+                shares = tail.shares
+            else:
+                self._reset()
+                result = compute_returns(cube)
+                self._cash_flows = self._irr_flows(result, 0)
+                native, shares = cube.prices.ffill(), cube.shares
+            self._finalize(result, shares.iloc[-2:-1], native.iloc[-2:-1])
+            return result
+
+    def _reset(self) -> None:
+        self._result = self._final = self._shares = self._prices = None
+        self._cash_flows = {}
+        self._irr_guesses = {}
+
+    def _extend(self, tail: SnapshotCube) -> ReturnsResult:
+        """Link the rows after the last final snapshot (tail's first row) onto the stored state."""
+        prev = self._result
+        shares, prices = _column_frames(tail)
+        keys = _group_keys(shares.columns)
+        values = _aggregate(shares * prices, keys)
+        flows = _aggregate(shares.diff().fillna(0.0) * prices, keys)
+        daily = _linked_returns(values, flows).iloc[1:]
+        base = prev.twr_index.iloc[-1].reindex(daily.columns).fillna(1.0)
+        index = (1.0 + daily).cumprod() * base.values
+        values, flows = values.iloc[1:], flows.iloc[1:]
+
+        result = ReturnsResult(
+            pd.concat([prev.values, values]).fillna(0.0),
+            pd.concat([prev.flows, flows]).fillna(0.0),
+            pd.concat([prev.daily_returns, daily]).fillna(0.0),
+            pd.concat([prev.twr_index, index]).ffill().fillna(1.0),
+        )
+        self._cash_flows = self._merge_flows(self._cash_flows, self._irr_flows(result, len(prev.values)))
+        result.irr = self._solve_irr(result, guesses=self._irr_guesses)
+        return result
+
+    @staticmethod
+    def _irr_flows(result: ReturnsResult, start: int) -> Dict[str, Tuple[List[float], List[float]]]:
+        """Nonzero invested amounts (negative) and their times for rows from start on."""
+        values, flows = result.values.iloc[start:], result.flows.iloc[start:]
+        seconds = np.asarray((values.index - result.values.index[0]).total_seconds(), dtype=float)
+        out = {}
+        for group in values.columns:
+            f = flows[group].to_numpy(dtype=float).copy()
+            if start == 0 and len(f):
+                f[0] = values[group].iloc[0]  # opening value is the first contribution
+            nz = f != 0
+            out[group] = (list(seconds[nz]), list(-f[nz]))
+        return out
+
+    @staticmethod
+    def _merge_flows(old, new):
+        merged = {group: (list(times), list(amounts)) for group, (times, amounts) in old.items()}
+        for group, (times, amounts) in new.items():
+            entry = merged.setdefault(group, ([], []))
+            entry[0].extend(times)
+            entry[1].extend(amounts)
+        return merged
+
+    def _solve_irr(self, result: ReturnsResult, guesses: Optional[Dict[str, Optional[float]]] = None):
+        """IRR per group from the running flows plus the last value, warm-started from the previous solve."""
+        out = {}
+        end = (result.values.index[-1] - result.values.index[0]).total_seconds()
+        for group in result.values.columns:
+            times, amounts = self._cash_flows.get(group, ([], []))
+            t = np.append(times, end)
+            cf = np.append(amounts, result.values[group].iloc[-1])
+            nz = cf != 0
+            if not nz.any():
+                out[group] = None
+                continue
+            years = (t[nz] - t[nz][0]) / (365.0 * 86400)
+            guess = (guesses or {}).get(group)
+            out[group] = xirr(cf[nz], years, guess=guess if guess is not None else 0.1)
+        return out
+
+    def _finalize(self, result: ReturnsResult, shares: pd.DataFrame, prices: pd.DataFrame) -> None:
+        """Keep everything but the last (still replaceable) snapshot as state.
+
+        shares/prices: the one-row frames of the new final snapshot, with prices
+        carried forward.
+        """
+        if len(result.values) < 2 or shares.empty:
+            self._reset()
+            return
+        last = len(result.values) - 1
+        # The last row's flows are provisional: drop them from the running IRR flows
+        for group, (times, amounts) in self._irr_flows(result, last).items():
+            if times:
+                kept_times, kept_amounts = self._cash_flows[group]
+                self._cash_flows[group] = (kept_times[:-len(times)], kept_amounts[:-len(amounts)])
+        self._irr_guesses = dict(result.irr)
+        self._result = ReturnsResult(
+            result.values.iloc[:-1],
+            result.flows.iloc[:-1],
+            result.daily_returns.iloc[:-1],
+            result.twr_index.iloc[:-1],
+        )
+        self._final = result.values.index[-2]
+        self._shares = shares.iloc[0].fillna(0.0)
+        self._prices = prices.iloc[0]
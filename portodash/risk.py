@@ -0,0 +1,301 @@
+"""Risk analytics over daily price history.
+
+Rolling volatility, drawdown, beta against a benchmark ticker and a holdings
+correlation matrix, computed with cumulative-sum NumPy windows instead of
+per-column pandas rolling objects. Results are cached in the local price store
+(`portodash.price_store`) together with the running state needed to extend
+them, keyed on the price window (e.g. period='1y'). When the window slides,
+the returns that leave it are subtracted from the correlation sums and only
+the rows whose trailing windows changed are recomputed, so results always
+match a full `compute_risk_report` over the same prices.
+"""
+from dataclasses import dataclass
+import logging
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import price_store
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+
+@dataclass
+class RiskReport:
+    """Risk metrics for a set of tickers.
+
+    volatility: rolling annualized volatility (dates x tickers)
+    drawdown: decline from the running peak (dates x tickers, <= 0)
+    beta: rolling beta against the benchmark (dates x tickers), empty without one
+    correlation: pairwise correlation of daily returns (tickers x tickers)
+    """
+
+    volatility: pd.DataFrame
+    drawdown: pd.DataFrame
+    beta: pd.DataFrame
+    correlation: pd.DataFrame
+    benchmark: Optional[str] = None
+    window: int = 63
+
+    @property
+    def max_drawdown(self) -> pd.Series:
+        return self.drawdown.min()
+
+    def summary(self) -> pd.DataFrame:
+        """Latest volatility, max drawdown and latest beta per ticker."""
+        out = pd.DataFrame({
+            'volatility': self.volatility.ffill().iloc[-1] if len(self.volatility) else np.nan,
+            'max_drawdown': self.max_drawdown,
+        })
+        if not self.beta.empty:
+            out['beta'] = self.beta.ffill().iloc[-1]
+        out.index.name = 'ticker'
+        return out
+
+
+@dataclass
+class _RiskState:
+    """Running state persisted with a report so it can be extended."""
+
+    report: RiskReport
+    # Prices covered by the report (the window, dates x tickers)
+    prices: pd.DataFrame
+    # Pairwise sums for the correlation matrix (see _pairwise_sums)
+    n: np.ndarray
+    sx: np.ndarray
+    sxx: np.ndarray
+    sxy: np.ndarray
+
+
+def daily_returns(prices: pd.DataFrame) -> pd.DataFrame:
+    """Simple daily returns; NaN where either day has no price."""
+    return prices / prices.shift(1) - 1.0
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing window sum along axis 0 (first window-1 rows are partial)."""
+    c = np.cumsum(values, axis=0)
+    out = c.copy()
+    out[window:] = c[window:] - c[:-window]
+    return out
+
+
+def _rolling_volatility(returns: np.ndarray, window: int) -> np.ndarray:
+    valid = ~np.isnan(returns)
+    x = np.where(valid, returns, 0.0)
+    n = _rolling_sum(valid.astype(float), window)
+    s = _rolling_sum(x, window)
+    s2 = _rolling_sum(x * x, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = (s2 - s * s / n) / (n - 1)
+    var = np.where(n >= max(2, window // 2), np.maximum(var, 0.0), np.nan)
+    return np.sqrt(var * TRADING_DAYS)
+
+
+def _rolling_beta(returns: np.ndarray, bench: np.ndarray, window: int) -> np.ndarray:
+    mask = ~np.isnan(returns) & ~np.isnan(bench)[:, None]
+    x = np.where(mask, returns, 0.0)
+    b = np.where(mask, bench[:, None], 0.0)
+    n = _rolling_sum(mask.astype(float), window)
+    sx, sb = _rolling_sum(x, window), _rolling_sum(b, window)
+    sxb, sbb = _rolling_sum(x * b, window), _rolling_sum(b * b, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (n * sxb - sx * sb) / (n * sbb - sb * sb)
+    return np.where(n >= max(2, window // 2), beta, np.nan)
+
+
+def _pairwise_sums(returns: np.ndarray):
+    """Additive sums for pairwise-complete correlation.
+
+    n[i, j] counts rows where both i and j have returns; sx[i, j] sums x_i over
+    those rows, sxx[i, j] sums x_i**2 and sxy[i, j] sums x_i * x_j. New rows
+    simply add to these, which keeps the correlation matrix incremental.
+    """
+    mask = (~np.isnan(returns)).astype(float)
+    x = np.where(mask > 0, returns, 0.0)
+    return mask.T @ mask, x.T @ mask, (x * x).T @ mask, x.T @ x
+
+
+def _correlation(n, sx, sxx, sxy, tickers) -> pd.DataFrame:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sxy - sx * sx.T
+        var_i = n * sxx - sx * sx
+        corr = cov / np.sqrt(var_i * var_i.T)
+    corr = np.where(n >= 2, np.clip(corr, -1.0, 1.0), np.nan)
+    np.fill_diagonal(corr, 1.0)
+    return pd.DataFrame(corr, index=tickers, columns=tickers)
+
+
+def _compute(prices: pd.DataFrame, benchmark: Optional[str], window: int) -> _RiskState:
+    tickers = list(prices.columns)
+    values = prices.to_numpy(dtype=float)
+    returns = daily_returns(prices).to_numpy(dtype=float)
+
+    vol = _rolling_volatility(returns, window)
+    running_max = np.fmax.accumulate(values, axis=0)
+    drawdown = values / running_max - 1.0
+
+    beta = np.empty((len(prices), 0))
+    if benchmark and benchmark in prices.columns:
+        beta = _rolling_beta(returns, returns[:, tickers.index(benchmark)], window)
+
+    n, sx, sxx, sxy = _pairwise_sums(returns[1:])
+    report = RiskReport(
+        volatility=pd.DataFrame(vol, index=prices.index, columns=tickers),
+        drawdown=pd.DataFrame(drawdown, index=prices.index, columns=tickers),
+        beta=pd.DataFrame(beta, index=prices.index, columns=tickers if beta.shape[1] else []),
+        correlation=_correlation(n, sx, sxx, sxy, tickers),
+        benchmark=benchmark,
+        window=window,
+    )
+    return _RiskState(report, prices, n, sx, sxx, sxy)
+
+
+def _rolling_block(prices: pd.DataFrame, benchmark: Optional[str], window: int):
+    """Volatility and beta rows for prices (the first row has no return)."""
+    returns = daily_returns(prices).to_numpy(dtype=float)
+    vol = _rolling_volatility(returns, window)
+    beta = None
+    if benchmark and benchmark in prices.columns:
+        beta = _rolling_beta(returns, returns[:, list(prices.columns).index(benchmark)], window)
+    return vol, beta
+
+
+def _extend(state: _RiskState, prices: pd.DataFrame) -> _RiskState:
+    """Move the state's window to prices: drop rows before prices' first date, add rows after its last.
+
+    Rolling volatility and beta only depend on their trailing window, so only
+    the new rows and, when the window start moved, the first `window` rows
+    (whose partial windows now begin later) are computed. Drawdown depends on
+    the peak since the window start and is rebuilt with one cumulative max.
+    """
+    report = state.report
+    window, benchmark = report.window, report.benchmark
+    tickers = list(prices.columns)
+    dropped = state.prices.index.get_loc(prices.index[0])
+    pos = prices.index.get_loc(state.prices.index[-1])
+    n_new = len(prices) - pos - 1
+
+    n, sx, sxx, sxy = state.n, state.sx, state.sxx, state.sxy
+    if n_new:
+        tail = prices.iloc[max(0, pos - window):]
+        vol_new, beta_new = _rolling_block(tail, benchmark, window)
+        dn, dsx, dsxx, dsxy = _pairwise_sums(daily_returns(tail).to_numpy(dtype=float)[-n_new:])
+        n, sx, sxx, sxy = n + dn, sx + dsx, sxx + dsxx, sxy + dsxy
+    if dropped:
+        # Returns up to the new first row leave the window (the first row has none)
+        gone = daily_returns(state.prices.iloc[:dropped + 1]).to_numpy(dtype=float)[1:]
+        dn, dsx, dsxx, dsxy = _pairwise_sums(gone)
+        n, sx, sxx, sxy = n - dn, sx - dsx, sxx - dsxx, sxy - dsxy
+
+    vol = report.volatility.to_numpy()[dropped:].copy()
+    beta = report.beta.to_numpy()[dropped:].copy() if not report.beta.empty else None
+    if n_new:
+        vol = np.vstack([vol, vol_new[-n_new:]])
+        if beta is not None:
+            beta = np.vstack([beta, beta_new[-n_new:]])
+    if dropped:
+        head_vol, head_beta = _rolling_block(prices.iloc[:window], benchmark, window)
+        vol[:len(head_vol)] = head_vol
+        if beta is not None:
+            beta[:len(head_beta)] = head_beta
+
+    values = prices.to_numpy(dtype=float)
+    drawdown = values / np.fmax.accumulate(values, axis=0) - 1.0
+    extended = RiskReport(
+        volatility=pd.DataFrame(vol, index=prices.index, columns=tickers),
+        drawdown=pd.DataFrame(drawdown, index=prices.index, columns=tickers),
+        beta=pd.DataFrame(beta, index=prices.index, columns=tickers) if beta is not None else report.beta,
+        correlation=_correlation(n, sx, sxx, sxy, tickers),
+        benchmark=benchmark,
+        window=window,
+    )
+    return _RiskState(extended, prices, n, sx, sxx, sxy)
+
+
+def _can_extend(state: Optional[_RiskState], prices: pd.DataFrame) -> bool:
+    """True when prices continue the state's window: same tickers, a later or equal start, same overlap."""
+    if state is None or not isinstance(getattr(state, 'prices', None), pd.DataFrame):
+        return False
+    old = state.prices
+    if list(old.columns) != list(prices.columns) or old.index[-1] not in prices.index:
+        return False
+    if prices.index[0] not in old.index:
+        return False
+    # Adjusted closes are rewritten after dividends/splits: then start over
+    overlap = prices.loc[prices.index[0]:old.index[-1]].to_numpy(dtype=float)
+    stored = old.loc[prices.index[0]:].to_numpy(dtype=float)
+    return overlap.shape == stored.shape and np.allclose(overlap, stored, equal_nan=True)
+
+
+def _is_current(state: _RiskState, prices: pd.DataFrame) -> bool:
+    """True when the cached state already covers exactly these prices."""
+    old = state.prices
+    return (list(old.columns) == list(prices.columns) and old.index.equals(prices.index)
+            and np.allclose(old.iloc[-1].to_numpy(dtype=float), prices.iloc[-1].to_numpy(dtype=float),
+                            equal_nan=True))
+
+
+def compute_risk_report(prices: pd.DataFrame, benchmark: Optional[str] = None, window: int = 63) -> RiskReport:
+    """Compute a RiskReport from a dates x tickers adjusted close frame."""
+    prices = prices.sort_index()
+    if prices.empty or len(prices) < 2:
+        empty = pd.DataFrame(columns=prices.columns, dtype=float)
+        return RiskReport(empty, empty, pd.DataFrame(), pd.DataFrame(), benchmark, window)
+    return _compute(prices, benchmark, window).report
+
+
+def _state_path(tickers, benchmark, window, period, path):
+    name = f"risk_{price_store.cache_key(tuple(tickers), benchmark, window, period)}.pkl"
+    return os.path.join(price_store.store_dir(path), name)
+
+
+@traced()
+def update_risk(prices: pd.DataFrame, benchmark: Optional[str] = None, window: int = 63,
+                path: Optional[str] = None, period: Optional[str] = None) -> RiskReport:
+    """Return a RiskReport, extending the cached one in the price store when possible.
+
+    period names the price window (e.g. '1y') so differently sized windows
+    over the same tickers keep separate states.
+    """
+    prices = prices.sort_index()
+    if prices.empty or len(prices) < 2:
+        return compute_risk_report(prices, benchmark, window)
+
+    state_file = _state_path(prices.columns, benchmark, window, period, path)
+    state = None
+    if os.path.exists(state_file):
+        try:
+            state = pd.read_pickle(state_file)
+        except Exception:
+            logger.debug('Ignoring unreadable risk cache %s', state_file, exc_info=True)
+
+    if _can_extend(state, prices) and _is_current(state, prices):
+        return state.report
+    if _can_extend(state, prices):
+        state = _extend(state, prices)
+    else:
+        state = _compute(prices, benchmark, window)
+
+    try:
+        pd.to_pickle(state, state_file)
+    except Exception:
+        logger.debug('Failed to write risk cache', exc_info=True)
+    return state.report
+
+
+@traced()
+def get_risk_report(tickers: Iterable[str], benchmark: Optional[str] = None, window: int = 63,
+                    period: str = '1y', path: Optional[str] = None, refresh: bool = True) -> RiskReport:
+    """Load prices from the local store (topping it up when refresh=True) and return risk metrics."""
+    tickers = list(dict.fromkeys(tickers))
+    if benchmark and benchmark not in tickers:
+        tickers.append(benchmark)
+    prices = price_store.get_price_history(tickers, period=period, path=path, refresh=refresh)
+    return update_risk(prices, benchmark=benchmark, window=window, path=path, period=period)
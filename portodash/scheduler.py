@@ -1,14 +1,8 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 from datetime import datetime
-import json
 import logging
 import pytz
 import threading
 
-from .data_fetch import get_current_prices, fetch_and_store_snapshot
-
 logger = logging.getLogger(__name__)
 import os
 import json as _json
@@ -92,6 +86,16 @@ def schedule_daily_snapshot(csv_path, portfolio_path, timezone=None):
     Returns:
         BackgroundScheduler instance (already started)
     """
+    # apscheduler and the yfinance-backed fetchers are only needed once a job is
+    # scheduled, so status checks importing this module stay lightweight
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+    from .data_fetch import get_current_prices, fetch_and_store_snapshot
+    from .distributions import refresh_distributions
+    from .ledger import default_path, load_ledger
+    from .portfolio import load_portfolio
+
     if timezone is None:
         timezone = pytz.timezone('America/Toronto')
 
@@ -100,14 +104,22 @@ def schedule_daily_snapshot(csv_path, portfolio_path, timezone=None):
         _status.set_running(True)
         _write_status_file()
         try:
-            with open(portfolio_path, 'r') as f:
-                cfg = json.load(f)
-            holdings = cfg.get('holdings', [])
-            tickers = [h['ticker'] for h in holdings]
+            portfolio = load_portfolio(portfolio_path)
+            holdings = list(portfolio.holdings)
+            tickers = portfolio.tickers
+            # With a transaction ledger, snapshot the positions held on the snapshot date
+            ledger = load_ledger(default_path(portfolio_path))
+            if ledger is not None:
+                tickers = sorted(set(tickers) | set(ledger.tickers))
 
             # get_current_prices now returns (prices, fetched_at_iso, source)
             prices, fetched_at_iso, source = get_current_prices(tickers, csv_path=csv_path)
-            df = fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=fetched_at_iso)
+            df = fetch_and_store_snapshot(holdings, prices, csv_path, fetched_at_iso=fetched_at_iso,
+                                          ledger=ledger)
+            try:
+                refresh_distributions(tickers)
+            except Exception:
+                logger.exception('Failed to refresh distributions')
 
             # Use the authoritative fetched_at timestamp (if available) for last_run
             try:
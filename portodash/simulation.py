@@ -0,0 +1,176 @@
+"""Monte Carlo projection of portfolio value.
+
+Daily log returns are drawn from a multivariate normal fitted to historical
+prices (Cholesky factor of the covariance matrix) and applied to the current
+buy-and-hold weights from `compute_portfolio_df`. Paths are generated in
+chunks sized to a memory budget, optionally spread across processes, and only
+the portfolio value at the sampled steps is kept to build percentile bands.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import logging
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Bytes allowed per chunk; a chunk holds two (paths x steps x assets) float64 tensors
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Runs with at least this many paths use worker processes when processes > 1
+PARALLEL_MIN_PATHS = 50_000
+
+# Paths drawn from one seed; chunks hold whole blocks, so results do not depend on the chunk size
+PATH_BLOCK = 256
+
+
+@dataclass
+class ProjectionBands:
+    """Percentile bands of projected portfolio value.
+
+    bands: DataFrame indexed by trading days ahead with one column per
+        percentile (e.g. 'p5', 'p50'); row 0 is the starting value
+    """
+
+    bands: pd.DataFrame
+    start_value: float
+    n_paths: int
+    horizon_days: int
+
+
+def portfolio_weights(df: pd.DataFrame) -> pd.Series:
+    """Current weight per ticker from a compute_portfolio_df frame (TOTAL row dropped)."""
+    if df is None or df.empty:
+        return pd.Series(dtype=float)
+    d = df[df['ticker'] != 'TOTAL']
+    values = d.groupby('ticker')['current_value'].sum()
+    total = values.sum()
+    return values / total if total > 0 else values * 0.0
+
+
+def estimate_parameters(prices: pd.DataFrame, tickers: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean vector and covariance matrix of daily log returns for tickers.
+
+    Days a ticker has no price are left out of its estimates rather than
+    counted as zero returns: each mean uses the ticker's own days and each
+    covariance the days both tickers trade (pairwise-complete), so holidays
+    on one exchange and late listings do not shrink volatility or correlation.
+    """
+    log_returns = np.log(prices[list(tickers)] / prices[list(tickers)].shift(1)).iloc[1:]
+    log_returns = log_returns.dropna(how='all')
+    mu = log_returns.mean().fillna(0.0).to_numpy(dtype=float)
+    # Pairs that never trade on the same day are treated as uncorrelated
+    cov = np.nan_to_num(np.atleast_2d(log_returns.cov().to_numpy(dtype=float)))
+    return mu, cov
+
+
+def _cholesky(cov: np.ndarray) -> np.ndarray:
+    """Cholesky factor, nudging the diagonal if the matrix is only semi-definite.
+
+    A pairwise-complete estimate can be slightly indefinite; it is replaced by
+    the nearest positive semi-definite matrix (negative eigenvalues clipped).
+    """
+    scale = float(np.mean(np.diag(cov))) or 1e-8
+    for attempt in range(2):
+        jitter = 0.0
+        for _ in range(6):
+            try:
+                return np.linalg.cholesky(cov + jitter * np.eye(len(cov)))
+            except np.linalg.LinAlgError:
+                jitter = scale * 1e-10 if jitter == 0.0 else jitter * 100
+        if attempt == 0:
+            values, vectors = np.linalg.eigh((cov + cov.T) / 2)
+            cov = (vectors * np.clip(values, 0.0, None)) @ vectors.T
+    raise np.linalg.LinAlgError('Covariance matrix is not positive semi-definite')
+
+
+def _simulate_chunk(args) -> np.ndarray:
+    """Simulate one chunk of paths; returns float32 (paths x sampled steps) values.
+
+    Daily log returns are i.i.d. normal, so the sum over the days between two
+    sampled steps is itself normal with variance scaled by the gap. Drawing
+    those gap increments directly gives the same distribution at the sampled
+    steps as simulating every day, with far fewer draws.
+
+    The chunk is made of PATH_BLOCK-path blocks, each drawn from its own seed.
+    """
+    n_paths, mu, chol, weights, steps, seeds = args
+    gaps = np.diff(np.concatenate([[0], steps])).astype(float)
+    z = np.empty((n_paths, len(steps), len(mu)))
+    for i, seed in enumerate(seeds):
+        np.random.default_rng(seed).standard_normal(out=z[i * PATH_BLOCK:(i + 1) * PATH_BLOCK])
+    z *= np.sqrt(gaps)[None, :, None]
+    np.cumsum(z, axis=1, out=z)
+    log_growth = z @ chol.T
+    log_growth += steps[:, None] * mu
+    np.exp(log_growth, out=log_growth)
+    return (log_growth @ weights).astype(np.float32)
+
+
+@traced()
+def simulate_paths(mu: np.ndarray, cov: np.ndarray, weights: np.ndarray, horizon_days: int = 252,
+                   n_paths: int = 10_000, n_points: int = 64, seed: Optional[int] = None,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES, processes: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (steps, growth) where growth[i, j] is path i's value multiple at steps[j].
+
+    Every block of PATH_BLOCK paths draws from its own seed spawned from
+    `seed`, and chunks are whole blocks, so results are the same for any
+    chunk_bytes and whether chunks run serially or in worker processes. A
+    chunk holds at least one block, even if that exceeds chunk_bytes.
+    """
+    mu = np.asarray(mu, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    chol = _cholesky(np.atleast_2d(np.asarray(cov, dtype=float)))
+    steps = np.unique(np.linspace(1, horizon_days, min(n_points, horizon_days)).round().astype(int))
+
+    blocks_per_chunk = max(1, int(chunk_bytes // (2 * len(steps) * len(mu) * 8)) // PATH_BLOCK)
+    chunk = blocks_per_chunk * PATH_BLOCK
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_paths // PATH_BLOCK))
+    jobs = [(min(chunk, n_paths - start), mu, chol, weights, steps,
+             seeds[start // PATH_BLOCK:start // PATH_BLOCK + blocks_per_chunk])
+            for start in range(0, n_paths, chunk)]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes > 1 and n_paths >= PARALLEL_MIN_PATHS and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(jobs))) as pool:
+            parts = list(pool.map(_simulate_chunk, jobs))
+    else:
+        parts = [_simulate_chunk(job) for job in jobs]
+    return steps, np.concatenate(parts, axis=0)
+
+
+@traced()
+def project_portfolio(df: pd.DataFrame, prices: pd.DataFrame, horizon_days: int = 252,
+                      n_paths: int = 10_000, percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                      n_points: int = 64, seed: Optional[int] = None,
+                      processes: Optional[int] = None) -> Optional[ProjectionBands]:
+    """Project a compute_portfolio_df portfolio forward using historical prices.
+
+    Tickers without price history are left out and the remaining weights are
+    rescaled. Returns None when nothing can be simulated.
+    """
+    weights = portfolio_weights(df)
+    tickers = [t for t in weights.index if t in prices.columns and prices[t].notna().sum() > 2]
+    if not tickers or weights[tickers].sum() <= 0:
+        return None
+    w = weights[tickers] / weights[tickers].sum()
+    start_value = float(df.loc[df['ticker'] != 'TOTAL', 'current_value'].sum())
+
+    mu, cov = estimate_parameters(prices, tickers)
+    steps, growth = simulate_paths(mu, cov, w.to_numpy(), horizon_days=horizon_days, n_paths=n_paths,
+                                   n_points=n_points, seed=seed, processes=processes)
+    pct = np.percentile(growth, percentiles, axis=0) * start_value
+    bands = pd.DataFrame(pct.T, index=steps, columns=[f'p{p:g}' for p in percentiles])
+    start_row = pd.DataFrame([[start_value] * len(percentiles)], index=[0], columns=bands.columns)
+    bands = pd.concat([start_row, bands])
+    bands.index.name = 'days_ahead'
+    return ProjectionBands(bands, start_value, n_paths, horizon_days)
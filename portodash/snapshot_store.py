@@ -0,0 +1,249 @@
+"""Compact columnar storage for snapshot history.
+
+`historical.csv` repeats the account name, full ISO timestamp and
+`portfolio_value` on every row. The compact store keeps the same data in a
+directory (default `historical.store/` next to the CSV):
+
+- dates.parquet: one row per snapshot timestamp with `portfolio_value`
+- rows.parquet: per-holding rows referencing the date by position, with
+  account and ticker dictionary-encoded and shares / cost basis / price as
+  scaled integers when every value round-trips exactly at that scale
+  (float32 when the values are exactly representable, as yfinance's
+  upcast float32 prices are, float64 otherwise)
+
+`current_value` and `allocation_pct` are derived on load, so read_compact
+returns the historical.csv columns unchanged.
+
+Retention tiers: with `daily_years` set, snapshots older than that keep only
+the last snapshot of each month.
+
+The store is a snapshot backend like historical.db: `history_path()` picks
+`historical.store/` over historical.csv when it exists, and
+fetch_and_store_snapshot writes new snapshots into it (under the same
+advisory lock as the CSV), applying the retention tier recorded in its
+meta.json on every write. `scripts/compact_history.py` converts an existing
+CSV.
+"""
+from datetime import timedelta
+import json
+import logging
+import os
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .locking import LOCK_TIMEOUT, file_lock
+from .sqlite_store import is_sqlite_store, read_rows
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = ['date', 'account', 'ticker', 'shares', 'cost_basis', 'price',
+               'current_value', 'portfolio_value', 'allocation_pct']
+ROWS_FILE = 'rows.parquet'
+DATES_FILE = 'dates.parquet'
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+# Candidate decimal scales for fixed-point columns, smallest first
+_SCALES = (1, 100, 10_000, 1_000_000)
+
+
+def default_store_path(csv_path: str) -> str:
+    """historical.store/ next to historical.csv."""
+    root, _ = os.path.splitext(os.path.abspath(csv_path))
+    return root + '.store'
+
+
+def is_compact_store(path: str) -> bool:
+    return bool(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+
+def _store_meta(path: str) -> dict:
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def encode_numbers(values: np.ndarray) -> Tuple[np.ndarray, dict]:
+    """Pick the most compact exact representation for a float column.
+
+    Returns (encoded array, encoding) where encoding is {'scale': n} for
+    fixed-point integers or {'float': 32|64}.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if len(finite) == len(values):
+        for scale in _SCALES:
+            scaled = np.round(values * scale)
+            if np.array_equal(scaled / scale, values):
+                peak = np.abs(scaled).max() if len(scaled) else 0
+                dtype = np.int32 if peak < 2 ** 31 else np.int64
+                return scaled.astype(dtype), {'scale': scale}
+    as32 = values.astype(np.float32)
+    if np.array_equal(as32.astype(np.float64), values, equal_nan=True):
+        return as32, {'float': 32}
+    return values, {'float': 64}
+
+
+def decode_numbers(values: np.ndarray, encoding: dict) -> np.ndarray:
+    if 'scale' in encoding:
+        return values.astype(np.float64) / encoding['scale']
+    return values.astype(np.float64)
+
+
+def apply_retention(df: pd.DataFrame, daily_years: Optional[float], now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Keep every snapshot of the last `daily_years`, month-end snapshots before that."""
+    if not daily_years or df.empty:
+        return df
+    dates = _parse_dates(df['date'])
+    now = now if now is not None else pd.Timestamp.now(tz='UTC')
+    cutoff = now - timedelta(days=365.25 * daily_years)
+    old = dates < cutoff
+    if not old.any():
+        return df
+    months = dates[old].dt.tz_localize(None).dt.to_period('M')
+    month_end = dates[old].groupby(months).transform('max')
+    keep = ~old
+    keep[old] = (dates[old] == month_end).values
+    return df[keep.values].reset_index(drop=True)
+
+
+def _parse_dates(dates: pd.Series) -> pd.Series:
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='ISO8601', utc=True)
+    elif dates.dt.tz is None:
+        dates = dates.dt.tz_localize('UTC')
+    return dates.dt.tz_convert('UTC')
+
+
+@traced()
+def write_compact(df: pd.DataFrame, path: str, daily_years: Optional[float] = None) -> dict:
+    """Write historical.csv-style rows to a compact store; returns the metadata."""
+    df = apply_retention(df, daily_years)
+    dates = _parse_dates(df['date'])
+    order = np.argsort(dates.values, kind='stable')
+    df = df.iloc[order].reset_index(drop=True)
+    dates = dates.iloc[order].reset_index(drop=True)
+
+    unique_dates, date_id = np.unique(dates.values, return_inverse=True)
+    if 'portfolio_value' in df:
+        totals = df.groupby(date_id)['portfolio_value'].first().to_numpy(dtype=np.float64)
+    else:
+        totals = (df['shares'] * df['price']).groupby(date_id).sum().to_numpy(dtype=np.float64)
+
+    meta = {'version': FORMAT_VERSION, 'rows': int(len(df)), 'dates': int(len(unique_dates)),
+            'daily_years': daily_years, 'encodings': {}}
+    rows = pd.DataFrame({
+        'date_id': date_id.astype(np.int32 if len(unique_dates) < 2 ** 31 else np.int64),
+        'account': pd.Categorical(df['account'].astype(str)),
+        'ticker': pd.Categorical(df['ticker'].astype(str)),
+    })
+    for column in ('shares', 'cost_basis', 'price'):
+        encoded, encoding = encode_numbers(df[column].to_numpy(dtype=np.float64))
+        rows[column] = encoded
+        meta['encodings'][column] = encoding
+
+    os.makedirs(path, exist_ok=True)
+    date_frame = pd.DataFrame({'date': pd.DatetimeIndex(unique_dates).tz_localize('UTC'),
+                               'portfolio_value': totals})
+    for name, frame in ((ROWS_FILE, rows), (DATES_FILE, date_frame)):
+        target = os.path.join(path, name)
+        frame.to_parquet(target + '.tmp', index=False, compression='zstd')
+        os.replace(target + '.tmp', target)
+    # meta.json is written last so a half-written store is never picked up
+    with open(os.path.join(path, META_FILE) + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(os.path.join(path, META_FILE) + '.tmp', os.path.join(path, META_FILE))
+    return meta
+
+
+def _decode_rows(rows: pd.DataFrame, dates: pd.DataFrame, meta: dict, columns=None) -> pd.DataFrame:
+    """historical.csv columns for encoded rows, given the store's dates and metadata."""
+    date_id = rows['date_id'].to_numpy()
+    out = pd.DataFrame({
+        'date': pd.DatetimeIndex(dates['date']).take(date_id),
+        'account': rows['account'].astype(str).to_numpy(),
+        'ticker': rows['ticker'].astype(str).to_numpy(),
+    })
+    for column in ('shares', 'cost_basis', 'price'):
+        out[column] = decode_numbers(rows[column].to_numpy(), meta['encodings'][column])
+    out['current_value'] = out['shares'] * out['price']
+    out['portfolio_value'] = dates['portfolio_value'].to_numpy()[date_id]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['allocation_pct'] = np.where(out['portfolio_value'] > 0, out['current_value'] / out['portfolio_value'], 0.0)
+    if columns is not None:
+        out = out[list(columns)]
+    return out
+
+
+@traced()
+def read_compact(path: str, columns=None) -> pd.DataFrame:
+    """Read a compact store back into historical.csv columns (dates as UTC datetimes)."""
+    meta = _store_meta(path)
+    rows = pd.read_parquet(os.path.join(path, ROWS_FILE))
+    dates = pd.read_parquet(os.path.join(path, DATES_FILE))
+    return _decode_rows(rows, dates, meta, columns=columns)
+
+
+def iter_compact(path: str, chunksize: int, columns=None) -> Iterator[pd.DataFrame]:
+    """Yield a compact store's rows in date order, `chunksize` rows at a time, as read_compact would return them.
+
+    Only dates.parquet (one row per snapshot) is read whole; rows.parquet
+    is streamed in record batches.
+    """
+    import pyarrow.parquet as pq
+
+    meta = _store_meta(path)
+    dates = pd.read_parquet(os.path.join(path, DATES_FILE))
+    rows_file = pq.ParquetFile(os.path.join(path, ROWS_FILE))
+    for batch in rows_file.iter_batches(batch_size=chunksize):
+        yield _decode_rows(batch.to_pandas(), dates, meta, columns=columns)
+
+
+@traced()
+def replace_compact_snapshots(path: str, df: pd.DataFrame, timeout: float = LOCK_TIMEOUT) -> int:
+    """Write snapshot rows to a compact store, replacing any snapshot already stored for the same days.
+
+    The store is rewritten under the advisory lock of `path` with the
+    retention tier it was created with; returns the rows written. Raises
+    LockTimeout if another writer holds the lock for longer than `timeout`.
+    """
+    if df.empty:
+        return 0
+    new = df.copy()
+    new['date'] = _parse_dates(new['date'])
+    with file_lock(path, timeout=timeout):
+        existing = read_compact(path)
+        existing = existing[~existing['date'].dt.normalize().isin(new['date'].dt.normalize())]
+        combined = pd.concat([existing, new[existing.columns]], ignore_index=True)
+        write_compact(combined, path, daily_years=_store_meta(path).get('daily_years'))
+    return len(new)
+
+
+def history_path(base_dir: str) -> str:
+    """Snapshot history used by the app and scheduler: historical.db when it
+    exists (see sqlite_store), then historical.store/ (a compact store),
+    historical.csv otherwise."""
+    db_path = os.path.join(base_dir, 'historical.db')
+    if os.path.exists(db_path):
+        return db_path
+    store = os.path.join(base_dir, 'historical.store')
+    return store if is_compact_store(store) else os.path.join(base_dir, 'historical.csv')
+
+
+def read_history(path: str, columns=None) -> pd.DataFrame:
+    """Read snapshot rows from historical.csv, a compact store directory or a SQLite store."""
+    if is_compact_store(path):
+        return read_compact(path, columns=columns)
+    if is_sqlite_store(path):
+        return read_rows(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def store_size(path: str) -> int:
+    """Bytes used by a file or every file in a store directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
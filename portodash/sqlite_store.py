@@ -0,0 +1,284 @@
+"""SQLite snapshot store, an alternative to historical.csv.
+
+A `historical.db` (any path ending in .db, .sqlite or .sqlite3) can be used
+wherever historical.csv is: fetch_and_store_snapshot, get_cached_prices,
+load_snapshot_cube and the exports all accept it. `history_path()` in
+snapshot_store picks historical.db over historical.csv when it exists, so the
+app and the scheduler switch together; `scripts/import_history_sqlite.py`
+imports an existing CSV.
+
+Schema (normalized on date, account, ticker):
+
+- snapshots: one row per day (`day` is unique) with the snapshot time in UTC
+  microseconds and `portfolio_value`
+- accounts, tickers: names stored once; tickers carry their currency
+- positions: (snapshot_id, account_id, ticker_id) primary key, shares,
+  cost basis and price
+
+Indexes cover the queries the app runs:
+
+- snapshots(taken_at, id): the window scan behind latest_prices and range reads
+- positions(ticker_id, snapshot_id, price, shares): range reads for selected
+  tickers (the ticker-filtered performance chart) walk only those tickers'
+  positions
+- snapshots(day) UNIQUE: same-day replace
+
+The database runs in WAL mode, so the scheduler can write while the
+dashboard reads. Writers wait up to `timeout` seconds for each other and
+raise locking.LockTimeout after that. `current_value` and `allocation_pct`
+are derived on read.
+"""
+from contextlib import closing
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .locking import LOCK_TIMEOUT, LockTimeout
+from .tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tickers (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL UNIQUE,
+    currency TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL UNIQUE,
+    taken_at INTEGER NOT NULL,
+    portfolio_value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_taken_at ON snapshots (taken_at, id);
+CREATE TABLE IF NOT EXISTS positions (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    account_id INTEGER NOT NULL REFERENCES accounts (id),
+    ticker_id INTEGER NOT NULL REFERENCES tickers (id),
+    shares REAL NOT NULL,
+    cost_basis REAL NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (snapshot_id, account_id, ticker_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS positions_by_ticker ON positions (ticker_id, snapshot_id, price, shares);
+"""
+
+# Range reads walk snapshots by date (CROSS JOIN fixes that join order) and
+# fetch each snapshot's positions by primary key prefix
+_ROWS_QUERY = """
+SELECT s.taken_at, a.name AS account, t.symbol AS ticker, p.shares, p.cost_basis, p.price, s.portfolio_value
+FROM snapshots s
+CROSS JOIN positions p ON p.snapshot_id = s.id
+JOIN accounts a ON a.id = p.account_id
+JOIN tickers t ON t.id = p.ticker_id
+WHERE s.taken_at >= ? AND s.taken_at < ?{filters}
+ORDER BY s.taken_at, a.name, t.symbol
+"""
+
+# With a ticker filter, reads start from those tickers' entries in
+# positions_by_ticker instead of every position of every snapshot in range
+_TICKER_ROWS_QUERY = """
+SELECT s.taken_at, a.name AS account, t.symbol AS ticker, p.shares, p.cost_basis, p.price, s.portfolio_value
+FROM tickers t
+CROSS JOIN positions p ON p.ticker_id = t.id
+JOIN snapshots s ON s.id = p.snapshot_id
+JOIN accounts a ON a.id = p.account_id
+WHERE s.taken_at >= ? AND s.taken_at < ?{filters}
+ORDER BY s.taken_at, a.name, t.symbol
+"""
+
+# SQLite returns the bare columns of the row holding MAX(taken_at) in each group;
+# CROSS JOIN pins the window scan on snapshots_taken_at as the outer loop
+_LATEST_PRICES_QUERY = """
+SELECT t.symbol, p.price, MAX(s.taken_at)
+FROM snapshots s
+CROSS JOIN positions p ON p.snapshot_id = s.id
+JOIN tickers t ON t.id = p.ticker_id
+WHERE s.taken_at >= ?{filters}
+GROUP BY t.id
+"""
+
+
+def is_sqlite_store(path: Optional[str]) -> bool:
+    return bool(path) and str(path).lower().endswith(SQLITE_SUFFIXES)
+
+
+def connect(path: str, timeout: float = LOCK_TIMEOUT) -> sqlite3.Connection:
+    """Open (creating if needed) a snapshot database in WAL mode."""
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        conn.executescript(_SCHEMA)
+        conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+    return conn
+
+
+def _micros(value) -> int:
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+    return int(ts.value // 1000)
+
+
+def _bounds(start=None, end=None) -> Tuple[int, int]:
+    return (_micros(start) if start is not None else -2 ** 63,
+            _micros(end) if end is not None else 2 ** 63 - 1)
+
+
+def _in_clause(column: str, values) -> Tuple[str, list]:
+    values = list(values)
+    return f" AND {column} IN ({','.join('?' * len(values))})", values
+
+
+def _ids(conn, table: str, column: str, values: Dict[str, tuple]) -> Dict[str, int]:
+    """Insert missing names (with extra column values) and return name -> id."""
+    extra = {'accounts': '', 'tickers': ', currency'}[table]
+    placeholders = ', ?' if extra else ''
+    conn.executemany(f'INSERT OR IGNORE INTO {table} ({column}{extra}) VALUES (?{placeholders})',
+                     [(name, *rest) for name, rest in values.items()])
+    names = list(values)
+    out = {}
+    for i in range(0, len(names), 500):
+        chunk = names[i:i + 500]
+        rows = conn.execute(f"SELECT {column}, id FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk)
+        out.update(rows.fetchall())
+    return out
+
+
+def _write_snapshots(conn, df: pd.DataFrame) -> int:
+    """Replace the days present in df (historical.csv columns); returns snapshots written."""
+    from .performance import is_usd_ticker
+
+    dates = pd.to_datetime(df['date'], format='ISO8601', utc=True)
+    df = df.assign(date=dates, day=dates.dt.strftime('%Y-%m-%d'))
+    # Only the latest snapshot of each day is kept, as with historical.csv
+    df = df[df['date'] == df.groupby('day')['date'].transform('max')]
+    df = df.assign(cost=df['shares'] * df['cost_basis'])
+    grouped = df.groupby(['day', 'account', 'ticker'], sort=False).agg(
+        date=('date', 'first'), shares=('shares', 'sum'), cost=('cost', 'sum'), price=('price', 'last'),
+        cost_basis=('cost_basis', 'first')).reset_index()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grouped['cost_basis'] = np.where(grouped['shares'] != 0, grouped['cost'] / grouped['shares'], grouped['cost_basis'])
+    totals = (grouped['shares'] * grouped['price']).groupby(grouped['day']).sum()
+
+    account_ids = _ids(conn, 'accounts', 'name', {str(a): () for a in grouped['account'].unique()})
+    ticker_ids = _ids(conn, 'tickers', 'symbol',
+                      {str(t): ('USD' if is_usd_ticker(t) else 'CAD',) for t in grouped['ticker'].unique()})
+    days = list(totals.index)
+    for i in range(0, len(days), 500):
+        chunk = days[i:i + 500]
+        # positions go with their snapshot (ON DELETE CASCADE)
+        conn.execute(f"DELETE FROM snapshots WHERE day IN ({','.join('?' * len(chunk))})", chunk)
+    first = grouped.groupby('day')['date'].first()
+    conn.executemany('INSERT INTO snapshots (day, taken_at, portfolio_value) VALUES (?, ?, ?)',
+                     [(day, _micros(first[day]), float(total)) for day, total in totals.items()])
+    snapshot_ids = dict(conn.execute('SELECT day, id FROM snapshots WHERE day >= ? AND day <= ?', (min(days), max(days))))
+    conn.executemany(
+        'INSERT INTO positions (snapshot_id, account_id, ticker_id, shares, cost_basis, price) VALUES (?, ?, ?, ?, ?, ?)',
+        zip(grouped['day'].map(snapshot_ids).tolist(), grouped['account'].astype(str).map(account_ids).tolist(),
+            grouped['ticker'].astype(str).map(ticker_ids).tolist(), grouped['shares'].astype(float).tolist(),
+            grouped['cost_basis'].astype(float).tolist(), grouped['price'].astype(float).tolist()))
+    return len(days)
+
+
+@traced()
+def replace_snapshots(path: str, df: pd.DataFrame, timeout: float = LOCK_TIMEOUT) -> int:
+    """Write snapshot rows, replacing any snapshot already stored for the same days.
+
+    Runs in one IMMEDIATE transaction; raises LockTimeout if another writer
+    holds the database for longer than `timeout` seconds.
+    """
+    if df.empty:
+        return 0
+    try:
+        with closing(connect(path, timeout=timeout)) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                written = _write_snapshots(conn, df)
+                conn.execute('COMMIT')
+                # Keeps planner statistics current so range queries pick the date or ticker index
+                conn.execute('PRAGMA optimize')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+    except sqlite3.OperationalError as e:
+        if 'locked' in str(e) or 'busy' in str(e):
+            raise LockTimeout(f'Timed out after {timeout:.0f}s waiting for {path}: {e}') from e
+        raise
+    # WAL commits do not always touch the main file; readers key caches on its mtime
+    os.utime(path)
+    return written
+
+
+@traced()
+def import_csv(csv_path: str, db_path: str) -> int:
+    """Load historical.csv into a snapshot database; returns the snapshots written."""
+    return replace_snapshots(db_path, pd.read_csv(csv_path))
+
+
+def _rows(conn, start=None, end=None, accounts: Optional[Iterable[str]] = None,
+          tickers: Optional[Iterable[str]] = None, chunksize: Optional[int] = None):
+    filters, params = '', list(_bounds(start, end))
+    for column, values in (('a.name', accounts), ('t.symbol', tickers)):
+        if values is not None:
+            clause, extra = _in_clause(column, values)
+            filters += clause
+            params += extra
+    query = _TICKER_ROWS_QUERY if tickers is not None else _ROWS_QUERY
+    return pd.read_sql_query(query.format(filters=filters), conn, params=params, chunksize=chunksize)
+
+
+def _to_history_columns(rows: pd.DataFrame, columns=None) -> pd.DataFrame:
+    out = rows.rename(columns={'taken_at': 'date'})
+    out['date'] = pd.to_datetime(out['date'].astype('int64'), unit='us', utc=True)
+    out.insert(6, 'current_value', out['shares'] * out['price'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['allocation_pct'] = np.where(out['portfolio_value'] > 0, out['current_value'] / out['portfolio_value'], 0.0)
+    return out[list(columns)] if columns is not None else out
+
+
+@traced()
+def read_rows(path: str, start=None, end=None, accounts: Optional[Iterable[str]] = None,
+              tickers: Optional[Iterable[str]] = None, columns=None) -> pd.DataFrame:
+    """Snapshot rows in [start, end) in historical.csv columns (dates as UTC datetimes)."""
+    with closing(connect(path)) as conn:
+        return _to_history_columns(_rows(conn, start, end, accounts, tickers), columns)
+
+
+def iter_rows(path: str, chunksize: int, **filters):
+    """read_rows in chunks of `chunksize` rows."""
+    with closing(connect(path)) as conn:
+        for chunk in _rows(conn, chunksize=chunksize, **filters):
+            yield _to_history_columns(chunk)
+
+
+@traced()
+def latest_prices(path: str, tickers: Iterable[str], since) -> Tuple[dict, dict]:
+    """Latest stored price and its ISO timestamp per ticker, from snapshots taken at or after `since`.
+
+    Same shape as cache.get_cached_prices: None for tickers without a recent price.
+    """
+    tickers = list(tickers)
+    prices, times = {t: None for t in tickers}, {t: None for t in tickers}
+    if not tickers:
+        return prices, times
+    clause, params = _in_clause('t.symbol', tickers)
+    query = _LATEST_PRICES_QUERY.format(filters=clause)
+    with closing(connect(path)) as conn:
+        for symbol, price, taken_at in conn.execute(query, [_micros(since)] + params):
+            prices[symbol] = float(price)
+            times[symbol] = pd.Timestamp(taken_at, unit='us', tz='UTC').isoformat()
+    return prices, times
@@ -1,7 +1,20 @@
-"""PortoDash theme utilities for modern fintech styling."""
+"""PortoDash theme utilities for modern fintech styling.
+
+The stylesheet is compiled once per process: the base, typography and
+accessibility blocks are minified and joined into a single <style> element
+tagged with a content hash. Streamlit resends an unchanged element on every
+rerun unless its message is at least `global.minCachedMessageSize` bytes
+(lowered in .streamlit/config.toml so the stylesheet qualifies); a browser
+that already holds the stylesheet then receives only its hash, and any CSS
+change yields a new hash. Metric cards are filled from precompiled templates
+and memoized per value.
+"""
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
+import re
 from typing import Dict, Optional, Union
 
 import streamlit as st
@@ -569,22 +582,75 @@ def _accessibility_css() -> str:
     """
 
 
+_CSS_SOURCES = {
+    "base": _base_css,
+    "typography": _typography_css,
+    "accessibility": _accessibility_css,
+}
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_STRING = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""")
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON = re.compile(r":\s+")
+
+
+def minify_css(css: str) -> str:
+    """Strip <style> tags, comments and insignificant whitespace (quoted strings are kept)."""
+
+    css = _CSS_COMMENT.sub("", css.replace("<style>", "").replace("</style>", ""))
+    parts = _CSS_STRING.split(css)
+    # Even parts are outside quotes
+    for i in range(0, len(parts), 2):
+        part = _CSS_SPACE.sub(" ", parts[i])
+        part = _CSS_PUNCTUATION.sub(r"\1", part)
+        parts[i] = _CSS_COLON.sub(":", part)
+    return "".join(parts).replace(";}", "}").strip()
+
+
+@lru_cache(maxsize=None)
+def compiled_css(*parts: str) -> str:
+    """Minified CSS for the given blocks (all by default), compiled once per process."""
+
+    return "".join(minify_css(_CSS_SOURCES[part]()) for part in parts or _CSS_SOURCES)
+
+
+@lru_cache(maxsize=None)
+def css_version(*parts: str) -> str:
+    """Short content hash of compiled_css(*parts)."""
+
+    return hashlib.sha1(compiled_css(*parts).encode()).hexdigest()[:12]
+
+
+@lru_cache(maxsize=None)
+def style_tag(*parts: str) -> str:
+    """The compiled CSS as a <style> element carrying its content hash."""
+
+    return f'<style data-pd-css="{css_version(*parts)}">{compiled_css(*parts)}</style>'
+
+
+def inject_theme_css() -> None:
+    """Inject the whole theme (base, typography, accessibility) as one stylesheet."""
+
+    st.markdown(style_tag(), unsafe_allow_html=True)
+
+
 def inject_modern_fintech_css() -> None:
     """Inject the modern fintech base CSS into Streamlit."""
 
-    st.markdown(_base_css(), unsafe_allow_html=True)
+    st.markdown(style_tag("base"), unsafe_allow_html=True)
 
 
 def inject_typography_css() -> None:
     """Inject typography-specific CSS into Streamlit."""
 
-    st.markdown(_typography_css(), unsafe_allow_html=True)
+    st.markdown(style_tag("typography"), unsafe_allow_html=True)
 
 
 def inject_accessibility_css() -> None:
     """Inject WCAG 2.1 Level AA accessibility CSS into Streamlit."""
 
-    st.markdown(_accessibility_css(), unsafe_allow_html=True)
+    st.markdown(style_tag("accessibility"), unsafe_allow_html=True)
 
 
 _SECTION_LABELS: Dict[str, str] = {
@@ -635,13 +701,25 @@ def format_metric(value: Number) -> str:
     return f"${value:,.0f}"
 
 
+@lru_cache(maxsize=None)
+def _percent_format(precision: int, include_sign: bool):
+    return (f"{{:+.{precision}f}}%" if include_sign else f"{{:.{precision}f}}%").format
+
+
 def format_percentage(value: Number, precision: int = 1, include_sign: bool = True) -> str:
     """Format a float as a percentage string."""
 
-    fmt = f"{{:+.{precision}f}}%" if include_sign else f"{{:.{precision}f}}%"
-    return fmt.format(value)
+    return _percent_format(precision, include_sign)(value)
 
 
+# Metric card templates, bound once
+_CARD = "<div class='metric-card'><div class='metric-label'>{}</div><div class='metric-value'>{}</div>{}{}</div>".format
+_CARD_DELTA = "<div class='metric-delta {}'>{}{}</div>".format
+_CARD_DELTA_LABEL = "<span class='metric-delta-label'>{}</span>".format
+_CARD_HELP = "<div class='metric-help'>{}</div>".format
+
+
+@lru_cache(maxsize=512)
 def render_metric_card(
     label: str,
     value: Union[str, Number],
@@ -654,7 +732,7 @@ def render_metric_card(
     value_is_currency: bool = True,
     value_precision: int = 0,
 ) -> str:
-    """Return HTML for a stylized metric card."""
+    """Return HTML for a stylized metric card (memoized: reruns with unchanged values reuse it)."""
 
     if isinstance(value, (int, float)):
         if value_is_currency:
@@ -672,19 +750,9 @@ def render_metric_card(
             else format_metric(delta)
         )
         tone = "positive" if delta > 0 else "negative" if delta < 0 else "neutral"
-        label_html = f"<span class='metric-delta-label'>{delta_label}</span>" if delta_label else ""
-        delta_html = f"<div class='metric-delta {tone}'>{delta_value}{label_html}</div>"
-
-    help_html = f"<div class='metric-help'>{help_text}</div>" if help_text else ""
-
-    return (
-        "<div class='metric-card'>"
-        f"<div class='metric-label'>{label}</div>"
-        f"<div class='metric-value'>{value_str}</div>"
-        f"{delta_html}"
-        f"{help_html}"
-        "</div>"
-    )
+        delta_html = _CARD_DELTA(tone, delta_value, _CARD_DELTA_LABEL(delta_label) if delta_label else "")
+
+    return _CARD(label, value_str, delta_html, _CARD_HELP(help_text) if help_text else "")
 
 
 def render_metric_grid(*cards: str) -> str:
@@ -0,0 +1,257 @@
+"""Lightweight spans for timing dashboard stages and library calls.
+
+Usage:
+
+    from portodash import tracing
+
+    with tracing.span('fx.lookup', currencies=3):
+        ...
+
+    @tracing.traced()
+    def compute_portfolio_df(...):
+        ...
+
+Tracing is off by default. PORTODASH_TRACE=1 (or `enable()`) turns it on
+for the whole process; `collect(enabled=...)` or `set_enabled()` override
+that default for the current thread only, so one Streamlit session turning
+its performance panel on or off does not affect the others. While off,
+`span()` hands back one shared no-op object and `traced` functions go
+straight to the wrapped call, so instrumented code costs a flag check.
+
+Finished spans go to the innermost active `collect()` recorder on the
+current thread (Streamlit runs each session's script in its own thread), or
+to a bounded process-wide buffer otherwise. `to_chrome_trace()` turns spans
+into Chrome trace-event JSON for chrome://tracing or Perfetto.
+"""
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import functools
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+_enabled = os.environ.get('PORTODASH_TRACE', '').lower() in ('1', 'true', 'yes')
+
+# Spans recorded outside any collect() block (most recent only)
+GLOBAL_BUFFER_SIZE = 10_000
+_global_spans = deque(maxlen=GLOBAL_BUFFER_SIZE)
+_global_lock = threading.Lock()
+
+
+class _ThreadState(threading.local):
+    def __init__(self):
+        # None follows the process-wide default
+        self.enabled: Optional[bool] = None
+        self.depth = 0
+        self.recorders: List[List['Span']] = []
+
+
+_local = _ThreadState()
+
+
+@dataclass
+class Span:
+    """One finished span; times are perf_counter nanoseconds."""
+
+    name: str
+    start_ns: int
+    duration_ns: int
+    depth: int
+    thread_id: int
+    args: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_ns / 1e6
+
+
+def enable() -> None:
+    """Turn tracing on by default for every thread."""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Turn tracing off by default for every thread."""
+    global _enabled
+    _enabled = False
+
+
+def set_enabled(value: Optional[bool]) -> None:
+    """Turn tracing on or off for the current thread (None: follow the default)."""
+    _local.enabled = None if value is None else bool(value)
+
+
+def is_enabled() -> bool:
+    """Whether spans are recorded on the current thread."""
+    enabled = _local.enabled
+    return _enabled if enabled is None else enabled
+
+
+def _record(span: Span) -> None:
+    recorders = _local.recorders
+    if recorders:
+        recorders[-1].append(span)
+    else:
+        with _global_lock:
+            _global_spans.append(span)
+
+
+class _NullSpan:
+    """Shared do-nothing span returned while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ('name', 'args', '_start', '_depth')
+
+    def __init__(self, name: str, args: Dict[str, object]):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self._depth = _local.depth
+        _local.depth += 1
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _local.depth = self._depth
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _record(Span(self.name, self._start, end - self._start, self._depth, threading.get_ident(), self.args))
+        return False
+
+    def set(self, **args) -> None:
+        """Attach extra arguments (e.g. row counts) to the span."""
+        self.args.update(args)
+
+
+def span(name: str, **args):
+    """Context manager timing the enclosed block as `name`."""
+    if not is_enabled():
+        return _NULL_SPAN
+    return _ActiveSpan(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator recording a span per call (named module.function by default)."""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+            with _ActiveSpan(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Stages:
+    """Sequential, non-overlapping stages inside one long function.
+
+    `next('name')` closes the running stage and opens the next one, so a long
+    function can be split into stages without re-indenting it under `with`
+    blocks. `close()` ends the last stage (call it from a finally clause).
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._current = None
+
+    def next(self, name: str) -> None:
+        self.close()
+        if is_enabled():
+            self._current = _ActiveSpan(f'{self.prefix}.{name}', {}).__enter__()
+
+    def close(self) -> None:
+        if self._current is not None:
+            current, self._current = self._current, None
+            current.__exit__(None, None, None)
+
+
+@contextmanager
+def collect(enabled: Optional[bool] = None):
+    """Capture spans finished on this thread inside the block into a list.
+
+    enabled turns tracing on or off for this thread inside the block
+    (default: leave it as it is).
+    """
+    spans: List[Span] = []
+    previous = _local.enabled
+    if enabled is not None:
+        _local.enabled = bool(enabled)
+    _local.recorders.append(spans)
+    try:
+        yield spans
+    finally:
+        _local.recorders.remove(spans)
+        _local.enabled = previous
+
+
+def recent_spans() -> List[Span]:
+    """Spans recorded outside any collect() block, oldest first."""
+    with _global_lock:
+        return list(_global_spans)
+
+
+def clear() -> None:
+    with _global_lock:
+        _global_spans.clear()
+
+
+def summarize(spans: Iterable[Span]) -> List[dict]:
+    """Total time and call count per span name, in order of first start."""
+    out: Dict[str, dict] = {}
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        row = out.setdefault(s.name, {'name': s.name, 'depth': s.depth, 'calls': 0, 'total_ms': 0.0})
+        row['calls'] += 1
+        row['total_ms'] += s.duration_ms
+        row['depth'] = min(row['depth'], s.depth)
+    return list(out.values())
+
+
+def to_chrome_trace(spans: Iterable[Span]) -> dict:
+    """Chrome trace-event format ('X' complete events, microseconds)."""
+    pid = os.getpid()
+    events = [
+        {
+            'name': s.name,
+            'cat': s.name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': s.start_ns / 1000.0,
+            'dur': s.duration_ns / 1000.0,
+            'pid': pid,
+            'tid': s.thread_id,
+            'args': {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+                     for k, v in s.args.items()},
+        }
+        for s in sorted(spans, key=lambda s: s.start_ns)
+    ]
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_chrome_trace(path: str, spans: Optional[Iterable[Span]] = None) -> None:
+    """Write spans (default: the process-wide buffer) as a Chrome trace file."""
+    with open(path, 'w') as f:
+        json.dump(to_chrome_trace(recent_spans() if spans is None else spans), f)
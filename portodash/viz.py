@@ -1,7 +1,14 @@
-import plotly.express as px
+"""Plotly chart builders.
+
+plotly is imported inside each function so importing this module (and the
+dashboard's cold start) does not pay for it until the first chart is drawn.
+"""
 import pandas as pd
 
+from .tracing import traced
+
 
+@traced()
 def make_allocation_pie(df, fund_names_map=None):
     """Return a Plotly pie chart for allocation with clean, modern styling.
     
@@ -9,6 +16,8 @@ def make_allocation_pie(df, fund_names_map=None):
         df: DataFrame with ticker and current_value columns
         fund_names_map: Optional dict mapping tickers to long names
     """
+    import plotly.express as px
+
     if df.empty:
         return px.pie(values=[], names=[], title="Allocation")
 
@@ -91,6 +100,8 @@ def make_30d_performance_chart(hist_prices, holdings_list):
 
     The chart shows portfolio value over time and optionally individual ticker lines.
     """
+    import plotly.express as px
+
     if hist_prices is None or hist_prices.empty:
         return px.line(title='30-day Performance (no data)')
 
@@ -112,6 +123,40 @@ def make_30d_performance_chart(hist_prices, holdings_list):
     return fig
 
 
+_LINE_LAYOUT = dict(
+    hovermode='x unified',
+    yaxis_tickformat='$,.0f',
+    legend=dict(
+        orientation='h',
+        yanchor='top',
+        y=-0.15,
+        xanchor='center',
+        x=0.5,
+        font=dict(size=13)
+    ),
+    font=dict(family='system-ui, -apple-system, sans-serif', color='#1A1A1A'),
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    xaxis=dict(
+        showgrid=True,
+        gridcolor='#E8EBED',
+        gridwidth=1,
+        title=''
+    ),
+    yaxis=dict(
+        showgrid=True,
+        gridcolor='#E8EBED',
+        gridwidth=1
+    ),
+    margin=dict(l=20, r=20, t=20, b=80),
+    hoverlabel=dict(
+        bgcolor='white',
+        font=dict(size=13, family='system-ui, -apple-system, sans-serif')
+    )
+)
+
+
+@traced()
 def make_snapshot_performance_chart(csv_path, days=30, fx_csv_path=None, tickers=None):
     """Create a performance chart from historical.csv snapshots with FX impact analysis.
     
@@ -129,262 +174,201 @@ def make_snapshot_performance_chart(csv_path, days=30, fx_csv_path=None, tickers
         Plotly figure showing portfolio value over time from snapshots
     """
     import os
-    from datetime import datetime, timedelta
-    
+    import plotly.express as px
+    from .performance import load_snapshot_cube
+
     if not os.path.exists(csv_path):
         return px.line(title='Performance (no snapshot data)')
-    
+
     try:
-        # Read the historical snapshots CSV
-        df = pd.read_csv(csv_path)
-        
-        if df.empty:
-            return px.line(title='Performance (no snapshot data)')
-        
-        # Filter by tickers if provided (for account/holder/type filtering)
-        if tickers is not None:
-            df = df[df['ticker'].isin(tickers)]
-            
-            if df.empty:
+        # Filter by tickers if provided (for account/holder/type filtering);
+        # the SQLite store reads only those tickers through its ticker index
+        cube = load_snapshot_cube(csv_path, fx_csv_path=fx_csv_path, days=days, tickers=tickers)
+        if cube.empty:
+            if tickers is not None:
                 return px.line(title='Performance (no data for selected filters)')
-        
-        # Parse dates - handle ISO8601 format
-        df['date'] = pd.to_datetime(df['date'], format='ISO8601')
-        
-        # Filter to last N days - make cutoff timezone-aware to match df['date']
-        cutoff = pd.Timestamp.now(tz='UTC') - timedelta(days=days)
-        df = df[df['date'] >= cutoff]
-        
-        if df.empty:
-            return px.line(title=f'Performance (no data in last {days} days)')
-        
-        # Deduplicate: if multiple snapshots exist for the same date, keep only the latest
-        # Group by normalized date and keep only the rows with the max timestamp for each date
-        df = df.sort_values('date')
-        df['date_only'] = df['date'].dt.normalize()
-        # For each date_only, find the max timestamp and keep only those rows
-        latest_timestamps = df.groupby('date_only')['date'].max().reset_index()
-        latest_timestamps.columns = ['date_only', 'latest_date']
-        df = df.merge(latest_timestamps, on='date_only')
-        df = df[df['date'] == df['latest_date']]
-        df = df.drop(['date_only', 'latest_date'], axis=1)
-        
-        # Load FX rates if available
-        fx_rates = None
-        if fx_csv_path and os.path.exists(fx_csv_path):
-            try:
-                fx_df = pd.read_csv(fx_csv_path)
-                # FX rates CSV should be simple YYYY-MM-DD format, but handle ISO8601 too
-                fx_df['date'] = pd.to_datetime(fx_df['date'], format='mixed')
-                # Ensure timezone-aware
-                if fx_df['date'].dt.tz is None:
-                    fx_df['date'] = fx_df['date'].dt.tz_localize('UTC')
-                fx_rates = fx_df.set_index('date')['usd_cad'].to_dict()
-            except Exception as e:
-                print(f"Could not load FX rates: {e}")
-        
-        # Calculate daily portfolio values
-        # Group by date and calculate for each holding
-        unique_dates = sorted(df['date'].unique())
-        
-        # Forward-fill FX rates for missing dates (similar to how we handle prices)
-        # Normalize FX rates to date-only for matching (ignore time component)
-        fx_rate_by_date = {}
-        last_known_fx = None
-        
-        if fx_rates:
-            # Normalize FX rates dict to use date-only keys
-            # This handles the case where FX rates are at 00:00 and snapshots are at 20:00
-            fx_rates_by_date_only = {}
-            for dt, rate in fx_rates.items():
-                date_only = pd.Timestamp(dt).normalize()  # Remove time component
-                fx_rates_by_date_only[date_only] = rate
-            
-            for date in unique_dates:
-                date_ts = pd.Timestamp(date).normalize()  # Normalize to date-only
-                if date_ts in fx_rates_by_date_only:
-                    last_known_fx = fx_rates_by_date_only[date_ts]
-                    fx_rate_by_date[pd.Timestamp(date)] = last_known_fx  # Store with original timestamp
-                elif last_known_fx is not None:
-                    # Forward-fill: use last known rate
-                    fx_rate_by_date[pd.Timestamp(date)] = last_known_fx
-        
-        # Get the first FX rate (for fixed FX calculation)
-        first_fx_rate = fx_rate_by_date.get(unique_dates[0]) if fx_rate_by_date else None
-        
-        # Check if there are any USD holdings (for FX labeling)
-        has_usd_holdings = any(not ticker.endswith('.TO') for ticker in df['ticker'].unique())
-        
-        # Calculate portfolio values with and without FX impact
-        portfolio_values_fixed_fx = []
-        portfolio_values_actual_fx = []
-        dates = []
-        
-        for date, group in df.groupby('date'):
-            # Get FX rate for this date (forward-filled if missing)
-            date_ts = pd.Timestamp(date)
-            actual_fx = fx_rate_by_date.get(date_ts, first_fx_rate)
-            
-            # Calculate portfolio value with fixed FX (first date's rate)
-            value_fixed = 0
-            value_actual = 0
-            
-            for _, holding in group.iterrows():
-                ticker = holding['ticker']
-                shares = holding['shares']
-                price = holding['price']
-                
-                # Infer currency from ticker (TSX tickers end with .TO)
-                is_usd = not ticker.endswith('.TO')
-                
-                # Value in native currency
-                native_value = shares * price
-                
-                # Convert to CAD if needed
-                if is_usd:
-                    if first_fx_rate:
-                        value_fixed += native_value * first_fx_rate
-                    else:
-                        value_fixed += native_value  # No conversion if no FX data
-                    
-                    if actual_fx:
-                        value_actual += native_value * actual_fx
-                    else:
-                        value_actual += native_value
-                else:
-                    # Already in CAD (TSX ticker)
-                    value_fixed += native_value
-                    value_actual += native_value
-            
-            dates.append(date)
-            portfolio_values_fixed_fx.append(value_fixed)
-            portfolio_values_actual_fx.append(value_actual)
-        
-        # Create DataFrame for plotting
-        plot_df = pd.DataFrame({
-            'date': dates,
-            'Market Performance (Fixed FX)': portfolio_values_fixed_fx,
-            'Actual Performance (with FX)': portfolio_values_actual_fx
-        }).sort_values('date')
-        
-        # Create the chart - show two lines only if we have FX data AND USD holdings
-        if fx_rate_by_date and first_fx_rate and has_usd_holdings:
-            # Show both lines if we have FX data and multi-currency portfolio
-            fig = px.line(
-                plot_df,
-                x='date',
-                y=['Market Performance (Fixed FX)', 'Actual Performance (with FX)'],
-                labels={'value': 'Portfolio Value (CAD)', 'date': '', 'variable': ''}
-            )
-            
-            # Customize line styles - cleaner, more modern
-            fig.data[0].line.color = '#6B7280'  # Gray for fixed FX baseline
-            fig.data[0].line.width = 2
-            fig.data[0].line.dash = 'dot'
-            fig.data[0].name = 'Market (Fixed FX)'
-            fig.data[0].hovertemplate = '%{y:$,.0f}<extra></extra>'
-            
-            fig.data[1].line.color = '#00D46A'  # Mint green for actual (Wealthsimple signature)
-            fig.data[1].line.width = 3
-            fig.data[1].name = 'Actual (with FX)'
-            fig.data[1].hovertemplate = '%{y:$,.0f}<extra></extra>'
-            
-            fig.update_layout(
-                hovermode='x unified',
-                yaxis_tickformat='$,.0f',
-                legend=dict(
-                    orientation='h',
-                    yanchor='top',
-                    y=-0.15,
-                    xanchor='center',
-                    x=0.5,
-                    font=dict(size=13)
-                ),
-                font=dict(family='system-ui, -apple-system, sans-serif', color='#1A1A1A'),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                xaxis=dict(
-                    showgrid=True,
-                    gridcolor='#E8EBED',
-                    gridwidth=1,
-                    title=''
-                ),
-                yaxis=dict(
-                    showgrid=True,
-                    gridcolor='#E8EBED',
-                    gridwidth=1
-                ),
-                margin=dict(l=20, r=20, t=20, b=80),
-                hoverlabel=dict(
-                    bgcolor='white',
-                    font=dict(size=13, family='system-ui, -apple-system, sans-serif')
-                )
-            )
-            
-            # Update x-axis to show formatted date in hover
-            fig.update_xaxes(hoverformat='%b %-d, %Y')
-        else:
-            # Single currency or no FX data - show single line
-            # Use the actual values (they'll be the same as fixed if single currency)
-            single_line_df = pd.DataFrame({
-                'date': dates,
-                'portfolio_value': portfolio_values_actual_fx
-            }).sort_values('date')
-            
-            fig = px.line(
-                single_line_df,
-                x='date',
-                y='portfolio_value',
-                labels={'portfolio_value': 'Portfolio Value (CAD)', 'date': ''}
-            )
-            
-            fig.update_traces(
-                line_color='#00D46A',
-                line_width=3,
-                name='Portfolio Value',
-                showlegend=True,
-                hovertemplate='%{y:$,.0f}<extra></extra>'
-            )
-            
-            fig.update_layout(
-                hovermode='x unified',
-                yaxis_tickformat='$,.0f',
-                showlegend=True,
-                legend=dict(
-                    orientation='h',
-                    yanchor='top',
-                    y=-0.15,
-                    xanchor='center',
-                    x=0.5,
-                    font=dict(size=13)
-                ),
-                font=dict(family='system-ui, -apple-system, sans-serif', color='#1A1A1A'),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                xaxis=dict(
-                    showgrid=True,
-                    gridcolor='#E8EBED',
-                    gridwidth=1,
-                    title=''
-                ),
-                yaxis=dict(
-                    showgrid=True,
-                    gridcolor='#E8EBED',
-                    gridwidth=1
-                ),
-                margin=dict(l=20, r=20, t=20, b=80),
-                hoverlabel=dict(
-                    bgcolor='white',
-                    font=dict(size=13, family='system-ui, -apple-system, sans-serif')
-                )
-            )
-            
-            # Update x-axis to show formatted date in hover
-            fig.update_xaxes(hoverformat='%b %-d, %Y')
-        
-        return fig
-    
+            return px.line(title='Performance (no snapshot data)')
+
+        return make_cube_performance_chart(cube, days=days)
+
     except Exception as e:
         import traceback
         traceback.print_exc()
         return px.line(title=f'Performance (error: {str(e)[:50]})')
+
+
+@traced()
+def make_cube_performance_chart(cube, days=30, total_return=None):
+    """Create the snapshot performance chart from an already-sliced SnapshotCube.
+
+    Shows market performance at the first FX rate of the window next to actual
+    performance with daily FX rates when the cube holds USD tickers and FX data;
+    otherwise a single portfolio value line. total_return (value plus
+    distributions received, see distributions.total_return_values) adds a
+    dashed total-return line.
+    """
+    import plotly.express as px
+
+    if cube.empty or cube.shares.index.empty:
+        return px.line(title=f'Performance (no data in last {days} days)')
+
+    has_fx = cube.fx is not None and not cube.fx.dropna().empty
+
+    if has_fx and cube.has_usd:
+        # Show both lines if we have FX data and multi-currency portfolio
+        plot_df = pd.DataFrame({
+            'date': cube.shares.index,
+            'Market Performance (Fixed FX)': cube.total(fixed_fx=True).values,
+            'Actual Performance (with FX)': cube.total().values,
+        })
+        fig = px.line(
+            plot_df,
+            x='date',
+            y=['Market Performance (Fixed FX)', 'Actual Performance (with FX)'],
+            labels={'value': 'Portfolio Value (CAD)', 'date': '', 'variable': ''}
+        )
+
+        # Customize line styles - cleaner, more modern
+        fig.data[0].line.color = '#6B7280'  # Gray for fixed FX baseline
+        fig.data[0].line.width = 2
+        fig.data[0].line.dash = 'dot'
+        fig.data[0].name = 'Market (Fixed FX)'
+        fig.data[0].hovertemplate = '%{y:$,.0f}<extra></extra>'
+
+        fig.data[1].line.color = '#00D46A'  # Mint green for actual (Wealthsimple signature)
+        fig.data[1].line.width = 3
+        fig.data[1].name = 'Actual (with FX)'
+        fig.data[1].hovertemplate = '%{y:$,.0f}<extra></extra>'
+
+        fig.update_layout(**_LINE_LAYOUT)
+    else:
+        # Single currency or no FX data - show single line
+        single_line_df = pd.DataFrame({
+            'date': cube.shares.index,
+            'portfolio_value': cube.total().values,
+        })
+        fig = px.line(
+            single_line_df,
+            x='date',
+            y='portfolio_value',
+            labels={'portfolio_value': 'Portfolio Value (CAD)', 'date': ''}
+        )
+        fig.update_traces(
+            line_color='#00D46A',
+            line_width=3,
+            name='Portfolio Value',
+            showlegend=True,
+            hovertemplate='%{y:$,.0f}<extra></extra>'
+        )
+        fig.update_layout(showlegend=True, **_LINE_LAYOUT)
+
+    if total_return is not None:
+        fig.add_scatter(
+            x=cube.shares.index,
+            y=total_return.values,
+            mode='lines',
+            name='Total Return (incl. distributions)',
+            line=dict(color='#2E86AB', width=2, dash='dash'),
+            hovertemplate='%{y:$,.0f}<extra></extra>',
+        )
+
+    # Update x-axis to show formatted date in hover
+    fig.update_xaxes(hoverformat='%b %-d, %Y')
+    return fig
+
+
+@traced()
+def make_breakdown_performance_chart(series_df, dimension_label='Account'):
+    """Plot one CAD value line per column of a breakdown frame (dates x groups).
+
+    series_df comes from performance.compute_breakdowns, so switching between
+    breakdowns only changes which precomputed frame is plotted.
+    """
+    import plotly.express as px
+
+    if series_df is None or series_df.empty or series_df.shape[1] == 0:
+        return px.line(title='Performance (no data for selected filters)')
+
+    colors = ['#00D46A', '#2E86AB', '#A23B72', '#F18F01', '#C73E1D',
+              '#6B7280', '#10B981', '#3B82F6', '#8B5CF6', '#EC4899']
+
+    # Largest groups first so legend order matches visual weight
+    order = series_df.iloc[-1].sort_values(ascending=False).index
+    plot_df = series_df[order].copy()
+    plot_df.index.name = 'date'
+    plot_df = plot_df.reset_index()
+    fig = px.line(
+        plot_df,
+        x='date',
+        y=[c for c in plot_df.columns if c != 'date'],
+        labels={'value': 'Value (CAD)', 'date': '', 'variable': dimension_label},
+        color_discrete_sequence=colors
+    )
+    fig.update_traces(line_width=2, hovertemplate='%{y:$,.0f}<extra></extra>')
+    fig.update_layout(**_LINE_LAYOUT)
+    fig.update_xaxes(hoverformat='%b %-d, %Y')
+    return fig
+
+
+@traced()
+def make_correlation_heatmap(corr):
+    """Return a Plotly heatmap for a tickers x tickers correlation matrix."""
+    import plotly.express as px
+
+    if corr is None or corr.empty:
+        return px.imshow([[0]], title='Correlation (no data)')
+
+    fig = px.imshow(
+        corr,
+        zmin=-1,
+        zmax=1,
+        color_continuous_scale=['#C73E1D', '#F9FAFB', '#2E86AB'],
+        aspect='auto',
+        labels={'color': 'Correlation'}
+    )
+    fig.update_traces(hovertemplate='%{y} / %{x}: %{z:.2f}<extra></extra>')
+    fig.update_layout(
+        font=dict(family='system-ui, -apple-system, sans-serif', color='#1A1A1A'),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(l=20, r=20, t=20, b=20),
+        xaxis_title='',
+        yaxis_title=''
+    )
+    return fig
+
+
+@traced()
+def make_projection_fan_chart(projection):
+    """Return a fan chart of projected portfolio value percentile bands.
+
+    projection: simulation.ProjectionBands (bands indexed by trading days ahead)
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    if projection is None or projection.bands.empty:
+        return px.line(title='Projection (no price history)')
+
+    bands = projection.bands
+    start = pd.Timestamp.now().normalize()
+    x = pd.bdate_range(start=start, periods=int(bands.index.max()) + 1)[bands.index.to_numpy()]
+
+    fig = go.Figure()
+    # Outer band first so the inner band draws on top of it
+    for low, high, color, name in (('p5', 'p95', 'rgba(0, 212, 106, 0.15)', '5th–95th percentile'),
+                                   ('p25', 'p75', 'rgba(0, 212, 106, 0.30)', '25th–75th percentile')):
+        if low not in bands.columns or high not in bands.columns:
+            continue
+        fig.add_trace(go.Scatter(x=x, y=bands[high], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=x, y=bands[low], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=color, name=name, hovertemplate='%{y:$,.0f}<extra></extra>'))
+    if 'p50' in bands.columns:
+        fig.add_trace(go.Scatter(x=x, y=bands['p50'], mode='lines', name='Median',
+                                 line=dict(color='#00D46A', width=3),
+                                 hovertemplate='%{y:$,.0f}<extra></extra>'))
+
+    fig.update_layout(**_LINE_LAYOUT)
+    fig.update_xaxes(hoverformat='%b %-d, %Y')
+    return fig
@@ -9,7 +9,6 @@ Usage:
     python scripts/backfill_snapshots.py [--days 30]
 """
 import argparse
-import json
 import os
 import sys
 import time
@@ -22,31 +21,11 @@ import pandas as pd
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from portodash.data_fetch import fetch_and_store_snapshot
+from portodash.ledger import default_path, load_ledger
+from portodash.portfolio import load_portfolio
 import yfinance as yf
 
 
-def load_portfolio():
-    """Load portfolio from portfolio.json."""
-    portfolio_path = Path(__file__).parent.parent / 'portfolio.json'
-    with open(portfolio_path) as f:
-        data = json.load(f)
-    
-    # Flatten holdings with account metadata
-    holdings = []
-    for account in data['accounts']:
-        for holding in account['holdings']:
-            holdings.append({
-                'ticker': holding['ticker'],
-                'shares': holding['shares'],
-                'cost_basis': holding['cost_basis'],
-                'currency': holding.get('currency', account.get('base_currency', 'CAD')),
-                'account_nickname': account['nickname'],
-                'account_holder': account['holder'],
-                'account_type': account['type'],
-            })
-    return holdings
-
-
 def get_historical_prices_batch(tickers, start_date, end_date):
     """
     Fetch closing prices for all tickers across a date range in one request.
@@ -108,9 +87,15 @@ def backfill_snapshots(days=30, delay=2):
     print(f"📊 Backfilling {days} days of portfolio snapshots...")
     
     # Load portfolio
-    holdings = load_portfolio()
+    portfolio_path = Path(__file__).parent.parent / 'portfolio.json'
+    holdings = list(load_portfolio(portfolio_path).holdings)
     tickers = list(set(h['ticker'] for h in holdings))
     print(f"📈 Found {len(holdings)} holdings with {len(tickers)} unique tickers")
+    # With a transaction ledger each date is snapshotted with the shares held that day
+    ledger = load_ledger(default_path(portfolio_path))
+    if ledger is not None:
+        tickers = sorted(set(tickers) | set(ledger.tickers))
+        print(f"📒 Using {len(ledger)} transactions from transactions.csv for as-of positions")
     print(f"   Tickers: {', '.join(sorted(tickers))}")
     
     # Determine date range
@@ -173,7 +158,8 @@ def backfill_snapshots(days=30, delay=2):
             fetched_at_iso = timestamp.isoformat() + '+00:00'
             
             # Save snapshot
-            fetch_and_store_snapshot(holdings, prices_dict, str(csv_path), fetched_at_iso=fetched_at_iso)
+            fetch_and_store_snapshot(holdings, prices_dict, str(csv_path), fetched_at_iso=fetched_at_iso,
+                                     ledger=ledger)
             print(f"✅ {date_obj} ({len(prices_dict)}/{len(tickers)} tickers)")
             success_count += 1
         else:
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Convert historical.csv into the compact snapshot store and report savings.
+
+The store (portodash/snapshot_store.py) dictionary-encodes account and
+ticker, keeps portfolio_value once per date and stores numbers as scaled
+integers where that is exact. With --daily-years, snapshots older than that
+are thinned to month-end, on this run and on every snapshot written later.
+
+Once historical.store/ exists next to historical.csv, the app, scheduler and
+CLI read and write it instead of the CSV (see snapshot_store.history_path).
+
+Usage:
+    python scripts/compact_history.py                      # historical.csv -> historical.store/
+    python scripts/compact_history.py --daily-years 2      # month-end only beyond 2 years
+    python scripts/compact_history.py --report-only        # compare an existing store
+    python scripts/compact_history.py --to-csv restored.csv
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from portodash.snapshot_store import default_store_path, read_compact, store_size, write_compact
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _read_csv(csv_path):
+    df = pd.read_csv(csv_path)
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601', utc=True)
+    return df
+
+
+def main():
+    root = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description='Compact historical.csv and report bytes and load time saved')
+    parser.add_argument('--csv', default=str(root / 'historical.csv'))
+    parser.add_argument('--store', default=None, help='Store directory (default: historical.store next to the CSV)')
+    parser.add_argument('--daily-years', type=float, default=None,
+                        help='Keep daily snapshots for this many years, month-end snapshots before that')
+    parser.add_argument('--report-only', action='store_true', help='Do not rewrite the store')
+    parser.add_argument('--to-csv', default=None, help='Expand the store back into a CSV file')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    store = args.store or default_store_path(args.csv)
+
+    if args.to_csv:
+        df = read_compact(store)
+        df['date'] = df['date'].map(lambda d: d.isoformat())
+        df.to_csv(args.to_csv, index=False)
+        print(f"✅ Wrote {len(df)} rows to {args.to_csv}")
+        return 0
+
+    if not os.path.exists(args.csv):
+        print(f"❌ {args.csv} not found")
+        return 1
+
+    if not args.report_only:
+        meta = write_compact(_read_csv(args.csv), store, daily_years=args.daily_years)
+        print(f"📦 Wrote {store} ({meta['rows']} rows, {meta['dates']} snapshot dates)")
+        for column, encoding in meta['encodings'].items():
+            kind = f"int x{encoding['scale']}" if 'scale' in encoding else f"float{encoding['float']}"
+            print(f"   {column:<11} {kind}")
+
+    csv_rows = sum(1 for _ in open(args.csv)) - 1
+    csv_bytes = store_size(args.csv)
+    store_bytes = store_size(store)
+    csv_time = _time(lambda: _read_csv(args.csv), args.repeat)
+    store_time = _time(lambda: read_compact(store), args.repeat)
+    store_rows = len(read_compact(store, columns=['ticker']))
+
+    print()
+    print(f"{'':<14}{'CSV':>14}{'Store':>14}")
+    print(f"{'rows':<14}{csv_rows:>14,}{store_rows:>14,}")
+    print(f"{'bytes':<14}{csv_bytes:>14,}{store_bytes:>14,}")
+    print(f"{'load (ms)':<14}{csv_time * 1000:>14.1f}{store_time * 1000:>14.1f}")
+    print()
+    print(f"💾 Bytes saved: {csv_bytes - store_bytes:,} ({1 - store_bytes / csv_bytes:.0%})")
+    print(f"⚡ Load time saved: {(csv_time - store_time) * 1000:.1f} ms ({csv_time / store_time:.1f}x faster)")
+    if store_rows < csv_rows:
+        print(f"🗓️  Retention dropped {csv_rows - store_rows:,} rows older than the daily window")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,7 +14,6 @@ Usage:
     3. Run: python scripts/consolidate_yahoo_csvs.py --dir data/
 """
 import argparse
-import json
 import os
 import sys
 from datetime import datetime, time
@@ -26,28 +25,8 @@ import pandas as pd
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from portodash.data_fetch import fetch_and_store_snapshot
-
-
-def load_portfolio():
-    """Load portfolio from portfolio.json."""
-    portfolio_path = Path(__file__).parent.parent / 'portfolio.json'
-    with open(portfolio_path) as f:
-        data = json.load(f)
-    
-    # Flatten holdings with account metadata
-    holdings = []
-    for account in data['accounts']:
-        for holding in account['holdings']:
-            holdings.append({
-                'ticker': holding['ticker'],
-                'shares': holding['shares'],
-                'cost_basis': holding['cost_basis'],
-                'currency': holding.get('currency', account.get('base_currency', 'CAD')),
-                'account_nickname': account['nickname'],
-                'account_holder': account['holder'],
-                'account_type': account['type'],
-            })
-    return holdings
+from portodash.ledger import default_path, load_ledger
+from portodash.portfolio import load_portfolio
 
 
 def load_ticker_csv(csv_path):
@@ -91,8 +70,14 @@ def consolidate_csvs(csv_dir, days=30):
     print()
     
     # Load portfolio
-    holdings = load_portfolio()
+    portfolio_path = Path(__file__).parent.parent / 'portfolio.json'
+    holdings = list(load_portfolio(portfolio_path).holdings)
     tickers = list(set(h['ticker'] for h in holdings))
+    # With a transaction ledger each date is snapshotted with the shares held that day
+    ledger = load_ledger(default_path(portfolio_path))
+    if ledger is not None:
+        tickers = sorted(set(tickers) | set(ledger.tickers))
+        print(f"📒 Using {len(ledger)} transactions from transactions.csv for as-of positions")
     print(f"📈 Portfolio has {len(tickers)} unique tickers:")
     print(f"   {', '.join(sorted(tickers))}")
     print()
@@ -191,7 +176,8 @@ def consolidate_csvs(csv_dir, days=30):
             fetched_at_iso = timestamp.isoformat() + '+00:00'
             
             # Save snapshot
-            fetch_and_store_snapshot(holdings, prices, str(csv_path), fetched_at_iso=fetched_at_iso)
+            fetch_and_store_snapshot(holdings, prices, str(csv_path), fetched_at_iso=fetched_at_iso,
+                                     ledger=ledger)
             
             # Show which prices were forward-filled
             ffilled_count = sum(1 for t in prices if t not in ticker_data or date not in ticker_data[t].index or pd.isna(ticker_data[t].loc[date, 'price']))
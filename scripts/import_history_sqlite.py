@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Import historical.csv into the SQLite snapshot store (historical.db).
+
+Once historical.db exists next to historical.csv, the app and the scheduler
+read and write it instead of the CSV (see portodash/sqlite_store.py).
+Snapshots already in the database are replaced day by day, so the import
+can be rerun safely.
+
+Usage:
+    python scripts/import_history_sqlite.py                    # historical.csv -> historical.db
+    python scripts/import_history_sqlite.py --db other.db
+    python scripts/import_history_sqlite.py --to-csv restored.csv
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from portodash.sqlite_store import connect, import_csv, read_rows
+
+
+def main():
+    root = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description='Import historical.csv into a SQLite snapshot store')
+    parser.add_argument('--csv', default=str(root / 'historical.csv'))
+    parser.add_argument('--db', default=str(root / 'historical.db'))
+    parser.add_argument('--to-csv', default=None, help='Export the database back into a CSV file')
+    args = parser.parse_args()
+
+    if args.to_csv:
+        df = read_rows(args.db)
+        df['date'] = df['date'].map(lambda d: d.isoformat())
+        df.to_csv(args.to_csv, index=False)
+        print(f"✅ Wrote {len(df)} rows to {args.to_csv}")
+        return 0
+
+    if not os.path.exists(args.csv):
+        print(f"❌ {args.csv} not found")
+        return 1
+
+    written = import_csv(args.csv, args.db)
+    conn = connect(args.db)
+    snapshots, positions = (conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                            for table in ('snapshots', 'positions'))
+    conn.close()
+    print(f"🗄️  Imported {written} snapshot days into {args.db} ({snapshots} snapshots, {positions} positions stored)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Run SQL against PortoDash's local stores with DuckDB.
+
+Registers the snapshot history (historical.csv, historical.db or a compact
+store), fx_rates.csv, the price store and the distributions store as views
+(see portodash/query.py) and runs either a prepared query or arbitrary SQL.
+Requires duckdb (pip install duckdb).
+
+Usage:
+    python scripts/query_sql.py --list
+    python scripts/query_sql.py --query gain_by_type --param period=quarter
+    python scripts/query_sql.py --query fx_contribution_by_holder --param start=2025-01-01
+    python scripts/query_sql.py "SELECT holder, year(day) AS year, avg(value_cad) FROM snapshots GROUP BY ALL"
+    python scripts/query_sql.py --format csv "SELECT * FROM prices" > prices.csv
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from portodash import query
+from portodash.portfolio import load_portfolio
+from portodash.snapshot_store import history_path
+
+
+def _print_table(df):
+    import pandas as pd
+
+    with pd.option_context('display.max_rows', 200, 'display.max_columns', None, 'display.width', 200):
+        print(df.to_string(index=False))
+
+
+def main():
+    root = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description='Query PortoDash snapshots, FX and prices with SQL (DuckDB)')
+    parser.add_argument('sql', nargs='?', help='SQL to run against the registered views')
+    parser.add_argument('--query', choices=sorted(query.QUERIES), help='Run a prepared query instead')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='Prepared query parameter (period, start)')
+    parser.add_argument('--list', action='store_true', help='List the registered views and their columns')
+    parser.add_argument('--history', default=history_path(str(root)))
+    parser.add_argument('--fx', default=str(root / 'fx_rates.csv'))
+    parser.add_argument('--prices', default=None, help='Price store directory (default: logs/prices)')
+    parser.add_argument('--portfolio', default=str(root / 'portfolio.json'))
+    parser.add_argument('--threads', type=int, default=None, help='DuckDB worker threads (default: all cores)')
+    parser.add_argument('--format', choices=['table', 'csv'], default='table')
+    args = parser.parse_args()
+
+    if not (args.sql or args.query or args.list):
+        parser.error('give SQL, --query or --list')
+    if not query.is_available():
+        print('❌ duckdb is not installed: pip install duckdb')
+        return 1
+
+    accounts = load_portfolio(args.portfolio).accounts if os.path.exists(args.portfolio) else None
+    con = query.connect(args.history, args.fx, price_dir=args.prices, accounts=accounts, threads=args.threads)
+    start = time.perf_counter()
+    if args.list:
+        result = query.sql(con, "SELECT table_name AS view, string_agg(column_name, ', ' ORDER BY ordinal_position) AS columns "
+                                "FROM information_schema.columns WHERE table_name IN "
+                                "('snapshots', 'fx', 'prices', 'distributions', 'accounts') GROUP BY 1 ORDER BY 1")
+    elif args.query:
+        params = dict(p.split('=', 1) for p in args.param)
+        result = query.run(con, args.query, **params)
+    else:
+        result = query.sql(con, args.sql)
+    elapsed = time.perf_counter() - start
+
+    if args.format == 'csv':
+        result.to_csv(sys.stdout, index=False)
+    else:
+        _print_table(result)
+        print(f"\n{len(result)} rows in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
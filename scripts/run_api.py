@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Local JSON API server for PortoDash.
+
+Serves valuation, cached prices, performance series and scheduler status as
+JSON (see portodash/api.py). Run it next to the scheduler:
+
+    python scripts/run_api.py
+    python scripts/run_api.py --port 8765 --portfolio ~/family/portfolio.json
+    curl -s localhost:8765/api/valuation | python -m json.tool
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+# Add parent dir to path so we can import portodash
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portodash.api import DEFAULT_HOST, DEFAULT_PORT, PortfolioApi, serve
+
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Serve PortoDash data as a local JSON API')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Bind address (default: %(default)s, local only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--portfolio', default=os.path.join(base_dir, 'portfolio.json'))
+    parser.add_argument('--history', help='Snapshot history (default: historical.db or historical.csv next to the portfolio)')
+    parser.add_argument('--fx', help='fx_rates.csv (default: next to the portfolio)')
+    parser.add_argument('--workers', type=int, default=4, help='Threads computing responses (default: %(default)s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    api = PortfolioApi(args.portfolio, history_path=args.history, fx_csv_path=args.fx, workers=args.workers)
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        logging.info('Shutting down')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -63,10 +63,11 @@ def main():
     log_file = setup_logging()
     logging.info("Starting PortoDash scheduler daemon")
     
-    # Get base paths
+    # Get base paths (snapshot_store loads pandas, which the scheduler needs from here on anyway)
+    from portodash.snapshot_store import history_path
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     portfolio_path = os.path.join(base_dir, 'portfolio.json')
-    hist_csv = os.path.join(base_dir, 'historical.csv')
+    hist_csv = history_path(base_dir)
     
     # Configure timezone for market time
     timezone = pytz.timezone('America/Toronto')
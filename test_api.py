@@ -0,0 +1,94 @@
+"""Tests for the local JSON API (ETag revalidation, gzip, concurrent requests)."""
+
+import asyncio
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('tornado')
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from portodash.api import PortfolioApi, make_app
+
+PORTFOLIO = {'accounts': [{'nickname': f'Acct{i}', 'holder': 'Ana' if i % 2 else 'Ben', 'type': 'TFSA', 'base_currency': 'CAD',
+                           'holdings': [{'ticker': f'T{j}.TO', 'shares': 10 + j, 'cost_basis': 20.0, 'currency': 'CAD'}
+                                        for j in range(10)]} for i in range(4)]}
+
+
+def _write_history(path, price):
+    now = pd.Timestamp.now(tz='UTC').floor('s')
+    rows = [{'date': (now - pd.Timedelta(days=d)).isoformat(), 'account': f'Acct{i}', 'ticker': f'T{j}.TO',
+             'shares': 10 + j, 'cost_basis': 20.0, 'price': price - d}
+            for d in (2, 1) for i in range(4) for j in range(10)]
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def _holder_value(price):
+    # Two accounts per holder, ten holdings each
+    return 2 * sum((10 + j) * price for j in range(10))
+
+
+def _serve(tmp_path, test):
+    portfolio = tmp_path / 'portfolio.json'
+    portfolio.write_text(json.dumps(PORTFOLIO))
+    _write_history(tmp_path / 'historical.csv', 30.0)
+    api = PortfolioApi(str(portfolio), status_path=str(tmp_path / 'scheduler_status.json'))
+
+    async def main():
+        sock, port = bind_unused_port()
+        server = HTTPServer(make_app(api))
+        server.add_sockets([sock])
+        try:
+            await test(api, AsyncHTTPClient(), f'http://127.0.0.1:{port}/api')
+        finally:
+            server.stop()
+            api.close()
+
+    asyncio.run(main())
+
+
+def test_etag_revalidation_and_gzip(tmp_path):
+    async def test(api, client, base):
+        first = await client.fetch(base + '/valuation?holder=Ana', decompress_response=False,
+                                   headers={'Accept-Encoding': 'gzip'})
+        assert first.headers['Content-Encoding'] == 'gzip'
+        body = json.loads(gzip.decompress(first.body))
+        # Latest snapshot (1 day old) is priced at 29
+        assert body['total_value'] == _holder_value(29.0)
+        assert body['missing'] == []
+
+        etag = first.headers['ETag']
+        again = await client.fetch(base + '/valuation?holder=Ana', headers={'If-None-Match': etag}, raise_error=False)
+        assert again.code == 304
+
+        # New data -> new version and body
+        _write_history(tmp_path / 'historical.csv', 40.0)
+        changed = await client.fetch(base + '/valuation?holder=Ana', headers={'If-None-Match': etag})
+        assert changed.headers['ETag'] != etag
+        assert json.loads(changed.body)['total_value'] == _holder_value(39.0)
+
+        bad = await client.fetch(base + '/performance?by=nope', raise_error=False)
+        assert bad.code == 400 and 'by' in json.loads(bad.body)['error']
+
+    _serve(tmp_path, test)
+
+
+def test_concurrent_misses_share_one_computation(tmp_path):
+    async def test(api, client, base):
+        calls = []
+        files, bucket, compute = api.endpoints['performance']
+        api.endpoints['performance'] = (files, bucket, lambda q: calls.append(q) or compute(q))
+        responses = await asyncio.gather(*[client.fetch(base + '/performance?by=holder') for _ in range(8)])
+        assert len(calls) == 1
+        bodies = {r.body for r in responses}
+        assert len(bodies) == 1
+        series = json.loads(bodies.pop())['series']
+        assert sorted(series) == ['Ana', 'Ben']
+        assert series['Ana'] == [_holder_value(28.0), _holder_value(29.0)]
+
+    _serve(tmp_path, test)
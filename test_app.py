@@ -0,0 +1,54 @@
+"""Offline AppTest checks for the Streamlit dashboard."""
+
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('streamlit')
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from portodash import data_fetch, fund_names, performance  # noqa: E402
+
+PRICES = {'XEQT.TO': 31.5, 'ZAG.TO': 14.2}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'), tmp_path / 'app.py')
+    (tmp_path / 'portfolio.json').write_text(json.dumps({'accounts': [{
+        'nickname': 'TFSA', 'holder': 'Alex', 'type': 'TFSA', 'base_currency': 'CAD',
+        'holdings': [{'ticker': t, 'shares': 100, 'cost_basis': 20, 'currency': 'CAD'} for t in PRICES],
+    }]}))
+    now = pd.Timestamp.now(tz='UTC') - pd.Timedelta(hours=1)
+    rows = [{'date': (now - pd.Timedelta(days=d)).isoformat(), 'account': 'TFSA', 'ticker': t, 'shares': 100.0,
+             'cost_basis': 20.0, 'price': p - d * 0.01, 'current_value': 100 * (p - d * 0.01)}
+            for d in range(45, -1, -1) for t, p in PRICES.items()]
+    pd.DataFrame(rows).to_csv(tmp_path / 'historical.csv', index=False)
+    monkeypatch.chdir(tmp_path)
+
+    # No network: prices come back as cached, fund names are the tickers
+    monkeypatch.setattr(data_fetch, 'get_current_prices',
+                        lambda tickers, csv_path=None, **kw: ({t: PRICES[t] for t in tickers}, now.isoformat(), 'cache'))
+    monkeypatch.setattr(fund_names, 'get_fund_names', lambda tickers: {t: t for t in tickers})
+    loads = []
+    load = performance.load_snapshot_cube
+    monkeypatch.setattr(performance, 'load_snapshot_cube', lambda *a, **kw: loads.append(kw) or load(*a, **kw))
+    at = AppTest.from_file(str(tmp_path / 'app.py'), default_timeout=60)
+    at.loads = loads
+    return at
+
+
+def test_changing_the_period_reruns_the_performance_fragment(app):
+    app.run()
+    assert not app.exception
+    for preset, days in (('Last 7 days', 7), ('Last day', 1), ('Custom', 30)):
+        app.radio(key='range_preset').set_value(preset).run()
+        assert not app.exception
+        assert any(f'Last {days} Days' in m.value for m in app.markdown)
+    app.slider(key='custom_days_slider').set_value(12).run()
+    assert not app.exception and any('Last 12 Days' in m.value for m in app.markdown)
+    # Every period slices the one cached cube
+    assert len(app.loads) == 1
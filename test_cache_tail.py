@@ -0,0 +1,42 @@
+"""Tests for the reverse-tail historical.csv reader behind the price cache."""
+
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from portodash.cache import get_cached_prices, read_csv_tail
+
+
+def _write_history(path, hours, tickers=('XEQT.TO', 'SPY')):
+    end = pd.Timestamp.now(tz='UTC').floor('h')
+    rows = [{'date': (end - timedelta(hours=h)).isoformat(), 'account': 'Acct, "A"', 'ticker': t,
+             'shares': 1.0, 'price': 100.0 + h + i}
+            for h in range(hours, -1, -1) for i, t in enumerate(tickers)]
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize('block_size', [7, 64, 1 << 16])
+def test_tail_matches_full_filter(tmp_path, block_size):
+    path = str(tmp_path / 'historical.csv')
+    df = _write_history(path, 500)
+    cutoff = pd.Timestamp.now(tz='UTC').floor('h') - timedelta(hours=72)
+    rows, latest = read_csv_tail(path, cutoff.to_pydatetime(), block_size=block_size)
+    expected = df[pd.to_datetime(df['date']) >= cutoff].reset_index(drop=True)
+    pd.testing.assert_frame_equal(rows, expected)
+    assert latest == pd.Timestamp(df['date'].iloc[-1])
+
+    # Everything older than the cutoff, and a header-only file
+    rows, _ = read_csv_tail(path, (cutoff + timedelta(days=30)).to_pydatetime(), block_size=block_size)
+    assert rows.empty and list(rows.columns) == list(df.columns)
+    df.head(0).to_csv(path, index=False)
+    assert read_csv_tail(path, cutoff.to_pydatetime(), block_size=block_size)[1] is None
+
+
+def test_cached_prices_use_latest_row_in_window(tmp_path):
+    path = str(tmp_path / 'historical.csv')
+    _write_history(path, 200)
+    prices, times = get_cached_prices(['XEQT.TO', 'SPY', 'VFV.TO'], path, max_age_hours=72)
+    assert prices == {'XEQT.TO': 100.0, 'SPY': 101.0, 'VFV.TO': None}
+    assert times['VFV.TO'] is None and pd.Timestamp(times['SPY']).tzinfo is not None
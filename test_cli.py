@@ -0,0 +1,72 @@
+"""Tests for the headless CLI (python -m portodash)."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from portodash import cli
+from portodash.locking import file_lock
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PORTFOLIO = {'accounts': [{'nickname': 'TFSA', 'holder': 'Ana', 'type': 'TFSA', 'base_currency': 'CAD',
+                           'holdings': [{'ticker': 'XEQT.TO', 'shares': 10, 'cost_basis': 25.0, 'currency': 'CAD'},
+                                        {'ticker': 'ZAG.TO', 'shares': 20, 'cost_basis': 14.0, 'currency': 'CAD'}]}]}
+
+
+@pytest.fixture
+def portfolio(tmp_path):
+    path = tmp_path / 'portfolio.json'
+    path.write_text(json.dumps(PORTFOLIO))
+    now = pd.Timestamp.now(tz='UTC').floor('s')
+    rows = [{'date': (now - pd.Timedelta(days=d)).isoformat(), 'account': 'TFSA', 'ticker': t, 'shares': s,
+             'cost_basis': c, 'price': p + d}
+            for d in (2, 1) for t, s, c, p in (('XEQT.TO', 10, 25.0, 30.0), ('ZAG.TO', 20, 14.0, 15.0))]
+    pd.DataFrame(rows).to_csv(tmp_path / 'historical.csv', index=False)
+    return str(path)
+
+
+def test_value_from_cached_prices(portfolio, capsys):
+    assert cli.main(['--portfolio', portfolio, 'value', '--cached', '--format', 'json']) == 0
+    out = json.loads(capsys.readouterr().out)
+    # Latest snapshot (1 day old): XEQT.TO 31, ZAG.TO 16
+    assert out['total_value'] == 10 * 31 + 20 * 16
+    assert out['gain'] == 10 * 31 + 20 * 16 - (10 * 25 + 20 * 14)
+    assert [r['ticker'] for r in out['rows']] == ['ZAG.TO', 'XEQT.TO']
+    assert out['missing_prices'] == []
+
+
+def test_history_and_export(portfolio, tmp_path, capsys):
+    assert cli.main(['--portfolio', portfolio, 'history', '--by', 'ticker', '--format', 'csv']) == 0
+    history = pd.read_csv(pd.io.common.StringIO(capsys.readouterr().out))
+    assert history.columns.tolist() == ['date', 'XEQT.TO', 'ZAG.TO']
+    assert history['ZAG.TO'].tolist() == [20 * 17, 20 * 16]
+
+    out = str(tmp_path / 'zag.csv')
+    assert cli.main(['--portfolio', portfolio, 'export', '--ticker', 'ZAG.TO', '-o', out]) == 0
+    assert pd.read_csv(out)['ticker'].tolist() == ['ZAG.TO', 'ZAG.TO']
+
+
+def test_snapshot_exit_codes(portfolio, tmp_path):
+    history = str(tmp_path / 'historical.csv')
+    before = pd.read_csv(history)
+    # No cached price within the window: nothing is written
+    assert cli.main(['--portfolio', portfolio, 'snapshot', '--cached', '--max-age', '1']) == 2
+    with file_lock(history):
+        assert cli.main(['--portfolio', portfolio, 'snapshot', '--cached', '--lock-timeout', '0.1']) == cli.EXIT_LOCKED
+    pd.testing.assert_frame_equal(pd.read_csv(history), before)
+
+    # Cached prices keep their own timestamp, so the latest day is rewritten in place
+    assert cli.main(['--portfolio', portfolio, 'snapshot', '--cached']) == 0
+    after = pd.read_csv(history)
+    assert len(after) == len(before)
+    assert after['current_value'].tolist()[-2:] == [310.0, 320.0]
+
+
+def test_help_does_not_load_pandas():
+    code = "import sys; from portodash import cli; cli.build_parser().format_help(); print('pandas' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
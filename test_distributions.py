@@ -0,0 +1,113 @@
+"""Tests for the distributions store and total-return series."""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash import distributions
+from portodash.performance import build_snapshot_cube
+
+
+def _fake_download(calls):
+    def download(tickers, start):
+        calls.append((tuple(tickers), start))
+        dates = pd.bdate_range(start, periods=10)
+        closes = pd.DataFrame({t: np.linspace(10, 19, 10) for t in tickers}, index=dates)
+        events = pd.DataFrame({'date': [dates[5]] * len(tickers), 'ticker': tickers,
+                               'dividend': 0.5, 'split': 0.0})
+        return closes, events
+    return download
+
+
+def test_refresh_is_incremental(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(distributions, '_download', _fake_download(calls))
+    assert distributions.refresh_distributions(['X', 'Y'], path=str(tmp_path))
+    # Fresh tickers are skipped, a new one is fetched alone
+    assert not distributions.refresh_distributions(['X', 'Y'], path=str(tmp_path))
+    assert distributions.refresh_distributions(['X', 'Z'], path=str(tmp_path))
+    assert [c[0] for c in calls] == [('X', 'Y'), ('Z',)]
+    # Stale tickers are topped up from a week before their last refresh
+    assert distributions.refresh_distributions(['X'], path=str(tmp_path), max_age_hours=0)
+    assert calls[-1][0] == ('X',)
+    assert pd.Timestamp(calls[-1][1]) > pd.Timestamp.now() - pd.Timedelta(days=8)
+
+    events = distributions.load_events(['X'], path=str(tmp_path))
+    assert events['dividend'].gt(0).all() and events['ticker'].eq('X').all()
+    assert set(distributions.load_closes(path=str(tmp_path)).columns) == {'X', 'Y', 'Z'}
+
+
+def test_return_series_reinvests_dividends():
+    dates = pd.bdate_range('2024-01-01', periods=6)
+    closes = pd.DataFrame({'X': [10.0, 10.0, 10.0, 10.0, 10.0, 9.0]}, index=dates)
+    # Ex-date on a Saturday applies to the next close
+    events = pd.DataFrame({'date': [pd.Timestamp('2024-01-06')], 'ticker': ['X'], 'dividend': [1.0], 'split': [0.0]})
+    series = distributions.return_series({'X': 10}, closes, events)
+    assert series['price_return'].tolist() == [100, 100, 100, 100, 100, 90]
+    assert series['total_return'].iloc[-1] == pytest.approx(100.0)
+
+
+def test_snapshot_total_return_counts_shares_before_ex_date():
+    rows = pd.DataFrame({
+        'date': ['2024-01-01T20:00:00', '2024-01-02T20:00:00', '2024-01-03T20:00:00', '2024-01-04T20:00:00'],
+        'account': 'A', 'ticker': 'XEQT.TO', 'shares': [10, 20, 20, 20], 'price': [30.0, 30.0, 29.0, 29.0],
+    })
+    cube = build_snapshot_cube(rows)
+    events = pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-03', '2024-06-01']), 'ticker': ['XEQT.TO', 'XEQT.TO'],
+        'dividend': [0.5, 0.0], 'split': [0.0, 2.0],
+    })
+    # yfinance restates the dividend for the later 2:1 split: 0.5 -> 1.0 per share actually paid
+    cash = distributions.cube_distributions(cube, events)
+    assert cash.sum(axis=1).tolist() == [0, 0, 20.0, 0]
+    total = distributions.total_return_values(cube, events)
+    assert (total - cube.total()).tolist() == [0, 0, 20.0, 20.0]
+
+
+def test_top_up_across_a_split_restates_stored_history(tmp_path, monkeypatch):
+    split_day = pd.Timestamp('2024-06-03')
+    dates = pd.bdate_range('2024-01-01', '2024-07-31')
+    clock = {'now': datetime(2024, 5, 1)}
+    calls = []
+
+    def download(tickers, start):
+        # What yfinance reports as of clock['now']: a known split restates earlier closes and dividends
+        calls.append(start)
+        now = pd.Timestamp(clock['now'])
+        split_known = now >= split_day
+        days = dates[(dates >= pd.Timestamp(start)) & (dates <= now)]
+        factor = np.where((days < split_day) & split_known, 0.5, 1.0)
+        closes = pd.DataFrame({'X': np.where(days < split_day, 100.0, 50.0) * factor}, index=days)
+        rows = [{'date': pd.Timestamp('2024-01-15'), 'ticker': 'X', 'dividend': 0.5 if split_known else 1.0,
+                 'split': 0.0}]
+        if split_known:
+            rows.append({'date': split_day, 'ticker': 'X', 'dividend': 0.0, 'split': 2.0})
+        events = pd.DataFrame(rows)
+        return closes, events[events['date'] >= pd.Timestamp(start)].reset_index(drop=True)
+
+    fixed = type('fixed', (), {'utcnow': staticmethod(lambda: clock['now'])})
+    monkeypatch.setattr(distributions, '_download', download)
+    monkeypatch.setattr(distributions, 'datetime', fixed)
+    monkeypatch.setattr(distributions.price_store, 'datetime', fixed)
+    path = str(tmp_path)
+
+    assert distributions.refresh_distributions(['X'], path=path, history='1y')
+    clock['now'] = datetime(2024, 7, 31)
+    assert distributions.refresh_distributions(['X'], path=path, max_age_hours=0)
+
+    # The top-up saw a new split, so X was downloaded again from its first stored date
+    assert calls == ['2023-05-01', '2024-04-24', '2024-01-01']
+    events = distributions.load_events(['X'], path=path)
+    assert distributions.raw_dividends(events)['dividend'].tolist() == [1.0]
+    closes = distributions.load_closes(['X'], path=path)['X']
+    assert closes.eq(50.0).all()
+    series = distributions.return_series({'X': 10}, closes.to_frame(), events, start='2024-05-01')
+    assert series['price_return'].eq(500.0).all()
+
+    # Topping up again does not re-download for the split already stored
+    calls.clear()
+    clock['now'] = datetime(2024, 8, 1)
+    assert distributions.refresh_distributions(['X'], path=path, max_age_hours=0)
+    assert calls == ['2024-07-24']
@@ -0,0 +1,104 @@
+"""Tests for streaming snapshot exports."""
+
+import gzip
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from portodash import export, snapshot_store
+
+
+def _write_history(path, days=20):
+    dates = pd.date_range('2025-01-01 20:00', periods=days, freq='D', tz='UTC')
+    rows = [{'date': d.isoformat(), 'account': account, 'ticker': ticker, 'shares': 2.0, 'price': 10.0 + i}
+            for i, d in enumerate(dates) for account, ticker in (('TFSA', 'XEQT.TO'), ('TFSA', 'VFV.TO'), ('RRSP', 'XEQT.TO'))]
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def test_filtered_exports_in_every_format(tmp_path, monkeypatch):
+    csv = str(tmp_path / 'historical.csv')
+    _write_history(csv)
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 4)  # force several chunks
+    filters = {'start': date(2025, 1, 5), 'end': date(2025, 1, 9), 'accounts': ['TFSA'], 'tickers': ['XEQT.TO']}
+
+    gz = export.export_history(csv, 'csv.gz', **filters)
+    with gzip.open(gz, 'rt') as f:
+        rows = pd.read_csv(f)
+    assert rows['date'].str[:10].tolist() == ['2025-01-05', '2025-01-06', '2025-01-07', '2025-01-08', '2025-01-09']
+    assert set(rows['account']) == {'TFSA'} and set(rows['ticker']) == {'XEQT.TO'}
+
+    parquet = pd.read_parquet(export.export_history(csv, 'parquet', **filters))
+    assert parquet['price'].tolist() == rows['price'].tolist()
+    assert str(parquet['date'].dt.tz) == 'UTC'
+
+    # Nothing matched: header only
+    empty = export.export_history(csv, 'csv', accounts=['Nope'])
+    assert list(pd.read_csv(empty).columns) == ['date', 'account', 'ticker', 'shares', 'price']
+
+
+def test_exports_are_reused_until_the_history_changes(tmp_path):
+    csv = str(tmp_path / 'historical.csv')
+    _write_history(csv)
+    assert export.export_history(csv) == csv  # unfiltered CSV is the file itself
+
+    first = export.export_history(csv, 'csv.gz')
+    assert export.export_history(csv, 'csv.gz') == first
+    _write_history(csv, days=21)
+    os.utime(csv, (os.path.getmtime(csv) + 5,) * 2)
+    second = export.export_history(csv, 'csv.gz')
+    assert second != first
+    with gzip.open(second, 'rt') as f:
+        assert len(pd.read_csv(f)) == 63
+    assert export.export_file_name('parquet', date(2025, 1, 5), date(2025, 1, 9)) == 'historical_2025-01-05_2025-01-09.parquet'
+
+
+def test_compact_store_exports_stream_in_batches(tmp_path, monkeypatch):
+    csv = str(tmp_path / 'historical.csv')
+    _write_history(csv)
+    store = str(tmp_path / 'historical.store')
+    snapshot_store.write_compact(pd.read_csv(csv).assign(cost_basis=9.0), store)
+    monkeypatch.setattr(snapshot_store, 'read_compact', None)  # the store is never loaded whole
+    batches = []
+    real_iter = export.iter_compact
+    monkeypatch.setattr(export, 'iter_compact', lambda *a, **k: (batches.append(len(b)) or b for b in real_iter(*a, **k)))
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 4)
+
+    filters = {'start': date(2025, 1, 5), 'end': date(2025, 1, 9), 'accounts': ['TFSA'], 'tickers': ['XEQT.TO']}
+    rows = pd.read_parquet(export.export_history(store, 'parquet', **filters))
+    assert rows['price'].tolist() == [14.0, 15.0, 16.0, 17.0, 18.0]
+    assert rows['date'].iloc[0] == pd.Timestamp('2025-01-05 20:00', tz='UTC')
+    assert max(batches) == 4 and len(batches) < 15  # reading stopped after the end date
+
+
+def test_concurrent_writes_do_not_share_a_temp_file(tmp_path, monkeypatch):
+    csv = str(tmp_path / 'historical.csv')
+    _write_history(csv)
+    out = str(tmp_path / 'export_same.csv')
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 4)
+    real_chunks = export.iter_history_chunks
+    nested = []
+
+    def chunks(*args, **kwargs):
+        for chunk in real_chunks(*args, **kwargs):
+            if not nested:
+                # A second session exports the same file while this one is mid-write
+                nested.append(None)
+                nested[0] = export.write_export(csv, out, 'csv', accounts=['RRSP'])
+            yield chunk
+
+    monkeypatch.setattr(export, 'iter_history_chunks', chunks)
+    assert export.write_export(csv, out, 'csv') == 60 and nested == [20]
+    assert len(pd.read_csv(out)) == 60
+
+    def failing(*args, **kwargs):
+        yield from real_chunks(*args, **kwargs)
+        raise OSError('disk full')
+
+    monkeypatch.setattr(export, 'iter_history_chunks', failing)
+    with pytest.raises(OSError):
+        export.write_export(csv, out, 'csv.gz')
+    # The finished export is untouched and no temporary file is left behind
+    assert len(pd.read_csv(out)) == 60
+    assert sorted(os.listdir(tmp_path)) == ['export_same.csv', 'historical.csv']
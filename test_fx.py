@@ -0,0 +1,86 @@
+"""Offline tests for the FX rate table cache and cross rates."""
+
+from datetime import datetime, timedelta
+import json
+
+import pytest
+
+from portodash import fx
+
+# USD-based feed: units of each currency per 1 USD
+FEED = {'USD': 1.0, 'CAD': 1.25, 'EUR': 0.8, 'GBP': 0.5}
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    requests = pytest.importorskip('requests')
+    cache = tmp_path / 'fx_rates.json'
+    monkeypatch.setattr(fx, '_cache_path', lambda: str(cache))
+    calls = []
+
+    class Reply:
+        def __init__(self, base):
+            self.base = base
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            scale = 1.0 / FEED[self.base]
+            return {'result': 'success', 'rates': {c: q * scale for c, q in FEED.items()}}
+
+    def get(url, timeout):
+        calls.append(url)
+        return Reply(url.rsplit('/', 1)[-1])
+
+    monkeypatch.setattr(requests, 'get', get)
+    return cache, calls
+
+
+def _age(cache, hours):
+    data = json.loads(cache.read_text())
+    data['fetched_at'] = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+    cache.write_text(json.dumps(data))
+
+
+def test_one_table_serves_every_currency_and_base(feed):
+    cache, calls = feed
+    assert fx.get_fx_rates(['USD'], base='CAD') == {'USD': pytest.approx(1.25)}
+    # Currencies and bases not asked for the first time come from the same table
+    assert fx.get_fx_rates(['usd', 'EUR', 'CAD', 'XYZ'], base='CAD') == {
+        'USD': pytest.approx(1.25), 'EUR': pytest.approx(1.5625)}
+    assert fx.get_fx_rates(['CAD', 'GBP'], base='EUR') == {'CAD': pytest.approx(0.64), 'GBP': pytest.approx(1.6)}
+    assert len(calls) == 1 and calls[0].endswith('/CAD')
+
+    ages = fx.fx_rate_ages(['USD', 'EUR', 'XYZ'], base='CAD')
+    assert sorted(ages) == ['EUR', 'USD'] and all(0 <= a < 0.1 for a in ages.values())
+
+    # A stale table is refreshed in the table's base
+    _age(cache, hours=13)
+    assert fx.get_fx_rates(['EUR'], base='USD') == {'EUR': pytest.approx(1.25)}
+    assert len(calls) == 2 and calls[1].endswith('/CAD')
+
+
+def test_old_cache_is_migrated_and_refreshed_for_new_currencies(feed, monkeypatch):
+    cache, calls = feed
+    fetched = datetime.utcnow() - timedelta(hours=2)
+    cache.write_text(json.dumps({'_fetched_at': fetched.isoformat(), 'rates': {'USD': 1.3}}))
+    # Currencies the old cache holds are served from it
+    assert fx.get_fx_rates(['USD'], base='CAD') == {'USD': pytest.approx(1.3)}
+    assert fx.fx_rate_ages(['USD'])['USD'] == pytest.approx(2, abs=0.01)
+    assert calls == []
+
+    # A new currency fetches the full table once
+    assert fx.get_fx_rates(['USD', 'EUR'], base='CAD') == {'USD': pytest.approx(1.25), 'EUR': pytest.approx(1.5625)}
+    assert len(calls) == 1
+    assert json.loads(cache.read_text())['version'] == fx.CACHE_VERSION
+
+    # Offline: a stale table is still used, no table gives no rates
+    def offline(base, previous, now):
+        raise OSError('offline')
+
+    monkeypatch.setattr(fx, '_fetch_table', offline)
+    _age(cache, hours=13)
+    assert fx.get_fx_rates(['EUR'], base='CAD') == {'EUR': pytest.approx(1.5625)}
+    cache.unlink()
+    assert fx.get_fx_rates(['USD'], base='CAD') == {}
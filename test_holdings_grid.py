@@ -0,0 +1,35 @@
+"""Tests for server-side filtering, sorting and paging of the holdings table."""
+
+from portodash.calculations import compute_portfolio_df
+from portodash.holdings_grid import holdings_frame, query_holdings
+
+
+def _frame(n=120):
+    holdings = [{'ticker': f'T{i:03d}' + ('.TO' if i % 2 else ''), 'shares': 10, 'cost_basis': 10.0,
+                 'currency': 'CAD' if i % 2 else 'USD', 'account_nickname': f'Acct{i % 3}'} for i in range(n)]
+    # Every fifth holding has no price yet (a loss at zero value)
+    prices = {h['ticker']: 5.0 + i % 10 for i, h in enumerate(holdings) if i % 5}
+    df = compute_portfolio_df(holdings, prices, fx_rates={'USD': 1.25})
+    return holdings_frame(df, {'T001.TO': 'Alpha Growth ETF'})
+
+
+def test_filters_sort_and_pages():
+    frame = _frame()
+    assert len(frame) == 120 and 'TOTAL' not in set(frame['ticker'])
+    assert frame.loc[frame['ticker'] == 'T001.TO', 'fund_name'].item() == 'Alpha Growth ETF'
+    trends = dict(zip(frame['ticker'], frame['trend']))
+    assert trends['T000'] == ['Loss'] and trends['T009.TO'] == ['Gain'] and trends['T010'] == ['Loss']
+
+    page = query_holdings(frame, accounts=['Acct1'], currencies=['cad'], sort_by='gain', descending=True,
+                          page=2, page_size=10)
+    selected = frame[(frame['account'] == 'Acct1') & (frame['currency'] == 'CAD')]
+    assert page.total_rows == len(selected) == 20 and page.pages == 2 and len(page.rows) == 10
+    expected = selected.sort_values('gain', ascending=False, kind='stable')['ticker'].tolist()
+    assert page.rows['ticker'].tolist() == expected[10:]
+
+    # Out-of-range pages clamp; search matches fund names and tickers
+    assert query_holdings(frame, page=99, page_size=50).page == 3
+    assert query_holdings(frame, search='alpha').rows['ticker'].tolist() == ['T001.TO']
+    assert query_holdings(frame, search='t11', sort_by='fund_name', descending=False).rows['ticker'].tolist() == [
+        f'T11{i}' + ('.TO' if i % 2 else '') for i in range(10)]
+    assert query_holdings(frame, search='nope').total_rows == 0
@@ -0,0 +1,184 @@
+"""Tests for the transaction ledger and as-of positions."""
+
+from datetime import date, timedelta
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from portodash import ledger as ledger_mod
+from portodash.data_fetch import fetch_and_store_snapshot
+from portodash.ledger import Ledger, LedgerError, append_transactions, parse_row
+from portodash.portfolio import parse_portfolio
+
+
+START = date(2024, 1, 1)
+
+
+def _random_rows(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    held = {}
+    for i in range(n):
+        kind = rng.choice(['BUY', 'BUY', 'SELL', 'DIVIDEND', 'SPLIT', 'TRANSFER'])
+        account, ticker = rng.choice(['A', 'B']), rng.choice(['X', 'Y.TO'])
+        shares = rng.randint(1, 50)
+        if kind in ('SELL', 'TRANSFER'):
+            # Only dispose of shares actually held
+            shares = min(shares, int(held.get((account, ticker), 0)))
+            if shares == 0:
+                kind, shares = 'BUY', rng.randint(1, 50)
+        rows.append({
+            'date': (START + timedelta(days=i // 3)).isoformat(),
+            'account': account, 'type': kind, 'ticker': ticker,
+            'shares': shares if kind != 'SPLIT' else '', 'price': round(rng.uniform(10, 50), 2),
+            'amount': 5 if kind == 'DIVIDEND' else '', 'ratio': 2 if kind == 'SPLIT' else '',
+            'to_account': 'B' if kind == 'TRANSFER' else '',
+        })
+        key = (account, ticker)
+        if kind in ('BUY', 'DIVIDEND'):
+            held[key] = held.get(key, 0) + shares
+        elif kind == 'SPLIT':
+            held[key] = held.get(key, 0) * 2
+        else:
+            held[key] -= shares
+            if kind == 'TRANSFER':
+                held[('B', ticker)] = held.get(('B', ticker), 0) + shares
+    return rows
+
+
+def _replay(txns, as_of):
+    positions = {}
+    for t in txns:
+        if t.day <= as_of.toordinal():
+            ledger_mod.apply(positions, t)
+    return positions
+
+
+def test_checkpoints_match_full_replay(monkeypatch):
+    monkeypatch.setattr(ledger_mod, 'CHECKPOINT_EVERY', 16)
+    txns = [parse_row({k: str(v) for k, v in r.items()}) for r in _random_rows(300)]
+    ledger = Ledger(transactions=txns)
+    for offset in (0, 7, 33, 64, 99, 200):
+        as_of = START + timedelta(days=offset)
+        assert ledger.positions_as_of(as_of) == pytest.approx(_replay(txns, as_of))
+
+
+def test_average_cost_sell_split_and_transfer():
+    ledger = Ledger(transactions=[parse_row(r) for r in [
+        {'date': '2024-01-02', 'account': 'A', 'type': 'BUY', 'ticker': 'X', 'shares': '10', 'price': '10'},
+        {'date': '2024-01-03', 'account': 'A', 'type': 'BUY', 'ticker': 'X', 'shares': '10', 'price': '20'},
+        {'date': '2024-01-04', 'account': 'A', 'type': 'SELL', 'ticker': 'X', 'shares': '5', 'price': '30'},
+        {'date': '2024-01-05', 'account': 'A', 'type': 'SPLIT', 'ticker': 'X', 'ratio': '2'},
+        {'date': '2024-01-06', 'account': 'A', 'type': 'TRANSFER', 'ticker': 'X', 'shares': '10', 'to_account': 'B'},
+    ]])
+    assert ledger.positions_as_of('2024-01-01') == {}
+    sold = ledger.positions_as_of('2024-01-04')[('A', 'X')]
+    assert (sold.shares, sold.cost, sold.realized) == (15, 225, 75)
+    final = ledger.positions_as_of()
+    assert final[('A', 'X')].shares == 20 and final[('B', 'X')].shares == 10
+    assert final[('B', 'X')].cost_basis == pytest.approx(7.5)
+
+
+def test_refresh_reads_only_appended_rows(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    rows = _random_rows(40, seed=1)
+    append_transactions(path, rows[:30])
+    ledger = Ledger(str(path))
+    assert len(ledger) == 30
+
+    # A partially written row is left for the next refresh
+    append_transactions(path, rows[30:])
+    with open(path, 'a') as f:
+        f.write('2024-03-01,A,BUY,X,1')
+    ledger.refresh()
+    assert len(ledger) == 40
+    with open(path, 'a') as f:
+        f.write(',10,,,,,\n2023-12-01,B,BUY,Y.TO,3,12,,,,,\n')
+    ledger.refresh()
+    assert len(ledger) == 42
+    assert ledger.positions_as_of('2023-12-31') == {('B', 'Y.TO'): ledger_mod.Position(3, 36)}
+    assert ledger.positions_as_of() == pytest.approx(Ledger(str(path)).positions_as_of())
+
+
+def test_invalid_rows_report_line_numbers(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    path.write_text('date,account,type,ticker,shares\n2024-01-01,A,BUY,X,1\n2024-01-02,A,SELL,X,-1\n')
+    with pytest.raises(LedgerError, match='line 3'):
+        Ledger(str(path))
+
+
+def test_disposing_of_more_than_held_is_an_error(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    path.write_text('date,account,type,ticker,shares,price,to_account\n'
+                    '2024-01-01,A,BUY,X,10,10,\n'
+                    '2024-01-02,A,TRANSFER,X,4,,B\n')
+    ledger = Ledger(str(path))
+    with open(path, 'a') as f:
+        f.write('2024-01-03,A,SELL,X,7,12,\n')
+    with pytest.raises(LedgerError, match='line 4: SELL of 7 X in A on 2024-01-03 exceeds the 6 shares held'):
+        ledger.refresh()
+    with pytest.raises(LedgerError, match='line 3: TRANSFER'):
+        Ledger(transactions=[parse_row({'date': '2024-01-01', 'account': 'A', 'type': 'TRANSFER', 'ticker': 'X',
+                                        'shares': '1', 'to_account': 'B'}, line=3)])
+
+    # Fixing the row replays the whole file again
+    path.write_text(path.read_text().replace('A,SELL,X,7', 'A,SELL,X,6'))
+    ledger.refresh()
+    assert ledger.positions_as_of()[('A', 'X')].shares == 0
+
+
+def test_snapshot_uses_as_of_positions(tmp_path):
+    portfolio = parse_portfolio({'accounts': [{
+        'nickname': 'A', 'holder': 'Alex', 'type': 'TFSA', 'base_currency': 'CAD',
+        'holdings': [{'ticker': 'X', 'shares': 99, 'cost_basis': 1}],
+    }]})
+    ledger = Ledger(transactions=[parse_row(r) for r in [
+        {'date': '2024-01-02', 'account': 'A', 'type': 'BUY', 'ticker': 'X', 'shares': '10', 'price': '10'},
+        {'date': '2024-02-01', 'account': 'A', 'type': 'BUY', 'ticker': 'X', 'shares': '10', 'price': '20'},
+    ]])
+    csv_path = str(tmp_path / 'historical.csv')
+    for day in ('2024-01-15', '2024-02-15'):
+        fetch_and_store_snapshot(portfolio.holdings, {'X': 30.0}, csv_path,
+                                 fetched_at_iso=f'{day}T20:00:00+00:00', ledger=ledger)
+    df = pd.read_csv(csv_path)
+    assert df['shares'].tolist() == [10, 20]
+    assert df['cost_basis'].tolist() == [10, 15]
+
+
+def test_append_keeps_the_layout_of_files_without_a_lot_column(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    path.write_text('date,account,type,ticker,shares,price,fees,amount,ratio,to_account,currency\n'
+                    '2024-01-02,A,BUY,X,10,10,,,,,CAD\n')
+    append_transactions(path, [{'date': '2024-01-03', 'account': 'A', 'type': 'BUY', 'ticker': 'X',
+                                'shares': 5, 'price': 12}])
+    lines = path.read_text().splitlines()
+    assert lines[-1] == '2024-01-03,A,BUY,X,5,12,,,,,' and len(lines) == 3
+    assert len(Ledger(str(path))) == 2
+
+    # A row naming a lot adds the column to the existing rows
+    append_transactions(path, [{'date': '2024-01-04', 'account': 'A', 'type': 'SELL', 'ticker': 'X',
+                                'shares': 1, 'price': 15, 'lot': 'first'}])
+    lines = path.read_text().splitlines()
+    assert lines[0].endswith(',currency,lot') and lines[1] == '2024-01-02,A,BUY,X,10,10,,,,,CAD,'
+    assert [t.lot for t in Ledger(str(path)).transactions] == ['', '', 'first']
+
+
+def test_refresh_starts_over_after_an_edit_in_place(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    append_transactions(path, [
+        {'date': '2024-01-02', 'account': 'A', 'type': 'BUY', 'ticker': 'X', 'shares': 100, 'price': 10},
+        {'date': '2024-01-03', 'account': 'A', 'type': 'SELL', 'ticker': 'X', 'shares': 50, 'price': 12},
+    ])
+    assert ledger_mod.load_ledger(str(path)).positions_as_of()[('A', 'X')].shares == 50
+
+    # Same size, different row; then a longer edit plus an appended row
+    st = path.stat()
+    path.write_bytes(path.read_bytes().replace(b',SELL,X,50,', b',SELL,X,40,'))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert path.stat().st_size == st.st_size
+    assert ledger_mod.load_ledger(str(path)).positions_as_of()[('A', 'X')].shares == 60
+    path.write_bytes(path.read_bytes().replace(b',SELL,X,40,', b',SELL,X,45.5,') + b'2024-01-04,A,BUY,X,1,10,,,,,,\n')
+    ledger = ledger_mod.load_ledger(str(path))
+    assert len(ledger) == 3 and ledger.positions_as_of()[('A', 'X')].shares == 55.5
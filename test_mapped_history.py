@@ -0,0 +1,124 @@
+"""Tests for the memory-mapped Arrow history mirror."""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash import mapped_history
+from portodash.data_fetch import fetch_and_store_snapshot
+from portodash.mapped_history import (default_arrow_path, open_history, read_history_range, sync_history_arrow,
+                                      write_history_arrow)
+from portodash.performance import load_snapshot_cube
+
+
+def _history(days):
+    end = pd.Timestamp.now(tz='UTC').normalize()
+    dates = pd.date_range(end=end, periods=days, freq='D') + pd.Timedelta(hours=20)
+    rows = [{'date': d.isoformat(), 'account': account, 'ticker': ticker, 'shares': shares, 'price': 30 + i * 0.01}
+            for i, d in enumerate(dates) for account, ticker, shares in (('TFSA', 'XEQT.TO', 100.5), ('Roth', 'SPY', 3.0))]
+    return pd.DataFrame(rows)
+
+
+def test_range_reads_match_full_scan(tmp_path):
+    df = _history(500).sample(frac=1, random_state=0)  # unsorted on purpose
+    path = str(tmp_path / 'h.arrow')
+    write_history_arrow(df, path, stride=7)
+    history = open_history(path)
+    dates = pd.DatetimeIndex(pd.to_datetime(df['date'], utc=True).sort_values())
+    for i in (0, 1, 6, 7, 8, 500, 999):
+        assert history.row_at(dates[i]) == np.searchsorted(dates, dates[i])
+    assert history.row_at(dates[-1] + pd.Timedelta(seconds=1)) == len(df)
+
+    start = dates[300]
+    window = history.frame(start=start, columns=['date', 'ticker', 'price'])
+    expected = df[pd.to_datetime(df['date'], utc=True) >= start]
+    assert len(window) == len(expected) and window['date'].is_monotonic_increasing
+    assert sorted(window['price']) == pytest.approx(sorted(expected['price']))
+    # Numeric columns are views over the mapping, not copies
+    assert not window['price'].to_numpy().flags.writeable
+
+
+def test_mirror_rebuilds_when_source_changes(tmp_path):
+    csv = str(tmp_path / 'historical.csv')
+    _history(60).to_csv(csv, index=False)
+    assert len(read_history_range(csv, days=10)) in (20, 22)
+    assert os.path.exists(default_arrow_path(csv))
+
+    _history(90).to_csv(csv, index=False)
+    os.utime(csv, (os.path.getmtime(csv) + 5,) * 2)
+    cube = load_snapshot_cube(csv, days=30)
+    full = load_snapshot_cube(csv).slice(days=30)
+    assert cube.total().tolist() == pytest.approx(full.total().tolist())
+    assert cube.total().iloc[-1] == pytest.approx(103.5 * (30 + 0.89))
+
+
+def test_new_snapshots_are_appended_to_the_mirror(tmp_path, monkeypatch):
+    csv = str(tmp_path / 'historical.csv')
+    holdings = [{'ticker': 'XEQT.TO', 'shares': 100, 'cost_basis': 30.0, 'currency': 'CAD',
+                 'account_nickname': 'TFSA'},
+                {'ticker': 'SPY', 'shares': 3, 'cost_basis': 500.0, 'currency': 'USD', 'account_nickname': 'Roth'}]
+    rebuilds = []
+    rebuild = mapped_history._rebuild
+    monkeypatch.setattr(mapped_history, '_rebuild', lambda *a: rebuilds.append(a) or rebuild(*a))
+    monkeypatch.setattr(mapped_history, 'MAX_BATCHES', 3)
+    end = pd.Timestamp.now(tz='UTC').normalize()
+
+    def snapshot(days_ago, price):
+        when = (end - pd.Timedelta(days=days_ago) + pd.Timedelta(hours=20)).isoformat()
+        fetch_and_store_snapshot(holdings, {'XEQT.TO': price, 'SPY': 10 * price}, csv, fetched_at_iso=when)
+        os.utime(csv, ns=(time.time_ns() + 1_000_000,) * 2)
+
+    def check():
+        history = open_history(sync_history_arrow(csv))
+        expected = pd.read_csv(csv)
+        assert history.frame()['price'].tolist() == pytest.approx(expected['price'].tolist())
+        last = pd.to_datetime(expected['date'], utc=True).iloc[-1]
+        assert history.frame(start=last - pd.Timedelta(days=1), columns=['ticker'])['ticker'].tolist() == \
+            expected['ticker'].tolist()[-4:]
+        return history
+
+    for day in range(10, 7, -1):
+        snapshot(day, 30.0 + day)
+    sync_history_arrow(csv)
+    rebuilds.clear()
+    for day in range(7, 1, -1):
+        snapshot(day, 30.0 + day)
+        history = check()
+    # Each new day was added as a batch (merged once there were too many)
+    assert rebuilds == [] and 1 <= history.num_batches <= 3 and len(history) == 18
+
+    # Replacing today's snapshot rewrites the CSV's last rows: rebuilt from the source
+    snapshot(2, 99.0)
+    check()
+    assert len(rebuilds) == 1
+
+
+
+def test_rewrites_keep_existing_rows_byte_for_byte(tmp_path, monkeypatch):
+    csv = str(tmp_path / 'historical.csv')
+    # Written by an older version: ISO 'T' dates and some naive ones
+    rows = _history(5)
+    rows = rows.assign(cost_basis=30.0, current_value=rows['shares'] * rows['price'], portfolio_value=100.0,
+                       allocation_pct=0.5)
+    rows = rows[['date', 'account', 'ticker', 'shares', 'cost_basis', 'price', 'current_value', 'portfolio_value',
+                 'allocation_pct']]
+    rows.loc[:3, 'date'] = rows.loc[:3, 'date'].str.replace('+00:00', '', regex=False)
+    rows.to_csv(csv, index=False)
+    with open(csv, 'rb') as f:
+        before = f.read()
+    sync_history_arrow(csv)
+    rebuilds = []
+    monkeypatch.setattr(mapped_history, '_rebuild', lambda *a: rebuilds.append(a))
+
+    when = pd.Timestamp.now(tz='UTC').normalize() + pd.Timedelta(days=1, hours=20)
+    holdings = [{'ticker': 'SPY', 'shares': 3, 'cost_basis': 500.0, 'account_nickname': 'Roth'}]
+    fetch_and_store_snapshot(holdings, {'SPY': 600.0}, csv, fetched_at_iso=when.isoformat())
+    with open(csv, 'rb') as f:
+        after = f.read()
+    assert after.startswith(before) and after[len(before):].startswith(str(when).encode())
+
+    os.utime(csv, ns=(time.time_ns() + 1_000_000,) * 2)
+    assert len(open_history(sync_history_arrow(csv))) == 11 and rebuilds == []
@@ -0,0 +1,55 @@
+"""Offline tests for the snapshot cube and its breakdowns."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash.performance import DIMENSIONS, build_snapshot_cube, compute_breakdowns
+
+META = {'TFSA': {'holder': 'Alex', 'type': 'TFSA'}, 'RRSP': {'holder': 'Alex', 'type': 'RRSP'}}
+# Midnight UTC after the last snapshot; fixtures never depend on the current time
+ANCHOR = pd.Timestamp('2025-06-30', tz='UTC')
+
+
+def _cube(days=20):
+    # Snapshots at 20:00 UTC ending the day before ANCHOR, one CAD and one USD fund per account (plus an unknown account)
+    end = ANCHOR - pd.Timedelta(hours=4)
+    dates = pd.date_range(end=end, periods=days, freq='D')
+    rng = np.random.default_rng(5)
+    rows = pd.DataFrame([{'date': d, 'account': a, 'ticker': t, 'shares': 10.0 + i,
+                          'price': 20.0 + rng.normal()}
+                         for i, d in enumerate(dates) for a in ('TFSA', 'RRSP', 'Cash') for t in ('XEQT.TO', 'VTI')])
+    # A missing price (a holding not yet priced that day) counts as zero value
+    rows.loc[5, 'price'] = np.nan
+    fx = pd.Series(np.linspace(1.3, 1.4, days), index=dates.normalize())
+    return build_snapshot_cube(rows, fx)
+
+
+@pytest.mark.parametrize('fixed_fx', [False, True])
+def test_every_breakdown_reconciles_to_the_total(fixed_fx):
+    cube = _cube()
+    breakdowns = compute_breakdowns(cube, META, fixed_fx=fixed_fx)
+    total = breakdowns['total']['Portfolio Value']
+    pd.testing.assert_series_equal(total, cube.total(fixed_fx=fixed_fx), check_names=False)
+    for dim in DIMENSIONS:
+        pd.testing.assert_series_equal(breakdowns[dim].sum(axis=1), total, check_names=False)
+    assert sorted(breakdowns['holder'].columns) == ['Alex', 'Unknown']
+    assert sorted(breakdowns['type'].columns) == ['RRSP', 'TFSA', 'Unknown']
+    # USD funds are converted: a fixed rate changes the total
+    assert not np.allclose(compute_breakdowns(cube, META, fixed_fx=not fixed_fx)['total'].values,
+                           breakdowns['total'].values)
+
+
+def test_slice_keeps_the_window_and_the_selected_columns():
+    cube = _cube()
+    # A start date keeps every snapshot from that midnight on: the 7 days before ANCHOR
+    start = ANCHOR - pd.Timedelta(days=7)
+    week = cube.slice(accounts=['TFSA', 'RRSP'], tickers=['VTI'], start=start)
+    assert len(week.shares) == 7
+    assert week.shares.index.min() == start + pd.Timedelta(hours=20)
+    assert list(week.shares.columns) == [('RRSP', 'VTI'), ('TFSA', 'VTI')]
+    pd.testing.assert_index_equal(week.fx.index, week.shares.index)
+    pd.testing.assert_frame_equal(week.prices, cube.prices.loc[week.shares.index, week.shares.columns])
+
+    assert cube.slice(start=ANCHOR - pd.Timedelta(days=100)).shares.shape == cube.shares.shape
+    assert cube.slice(start=ANCHOR).empty
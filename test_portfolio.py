@@ -0,0 +1,70 @@
+"""Tests for the shared portfolio model."""
+
+import json
+import os
+import re
+
+import pytest
+
+from portodash.portfolio import PortfolioError, load_portfolio, parse_portfolio
+
+
+def _account(nickname, holder, type_, tickers, base='CAD'):
+    return {
+        'nickname': nickname, 'holder': holder, 'type': type_, 'base_currency': base,
+        'holdings': [{'ticker': t, 'shares': 10, 'cost_basis': 20.0, 'currency': base} for t in tickers],
+    }
+
+
+SAMPLE = {'accounts': [
+    _account('TFSA A', 'Alex', 'TFSA', ['XEQT.TO', 'ZAG.TO']),
+    _account('RRSP A', 'Alex', 'RRSP', ['XEQT.TO']),
+    _account('Roth S', 'Sam', 'Roth IRA', ['SPY'], base='USD'),
+]}
+
+
+def test_indexes_and_dict_access():
+    p = parse_portfolio(SAMPLE)
+    assert p.tickers == ['SPY', 'XEQT.TO', 'ZAG.TO']
+    assert [h['account_nickname'] for h in p.by_ticker['XEQT.TO']] == ['TFSA A', 'RRSP A']
+    assert p.accounts_by_holder['Alex'] == ('TFSA A', 'RRSP A')
+    h = p.by_account['Roth S'][0]
+    assert h.get('currency') == 'USD' and h.get('missing', 'x') == 'x'
+    assert {**h}['account_type'] == 'Roth IRA'
+    assert p.base_currency == 'CAD'
+    assert parse_portfolio({**SAMPLE, 'base_currency': 'usd'}).base_currency == 'USD'
+
+
+def test_filters_match_and_logic():
+    p = parse_portfolio(SAMPLE)
+    assert len(p.filter_holdings()) == 4
+    assert [h.ticker for h in p.filter_holdings(holders=['Alex'], types=['RRSP'])] == ['XEQT.TO']
+    assert p.filter_holdings(nicknames=['Roth S'], holders=['Alex']) == []
+
+
+@pytest.mark.parametrize('mutate, message', [
+    (lambda d: d.pop('accounts'), "'accounts' key"),
+    (lambda d: d['accounts'][0]['holdings'][0].update(shares='ten'), 'holdings[0].shares'),
+    (lambda d: d['accounts'][1].update(nickname='TFSA A'), 'more than one account'),
+    (lambda d: d['accounts'][0].update(targets={'XEQT.TO': 0.8, 'ZAG.TO': 0.4}), 'more than 1.0'),
+    (lambda d: d.update(base_currency=''), 'portfolio.base_currency'),
+])
+def test_schema_errors(mutate, message):
+    data = json.loads(json.dumps(SAMPLE))
+    mutate(data)
+    with pytest.raises(PortfolioError, match=re.escape(message)):
+        parse_portfolio(data)
+
+
+def test_cache_is_keyed_on_file_version(tmp_path):
+    path = tmp_path / 'portfolio.json'
+    path.write_text(json.dumps(SAMPLE))
+    first = load_portfolio(str(path))
+    assert load_portfolio(str(path)) is first
+
+    data = json.loads(json.dumps(SAMPLE))
+    data['accounts'].pop()
+    path.write_text(json.dumps(data))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert load_portfolio(str(path)).nicknames == ['RRSP A', 'TFSA A']
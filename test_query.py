@@ -0,0 +1,55 @@
+"""Tests for the optional DuckDB query layer."""
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('duckdb')
+
+from portodash import query
+from portodash.performance import SnapshotCube, load_snapshot_cube
+
+ACCOUNTS = [{'nickname': 'TFSA', 'holder': 'Ana', 'type': 'TFSA'},
+            {'nickname': 'Roth', 'holder': 'Ben', 'type': 'Roth IRA'}]
+
+
+def _stores(tmp_path):
+    dates = pd.date_range('2024-11-25 20:00', '2025-02-05 20:00', freq='D', tz='UTC')
+    rows = [{'date': d.isoformat(), 'account': account, 'ticker': ticker, 'shares': shares, 'cost_basis': cost,
+             'price': price + i * 0.1}
+            for i, d in enumerate(dates)
+            for account, ticker, shares, cost, price in (('TFSA', 'XEQT.TO', 100, 25.0, 30.0), ('Roth', 'SPY', 5, 400.0, 500.0))]
+    csv = tmp_path / 'historical.csv'
+    pd.DataFrame(rows).to_csv(csv, index=False)
+    fx = tmp_path / 'fx_rates.csv'
+    pd.DataFrame({'date': pd.date_range('2024-12-01', periods=70, freq='D').strftime('%Y-%m-%d'),
+                  'usd_cad': [1.35 + i * 0.001 for i in range(70)]}).to_csv(fx, index=False)
+    return str(csv), str(fx)
+
+
+def test_snapshot_view_matches_cube_valuation(tmp_path):
+    csv, fx = _stores(tmp_path)
+    con = query.connect(csv, fx, price_dir=str(tmp_path), accounts=ACCOUNTS)
+    daily = query.sql(con, 'SELECT day, sum(value_cad) AS value FROM snapshots GROUP BY day ORDER BY day')
+    cube = load_snapshot_cube(csv, fx)
+    assert daily['value'].tolist() == pytest.approx(cube.total().tolist())
+
+    # Same as the chart's "Fixed FX" gap over a window starting on 2025-01-06
+    start = pd.Timestamp('2025-01-06', tz='UTC')
+    rows = cube.shares.index >= start
+    window = SnapshotCube(cube.shares[rows], cube.prices[rows], cube.fx[rows])
+    fx_effect = (window.total() - window.total(fixed_fx=True)).iloc[-1]
+    by_holder = query.run(con, 'fx_contribution_by_holder', start='2025-01-06').set_index('holder')
+    assert by_holder.loc['Ben', 'fx_contribution_cad'] == pytest.approx(fx_effect)
+    assert by_holder.loc['Ana', 'fx_contribution_cad'] == 0
+
+
+def test_gain_by_type_per_quarter(tmp_path):
+    csv, fx = _stores(tmp_path)
+    con = query.connect(csv, fx, price_dir=str(tmp_path), accounts=ACCOUNTS)
+    gains = query.run(con, 'gain_by_type')
+    gains['period'] = gains['period'].astype(str)
+    assert gains['period'].unique().tolist() == ['2024-10-01', '2025-01-01']
+    tfsa = gains[gains['type'] == 'TFSA'].set_index('period')
+    # Quarter-end snapshots: 2024-12-31 (day 36) and 2025-02-05 (day 72)
+    assert tfsa.loc['2024-10-01', 'gain_cad'] == pytest.approx(100 * (30 + 3.6 - 25))
+    assert tfsa.loc['2025-01-01', 'value_change_cad'] == pytest.approx(100 * 3.6)
@@ -0,0 +1,70 @@
+"""Offline tests for rebalancing trades."""
+
+import pandas as pd
+import pytest
+
+from portodash.rebalance import compute_rebalance_trades
+
+
+def _df(rows):
+    return pd.DataFrame(rows, columns=['account', 'ticker', 'currency', 'shares', 'price', 'current_value'])
+
+
+def test_trades_land_inside_band_and_respect_cash():
+    # 90/10 against 60/40 targets: sell equity, buy bonds with the proceeds
+    df = _df([
+        ('TFSA', 'XEQT.TO', 'CAD', 90, 100.0, 9000.0),
+        ('TFSA', 'ZAG.TO', 'CAD', 100, 10.0, 1000.0),
+    ])
+    accounts = [{'nickname': 'TFSA', 'base_currency': 'CAD', 'tolerance': 0.02,
+                 'targets': {'XEQT.TO': 0.6, 'ZAG.TO': 0.4}}]
+    trades = compute_rebalance_trades(df, accounts).set_index('ticker')
+
+    assert trades.loc['XEQT.TO', 'action'] == 'SELL'
+    assert trades.loc['ZAG.TO', 'action'] == 'BUY'
+    assert (trades['post_pct'] - trades['target_pct']).abs().max() <= 0.02 + 1e-9
+    assert trades['trade_value'].sum() <= 1e-9  # buys funded by sales only
+
+
+def test_household_buys_use_the_buying_accounts_own_cash():
+    df = _df([
+        ('RRSP', 'XEQT.TO', 'CAD', 100, 100.0, 10000.0),
+        ('Cash', 'XEQT.TO', 'CAD', 10, 100.0, 1000.0),
+    ])
+    accounts = [
+        {'nickname': 'RRSP', 'base_currency': 'CAD'},
+        {'nickname': 'Cash', 'base_currency': 'CAD', 'cash': 4000},
+    ]
+    trades = compute_rebalance_trades(df, accounts, prices={'ZAG.TO': 10.0},
+                                      household_targets={'XEQT.TO': 0.7, 'ZAG.TO': 0.3})
+    # The largest account has no cash, so the account holding it buys
+    buy = trades[trades['ticker'] == 'ZAG.TO'].iloc[0]
+    assert len(trades) == 1
+    assert (buy['account'], buy['action'], buy['shares']) == ('Cash', 'BUY', 375)
+    assert buy['post_pct'] == pytest.approx(0.25, abs=0.001)
+
+
+def test_household_sells_spread_over_accounts_and_buys_keep_currencies():
+    df = _df([
+        ('RRSP', 'XEQT.TO', 'CAD', 60, 100.0, 6000.0),
+        ('TFSA', 'XEQT.TO', 'CAD', 50, 100.0, 5000.0),
+        ('US', 'VTI', 'USD', 10, 250.0, 2500.0),
+    ])
+    accounts = [
+        {'nickname': 'RRSP', 'base_currency': 'CAD'},
+        {'nickname': 'TFSA', 'base_currency': 'CAD'},
+        {'nickname': 'US', 'base_currency': 'USD', 'cash': 1000},
+    ]
+    trades = compute_rebalance_trades(df, accounts, prices={'ZAG.TO': 10.0}, fx_rates={'USD': 1.25},
+                                      household_targets={'XEQT.TO': 0.2, 'VTI': 0.5, 'ZAG.TO': 0.3})
+    rows = {(r.account, r.ticker): (r.action, r.shares) for r in trades.itertuples()}
+    # 74 shares to sell: all 60 in the RRSP, the rest in the TFSA
+    assert rows.pop(('RRSP', 'XEQT.TO')) == ('SELL', 60)
+    assert rows.pop(('TFSA', 'XEQT.TO')) == ('SELL', 14)
+    # CAD proceeds buy the CAD fund; only the USD account's USD cash buys VTI
+    assert rows.pop(('RRSP', 'ZAG.TO')) == ('BUY', 369)
+    assert rows.pop(('US', 'VTI')) == ('BUY', 5)
+    assert rows == {}
+    assert trades.set_index('ticker').loc['VTI', 'price'] == pytest.approx(200.0)
+    spent = trades.groupby('account')['trade_value'].sum()
+    assert spent['RRSP'] <= 0 and spent['US'] <= 1250 + 1e-9
@@ -0,0 +1,93 @@
+"""Offline tests for the snapshot returns engine."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash.performance import build_snapshot_cube
+from portodash import returns
+from portodash.returns import ReturnsEngine, compute_returns, xirr, TOTAL
+
+
+def _rows(days, shares_by_day, prices_by_day, account='TFSA', ticker='XEQT.TO'):
+    dates = pd.date_range('2025-01-01 20:00', periods=days, freq='D', tz='UTC')
+    return pd.DataFrame({
+        'date': dates,
+        'account': account,
+        'ticker': ticker,
+        'shares': shares_by_day,
+        'price': prices_by_day,
+    })
+
+
+def test_share_purchases_are_not_performance():
+    # Price is flat but shares double halfway: value doubles, TWR stays 0
+    rows = _rows(4, [100, 100, 200, 200], [10.0, 10.0, 10.0, 10.0])
+    result = compute_returns(build_snapshot_cube(rows))
+
+    assert result.values[TOTAL].iloc[-1] == pytest.approx(2000.0)
+    assert result.flows[TOTAL].iloc[2] == pytest.approx(1000.0)
+    assert result.twr(TOTAL) == pytest.approx(0.0)
+
+
+def test_twr_chain_links_price_moves():
+    rows = _rows(3, [100, 150, 150], [10.0, 11.0, 12.1])
+    result = compute_returns(build_snapshot_cube(rows))
+    assert result.twr('TFSA') == pytest.approx(0.21)
+
+
+def test_short_windows_report_the_period_money_weighted_return():
+    # No flows over a week: the period MWR is the price move, the IRR annualizes it
+    rows = _rows(8, [100] * 8, [10.0] * 7 + [10.1])
+    result = compute_returns(build_snapshot_cube(rows))
+    assert result.years == pytest.approx(7 / 365)
+    assert result.mwr(TOTAL) == pytest.approx(0.01)
+    assert result.irr[TOTAL] == pytest.approx(1.01 ** (365 / 7) - 1)
+
+
+def test_xirr_matches_simple_compounding():
+    # Invest 100, receive 110 one year later -> 10%
+    assert xirr([-100.0, 110.0], [0.0, 1.0]) == pytest.approx(0.10)
+    assert xirr([-100.0, -100.0], [0.0, 1.0]) is None
+
+
+def test_incremental_engine_matches_full_recompute(monkeypatch):
+    rng = np.random.default_rng(7)
+    days = 40
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.01, days))
+    shares = np.repeat([100, 120, 90, 150], days // 4)
+    rows = pd.concat([_rows(days, shares, prices), _rows(days, 50, prices * 2, account='RRSP', ticker='VFV.TO')])
+
+    engine = ReturnsEngine()
+    engine.update(build_snapshot_cube(rows[rows['date'] < rows['date'].iloc[25]]))
+    # Later updates only link new rows: no full recompute inside the engine
+    monkeypatch.setattr(returns, 'compute_returns', None)
+    # Append one snapshot at a time; the second step replaces the same day's snapshot first
+    for end in (26, 27, 27, 40):
+        head = rows[rows['date'] < rows['date'].iloc[end - 1] + pd.Timedelta(hours=1)]
+        if end == 27:
+            head = head.copy()
+            head.loc[head['date'] == head['date'].max(), 'price'] *= 1.01
+        incremental = engine.update(build_snapshot_cube(head))
+        full = compute_returns(build_snapshot_cube(head))
+        for name in ('values', 'flows', 'daily_returns', 'twr_index'):
+            pd.testing.assert_frame_equal(getattr(incremental, name), getattr(full, name), check_freq=False)
+        for group in (TOTAL, 'TFSA', 'RRSP'):
+            assert incremental.irr[group] == pytest.approx(full.irr[group])
+
+    # A window of the full history matches computing the window on its own
+    start = rows['date'].iloc[10]
+    window = incremental.slice(start)
+    alone = compute_returns(build_snapshot_cube(rows).slice(start=start))
+    pd.testing.assert_frame_equal(window.twr_index, alone.twr_index, check_freq=False)
+    assert window.irr[TOTAL] == pytest.approx(alone.irr[TOTAL])
+
+
+def test_engine_recomputes_after_history_edit():
+    rows = _rows(10, [100] * 10, [10.0 + i for i in range(10)])
+    engine = ReturnsEngine()
+    engine.update(build_snapshot_cube(rows))
+    edited = rows.copy()
+    edited.loc[3:, 'shares'] = 200
+    result = engine.update(build_snapshot_cube(edited))
+    pd.testing.assert_frame_equal(result.flows, compute_returns(build_snapshot_cube(edited)).flows, check_freq=False)
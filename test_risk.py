@@ -0,0 +1,111 @@
+"""Offline tests for incremental risk metrics and the local price store."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash import price_store
+from portodash.risk import compute_risk_report, update_risk
+
+
+def _prices(days=400, tickers=('AAA', 'BBB', 'SPY'), seed=3):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2024-01-01', periods=days)
+    returns = rng.normal(0.0003, 0.015, size=(days, len(tickers)))
+    returns[:, 1] += 0.5 * returns[:, -1]
+    # A crash early on that later windows no longer contain
+    returns[60:80, 0] -= 0.03
+    prices = pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=index, columns=list(tickers))
+    prices.iloc[150:155, 1] = np.nan
+    return prices
+
+
+def _assert_same(actual, expected):
+    pd.testing.assert_frame_equal(actual.volatility, expected.volatility, rtol=1e-7, atol=1e-9)
+    pd.testing.assert_frame_equal(actual.drawdown, expected.drawdown)
+    pd.testing.assert_frame_equal(actual.beta, expected.beta, rtol=1e-7, atol=1e-9)
+    pd.testing.assert_frame_equal(actual.correlation, expected.correlation, rtol=1e-6, atol=1e-9)
+
+
+def test_sliding_window_matches_full_recompute(tmp_path):
+    prices = _prices()
+    # A 1y window moving forward a day (or a few) at a time, past the crash
+    for end in (252, 253, 256, 300, 330, 400):
+        window = prices.iloc[end - 252:end]
+        report = update_risk(window, benchmark='SPY', path=str(tmp_path), period='1y')
+        _assert_same(report, compute_risk_report(window, benchmark='SPY'))
+    assert report.max_drawdown['AAA'] == pytest.approx(compute_risk_report(window).max_drawdown['AAA'])
+
+    # Another window over the same tickers keeps its own state
+    longer = prices.iloc[:400]
+    _assert_same(update_risk(longer, benchmark='SPY', path=str(tmp_path), period='2y'),
+                 compute_risk_report(longer, benchmark='SPY'))
+
+    # Rewritten adjusted closes (a dividend) start over
+    adjusted = prices.iloc[148:400].copy()
+    adjusted.iloc[:100] *= 0.98
+    _assert_same(update_risk(adjusted, benchmark='SPY', path=str(tmp_path), period='1y'),
+                 compute_risk_report(adjusted, benchmark='SPY'))
+
+
+def test_price_store_downloads_only_missing_days(tmp_path, monkeypatch):
+    prices = _prices(days=30, tickers=('AAA', 'BBB'))
+    calls = []
+
+    def fake_history(tickers, start=None, period=None):
+        calls.append((tuple(tickers), start))
+        return prices.loc[pd.Timestamp(start):, list(tickers)]
+
+    monkeypatch.setattr(price_store, 'get_historical_prices', fake_history)
+    monkeypatch.setattr(price_store, '_period_start', lambda period: prices.index[0])
+    path = str(tmp_path)
+
+    price_store.save_prices(prices.iloc[:20, :1], path)
+    today = prices.index[-1] + pd.Timedelta(days=1)
+    monkeypatch.setattr(price_store, 'datetime', type('fixed', (), {'utcnow': staticmethod(lambda: today)}))
+    frame = price_store.get_price_history(['AAA', 'BBB'], path=path)
+
+    # BBB is new (full period); AAA is topped up from its last stored day
+    assert calls == [(('BBB',), prices.index[0].strftime('%Y-%m-%d')),
+                     (('AAA',), (prices.index[19] + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))]
+    pd.testing.assert_frame_equal(frame, prices, check_freq=False)
+    # Stored now: no further downloads
+    calls.clear()
+    pd.testing.assert_frame_equal(price_store.get_price_history(['AAA', 'BBB'], path=path, refresh=False), prices,
+                                  check_freq=False)
+    assert calls == []
+
+    # Same day, a weekend or a holiday later: the store was checked today
+    assert price_store.get_price_history(['AAA', 'BBB'], path=path).shape == prices.shape
+    assert calls == []
+
+
+def test_price_store_checks_each_ticker_once_per_day(tmp_path, monkeypatch):
+    prices = _prices(days=30, tickers=('AAA', 'NEW'))
+    # NEW listed a week before the last stored day; GONE has no data at all
+    prices.iloc[:25, 1] = np.nan
+    calls = []
+
+    def fake_history(tickers, start=None, period=None):
+        calls.append((tuple(tickers), start))
+        return prices.reindex(columns=list(tickers)).loc[pd.Timestamp(start):].dropna(how='all')
+
+    start = prices.index[0] - pd.Timedelta(days=200)
+    monkeypatch.setattr(price_store, 'get_historical_prices', fake_history)
+    monkeypatch.setattr(price_store, '_period_start', lambda period: start)
+    clock = {'today': prices.index[-1] + pd.Timedelta(days=1)}
+    monkeypatch.setattr(price_store, 'datetime', type('fixed', (), {'utcnow': staticmethod(lambda: clock['today'])}))
+    path = str(tmp_path)
+
+    price_store.get_price_history(['AAA', 'NEW', 'GONE'], path=path)
+    assert calls == [(('AAA', 'NEW', 'GONE'), start.strftime('%Y-%m-%d'))]
+
+    # A young listing and a ticker with no data are not downloaded again today
+    calls.clear()
+    price_store.get_price_history(['AAA', 'NEW', 'GONE'], path=path)
+    assert calls == []
+
+    # Next day: one top-up from the last stored date, no full downloads
+    clock['today'] += pd.Timedelta(days=1)
+    price_store.get_price_history(['AAA', 'NEW', 'GONE'], path=path)
+    assert calls == [(('AAA', 'NEW', 'GONE'), (prices.index[-1] + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))]
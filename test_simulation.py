@@ -0,0 +1,60 @@
+"""Offline tests for the Monte Carlo projection engine."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash import simulation
+from portodash.simulation import _cholesky, estimate_parameters, simulate_paths
+
+MU = np.array([0.0004, 0.0002, 0.0003])
+COV = np.array([[1.0, 0.6, 0.2], [0.6, 1.5, 0.3], [0.2, 0.3, 0.8]]) * 1e-4
+
+
+def test_same_seed_gives_the_same_paths_for_any_chunking_and_workers(monkeypatch):
+    monkeypatch.setattr(simulation, 'PARALLEL_MIN_PATHS', 0)
+    weights = np.full(3, 1 / 3)
+    kwargs = dict(horizon_days=40, n_paths=1000, n_points=10, seed=7)
+    steps, serial = simulate_paths(MU, COV, weights, processes=1, **kwargs)
+    # One block per chunk, a few blocks per chunk, in two worker processes
+    for chunk_bytes, processes in ((1, 1), (2 * 10 * 3 * 8 * 600, 1), (1, 2)):
+        other_steps, growth = simulate_paths(MU, COV, weights, chunk_bytes=chunk_bytes, processes=processes, **kwargs)
+        np.testing.assert_array_equal(other_steps, steps)
+        np.testing.assert_array_equal(growth, serial)
+    assert not np.array_equal(simulate_paths(MU, COV, weights, processes=1, **{**kwargs, 'seed': 8})[1], serial)
+
+
+def test_paths_follow_the_covariance_through_its_cholesky_factor():
+    # Two perfectly correlated assets: only semi-definite, so the factor needs jitter
+    singular = np.array([[1.0, 1.0], [1.0, 1.0]]) * 1e-4
+    chol = _cholesky(singular)
+    np.testing.assert_allclose(chol @ chol.T, singular, atol=1e-12)
+    # An indefinite (pairwise-complete) estimate is repaired rather than rejected
+    indefinite = np.array([[1.0, 0.9, -0.9], [0.9, 1.0, 0.9], [-0.9, 0.9, 1.0]]) * 1e-4
+    chol = _cholesky(indefinite)
+    assert np.all(np.linalg.eigvalsh(chol @ chol.T) >= -1e-12)
+
+    # Identity weights keep each asset's growth; one-day log returns reproduce COV
+    steps, growth = simulate_paths(np.zeros(3), COV, np.eye(3), horizon_days=5, n_paths=40_000, n_points=5,
+                                   seed=1, processes=1)
+    assert steps[0] == 1
+    np.testing.assert_allclose(np.cov(np.log(growth[:, 0, :].astype(float)), rowvar=False), COV, rtol=0.05,
+                               atol=2e-6)
+
+
+def test_missing_prices_are_left_out_of_the_covariance():
+    rng = np.random.default_rng(4)
+    returns = rng.multivariate_normal([0.0, 0.0], COV[:2, :2], size=400)
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), columns=['AAA', 'BBB'],
+                          index=pd.bdate_range('2024-01-01', periods=400))
+    # BBB lists late and misses a few days (another exchange's holidays)
+    prices.iloc[:100, 1] = np.nan
+    prices.iloc[200:205, 1] = np.nan
+    mu, cov = estimate_parameters(prices, ['AAA', 'BBB'])
+
+    log_returns = np.log(prices / prices.shift(1)).iloc[1:]
+    np.testing.assert_allclose(cov, log_returns.cov().to_numpy())
+    np.testing.assert_allclose(mu, log_returns.mean().to_numpy())
+    # Zero-filling the gaps would have shrunk BBB's variance by about a quarter
+    assert cov[1, 1] == pytest.approx(COV[1, 1], rel=0.15)
+    assert cov[1, 1] > np.log(prices / prices.shift(1)).iloc[1:].fillna(0.0).cov().iloc[1, 1] * 1.2
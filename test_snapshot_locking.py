@@ -0,0 +1,64 @@
+"""Stress test: concurrent snapshot writers must not lose rows or expose partial files."""
+
+import multiprocessing as mp
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from portodash.data_fetch import fetch_and_store_snapshot
+from portodash.locking import LockTimeout, file_lock
+
+WRITERS = 12
+SNAPSHOTS_PER_WRITER = 5
+HOLDINGS = [{'ticker': t, 'shares': 10, 'cost_basis': 5.0, 'account_nickname': 'TFSA'} for t in ('XEQT.TO', 'VFV.TO', 'ZAG.TO')]
+
+
+def _writer(csv_path, writer_id, barrier):
+    barrier.wait()
+    for k in range(SNAPSHOTS_PER_WRITER):
+        # Every snapshot lands on its own day, so none replaces another
+        day = pd.Timestamp('2024-01-01') + pd.Timedelta(days=writer_id * SNAPSHOTS_PER_WRITER + k)
+        prices = {h['ticker']: 10.0 + writer_id for h in HOLDINGS}
+        fetch_and_store_snapshot(HOLDINGS, prices, csv_path, fetched_at_iso=(day + pd.Timedelta(hours=20)).isoformat(),
+                                 lock_timeout=60)
+
+
+def test_concurrent_writers_keep_every_row(tmp_path):
+    csv_path = str(tmp_path / 'historical.csv')
+    ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+    barrier = ctx.Barrier(WRITERS)
+    procs = [ctx.Process(target=_writer, args=(csv_path, i, barrier)) for i in range(WRITERS)]
+    for p in procs:
+        p.start()
+
+    # Unlocked readers only ever see complete files
+    reads = 0
+    while any(p.is_alive() for p in procs):
+        if os.path.exists(csv_path):
+            df = pd.read_csv(csv_path)
+            assert len(df) % len(HOLDINGS) == 0
+            reads += 1
+        time.sleep(0.005)
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    df = pd.read_csv(csv_path)
+    assert len(df) == WRITERS * SNAPSHOTS_PER_WRITER * len(HOLDINGS)
+    dates = pd.to_datetime(df['date'], format='ISO8601', utc=True)
+    assert dates.dt.normalize().nunique() == WRITERS * SNAPSHOTS_PER_WRITER
+    assert dates.is_monotonic_increasing
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    assert reads > 0
+
+
+def test_lock_wait_is_bounded(tmp_path):
+    path = str(tmp_path / 'historical.csv')
+    with file_lock(path):
+        ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+        with ctx.Pool(1) as pool:
+            with pytest.raises(LockTimeout):
+                pool.apply(fetch_and_store_snapshot, (HOLDINGS, {}, path), {'lock_timeout': 0.2})
+    assert not os.path.exists(path)
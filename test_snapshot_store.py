@@ -0,0 +1,97 @@
+"""Tests for the compact snapshot store."""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portodash.cache import get_cached_prices
+from portodash.data_fetch import fetch_and_store_snapshot
+from portodash.performance import load_snapshot_cube
+from portodash.snapshot_store import (
+    apply_retention, decode_numbers, default_store_path, encode_numbers, history_path, read_compact, write_compact,
+)
+
+
+def _history(days, end='2025-06-30'):
+    dates = pd.date_range(end=end, periods=days, freq='D', tz='UTC') + pd.Timedelta(hours=20)
+    rows = []
+    for i, d in enumerate(dates):
+        for account, ticker, shares in (('TFSA', 'XEQT.TO', 100.5), ('Roth', 'SPY', 3.0)):
+            price = round(30 + i * 0.01, 2)
+            rows.append({'date': d.isoformat(), 'account': account, 'ticker': ticker, 'shares': shares,
+                         'cost_basis': 25.75, 'price': price, 'current_value': shares * price})
+    df = pd.DataFrame(rows)
+    df['portfolio_value'] = df.groupby('date')['current_value'].transform('sum')
+    df['allocation_pct'] = df['current_value'] / df['portfolio_value']
+    return df
+
+
+def test_round_trip_matches_csv_columns(tmp_path):
+    df = _history(40)
+    meta = write_compact(df, str(tmp_path / 'store'))
+    assert meta['encodings']['shares'] == {'scale': 100} and meta['encodings']['price'] == {'scale': 100}
+    out = read_compact(str(tmp_path / 'store'))
+    assert list(out.columns) == list(df.columns)
+    pd.testing.assert_frame_equal(out.drop(columns='date'), df.drop(columns='date'), check_dtype=False)
+    assert (out['date'] == pd.to_datetime(df['date'], utc=True)).all()
+
+    # The performance cube reads the store like the CSV
+    cube = load_snapshot_cube(str(tmp_path / 'store'))
+    assert cube.total().iloc[-1] == pytest.approx(df['portfolio_value'].iloc[-1])
+
+
+def test_encoding_falls_back_when_scaling_is_not_exact():
+    values, encoding = encode_numbers(np.array([1 / 3, 2 / 3]))
+    assert encoding == {'float': 64} and values.dtype == np.float64
+    values, encoding = encode_numbers(np.array([0.1, 37.24], dtype=np.float32).astype(np.float64))
+    assert encoding == {'float': 32}
+
+
+def test_retention_keeps_month_end_for_old_snapshots():
+    df = _history(800)
+    kept = apply_retention(df, daily_years=1, now=pd.Timestamp('2025-07-01', tz='UTC'))
+    dates = pd.to_datetime(kept['date'], utc=True).drop_duplicates()
+    old = dates[dates < pd.Timestamp('2024-06-30', tz='UTC')]
+    assert old.dt.strftime('%Y-%m').value_counts().eq(1).all()
+    assert old.iloc[:-1].dt.is_month_end.all()
+    assert len(dates[dates >= pd.Timestamp('2024-07-02', tz='UTC')]) == 364
+
+
+def test_scaled_integers_must_round_trip_exactly():
+    values, encoding = encode_numbers(np.array([1.0000000001, 2.0]))
+    assert encoding == {'float': 64}
+    assert np.array_equal(decode_numbers(values, encoding), [1.0000000001, 2.0])
+
+
+def test_snapshots_are_written_into_the_store(tmp_path):
+    now = pd.Timestamp.now(tz='UTC').floor('s')
+    df = _history(800, end=(now - pd.Timedelta(days=1)).normalize().tz_localize(None))
+    csv = tmp_path / 'historical.csv'
+    df.to_csv(csv, index=False)
+    store = default_store_path(str(csv))
+    # Every day kept so far, with a one-year daily tier recorded for later writes
+    write_compact(df, store)
+    meta_path = os.path.join(store, 'meta.json')
+    with open(meta_path) as f:
+        meta = json.load(f)
+    with open(meta_path, 'w') as f:
+        json.dump(dict(meta, daily_years=1), f)
+    assert history_path(str(tmp_path)) == store
+
+    holdings = [{'ticker': 'XEQT.TO', 'shares': 101, 'cost_basis': 26, 'account_nickname': 'TFSA'},
+                {'ticker': 'SPY', 'shares': 3, 'cost_basis': 400, 'account_nickname': 'Roth'}]
+    for price in (31.0, 32.0):
+        # The second snapshot of the day replaces the first
+        fetch_and_store_snapshot(holdings, {'XEQT.TO': price, 'SPY': 500.0}, store, fetched_at_iso=now.isoformat())
+
+    out = read_compact(store)
+    today = out[out['date'].dt.normalize() == now.normalize()]
+    assert sorted(today['price']) == [32.0, 500.0]
+    # The store's retention tier applies to live writes
+    old = out['date'].drop_duplicates()
+    old = old[old < now - pd.Timedelta(days=366)]
+    assert len(old) and old.dt.strftime('%Y-%m').value_counts().eq(1).all()
+    assert get_cached_prices(['XEQT.TO'], store)[0] == {'XEQT.TO': 32.0}
@@ -0,0 +1,83 @@
+"""Tests for the SQLite snapshot store."""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from portodash import sqlite_store
+from portodash.cache import get_cached_prices
+from portodash.data_fetch import fetch_and_store_snapshot
+from portodash.performance import load_snapshot_cube
+from portodash.snapshot_store import CSV_COLUMNS
+
+HOLDINGS = [
+    {'ticker': 'XEQT.TO', 'shares': 10, 'cost_basis': 25.0, 'account_nickname': 'TFSA'},
+    {'ticker': 'SPY', 'shares': 2, 'cost_basis': 400.0, 'account_nickname': 'Roth'},
+]
+
+
+def _snapshot(db, day, price):
+    fetch_and_store_snapshot(HOLDINGS, {'XEQT.TO': price, 'SPY': price * 10}, db,
+                             fetched_at_iso=f'{day}T20:00:00+00:00')
+
+
+def test_snapshots_round_trip_and_replace_same_day(tmp_path):
+    db = str(tmp_path / 'historical.db')
+    now = pd.Timestamp.now(tz='UTC').normalize()
+    days = [str((now - pd.Timedelta(days=n)).date()) for n in (40, 2, 1)]
+    for i, day in enumerate(days):
+        _snapshot(db, day, 30.0 + i)
+    _snapshot(db, days[-1], 35.0)  # replaces the day's snapshot
+
+    rows = sqlite_store.read_rows(db)
+    assert len(rows) == 6 and list(rows.columns) == CSV_COLUMNS
+    assert rows['price'].tolist()[-2:] == [350.0, 35.0]
+    assert rows['portfolio_value'].iloc[-1] == pytest.approx(10 * 35 + 2 * 350)
+
+    prices, times = get_cached_prices(['XEQT.TO', 'VFV.TO'], db, max_age_hours=72)
+    assert prices == {'XEQT.TO': 35.0, 'VFV.TO': None} and times['XEQT.TO'].startswith(days[-1])
+
+    spy = sqlite_store.read_rows(db, start=now - pd.Timedelta(days=7), tickers=['SPY'])
+    assert list(spy.columns) == CSV_COLUMNS and spy['price'].tolist() == [310.0, 350.0]
+
+    cube = load_snapshot_cube(db, days=30)
+    assert len(cube.shares) == 2 and set(cube.shares.columns.get_level_values('account')) == {'TFSA', 'Roth'}
+    cube = load_snapshot_cube(db, days=30, tickers=['SPY'])
+    assert cube.shares.columns.get_level_values('ticker').unique().tolist() == ['SPY']
+
+
+def test_queries_use_indexes(tmp_path):
+    db = str(tmp_path / 'historical.db')
+    _snapshot(db, '2025-01-02', 30.0)
+    conn = sqlite_store.connect(db)
+    tickers, ticker_params = sqlite_store._in_clause('t.symbol', ['SPY'])
+    accounts, account_params = sqlite_store._in_clause('a.name', ['Roth'])
+    queries = [
+        (sqlite_store._LATEST_PRICES_QUERY.format(filters=tickers), [0] + ticker_params),
+        (sqlite_store._ROWS_QUERY.format(filters=accounts), [0, 2 ** 62] + account_params),
+        (sqlite_store._TICKER_ROWS_QUERY.format(filters=accounts + tickers),
+         [0, 2 ** 62] + account_params + ticker_params),
+        ('DELETE FROM snapshots WHERE day IN (?)', ['2025-01-02']),
+    ]
+    plans = []
+    for query, params in queries:
+        plans.append(' | '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)))
+        assert 'SCAN p' not in plans[-1] and 'SCAN positions' not in plans[-1], plans[-1]
+    assert 'positions_by_ticker' in plans[2]
+    conn.close()
+
+
+def test_wal_lets_writers_proceed_during_reads(tmp_path):
+    db = str(tmp_path / 'historical.db')
+    _snapshot(db, '2025-01-02', 30.0)
+    reader = sqlite3.connect(db, isolation_level=None)
+    reader.execute('BEGIN')
+    assert reader.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0] == 1
+    # The writer does not wait for the open read transaction
+    assert sqlite_store.replace_snapshots(db, sqlite_store.read_rows(db).assign(date='2025-01-03T20:00:00+00:00'),
+                                          timeout=0.5) == 1
+    assert reader.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0] == 1
+    reader.execute('COMMIT')
+    assert reader.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0] == 2
+    reader.close()
@@ -0,0 +1,37 @@
+"""Tests for the compiled theme stylesheet and metric card templates."""
+
+import re
+import tomllib
+
+from portodash import theme
+
+
+def test_compiled_css_is_minified_hashed_and_cacheable():
+    css = theme.compiled_css()
+    assert '/*' not in css and '\n' not in css and '  ' not in css.replace('"PortoDash Portfolio Report"', '')
+    # Rules, media queries and quoted content survive
+    for fragment in ('.stButton>button:focus-visible', '@media print{', 'content:"PortoDash Portfolio Report"',
+                     f'--pd-secondary:{theme.TOKENS.secondary}'):
+        assert fragment in css
+    assert css.count('{') == css.count('}')
+    assert theme.compiled_css() is css
+
+    tag = theme.style_tag()
+    assert re.fullmatch(r'<style data-pd-css="[0-9a-f]{12}">.*</style>', tag)
+    assert theme.css_version() != theme.css_version('base')
+    # Large enough for Streamlit to send unchanged reruns as a hash reference
+    with open('.streamlit/config.toml', 'rb') as f:
+        threshold = tomllib.load(f)['global']['minCachedMessageSize']
+    assert len(tag.encode()) >= threshold
+
+
+def test_metric_card_templates_match_markup():
+    card = theme.render_metric_card('Gain', 1234.5, delta=-2.345, delta_precision=2, delta_label='vs cost',
+                                    help_text='In CAD')
+    assert card == ("<div class='metric-card'><div class='metric-label'>Gain</div>"
+                    "<div class='metric-value'>$1,234</div>"
+                    "<div class='metric-delta negative'>-2.35%<span class='metric-delta-label'>vs cost</span></div>"
+                    "<div class='metric-help'>In CAD</div></div>")
+    assert theme.render_metric_card('Holdings', 37, value_is_currency=False) == (
+        "<div class='metric-card'><div class='metric-label'>Holdings</div><div class='metric-value'>37</div></div>")
+    assert theme.format_percentage(3.14159, precision=2, include_sign=False) == '3.14%'
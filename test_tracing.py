@@ -0,0 +1,86 @@
+"""Tests for the span/timer API."""
+
+import threading
+
+from portodash import tracing
+
+
+def test_disabled_tracing_records_nothing():
+    tracing.disable()
+
+    @tracing.traced()
+    def work():
+        return 42
+
+    with tracing.collect() as spans:
+        with tracing.span('outer'):
+            assert work() == 42
+    assert spans == []
+
+
+def test_nested_spans_and_chrome_trace():
+    tracing.enable()
+    try:
+        @tracing.traced('lib.work')
+        def work():
+            return 1
+
+        with tracing.collect() as spans:
+            stages = tracing.Stages('app')
+            with tracing.span('app.main'):
+                stages.next('load')
+                work()
+                stages.next('render')
+                work()
+                stages.close()
+    finally:
+        tracing.disable()
+
+    summary = {row['name']: row for row in tracing.summarize(spans)}
+    assert list(summary) == ['app.main', 'app.load', 'lib.work', 'app.render']
+    assert summary['app.main']['depth'] == 0
+    assert summary['app.load']['depth'] == 1
+    assert summary['lib.work']['depth'] == 2 and summary['lib.work']['calls'] == 2
+
+    events = tracing.to_chrome_trace(spans)['traceEvents']
+    assert {e['ph'] for e in events} == {'X'}
+    main = next(e for e in events if e['name'] == 'app.main')
+    assert all(main['ts'] <= e['ts'] and e['ts'] + e['dur'] <= main['ts'] + main['dur'] for e in events)
+
+
+def test_collect_enables_tracing_for_its_thread_only():
+    tracing.disable()
+    started, release = threading.Event(), threading.Event()
+    other = []
+
+    def session():
+        with tracing.collect() as spans:
+            started.wait()
+            with tracing.span('other.session'):
+                pass
+        other.extend(spans)
+        release.set()
+
+    worker = threading.Thread(target=session)
+    worker.start()
+    with tracing.collect(enabled=True) as spans:
+        started.set()
+        release.wait()
+        with tracing.span('this.session'):
+            assert tracing.is_enabled()
+    worker.join()
+    assert [s.name for s in spans] == ['this.session'] and other == []
+    assert not tracing.is_enabled()
+
+    # The process-wide default still applies where a thread sets nothing
+    tracing.enable()
+    try:
+        with tracing.collect() as spans, tracing.collect(enabled=False) as off:
+            with tracing.span('off'):
+                pass
+        assert spans == off == []
+        tracing.set_enabled(False)
+        assert not tracing.is_enabled()
+    finally:
+        tracing.set_enabled(None)
+        tracing.disable()